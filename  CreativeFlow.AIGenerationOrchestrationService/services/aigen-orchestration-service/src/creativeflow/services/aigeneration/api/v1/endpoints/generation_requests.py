@@ -5,22 +5,40 @@ This module defines the API endpoints that clients use to initiate, monitor,
 and manage AI generation tasks. It delegates the core business logic to the
 OrchestrationService.
 """
+import asyncio
+import json
+from contextlib import AsyncExitStack
+from typing import AsyncIterator, List, Optional
 from uuid import UUID
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 
 from creativeflow.services.aigeneration.api.v1 import schemas
+from creativeflow.services.aigeneration.application.dtos import GenerationRequestCreateDTO
 from creativeflow.services.aigeneration.application.services.orchestration_service import (
     OrchestrationService,
     InsufficientCreditsError,
-    GenerationRequestStateError,
+    InvalidGenerationState,
 )
-from creativeflow.services.aigeneration.core.dependencies import get_orchestration_service
+from creativeflow.services.aigeneration.core.config import settings
+from creativeflow.services.aigeneration.core.dependencies import get_orchestration_service, get_status_broadcaster
+from creativeflow.services.aigeneration.domain.models.generation_status import GenerationStatus
+from creativeflow.services.aigeneration.infrastructure.messaging.status_event_broadcaster import GenerationStatusBroadcaster
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Statuses after which a request's event stream has nothing more to report.
+TERMINAL_STATUSES = {
+    GenerationStatus.COMPLETED.value,
+    GenerationStatus.FAILED.value,
+    GenerationStatus.CONTENT_REJECTED.value,
+}
+# Disable proxy buffering so events reach the client as soon as they are written.
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
 
 @router.post(
     "/",
@@ -48,7 +66,7 @@ async def create_generation_request(
             request_payload.project_id
         )
         generation_request_domain = await orchestration_svc.initiate_generation(
-            request_data=request_payload
+            request_data=GenerationRequestCreateDTO(**request_payload.dict())
         )
         return generation_request_domain
     except InsufficientCreditsError as e:
@@ -65,6 +83,147 @@ async def create_generation_request(
         )
 
 
+@router.get(
+    "/",
+    response_model=schemas.GenerationRequestPage,
+    status_code=status.HTTP_200_OK,
+    summary="List a user's generation requests",
+    description="Lists a user's generation requests, newest first, using cursor (keyset) pagination on (created_at, id).",
+)
+async def list_generation_requests(
+    user_id: str = Query(..., description="Identifier of the user whose requests are listed."),
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of requests to return."),
+    cursor: Optional[str] = Query(None, description="The `next_cursor` returned by the previous page."),
+    orchestration_svc: OrchestrationService = Depends(get_orchestration_service),
+) -> schemas.GenerationRequestPage:
+    """
+    Endpoint to page through a user's generation requests.
+
+    Pass the returned `next_cursor` to fetch the following page; the cost of a page does not grow with its depth.
+    """
+    requests, next_cursor = await orchestration_svc.list_user_generations(user_id=user_id, limit=limit, cursor=cursor)
+    return schemas.GenerationRequestPage(items=requests, next_cursor=next_cursor)
+
+
+@router.post(
+    "/status:batchGet",
+    response_model=schemas.GenerationStatusBatchGetResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Get the status of several generation requests",
+    description="Resolves the current status and details of up to 200 generation requests with a single query.",
+)
+async def batch_get_generation_status(
+    batch_request: schemas.GenerationStatusBatchGetRequest,
+    orchestration_svc: OrchestrationService = Depends(get_orchestration_service),
+) -> schemas.GenerationStatusBatchGetResponse:
+    """
+    Endpoint for clients polling many in-flight requests at once.
+
+    - **batch_request**: The IDs to resolve. Unknown IDs are reported in `not_found_ids` rather than failing the call.
+    """
+    logger.info("Fetching status for %d generation requests", len(batch_request.request_ids))
+    requests, not_found_ids = await orchestration_svc.get_generation_statuses(batch_request.request_ids)
+    return schemas.GenerationStatusBatchGetResponse(requests=requests, not_found_ids=not_found_ids)
+
+
+def _format_sse(event: dict) -> str:
+    return f"event: status\ndata: {json.dumps(event)}\n\n"
+
+
+async def _stream_status_events(
+    http_request: Request,
+    queue: asyncio.Queue,
+    subscription: AsyncExitStack,
+    initial_events: List[dict],
+    close_on_terminal_status: bool,
+) -> AsyncIterator[str]:
+    """
+    Yields Server-Sent Events from a status subscription, with keep-alive comments while idle.
+    The subscription is released when the client disconnects or the stream ends.
+    """
+    try:
+        for event in initial_events:
+            yield _format_sse(event)
+            if close_on_terminal_status and event["status"] in TERMINAL_STATUSES:
+                return
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=settings.STATUS_EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await http_request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            yield _format_sse(event)
+            if close_on_terminal_status and event["status"] in TERMINAL_STATUSES:
+                return
+    finally:
+        await subscription.aclose()
+
+
+@router.get(
+    "/events",
+    summary="Stream status events for all of a user's generation requests",
+    description="Server-Sent Events stream multiplexing the status transitions of every generation request of a user.",
+    response_class=StreamingResponse,
+)
+async def stream_user_generation_events(
+    http_request: Request,
+    user_id: str = Query(..., description="Identifier of the user whose requests are streamed."),
+    broadcaster: GenerationStatusBroadcaster = Depends(get_status_broadcaster),
+) -> StreamingResponse:
+    """
+    Endpoint for dashboards that follow many in-flight requests of a user without polling.
+    """
+    logger.info("Opening status event stream for user %s", user_id)
+    subscription = AsyncExitStack()
+    queue = await subscription.enter_async_context(broadcaster.subscribe(broadcaster.user_channel(user_id)))
+    return StreamingResponse(
+        _stream_status_events(http_request, queue, subscription, [], close_on_terminal_status=False),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+@router.get(
+    "/{request_id}/events",
+    summary="Stream status events for a generation request",
+    description="Server-Sent Events stream of a generation request's status transitions. The current status is sent first; the stream closes once the request reaches a terminal status.",
+    response_class=StreamingResponse,
+)
+async def stream_generation_events(
+    request_id: UUID,
+    http_request: Request,
+    orchestration_svc: OrchestrationService = Depends(get_orchestration_service),
+    broadcaster: GenerationStatusBroadcaster = Depends(get_status_broadcaster),
+) -> StreamingResponse:
+    """
+    Endpoint to follow a single generation request without polling.
+
+    - **request_id**: The unique identifier of the generation request.
+    """
+    logger.info("Opening status event stream for generation request %s", request_id)
+    # Subscribe before reading the current state so no transition can fall between the two.
+    subscription = AsyncExitStack()
+    queue = await subscription.enter_async_context(broadcaster.subscribe(broadcaster.request_channel(request_id)))
+    try:
+        generation_request_domain = await orchestration_svc.get_generation_status(request_id)
+    except Exception:
+        await subscription.aclose()
+        raise
+    return StreamingResponse(
+        _stream_status_events(
+            http_request,
+            queue,
+            subscription,
+            [GenerationStatusBroadcaster.build_event(generation_request_domain)],
+            close_on_terminal_status=True,
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
 @router.get(
     "/{request_id}",
     response_model=schemas.GenerationRequestRead,
@@ -126,9 +285,9 @@ async def select_sample_for_final_generation(
     except InsufficientCreditsError as e:
         logger.warning("Insufficient credits for user %s, final generation request %s.", sample_selection.user_id, request_id)
         raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail=str(e))
-    except GenerationRequestStateError as e:
-        logger.warning("Invalid state for sample selection on request %s: %s", request_id, e)
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except InvalidGenerationState as e:
+        logger.warning("Invalid state for sample selection on request %s: %s", request_id, e.detail)
+        raise
     except ValueError as e: # For invalid sample ID
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
@@ -168,9 +327,9 @@ async def regenerate_samples(
     except InsufficientCreditsError as e:
         logger.warning("Insufficient credits for user %s to regenerate samples for request %s.", regeneration_request.user_id, request_id)
         raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail=str(e))
-    except GenerationRequestStateError as e:
-        logger.warning("Invalid state for sample regeneration on request %s: %s", request_id, e)
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except InvalidGenerationState as e:
+        logger.warning("Invalid state for sample regeneration on request %s: %s", request_id, e.detail)
+        raise
     except Exception as e:
         logger.error("Failed to regenerate samples for request %s: %s", request_id, e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred.")
\ No newline at end of file
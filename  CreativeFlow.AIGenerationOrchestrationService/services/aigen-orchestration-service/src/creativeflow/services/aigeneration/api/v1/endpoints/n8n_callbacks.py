@@ -4,16 +4,30 @@ FastAPI router for handling asynchronous callbacks from the n8n Workflow Engine.
 These endpoints are crucial for updating the status of generation requests
 as they are processed by the n8n workflows. They receive results, errors,
 and status updates, and delegate processing to the OrchestrationService.
+
+n8n may deliver the same callback more than once (retries after timeouts), so each
+callback is processed at most once per idempotency key: the `Idempotency-Key` header
+if n8n sends one, otherwise a hash of the request body. The key is only marked as
+processed once the callback's changes are committed; a redelivery arriving while
+another delivery is still processing is answered with 409 so that n8n retries it.
 """
 
+import hashlib
 import logging
 from typing import Optional, Dict
 
-from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from creativeflow.services.aigeneration.api.v1 import schemas
 from creativeflow.services.aigeneration.application.services.orchestration_service import OrchestrationService
-from creativeflow.services.aigeneration.core.dependencies import get_orchestration_service
+from creativeflow.services.aigeneration.core.dependencies import (
+    get_callback_idempotency_store,
+    get_db_session,
+    get_orchestration_service,
+)
+from creativeflow.services.aigeneration.infrastructure.cache.callback_idempotency_store import CallbackIdempotencyStore
+from creativeflow.services.aigeneration.infrastructure.database import db_config
 from creativeflow.services.aigeneration.core.config import settings
 
 router = APIRouter()
@@ -45,6 +59,35 @@ async def verify_n8n_secret(x_callback_secret: Optional[str] = Header(None)):
         logger.warning("N8N_CALLBACK_SECRET is not set. Skipping callback verification.")
 
 
+async def get_callback_idempotency_key(request: Request, idempotency_key: Optional[str] = Header(None)) -> str:
+    """
+    Dependency deriving the idempotency key of a callback, scoped to the callback endpoint.
+    """
+    if idempotency_key:
+        return f"{request.url.path}:{idempotency_key}"
+    body = await request.body()
+    return f"{request.url.path}:sha256:{hashlib.sha256(body).hexdigest()}"
+
+
+async def _duplicate_response(idempotency_store: CallbackIdempotencyStore, idempotency_key: str) -> Dict[str, str]:
+    """
+    Answers a callback whose key is already claimed. While the first delivery is still
+    processing, a 409 makes n8n retry, so the callback is not lost if that delivery fails.
+    """
+    if await idempotency_store.is_processing(idempotency_key):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This callback is already being processed.",
+        )
+    return {"status": "duplicate"}
+
+
+async def _commit_processed(db_session: AsyncSession, idempotency_store: CallbackIdempotencyStore, idempotency_key: str) -> None:
+    """Commits the callback's changes, then marks its idempotency key as processed."""
+    await db_config.commit_session(db_session)
+    await idempotency_store.mark_done(idempotency_key)
+
+
 @router.post(
     "/sample-result",
     response_model=Dict[str, str],
@@ -55,15 +98,26 @@ async def verify_n8n_secret(x_callback_secret: Optional[str] = Header(None)):
 async def handle_n8n_sample_generation_callback(
     callback_payload: schemas.N8NSampleResultPayload,
     orchestration_svc: OrchestrationService = Depends(get_orchestration_service),
+    idempotency_store: CallbackIdempotencyStore = Depends(get_callback_idempotency_store),
+    idempotency_key: str = Depends(get_callback_idempotency_key),
+    db_session: AsyncSession = Depends(get_db_session),
 ) -> Dict[str, str]:
     """
     Webhook endpoint for n8n to post the results of a sample generation job.
     """
     logger.info("Received n8n sample result callback for request ID: %s", callback_payload.generation_request_id)
+    if not await idempotency_store.claim(idempotency_key):
+        logger.info("Ignoring duplicate n8n sample result callback for request ID: %s", callback_payload.generation_request_id)
+        return await _duplicate_response(idempotency_store, idempotency_key)
     try:
         await orchestration_svc.process_n8n_sample_callback(callback_payload)
+        await _commit_processed(db_session, idempotency_store, idempotency_key)
         return {"status": "received"}
     except Exception as e:
+        # Discard any partial changes; the request's unit of work would otherwise commit them.
+        await db_config.rollback_session(db_session)
+        # Allow a later redelivery to be processed again.
+        await idempotency_store.release(idempotency_key)
         # Log the error but still return a 200 OK to n8n to prevent retries.
         # The error needs to be handled internally (e.g., via monitoring and alerts).
         logger.error(
@@ -85,15 +139,24 @@ async def handle_n8n_sample_generation_callback(
 async def handle_n8n_final_generation_callback(
     callback_payload: schemas.N8NFinalResultPayload,
     orchestration_svc: OrchestrationService = Depends(get_orchestration_service),
+    idempotency_store: CallbackIdempotencyStore = Depends(get_callback_idempotency_store),
+    idempotency_key: str = Depends(get_callback_idempotency_key),
+    db_session: AsyncSession = Depends(get_db_session),
 ) -> Dict[str, str]:
     """
     Webhook endpoint for n8n to post the results of a final asset generation job.
     """
     logger.info("Received n8n final result callback for request ID: %s", callback_payload.generation_request_id)
+    if not await idempotency_store.claim(idempotency_key):
+        logger.info("Ignoring duplicate n8n final result callback for request ID: %s", callback_payload.generation_request_id)
+        return await _duplicate_response(idempotency_store, idempotency_key)
     try:
         await orchestration_svc.process_n8n_final_asset_callback(callback_payload)
+        await _commit_processed(db_session, idempotency_store, idempotency_key)
         return {"status": "received"}
     except Exception as e:
+        await db_config.rollback_session(db_session)
+        await idempotency_store.release(idempotency_key)
         logger.error(
             "Error processing n8n final result callback for request %s: %s",
             callback_payload.generation_request_id, e, exc_info=True
@@ -111,6 +174,9 @@ async def handle_n8n_final_generation_callback(
 async def handle_n8n_error_callback(
     callback_payload: schemas.N8NErrorPayload,
     orchestration_svc: OrchestrationService = Depends(get_orchestration_service),
+    idempotency_store: CallbackIdempotencyStore = Depends(get_callback_idempotency_store),
+    idempotency_key: str = Depends(get_callback_idempotency_key),
+    db_session: AsyncSession = Depends(get_db_session),
 ) -> Dict[str, str]:
     """
     Webhook endpoint for n8n to report an error during a generation job.
@@ -120,10 +186,16 @@ async def handle_n8n_error_callback(
         callback_payload.generation_request_id,
         callback_payload.error_message
     )
+    if not await idempotency_store.claim(idempotency_key):
+        logger.info("Ignoring duplicate n8n error callback for request ID: %s", callback_payload.generation_request_id)
+        return await _duplicate_response(idempotency_store, idempotency_key)
     try:
         await orchestration_svc.handle_n8n_error(callback_payload)
+        await _commit_processed(db_session, idempotency_store, idempotency_key)
         return {"status": "received"}
     except Exception as e:
+        await db_config.rollback_session(db_session)
+        await idempotency_store.release(idempotency_key)
         logger.error(
             "Error processing n8n error callback for request %s: %s",
             callback_payload.generation_request_id, e, exc_info=True
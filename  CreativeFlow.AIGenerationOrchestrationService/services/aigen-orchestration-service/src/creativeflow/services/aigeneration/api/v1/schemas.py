@@ -49,6 +49,10 @@ class GenerationRequestCreate(BaseModel):
     target_platform_hints: Optional[List[str]] = Field(None, description="Hints about the target social media platform.")
     emotional_tone: Optional[str] = Field(None, description="Desired emotional tone of the creative.")
     cultural_adaptation_parameters: Optional[Dict[str, Any]] = Field(None, description="Parameters for cultural adaptation.")
+    reuse_cached_samples: bool = Field(
+        False,
+        description="If true and the same user already generated samples for identical inputs, those samples are returned immediately instead of running a new generation."
+    )
 
 class GenerationRequestRead(BaseModel):
     """Schema for reading a generation request's state and results."""
@@ -66,6 +70,23 @@ class GenerationRequestRead(BaseModel):
     class Config:
         from_attributes = True
 
+# Upper bound on the number of IDs resolved by one batch status call.
+BATCH_GET_MAX_IDS = 200
+
+class GenerationStatusBatchGetRequest(BaseModel):
+    """Schema for fetching the status of several generation requests at once."""
+    request_ids: List[UUID] = Field(..., min_length=1, max_length=BATCH_GET_MAX_IDS, description="IDs of the generation requests to fetch.")
+
+class GenerationStatusBatchGetResponse(BaseModel):
+    """Schema for the result of a batch status call."""
+    requests: List[GenerationRequestRead] = Field(..., description="The generation requests found, in request order.")
+    not_found_ids: List[UUID] = Field(default_factory=list, description="Requested IDs that do not exist.")
+
+class GenerationRequestPage(BaseModel):
+    """Schema for a page of generation requests using cursor (keyset) pagination."""
+    items: List[GenerationRequestRead] = Field(..., description="Generation requests, newest first.")
+    next_cursor: Optional[str] = Field(None, description="Opaque cursor for the next page; absent on the last page.")
+
 # --- API Interaction Schemas ---
 
 class SampleSelection(BaseModel):
@@ -12,6 +12,24 @@ from typing import Optional, List, Dict, Any
 from uuid import UUID
 from pydantic import BaseModel, Field
 
+# --- DTOs for Generation Requests ---
+
+class GenerationRequestCreateDTO(BaseModel):
+    """Internal DTO carrying a new generation request from the API layer to the orchestration service."""
+    user_id: str
+    project_id: str
+    input_prompt: str
+    style_guidance: Optional[str] = None
+    output_format: str
+    custom_dimensions: Optional[Dict[str, int]] = None
+    brand_kit_id: Optional[str] = None
+    uploaded_image_references: Optional[List[str]] = None
+    target_platform_hints: Optional[List[str]] = None
+    emotional_tone: Optional[str] = None
+    cultural_adaptation_parameters: Optional[Dict[str, Any]] = None
+    reuse_cached_samples: bool = False
+
+
 # --- DTOs for n8n Job Publishing ---
 
 class GenerationJobParameters(BaseModel):
@@ -82,6 +100,15 @@ class RefundCreditsDTO(BaseModel):
     amount: float
     reason: str
 
+class CreditReservationDTO(BaseModel):
+    """
+    Result of a combined check-and-reserve call to the Credit Service: the user's
+    subscription tier and the credits held (already deducted) for the request.
+    """
+    tier: str
+    reserved_credits: float = 0.0
+    hold_id: Optional[str] = None
+
 class CreditServiceRequest(BaseModel):
     """A generic container for credit service requests, if needed."""
     action: str
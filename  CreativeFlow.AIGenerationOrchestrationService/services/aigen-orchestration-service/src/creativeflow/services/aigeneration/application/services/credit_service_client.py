@@ -1,9 +1,13 @@
 import logging
+from typing import Optional
 from uuid import UUID
 
 import httpx
 from fastapi import HTTPException, status
 
+from creativeflow.services.aigeneration.application.dtos import CreditReservationDTO
+from creativeflow.services.aigeneration.infrastructure.cache.subscription_tier_cache import SubscriptionTierCache
+
 logger = logging.getLogger(__name__)
 
 # Custom exceptions for the credit service client
@@ -22,16 +26,18 @@ class CreditServiceClient:
     This class encapsulates the communication details for all credit and subscription operations.
     """
 
-    def __init__(self, base_url: str, http_client: httpx.AsyncClient):
+    def __init__(self, base_url: str, http_client: httpx.AsyncClient, tier_cache: Optional[SubscriptionTierCache] = None):
         """
         Initializes the CreditServiceClient.
 
         Args:
             base_url: The base URL of the Credit Service API.
             http_client: An instance of httpx.AsyncClient for making requests.
+            tier_cache: Optional short-TTL cache for subscription tier lookups.
         """
         self._base_url = base_url.rstrip('/')
         self._http_client = http_client
+        self._tier_cache = tier_cache
 
     async def check_credits(self, user_id: str, required_credits: float) -> bool:
         """
@@ -126,23 +132,68 @@ class CreditServiceClient:
 
     async def get_user_subscription_tier(self, user_id: str) -> str:
         """
-        Retrieves the subscription tier for a given user.
+        Retrieves the subscription tier for a given user, serving it from the tier cache when possible.
 
         Returns:
             The user's subscription tier as a string (e.g., "Free", "Pro").
         Raises:
             CreditServiceError: If the user or tier cannot be retrieved.
         """
+        if self._tier_cache is not None:
+            cached_tier = await self._tier_cache.get(user_id)
+            if cached_tier is not None:
+                return cached_tier
+
         url = f"{self._base_url}/users/{user_id}/subscription"
         try:
             response = await self._http_client.get(url)
             response.raise_for_status()
             tier = response.json().get("tier", "Free")
             logger.debug(f"Retrieved subscription tier '{tier}' for user {user_id}.")
+            if self._tier_cache is not None:
+                await self._tier_cache.set(user_id, tier)
             return tier
         except httpx.HTTPStatusError as e:
             logger.error(f"Failed to get subscription tier for user {user_id}: {e.response.text}")
             raise CreditServiceError(f"Failed to retrieve user subscription tier (status: {e.response.status_code}).")
         except httpx.RequestError as e:
             logger.error(f"Could not connect to credit service for subscription check: {e.request.url!r}.")
-            raise CreditServiceError("Could not connect to the Credit Service for subscription check.")
\ No newline at end of file
+            raise CreditServiceError("Could not connect to the Credit Service for subscription check.")
+
+    async def check_and_reserve_credits(self, user_id: str, request_id: UUID, required_credits: float, action_type: str) -> CreditReservationDTO:
+        """
+        Resolves the user's subscription tier, checks the balance and places a credit hold
+        for the request in a single round trip. Tiers with free samples get no hold
+        (`reserved_credits` is 0). A hold is released with `refund_credits` for the same request.
+
+        Returns:
+            A CreditReservationDTO with the tier and the reserved amount.
+        Raises:
+            InsufficientCreditsError: If the user does not have enough credits.
+            CreditServiceError: For any other API or network issue.
+        """
+        url = f"{self._base_url}/users/{user_id}/credits/check-and-reserve"
+        payload = {
+            "required_credits": required_credits,
+            "action_type": action_type,
+            "reference_id": str(request_id),
+        }
+        try:
+            response = await self._http_client.post(url, json=payload)
+            if response.status_code == 402:
+                raise InsufficientCreditsError(response.json().get("detail", "Insufficient credits."))
+            response.raise_for_status()
+            reservation = CreditReservationDTO(**response.json())
+            logger.info(
+                f"Reserved {reservation.reserved_credits} credits for user {user_id} (tier '{reservation.tier}') "
+                f"on request {request_id}."
+            )
+            if self._tier_cache is not None:
+                await self._tier_cache.set(user_id, reservation.tier)
+            return reservation
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Credit check-and-reserve failed for user {user_id}. Status: {e.response.status_code}, Body: {e.response.text}")
+            raise CreditServiceError(f"Credit service failed with status {e.response.status_code}.")
+        except httpx.RequestError as e:
+            logger.error(f"Could not connect to credit service for check-and-reserve: {e.request.url!r}.")
+            raise CreditServiceError("Could not connect to the Credit Service.")
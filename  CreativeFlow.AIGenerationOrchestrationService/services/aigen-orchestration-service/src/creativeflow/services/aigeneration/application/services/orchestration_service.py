@@ -1,16 +1,25 @@
+import asyncio
+import base64
 import logging
-from typing import Optional
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 from uuid import UUID
 import json
 
 from fastapi import HTTPException, status
+from pydantic import BaseModel
 
-from creativeflow.services.aigeneration.core.config import get_settings
+from creativeflow.services.aigeneration.core.config import Settings, settings as default_settings
 from creativeflow.services.aigeneration.application.dtos import GenerationRequestCreateDTO, N8NSampleResultDTO, N8NFinalResultDTO, N8NErrorDTO
+from creativeflow.services.aigeneration.domain.models.asset_info import AssetInfo
 from creativeflow.services.aigeneration.domain.models.generation_request import GenerationRequest
 from creativeflow.services.aigeneration.domain.models.generation_status import GenerationStatus
 from creativeflow.services.aigeneration.domain.repositories.generation_request_repository import IGenerationRequestRepository
+from creativeflow.services.aigeneration.infrastructure.cache.prompt_result_cache import PromptResultCache
+from creativeflow.services.aigeneration.infrastructure.messaging.outbox_relay import OutboxRelay
 from creativeflow.services.aigeneration.infrastructure.messaging.rabbitmq_publisher import RabbitMQPublisher
+from creativeflow.services.aigeneration.infrastructure.messaging.status_event_broadcaster import GenerationStatusBroadcaster
+from creativeflow.services.aigeneration.infrastructure.repositories.generation_request_batch_writer import GenerationRequestBatchWriter
 from .credit_service_client import CreditServiceClient, InsufficientCreditsError, CreditServiceError
 from .notification_service_client import NotificationServiceClient
 
@@ -27,8 +36,20 @@ class JobPublishError(HTTPException):
     def __init__(self, detail: str):
         super().__init__(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to publish generation job: {detail}")
 
+class InvalidPaginationCursor(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+
+class StaleCallbackError(Exception):
+    """Raised for an n8n callback that arrives after its request left the stage it reports on."""
+    def __init__(self, request_id: UUID, current_status: GenerationStatus):
+        super().__init__(f"Request {request_id} is no longer awaiting this callback (status: {current_status.value}).")
+
 logger = logging.getLogger(__name__)
 
+# Statuses in which a request is waiting for an n8n callback.
+IN_FLIGHT_STATUSES = {GenerationStatus.PROCESSING_SAMPLES, GenerationStatus.PROCESSING_FINAL}
+
 # As per REQ-016
 CREDITS_COST_SAMPLE = 0.25
 CREDITS_COST_REGENERATION = 0.25
@@ -47,12 +68,21 @@ class OrchestrationService:
         rabbitmq_publisher: RabbitMQPublisher,
         credit_service_client: CreditServiceClient,
         notification_client: NotificationServiceClient,
+        outbox_relay: Optional[OutboxRelay] = None,
+        status_broadcaster: Optional[GenerationStatusBroadcaster] = None,
+        callback_writer: Optional[GenerationRequestBatchWriter] = None,
+        prompt_cache: Optional[PromptResultCache] = None,
+        settings: Optional[Settings] = None,
     ):
         self._repo = repo
         self._rabbitmq_publisher = rabbitmq_publisher
         self._credit_service_client = credit_service_client
         self._notification_client = notification_client
-        self.settings = get_settings()
+        self._outbox_relay = outbox_relay
+        self._status_broadcaster = status_broadcaster
+        self._callback_writer = callback_writer
+        self._prompt_cache = prompt_cache
+        self.settings = settings or default_settings
 
     async def initiate_generation(self, request_data: GenerationRequestCreateDTO) -> GenerationRequest:
         """
@@ -61,29 +91,60 @@ class OrchestrationService:
         """
         logger.info(f"Initiating generation for user '{request_data.user_id}' in project '{request_data.project_id}'.")
 
+        # The aggregate is built up front (not yet persisted) so its ID can reference a credit hold.
+        new_request = GenerationRequest(
+            user_id=request_data.user_id,
+            project_id=request_data.project_id,
+            input_prompt=request_data.input_prompt,
+            style_guidance=request_data.style_guidance,
+            input_parameters=request_data.dict(exclude={"user_id", "project_id", "input_prompt", "style_guidance", "reuse_cached_samples"}),
+            status=GenerationStatus.VALIDATING_CREDITS
+        )
+
         # 1. Credit/Subscription Check
         required_credits = CREDITS_COST_SAMPLE
         try:
-            subscription_tier = await self._credit_service_client.get_user_subscription_tier(request_data.user_id)
-            if subscription_tier.lower() in ["team", "enterprise"]:  # Example tiers with free samples
-                 logger.info(f"User '{request_data.user_id}' on tier '{subscription_tier}', skipping sample credit check.")
-                 required_credits = 0.0
+            if self.settings.ENABLE_COMBINED_CREDIT_RESERVATION:
+                # Tier lookup, balance check and credit hold in a single round trip.
+                reservation = await self._credit_service_client.check_and_reserve_credits(
+                    user_id=request_data.user_id,
+                    request_id=new_request.id,
+                    required_credits=required_credits,
+                    action_type="sample_generation_fee"
+                )
+                if reservation.reserved_credits > 0:
+                    new_request.credits_cost_sample = reservation.reserved_credits
+                # The hold already covers the sample fee; there is nothing left to deduct in step 3.
+                required_credits = 0.0
             else:
-                await self._credit_service_client.check_credits(request_data.user_id, required_credits)
+                subscription_tier = await self._credit_service_client.get_user_subscription_tier(request_data.user_id)
+                if subscription_tier.lower() in ["team", "enterprise"]:  # Example tiers with free samples
+                     logger.info(f"User '{request_data.user_id}' on tier '{subscription_tier}', skipping sample credit check.")
+                     required_credits = 0.0
+                else:
+                    await self._credit_service_client.check_credits(request_data.user_id, required_credits)
         except (InsufficientCreditsError, CreditServiceError) as e:
             logger.warning(f"Credit check failed for user '{request_data.user_id}': {e.detail}")
             raise e
 
+        # Opt-in short-circuit: reuse the samples already generated for identical inputs.
+        if request_data.reuse_cached_samples and self._prompt_cache is not None:
+            cached_request = await self._initiate_generation_from_cache(new_request, required_credits)
+            if cached_request is not None:
+                return cached_request
+
         # 2. Create GenerationRequest Record
-        new_request = GenerationRequest(
-            user_id=request_data.user_id,
-            project_id=request_data.project_id,
-            input_prompt=request_data.input_prompt,
-            style_guidance=request_data.style_guidance,
-            input_parameters=request_data.dict(exclude={"user_id", "project_id", "input_prompt", "style_guidance"}),
-            status=GenerationStatus.VALIDATING_CREDITS
-        )
-        await self._repo.add(new_request)
+        if self.settings.ENABLE_TRANSACTIONAL_OUTBOX:
+            return await self._initiate_generation_with_outbox(new_request, required_credits)
+
+        try:
+            await self._repo.add(new_request)
+        except Exception as e:
+            logger.critical(f"Failed to persist request {new_request.id}: {e}", exc_info=True)
+            # Release the credit hold placed by the combined reservation, if any.
+            if new_request.credits_cost_sample:
+                await self._try_refund_credits(new_request, new_request.credits_cost_sample, "Request persistence failure")
+            raise
         logger.info(f"Created GenerationRequest record with ID: {new_request.id}")
 
         # 3. Deduct Credits
@@ -99,35 +160,112 @@ class OrchestrationService:
                 logger.info(f"Deducted {required_credits} credits for sample generation for request {new_request.id}.")
             except CreditServiceError as e:
                 logger.error(f"Credit deduction failed for request {new_request.id}. Error: {e.detail}")
-                new_request.update_status(GenerationStatus.FAILED, error_message="Credit deduction failed.")
-                await self._repo.update(new_request)
+                await self._fail_request(new_request, "Credit deduction failed.")
                 raise e
 
-        # 4. Prepare and Publish n8n Job
+        # 4 & 5. Commit the request in its processing state, then publish the n8n job.
+        # The stuck-request reaper fails and refunds the request if the process dies in between.
+        new_request.update_status(GenerationStatus.PROCESSING_SAMPLES)
+        await self._repo.update(new_request)
+        await self._publish_status_event(new_request)
+        await self._commit_and_publish_job(
+            new_request,
+            self._prepare_n8n_job_payload(new_request, "sample_generation"),
+            fee=new_request.credits_cost_sample or 0.0,
+        )
+        return new_request
+
+    def _prompt_fingerprint(self, request: GenerationRequest) -> str:
+        """The prompt result cache key for the request's current generation inputs."""
+        return self._prompt_cache.fingerprint(
+            user_id=request.user_id,
+            input_prompt=request.input_prompt,
+            style_guidance=request.style_guidance,
+            input_parameters=request.input_parameters,
+            model_version=request.ai_model_used or self.settings.GENERATION_MODEL_VERSION,
+        )
+
+    async def _initiate_generation_from_cache(self, new_request: GenerationRequest, required_credits: float) -> Optional[GenerationRequest]:
+        """
+        Completes the sample stage from the prompt result cache, if the user already generated
+        samples for identical inputs. No job is published, but the sample fee is charged and the
+        user notified as for a generated sample set. Returns None on a cache miss.
+        """
+        samples = await self._prompt_cache.get(self._prompt_fingerprint(new_request))
+        if not samples:
+            return None
+
+        if required_credits > 0:
+            await self._credit_service_client.deduct_credits(
+                user_id=new_request.user_id,
+                request_id=new_request.id,
+                amount=required_credits,
+                action_type="sample_generation_fee"
+            )
+            new_request.credits_cost_sample = required_credits
+
+        new_request.add_sample_results(samples)
+        new_request.update_status(GenerationStatus.AWAITING_SELECTION)
         try:
-            job_payload = self._prepare_n8n_job_payload(new_request, "sample_generation")
-            new_request.update_status(GenerationStatus.PUBLISHING_TO_QUEUE)
-            await self._repo.update(new_request)
-            
-            self._rabbitmq_publisher.publish_generation_job(
-                job_payload=job_payload,
+            await self._repo.add(new_request)
+            await self._publish_status_event(new_request)
+            await self._repo.commit()
+        except Exception as e:
+            logger.critical(f"Failed to persist request {new_request.id}: {e}", exc_info=True)
+            if new_request.credits_cost_sample:
+                await self._try_refund_credits(new_request, new_request.credits_cost_sample, "Request persistence failure")
+            raise
+        logger.info(f"Created GenerationRequest {new_request.id} from {len(samples)} cached samples; no generation job published.")
+        await self._notify_samples_ready(new_request)
+        return new_request
+
+    async def _initiate_generation_with_outbox(self, new_request: GenerationRequest, required_credits: float) -> GenerationRequest:
+        """
+        Transactional-outbox variant of steps 2-5 of `initiate_generation`.
+
+        Credits are deducted first, then the request row (already in PROCESSING_SAMPLES)
+        and its n8n job message are committed together. The OutboxRelay is woken once they
+        are committed and publishes the job, so a broker outage can no longer strand a
+        request in PUBLISHING_TO_QUEUE, and the request path costs one DB round trip instead
+        of five. The commit happens here rather than at the end of the unit of work so that
+        a failed commit can still refund the sample fee.
+        """
+        # 3. Deduct Credits
+        if required_credits > 0:
+            try:
+                await self._credit_service_client.deduct_credits(
+                    user_id=new_request.user_id,
+                    request_id=new_request.id,
+                    amount=required_credits,
+                    action_type="sample_generation_fee"
+                )
+                new_request.credits_cost_sample = required_credits
+                logger.info(f"Deducted {required_credits} credits for sample generation for request {new_request.id}.")
+            except CreditServiceError as e:
+                logger.error(f"Credit deduction failed for request {new_request.id}. Error: {e.detail}")
+                await self._fail_request(new_request, "Credit deduction failed.", is_new=True)
+                raise e
+
+        # 4 & 5. Persist the request in its processing state together with the job message.
+        new_request.update_status(GenerationStatus.PROCESSING_SAMPLES)
+        job_payload = self._prepare_n8n_job_payload(new_request, "sample_generation")
+        try:
+            await self._repo.add_with_outbox_message(
+                new_request,
+                exchange_name=self.settings.RABBITMQ_GENERATION_EXCHANGE,
                 routing_key=self.settings.RABBITMQ_N8N_JOB_ROUTING_KEY,
-                exchange_name=self.settings.RABBITMQ_GENERATION_EXCHANGE
+                payload=job_payload,
+                on_commit=self._outbox_relay.notify if self._outbox_relay is not None else None,
             )
-            logger.info(f"Published sample generation job for request {new_request.id} to RabbitMQ.")
+            await self._publish_status_event(new_request)
+            await self._repo.commit()
         except Exception as e:
-            logger.critical(f"Failed to publish RabbitMQ job for request {new_request.id}: {e}", exc_info=True)
-            new_request.update_status(GenerationStatus.FAILED, error_message="Failed to queue generation job.")
-            await self._repo.update(new_request)
-            # Attempt to refund credits if they were deducted
-            if new_request.credits_cost_sample > 0:
-                await self._try_refund_credits(new_request, new_request.credits_cost_sample, "Job publishing failure")
+            logger.critical(f"Failed to persist request {new_request.id} with its outbox message: {e}", exc_info=True)
+            if new_request.credits_cost_sample:
+                await self._try_refund_credits(new_request, new_request.credits_cost_sample, "Job persistence failure")
             raise JobPublishError(str(e))
 
-        # 5. Final Status Update
-        new_request.update_status(GenerationStatus.PROCESSING_SAMPLES)
-        await self._repo.update(new_request)
-        
+        logger.info(f"Queued sample generation job for request {new_request.id} via the transactional outbox.")
         return new_request
 
     async def get_generation_status(self, request_id: UUID) -> GenerationRequest:
@@ -137,19 +275,75 @@ class OrchestrationService:
             raise GenerationRequestNotFound(request_id)
         return generation_request
 
+    async def get_generation_statuses(self, request_ids: List[UUID]) -> Tuple[List[GenerationRequest], List[UUID]]:
+        """
+        Retrieves many generation requests with a single repository query.
+
+        Returns:
+            The requests found (in the order their IDs were given, duplicates removed)
+            and the IDs that were not found.
+        """
+        unique_ids = list(dict.fromkeys(request_ids))
+        found = {request.id: request for request in await self._repo.get_by_ids(unique_ids)}
+        requests = [found[request_id] for request_id in unique_ids if request_id in found]
+        not_found_ids = [request_id for request_id in unique_ids if request_id not in found]
+        return requests, not_found_ids
+
+    async def list_user_generations(self, user_id: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[GenerationRequest], Optional[str]]:
+        """
+        Lists a user's generation requests, newest first, using keyset pagination.
+
+        Returns:
+            The page of requests and an opaque cursor for the next page (None on the last page).
+        """
+        after = self._decode_cursor(cursor) if cursor else None
+        # Fetch one extra row to know whether another page exists without a COUNT query.
+        requests = await self._repo.list_by_user_id_after(user_id, limit=limit + 1, after=after)
+        if len(requests) <= limit:
+            return requests, None
+        page = requests[:limit]
+        return page, self._encode_cursor(page[-1])
+
+    @staticmethod
+    def _encode_cursor(request: GenerationRequest) -> str:
+        raw = f"{request.created_at.isoformat()}|{request.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+        try:
+            created_at, request_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+            return datetime.fromisoformat(created_at), UUID(request_id)
+        except (ValueError, UnicodeDecodeError):
+            raise InvalidPaginationCursor()
+
     async def process_n8n_sample_callback(self, callback_data: N8NSampleResultDTO) -> None:
         """Processes the callback from n8n after sample generation is complete. REQ-008"""
         logger.info(f"Processing n8n sample callback for request ID: {callback_data.generation_request_id}")
-        request = await self._repo.get_by_id(callback_data.generation_request_id)
+        samples = [self._to_asset_info(sample) for sample in callback_data.samples]
+
+        def apply(request: GenerationRequest) -> None:
+            request.add_sample_results(samples)
+            request.update_status(GenerationStatus.AWAITING_SELECTION)
+
+        try:
+            request = await self._apply_callback_mutation(
+                callback_data.generation_request_id, apply, {GenerationStatus.PROCESSING_SAMPLES}
+            )
+        except StaleCallbackError as e:
+            logger.warning(f"Ignoring n8n sample callback: {e}")
+            return
         if not request:
             logger.error(f"Received n8n sample callback for non-existent request ID: {callback_data.generation_request_id}")
             return
+        logger.info(f"Request {request.id} updated to AWAITING_SELECTION with {len(request.sample_asset_infos)} samples.")
+        await self._publish_status_event(request)
+        if self._prompt_cache is not None:
+            await self._prompt_cache.set(self._prompt_fingerprint(request), samples)
 
-        request.add_sample_result(callback_data.samples)
-        request.update_status(GenerationStatus.AWAITING_SELECTION)
-        await self._repo.update(request)
-        logger.info(f"Request {request.id} updated to AWAITING_SELECTION with {len(callback_data.samples)} samples.")
+        await self._notify_samples_ready(request)
 
+    async def _notify_samples_ready(self, request: GenerationRequest) -> None:
         await self._notification_client.send_notification(
             user_id=request.user_id,
             notification_type="samples_ready",
@@ -160,38 +354,53 @@ class OrchestrationService:
     async def process_n8n_final_asset_callback(self, callback_data: N8NFinalResultDTO) -> None:
         """Processes the callback from n8n after final asset generation is complete. REQ-009"""
         logger.info(f"Processing n8n final asset callback for request ID: {callback_data.generation_request_id}")
-        request = await self._repo.get_by_id(callback_data.generation_request_id)
+        final_asset = self._to_asset_info(callback_data.final_asset)
+
+        def apply(request: GenerationRequest) -> None:
+            request.set_final_asset(final_asset)
+            request.update_status(GenerationStatus.COMPLETED)
+
+        try:
+            request = await self._apply_callback_mutation(
+                callback_data.generation_request_id, apply, {GenerationStatus.PROCESSING_FINAL}
+            )
+        except StaleCallbackError as e:
+            logger.warning(f"Ignoring n8n final asset callback: {e}")
+            return
         if not request:
             logger.error(f"Received n8n final asset callback for non-existent request ID: {callback_data.generation_request_id}")
             return
-
-        request.set_final_asset(callback_data.final_asset)
-        request.update_status(GenerationStatus.COMPLETED)
-        await self._repo.update(request)
         logger.info(f"Request {request.id} updated to COMPLETED with final asset.")
+        await self._publish_status_event(request)
 
         await self._notification_client.send_notification(
             user_id=request.user_id,
             notification_type="final_asset_ready",
             message="Your final AI creative is generated and ready!",
-            metadata={"request_id": str(request.id), "asset_url": callback_data.final_asset.url}
+            metadata={"request_id": str(request.id), "asset_url": str(final_asset.url)}
         )
 
     async def handle_n8n_error(self, error_data: N8NErrorDTO) -> None:
         """Handles error callbacks from n8n. REQ-007.1, REQ-016"""
         logger.error(f"Processing n8n error callback for request ID: {error_data.generation_request_id}. Error: {error_data.error_message}")
-        request = await self._repo.get_by_id(error_data.generation_request_id)
-        if not request:
-            logger.error(f"Received n8n error callback for non-existent request ID: {error_data.generation_request_id}")
-            return
 
         # Determine new status
         new_status = GenerationStatus.FAILED
         if error_data.error_code and "CONTENT_POLICY" in error_data.error_code.upper():
             new_status = GenerationStatus.CONTENT_REJECTED
-        
-        request.update_status(new_status, error_message=error_data.error_message, error_details=error_data.error_details)
-        
+
+        def apply(request: GenerationRequest) -> None:
+            request.update_status(new_status, error_message=error_data.error_message, error_details=error_data.error_details)
+
+        try:
+            request = await self._apply_callback_mutation(error_data.generation_request_id, apply, IN_FLIGHT_STATUSES)
+        except StaleCallbackError as e:
+            logger.warning(f"Ignoring n8n error callback: {e}")
+            return
+        if not request:
+            logger.error(f"Received n8n error callback for non-existent request ID: {error_data.generation_request_id}")
+            return
+
         # Log detailed errors if enabled
         if self.settings.ENABLE_DETAILED_N8N_ERROR_LOGGING:
             logger.error(f"Detailed n8n error for request {request.id}: {error_data.error_details}")
@@ -209,7 +418,7 @@ class OrchestrationService:
             if credits_to_refund > 0:
                 await self._try_refund_credits(request, credits_to_refund, f"System error during {error_data.failed_stage}")
 
-        await self._repo.update(request)
+        await self._publish_status_event(request)
 
         await self._notification_client.send_notification(
             user_id=request.user_id,
@@ -218,6 +427,77 @@ class OrchestrationService:
             metadata={"request_id": str(request.id)}
         )
 
+    async def _apply_callback_mutation(
+        self,
+        request_id: UUID,
+        mutation: Callable[[GenerationRequest], None],
+        expected_statuses: Set[GenerationStatus],
+    ) -> Optional[GenerationRequest]:
+        """
+        Applies a callback's state change to the request and persists it, either through the
+        batch writer (coalesced with concurrent callbacks) or with a direct read-modify-write.
+        The change is only applied while the request is in one of `expected_statuses`, so a
+        late callback cannot overwrite, e.g., a request the reaper has already failed and refunded.
+
+        Returns:
+            The updated request, or None if it does not exist.
+
+        Raises:
+            StaleCallbackError: If the request is no longer in an expected status.
+        """
+        def guarded_mutation(request: GenerationRequest) -> None:
+            if request.status not in expected_statuses:
+                raise StaleCallbackError(request.id, request.status)
+            mutation(request)
+
+        if self._callback_writer is not None:
+            return await self._callback_writer.submit(request_id, guarded_mutation)
+
+        request = await self._repo.get_by_id(request_id)
+        if not request:
+            return None
+        guarded_mutation(request)
+        await self._repo.update(request)
+        return request
+
+    @staticmethod
+    def _to_asset_info(asset: Union[BaseModel, Dict[str, Any]]) -> AssetInfo:
+        """Converts an asset from a callback payload (API schema or plain dict) into the domain value object."""
+        return AssetInfo.model_validate(asset.model_dump() if isinstance(asset, BaseModel) else asset)
+
+    async def settle_timed_out_requests(self, timed_out: List[Tuple[GenerationRequest, GenerationStatus]]) -> Tuple[int, int]:
+        """
+        Completes the failure handling for requests the stuck-request reaper has already moved to
+        FAILED: refunds the fee of the stage that timed out (concurrently, as one batch), publishes
+        the status events and notifies the users.
+
+        Returns:
+            (refunds attempted, refunds that succeeded)
+        """
+        refunds = []
+        if self.settings.ENABLE_CREDIT_REFUND_ON_SYSTEM_FAILURE:
+            for request, timed_out_status in timed_out:
+                if timed_out_status == GenerationStatus.PROCESSING_SAMPLES:
+                    amount = request.credits_cost_sample
+                else:
+                    amount = request.credits_cost_final
+                if amount:
+                    refunds.append(self._try_refund_credits(request, amount, f"Generation timed out in {timed_out_status.value}"))
+        refund_results = await asyncio.gather(*refunds)
+
+        for request, _ in timed_out:
+            await self._publish_status_event(request)
+        await asyncio.gather(*[
+            self._notification_client.send_notification(
+                user_id=request.user_id,
+                notification_type="generation_failed",
+                message="AI generation failed: the generation did not complete in time.",
+                metadata={"request_id": str(request.id)}
+            )
+            for request, _ in timed_out
+        ])
+        return len(refunds), sum(refund_results)
+
     async def trigger_sample_regeneration(self, request_id: UUID, user_id: str, updated_prompt: Optional[str] = None, updated_style_guidance: Optional[str] = None) -> GenerationRequest:
         """Triggers a regeneration of samples for an existing request. REQ-008, REQ-016"""
         logger.info(f"Triggering sample regeneration for request {request_id} by user {user_id}.")
@@ -250,12 +530,10 @@ class OrchestrationService:
             request.style_guidance = updated_style_guidance
             
         job_payload = self._prepare_n8n_job_payload(request, "sample_regeneration")
-        self._rabbitmq_publisher.publish_generation_job(job_payload, self.settings.RABBITMQ_N8N_JOB_ROUTING_KEY, self.settings.RABBITMQ_GENERATION_EXCHANGE)
-        
         request.update_status(GenerationStatus.PROCESSING_SAMPLES)
         await self._repo.update(request)
-        
-        logger.info(f"Published sample regeneration job for request {request.id}.")
+        await self._publish_status_event(request)
+        await self._commit_and_publish_job(request, job_payload, fee=required_credits)
         return request
 
     async def select_sample_and_initiate_final(self, request_id: UUID, selected_sample_id: str, user_id: str, desired_resolution: Optional[str] = None) -> GenerationRequest:
@@ -288,12 +566,10 @@ class OrchestrationService:
         # Prepare Job
         request.set_selected_sample(selected_sample_id, desired_resolution)
         job_payload = self._prepare_n8n_job_payload(request, "final_generation")
-        self._rabbitmq_publisher.publish_generation_job(job_payload, self.settings.RABBITMQ_N8N_JOB_ROUTING_KEY, self.settings.RABBITMQ_GENERATION_EXCHANGE)
-        
         request.update_status(GenerationStatus.PROCESSING_FINAL)
         await self._repo.update(request)
-        
-        logger.info(f"Published final generation job for request {request.id}.")
+        await self._publish_status_event(request)
+        await self._commit_and_publish_job(request, job_payload, fee=required_credits)
         return request
 
     def _prepare_n8n_job_payload(self, request: GenerationRequest, job_type: str) -> dict:
@@ -320,8 +596,65 @@ class OrchestrationService:
 
         return payload
 
-    async def _try_refund_credits(self, request: GenerationRequest, amount: float, reason: str) -> None:
-        """Internal helper to attempt a credit refund and log the outcome."""
+    async def _commit_and_publish_job(self, request: GenerationRequest, job_payload: dict, fee: float) -> None:
+        """
+        Commits the request's transaction, then publishes its n8n job, so the job's callback
+        can never arrive before the state it updates is visible. If the commit fails, `fee` is
+        refunded; if the publish fails, the request is failed in its own transaction and `fee`
+        refunded.
+        """
+        try:
+            await self._repo.commit()
+        except Exception as e:
+            logger.critical(f"Failed to commit request {request.id} before publishing its job: {e}", exc_info=True)
+            if fee:
+                await self._try_refund_credits(request, fee, "Request persistence failure")
+            raise
+
+        try:
+            await self._rabbitmq_publisher.publish_generation_job(
+                job_payload=job_payload,
+                routing_key=self.settings.RABBITMQ_N8N_JOB_ROUTING_KEY,
+                exchange_name=self.settings.RABBITMQ_GENERATION_EXCHANGE
+            )
+        except Exception as e:
+            logger.critical(f"Failed to publish RabbitMQ job for request {request.id}: {e}", exc_info=True)
+            await self._fail_request(request, "Failed to queue generation job.")
+            if fee:
+                await self._try_refund_credits(request, fee, "Job publishing failure")
+            raise JobPublishError(str(e))
+        logger.info(f"Published {job_payload['job_type']} job for request {request.id} to RabbitMQ.")
+
+    async def _fail_request(self, request: GenerationRequest, error_message: str, is_new: bool = False) -> None:
+        """
+        Moves the request to FAILED and commits it in its own transaction, so the failure is
+        recorded even though the caller then raises and the unit of work rolls back.
+
+        Args:
+            is_new: True if the request has not been added to the session yet.
+        """
+        request.update_status(GenerationStatus.FAILED, error_message=error_message)
+        try:
+            if is_new:
+                await self._repo.add(request)
+            else:
+                await self._repo.update(request)
+            await self._publish_status_event(request)
+            await self._repo.commit()
+        except Exception as e:
+            logger.error(f"Failed to record the failure of request {request.id}: {e}", exc_info=True)
+
+    async def _publish_status_event(self, request: GenerationRequest) -> None:
+        """
+        Pushes the request's new status to Server-Sent Events subscribers, if streaming is
+        enabled, once the transaction recording it commits.
+        """
+        if self._status_broadcaster is not None:
+            broadcaster = self._status_broadcaster
+            await self._repo.after_commit(lambda: broadcaster.publish(request))
+
+    async def _try_refund_credits(self, request: GenerationRequest, amount: float, reason: str) -> bool:
+        """Internal helper to attempt a credit refund and log the outcome. Returns whether the refund succeeded."""
         try:
             success = await self._credit_service_client.refund_credits(
                 user_id=request.user_id,
@@ -333,5 +666,7 @@ class OrchestrationService:
                 logger.info(f"Successfully refunded {amount} credits for request {request.id}. Reason: {reason}")
             else:
                 logger.error(f"Credit service failed to process refund for request {request.id}.")
+            return bool(success)
         except Exception as e:
-            logger.error(f"Exception during credit refund attempt for request {request.id}: {e}", exc_info=True)
\ No newline at end of file
+            logger.error(f"Exception during credit refund attempt for request {request.id}: {e}", exc_info=True)
+            return False
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""
+stuck_request_reaper.py
+
+Background sweeper for generation requests that never hear back from n8n.
+
+Entering PROCESSING_SAMPLES or PROCESSING_FINAL starts a lease that lasts for the
+stage's deadline, measured from the request's `updated_at`. When a callback is lost,
+the lease expires. Each sweep fails expired requests in bulk with a single statement
+served by a partial index on the in-flight statuses. After the commit it refunds the
+fee of the timed-out stage as one concurrent batch and notifies the users. Rows are
+claimed with `FOR UPDATE SKIP LOCKED`, so every service instance can run the reaper.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from creativeflow.services.aigeneration.core.config import settings
+from creativeflow.services.aigeneration.core.dependencies import get_credit_service_client, get_notification_client
+from creativeflow.services.aigeneration.domain.models.generation_status import GenerationStatus
+from creativeflow.services.aigeneration.domain.repositories.generation_request_repository import IGenerationRequestRepository
+from creativeflow.services.aigeneration.infrastructure.database import db_config
+from creativeflow.services.aigeneration.infrastructure.messaging.rabbitmq_publisher import rabbitmq_publisher
+from creativeflow.services.aigeneration.infrastructure.messaging.status_event_broadcaster import status_broadcaster
+from creativeflow.services.aigeneration.infrastructure.repositories.postgres_generation_request_repository import PostgresGenerationRequestRepository
+from .orchestration_service import OrchestrationService
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_ERROR_MESSAGE = "Generation timed out: no result was received from the generation workflow."
+
+
+class StuckRequestReaper:
+    """
+    Periodically fails in-flight generation requests whose stage deadline has passed.
+    """
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        service_factory: Callable[[IGenerationRequestRepository], OrchestrationService],
+        deadlines: Dict[GenerationStatus, timedelta],
+        interval: float = 60.0,
+        batch_size: int = 100,
+    ):
+        """
+        Args:
+            session_factory: Factory for the sessions sweeps run in.
+            service_factory: Builds the OrchestrationService used to refund and notify, given a repository.
+            deadlines: The maximum time a request may stay in each in-flight status.
+            interval: Seconds between sweeps when there is no backlog.
+            batch_size: Maximum number of requests failed per sweep.
+        """
+        self._session_factory = session_factory
+        self._service_factory = service_factory
+        self._deadlines = deadlines
+        self._interval = interval
+        self._batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self._metrics: Dict[str, float] = {
+            "sweeps": 0,
+            "sweep_errors": 0,
+            "requests_failed": 0,
+            "refunds_attempted": 0,
+            "refunds_failed": 0,
+            "last_sweep_seconds": 0.0,
+        }
+        self._failed_by_stage: Dict[str, int] = {stage.value: 0 for stage in deadlines}
+
+    @property
+    def metrics(self) -> Dict[str, object]:
+        """Counters since startup, including the number of requests failed per timed-out stage."""
+        return {**self._metrics, "requests_failed_by_stage": dict(self._failed_by_stage)}
+
+    def start(self) -> None:
+        """Starts the sweep loop as a background task on the running event loop."""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.get_event_loop().create_task(self._run())
+        deadlines = ", ".join(f"{stage.value}={deadline}" for stage, deadline in self._deadlines.items())
+        logger.info(f"Stuck-request reaper started (interval: {self._interval}s, deadlines: {deadlines}).")
+
+    async def stop(self) -> None:
+        """Stops the sweep loop."""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Stuck-request reaper stopped.")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                reaped = await self.sweep_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._metrics["sweep_errors"] += 1
+                logger.error(f"Stuck-request sweep failed: {e}", exc_info=True)
+                reaped = 0
+
+            # A full batch means more requests have likely expired; sweep again without waiting.
+            if reaped < self._batch_size:
+                await asyncio.sleep(self._interval)
+
+    async def sweep_once(self) -> int:
+        """
+        Fails up to `batch_size` expired requests, then refunds and notifies their users.
+
+        Returns:
+            The number of requests failed.
+        """
+        started = time.perf_counter()
+        async with self._session_factory() as session:
+            repo = PostgresGenerationRequestRepository(session)
+            # Built before anything is committed, so a wiring error cannot strand failed requests unrefunded.
+            service = self._service_factory(repo)
+            async with session.begin():
+                timed_out = await repo.fail_expired_in_flight(self._deadlines, TIMEOUT_ERROR_MESSAGE, self._batch_size)
+
+            # Refunds and notifications only happen once the FAILED transition is committed.
+            refunds_attempted = refunds_succeeded = 0
+            if timed_out:
+                refunds_attempted, refunds_succeeded = await service.settle_timed_out_requests(timed_out)
+
+        elapsed = time.perf_counter() - started
+        self._metrics["sweeps"] += 1
+        self._metrics["last_sweep_seconds"] = elapsed
+        self._metrics["requests_failed"] += len(timed_out)
+        self._metrics["refunds_attempted"] += refunds_attempted
+        self._metrics["refunds_failed"] += refunds_attempted - refunds_succeeded
+        for _, stage in timed_out:
+            self._failed_by_stage[stage.value] = self._failed_by_stage.get(stage.value, 0) + 1
+
+        if timed_out:
+            logger.warning(
+                f"Reaped {len(timed_out)} stuck generation request(s) in {elapsed * 1000:.0f}ms "
+                f"({refunds_succeeded}/{refunds_attempted} refunds succeeded)."
+            )
+        return len(timed_out)
+
+
+def _session_factory() -> AsyncSession:
+    # Resolved lazily: the session factory only exists once init_db() has run at startup.
+    return db_config.AsyncSessionLocal()
+
+
+def _service_factory(repo: IGenerationRequestRepository) -> OrchestrationService:
+    return OrchestrationService(
+        repo=repo,
+        rabbitmq_publisher=rabbitmq_publisher,
+        credit_service_client=get_credit_service_client(),
+        notification_client=get_notification_client(),
+        status_broadcaster=status_broadcaster,
+    )
+
+
+# Process-wide reaper, started and stopped by main.py when ENABLE_STUCK_REQUEST_REAPER is set.
+stuck_request_reaper = StuckRequestReaper(
+    session_factory=_session_factory,
+    service_factory=_service_factory,
+    deadlines={
+        GenerationStatus.PROCESSING_SAMPLES: timedelta(seconds=settings.SAMPLE_GENERATION_DEADLINE_SECONDS),
+        GenerationStatus.PROCESSING_FINAL: timedelta(seconds=settings.FINAL_GENERATION_DEADLINE_SECONDS),
+    },
+    interval=settings.STUCK_REQUEST_REAPER_INTERVAL_SECONDS,
+    batch_size=settings.STUCK_REQUEST_REAPER_BATCH_SIZE,
+)
@@ -37,6 +37,30 @@ class Settings(BaseSettings):
         "n8n.job.generation",
         description="Routing key for n8n generation jobs."
     )
+    RABBITMQ_PUBLISHER_CHANNEL_POOL_SIZE: int = Field(
+        8,
+        description="Maximum number of pooled publisher-confirm channels used for publishing jobs."
+    )
+    RABBITMQ_PUBLISHER_BUFFER_SIZE: int = Field(
+        1000,
+        description="Maximum number of messages buffered locally while the broker connection is being restored."
+    )
+    RABBITMQ_PUBLISHER_CONFIRM_TIMEOUT_SECONDS: float = Field(
+        5.0,
+        description="Maximum time to wait for broker publisher confirms on a batch."
+    )
+    RABBITMQ_PUBLISHER_BUFFER_TIMEOUT_SECONDS: float = Field(
+        30.0,
+        description="Maximum time a publish waits in the local buffer for the broker connection to be restored before failing."
+    )
+    OUTBOX_RELAY_POLL_INTERVAL_SECONDS: float = Field(
+        0.5,
+        description="How often the outbox relay polls for unpublished job messages when idle."
+    )
+    OUTBOX_RELAY_BATCH_SIZE: int = Field(
+        100,
+        description="Maximum number of outbox messages the relay publishes per iteration."
+    )
 
     # External Services and Callbacks
     N8N_CALLBACK_BASE_URL: AnyHttpUrl = Field(
@@ -51,17 +75,113 @@ class Settings(BaseSettings):
         "http://localhost:8002/api/v1/notifications",
         description="Base URL for the Notification Service API."
     )
+    SERVICE_HTTP_TIMEOUT_SECONDS: float = Field(
+        10.0,
+        description="Timeout for HTTP calls to the Credit and Notification services."
+    )
     N8N_CALLBACK_SHARED_SECRET: Optional[str] = Field(
         None,
         description="A shared secret key to validate incoming callbacks from n8n."
     )
+    N8N_CALLBACK_IDEMPOTENCY_TTL_SECONDS: int = Field(
+        86400,
+        description="How long processed n8n callback idempotency keys are remembered in Redis."
+    )
+    N8N_CALLBACK_PROCESSING_TTL_SECONDS: int = Field(
+        120,
+        description="How long a claimed n8n callback may stay in processing before a redelivery can claim it again."
+    )
+    CALLBACK_BATCH_MAX_SIZE: int = Field(
+        200,
+        description="Maximum number of n8n callbacks coalesced into one database write (when ENABLE_CALLBACK_BATCHING is set)."
+    )
+    CALLBACK_BATCH_MAX_DELAY_MS: float = Field(
+        5.0,
+        description="Maximum time a callback waits for others to join its batched database write."
+    )
+
+
+    # Redis Configuration (optional; used for shared caches)
+    REDIS_URL: Optional[str] = Field(
+        None,
+        description="Connection string for Redis, e.g. redis://localhost:6379/0. If unset, caches are in-process only."
+    )
+    SUBSCRIPTION_TIER_CACHE_TTL_SECONDS: int = Field(
+        60,
+        description="Time-to-live for cached user subscription tiers."
+    )
+    SUBSCRIPTION_TIER_CACHE_MAX_ENTRIES: int = Field(
+        10000,
+        description="Maximum number of users held in the in-process subscription tier cache."
+    )
+    SUBSCRIPTION_CHANGE_EVENTS_CHANNEL: str = Field(
+        "subscription.changed",
+        description="Redis pub/sub channel carrying subscription-change events ({\"user_id\": ...}) that invalidate cached tiers."
+    )
+
+    STATUS_EVENTS_CHANNEL_PREFIX: str = Field(
+        "aigen:status",
+        description="Prefix of the Redis pub/sub channels carrying generation status events."
+    )
+    STATUS_EVENTS_CLIENT_QUEUE_SIZE: int = Field(
+        100,
+        description="Per-client buffer of pending status events; the oldest is dropped for slow clients."
+    )
+    STATUS_EVENTS_HEARTBEAT_SECONDS: float = Field(
+        15.0,
+        description="Interval between keep-alive comments on idle Server-Sent Events streams."
+    )
+
+    # Stuck-request reaper (used when ENABLE_STUCK_REQUEST_REAPER is set)
+    SAMPLE_GENERATION_DEADLINE_SECONDS: int = Field(
+        900,
+        description="Time after which a request still in PROCESSING_SAMPLES is considered lost and failed."
+    )
+    FINAL_GENERATION_DEADLINE_SECONDS: int = Field(
+        1800,
+        description="Time after which a request still in PROCESSING_FINAL is considered lost and failed."
+    )
+    STUCK_REQUEST_REAPER_INTERVAL_SECONDS: float = Field(
+        60.0,
+        description="Interval between sweeps for requests whose stage deadline has passed."
+    )
+    STUCK_REQUEST_REAPER_BATCH_SIZE: int = Field(
+        100,
+        description="Maximum number of stuck requests failed and refunded per sweep."
+    )
 
+    # Prompt result cache (used when ENABLE_PROMPT_RESULT_CACHE is set)
+    GENERATION_MODEL_VERSION: str = Field(
+        "default",
+        description="Version of the generation models/workflows; part of the prompt result cache key, so bumping it invalidates all entries."
+    )
+    PROMPT_RESULT_CACHE_TTL_SECONDS: int = Field(
+        7 * 24 * 3600,
+        description="Time-to-live of cached sample sets."
+    )
+    PROMPT_RESULT_CACHE_MAX_ENTRIES: int = Field(
+        100000,
+        description="Maximum number of sample sets kept in Redis; least recently used entries are evicted."
+    )
+    PROMPT_RESULT_CACHE_LOCAL_MAX_ENTRIES: int = Field(
+        1000,
+        description="Maximum number of sample sets held in the in-process cache."
+    )
 
     # Odoo Configuration
     ODOO_URL: Optional[AnyHttpUrl] = Field(None, description="URL for the Odoo XML-RPC/JSON-RPC endpoint.")
     ODOO_DB: Optional[str] = Field(None, description="Odoo database name.")
     ODOO_UID: Optional[int] = Field(None, description="Odoo user ID for API access.")
     ODOO_PASSWORD: Optional[str] = Field(None, description="Odoo password for API access.")
+    ODOO_RPC_POOL_SIZE: int = Field(
+        8,
+        description="Number of pooled keep-alive Odoo XML-RPC connections (and RPC worker threads)."
+    )
+    ODOO_RPC_TIMEOUT_SECONDS: float = Field(30.0, description="Socket timeout for Odoo XML-RPC calls.")
+    ODOO_RPC_USE_MULTICALL: bool = Field(
+        False,
+        description="If true, batched Odoo calls are sent in one system.multicall round trip (the Odoo deployment must expose it)."
+    )
 
     # Logging Configuration
     LOG_LEVEL: str = Field("INFO", description='Logging level (e.g., "INFO", "DEBUG").')
@@ -80,6 +200,30 @@ class Settings(BaseSettings):
         True,
         description="If true, automatically triggers credit refund attempts for system-caused generation failures."
     )
+    ENABLE_TRANSACTIONAL_OUTBOX: bool = Field(
+        False,
+        description="If true, new requests and their n8n job message are written in one transaction and published by the outbox relay."
+    )
+    ENABLE_COMBINED_CREDIT_RESERVATION: bool = Field(
+        False,
+        description="If true, uses the Credit Service check-and-reserve endpoint (tier + credit hold in one call) when initiating generations."
+    )
+    ENABLE_OPTIMISTIC_LOCKING: bool = Field(
+        False,
+        description="If true, generation request updates are rejected when the row changed since it was loaded (updated_at check)."
+    )
+    ENABLE_STUCK_REQUEST_REAPER: bool = Field(
+        False,
+        description="If true, requests stuck in PROCESSING_SAMPLES/PROCESSING_FINAL past their deadline are failed and refunded."
+    )
+    ENABLE_PROMPT_RESULT_CACHE: bool = Field(
+        False,
+        description="If true, requests that opt in with reuse_cached_samples are served from previously generated samples for identical inputs."
+    )
+    ENABLE_CALLBACK_BATCHING: bool = Field(
+        False,
+        description="If true, n8n callback state changes arriving within a few milliseconds are written in a single multi-row UPDATE."
+    )
 
     class Config:
         case_sensitive = True
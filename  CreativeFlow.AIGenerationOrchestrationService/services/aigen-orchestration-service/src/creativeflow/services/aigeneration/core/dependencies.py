@@ -6,7 +6,7 @@ service clients, and repository instances into FastAPI path operation functions.
 This follows the dependency injection pattern to promote loose coupling and testability.
 """
 
-from typing import AsyncGenerator, Optional
+from typing import AsyncGenerator
 
 from fastapi import Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -16,42 +16,57 @@ from creativeflow.services.aigeneration.application.services.orchestration_servi
 from creativeflow.services.aigeneration.application.services.credit_service_client import CreditServiceClient
 from creativeflow.services.aigeneration.application.services.notification_service_client import NotificationServiceClient
 from creativeflow.services.aigeneration.domain.repositories.generation_request_repository import IGenerationRequestRepository
-from creativeflow.services.aigeneration.infrastructure.database.db_config import SessionLocal
+from creativeflow.services.aigeneration.infrastructure.clients.http_client import http_client
+from creativeflow.services.aigeneration.infrastructure.database import db_config
+from creativeflow.services.aigeneration.infrastructure.repositories.generation_request_batch_writer import callback_batch_writer
 from creativeflow.services.aigeneration.infrastructure.repositories.postgres_generation_request_repository import PostgresGenerationRequestRepository
-from creativeflow.services.aigeneration.infrastructure.messaging.rabbitmq_publisher import RabbitMQPublisher
-from creativeflow.services.aigeneration.infrastructure.clients.odoo_adapter_client import OdooAdapterClient
-
-# This global instance will be managed by startup/shutdown events in main.py
-# to ensure connections are handled gracefully.
-rabbitmq_publisher_instance: Optional[RabbitMQPublisher] = None
-
+from creativeflow.services.aigeneration.infrastructure.cache.callback_idempotency_store import CallbackIdempotencyStore, callback_idempotency_store
+from creativeflow.services.aigeneration.infrastructure.cache.prompt_result_cache import prompt_result_cache
+from creativeflow.services.aigeneration.infrastructure.cache.subscription_tier_cache import subscription_tier_cache
+from creativeflow.services.aigeneration.infrastructure.messaging.outbox_relay import outbox_relay
+from creativeflow.services.aigeneration.infrastructure.messaging.rabbitmq_publisher import RabbitMQPublisher, rabbitmq_publisher
+from creativeflow.services.aigeneration.infrastructure.messaging.status_event_broadcaster import GenerationStatusBroadcaster, status_broadcaster
+from creativeflow.services.aigeneration.infrastructure.clients.odoo_adapter_client import OdooAdapterClient, odoo_adapter_client
 
 async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
     """
     FastAPI dependency to provide an SQLAlchemy AsyncSession.
 
-    Yields a database session from the session factory and ensures it's closed
-    after the request is processed.
+    The session is the request's unit of work: repositories only flush, and the
+    transaction is committed once the request has been handled, or rolled back if
+    it raised. Side effects that must not be seen before the data they describe,
+    such as status events, are registered as after-commit callbacks and only run
+    once the commit succeeded. The session is closed afterwards.
     """
-    async with SessionLocal() as session:
-        yield session
+    if db_config.AsyncSessionLocal is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database is not available.",
+        )
+    async with db_config.AsyncSessionLocal() as session:
+        try:
+            yield session
+            await db_config.commit_session(session)
+        except Exception:
+            await db_config.rollback_session(session)
+            raise
 
 
 async def get_rabbitmq_publisher() -> RabbitMQPublisher:
     """
     FastAPI dependency that provides a singleton RabbitMQPublisher instance.
 
-    The instance is managed globally and initialized at application startup.
-    This prevents creating new connections for every request.
+    The instance is managed globally and connected at application startup (see main.py).
+    This prevents creating new connections for every request. While the broker is
+    reconnecting the publisher buffers messages locally, so only a publisher that was
+    never connected (or has been closed) is reported as unavailable.
     """
-    if rabbitmq_publisher_instance is None:
-        # This state should not be reached in a running application as the
-        # instance is created on startup. This is a safeguard.
+    if not rabbitmq_publisher.is_ready:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="RabbitMQ publisher is not available.",
         )
-    return rabbitmq_publisher_instance
+    return rabbitmq_publisher
 
 
 def get_generation_request_repo(
@@ -62,20 +77,19 @@ def get_generation_request_repo(
 
     Injects an async database session into the repository implementation.
     """
-    return PostgresGenerationRequestRepository(db_session=db_session)
+    return PostgresGenerationRequestRepository(
+        db_session=db_session,
+        optimistic_locking=settings.ENABLE_OPTIMISTIC_LOCKING,
+    )
 
 
 def get_odoo_adapter_client() -> OdooAdapterClient:
     """
-    FastAPI dependency that provides an OdooAdapterClient instance.
-    The client is configured from application settings.
+    FastAPI dependency that provides the singleton OdooAdapterClient.
+    The client is configured from application settings; sharing it keeps its pooled
+    keep-alive connections warm across requests.
     """
-    return OdooAdapterClient(
-        url=settings.ODOO_URL,
-        db=settings.ODOO_DB,
-        uid=settings.ODOO_UID,
-        password=str(settings.ODOO_PASSWORD), # Ensure password is a string
-    )
+    return odoo_adapter_client
 
 
 def get_credit_service_client() -> CreditServiceClient:
@@ -83,16 +97,40 @@ def get_credit_service_client() -> CreditServiceClient:
     FastAPI dependency that provides a CreditServiceClient instance.
     This client interacts with the dedicated Credit Service API via HTTP.
     """
-    # Assumes CreditServiceClient is stateless and uses httpx.AsyncClient internally.
-    # A single client instance can be reused across the application via `Depends`.
-    return CreditServiceClient(base_url=settings.CREDIT_SERVICE_API_URL)
+    # The client is stateless; it issues its calls through the shared httpx.AsyncClient.
+    return CreditServiceClient(
+        base_url=str(settings.CREDIT_SERVICE_API_URL),
+        http_client=http_client,
+        tier_cache=subscription_tier_cache,
+    )
 
 
 def get_notification_client() -> NotificationServiceClient:
     """
     FastAPI dependency that provides a NotificationServiceClient instance.
     """
-    return NotificationServiceClient(base_url=settings.NOTIFICATION_SERVICE_API_URL)
+    return NotificationServiceClient(base_url=str(settings.NOTIFICATION_SERVICE_API_URL), http_client=http_client)
+
+
+def get_status_broadcaster() -> GenerationStatusBroadcaster:
+    """
+    FastAPI dependency that provides the singleton GenerationStatusBroadcaster.
+    Status streaming needs Redis; without it the streaming endpoints are unavailable.
+    """
+    if not status_broadcaster.is_available:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Status event streaming is not available.",
+        )
+    return status_broadcaster
+
+
+def get_callback_idempotency_store() -> CallbackIdempotencyStore:
+    """
+    FastAPI dependency that provides the singleton CallbackIdempotencyStore used to
+    deduplicate redelivered n8n callbacks.
+    """
+    return callback_idempotency_store
 
 
 def get_settings() -> Settings:
@@ -121,4 +159,8 @@ def get_orchestration_service(
         credit_service_client=credit_service_client,
         notification_client=notification_client,
         settings=app_settings,
+        outbox_relay=outbox_relay if app_settings.ENABLE_TRANSACTIONAL_OUTBOX else None,
+        status_broadcaster=status_broadcaster,
+        callback_writer=callback_batch_writer if callback_batch_writer.is_running else None,
+        prompt_cache=prompt_result_cache if app_settings.ENABLE_PROMPT_RESULT_CACHE else None,
     )
\ No newline at end of file
@@ -68,7 +68,8 @@ def setup_logging(log_level: str = "INFO", log_format: str = "json"):
     # Set log levels for third-party libraries that are too verbose
     logging.getLogger("uvicorn").setLevel(logging.WARNING)
     logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
-    logging.getLogger("pika").setLevel(logging.WARNING)
+    logging.getLogger("aio_pika").setLevel(logging.WARNING)
+    logging.getLogger("aiormq").setLevel(logging.WARNING)
 
     # Log that logging has been configured
     root_logger.info(
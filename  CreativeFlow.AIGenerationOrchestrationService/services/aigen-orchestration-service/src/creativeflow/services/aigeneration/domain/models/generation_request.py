@@ -1,9 +1,9 @@
 import uuid
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, FrozenSet, Set
 from uuid import UUID
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 from .asset_info import AssetInfo
 from .generation_status import GenerationStatus
@@ -42,6 +42,38 @@ class GenerationRequest(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow, description="Timestamp when the request was created.")
     updated_at: datetime = Field(default_factory=datetime.utcnow, description="Timestamp when the request was last updated.")
 
+    # Change tracking (not part of the serialized model)
+    _dirty_fields: Set[str] = PrivateAttr(default_factory=set)
+    _persisted_updated_at: Optional[datetime] = PrivateAttr(None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name in type(self).model_fields:
+            self._dirty_fields.add(name)
+
+    @property
+    def dirty_fields(self) -> FrozenSet[str]:
+        """Names of the fields changed since the request was loaded or last persisted."""
+        return frozenset(self._dirty_fields)
+
+    @property
+    def persisted_updated_at(self) -> Optional[datetime]:
+        """The `updated_at` value stored in the database when this object was loaded or last persisted."""
+        return self._persisted_updated_at
+
+    def mark_clean(self, persisted_updated_at: Optional[datetime] = None) -> None:
+        """
+        Clears the change tracking state. Called by the repository after loading or persisting,
+        optionally recording the database `updated_at` used for optimistic concurrency checks.
+        """
+        self._dirty_fields.clear()
+        if persisted_updated_at is not None:
+            self._persisted_updated_at = persisted_updated_at
+
+    def _mark_dirty(self, *field_names: str) -> None:
+        """Records fields mutated in place (e.g. list appends), which `__setattr__` cannot observe."""
+        self._dirty_fields.update(field_names)
+
     def update_status(self, new_status: GenerationStatus, error_message: Optional[str] = None, error_details: Optional[Dict[str, Any]] = None) -> None:
         """
         Updates the status of the request and sets the update timestamp.
@@ -55,8 +87,19 @@ class GenerationRequest(BaseModel):
     def add_sample_results(self, sample_assets: List[AssetInfo]) -> None:
         """
         Adds a list of generated sample asset information to the request.
+
+        Samples whose `asset_id` is already recorded are skipped, so a redelivered
+        n8n callback does not append the same samples twice.
         """
-        self.sample_asset_infos.extend(sample_assets)
+        known_ids = {sample.asset_id for sample in self.sample_asset_infos}
+        new_samples = []
+        for sample in sample_assets:
+            if sample.asset_id not in known_ids:
+                known_ids.add(sample.asset_id)
+                new_samples.append(sample)
+        if new_samples:
+            self.sample_asset_infos.extend(new_samples)
+            self._mark_dirty("sample_asset_infos")
         self.updated_at = datetime.utcnow()
     
     def set_selected_sample(self, sample_id: str) -> None:
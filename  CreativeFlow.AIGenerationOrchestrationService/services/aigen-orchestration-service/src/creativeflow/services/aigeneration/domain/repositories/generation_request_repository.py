@@ -1,8 +1,20 @@
 from abc import ABC, abstractmethod
-from typing import Optional, List
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, List, Tuple
 from uuid import UUID
 
 from creativeflow.services.aigeneration.domain.models.generation_request import GenerationRequest
+from creativeflow.services.aigeneration.domain.models.generation_status import GenerationStatus
+
+
+class StaleGenerationRequestError(Exception):
+    """
+    Raised when an optimistic concurrency check fails because the GenerationRequest
+    was modified by someone else since it was loaded.
+    """
+    def __init__(self, request_id: UUID):
+        self.request_id = request_id
+        super().__init__(f"Generation request '{request_id}' was modified concurrently.")
 
 
 class IGenerationRequestRepository(ABC):
@@ -23,6 +35,17 @@ class IGenerationRequestRepository(ABC):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    async def get_by_ids(self, request_ids: List[UUID], for_update: bool = False) -> List[GenerationRequest]:
+        """
+        Retrieves several GenerationRequests in a single query.
+
+        :param request_ids: The UUIDs of the generation requests.
+        :param for_update: If True, the rows are locked until the current transaction ends.
+        :return: The GenerationRequests found, in no particular order. Unknown IDs are omitted.
+        """
+        raise NotImplementedError
+
     @abstractmethod
     async def add(self, generation_request: GenerationRequest) -> None:
         """
@@ -37,7 +60,83 @@ class IGenerationRequestRepository(ABC):
         """
         Updates an existing GenerationRequest in the repository.
 
+        Implementations persist only the aggregate's `dirty_fields` and mark it clean afterwards.
+
         :param generation_request: The GenerationRequest domain object with updated state.
+        :raises StaleGenerationRequestError: If optimistic locking is enabled and the stored
+            request changed since it was loaded.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_many(self, generation_requests: List[GenerationRequest]) -> None:
+        """
+        Updates several existing GenerationRequests with as few statements as possible.
+
+        Like `update`, only the dirty fields of each aggregate are persisted; requests whose
+        dirty fields map to the same columns are written together in one multi-row statement.
+        No optimistic concurrency check is applied, so callers should hold row locks
+        (see `get_by_ids(..., for_update=True)`) for the duration of the transaction.
+
+        :param generation_requests: The GenerationRequest domain objects with updated state.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def fail_expired_in_flight(
+        self, deadlines: Dict[GenerationStatus, timedelta], error_message: str, limit: int = 100
+    ) -> List[Tuple[GenerationRequest, GenerationStatus]]:
+        """
+        Moves in-flight GenerationRequests whose stage deadline has passed to FAILED in one bulk operation.
+
+        A request has expired when its status is a key of `deadlines` and it was last updated
+        longer ago than that status's deadline. Rows locked by concurrent sweeps are skipped.
+
+        :param deadlines: The maximum time a request may stay in each in-flight status.
+        :param error_message: The error message recorded on the failed requests.
+        :param limit: The maximum number of requests failed per call.
+        :return: The failed requests (in their new state) with the status they timed out in.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def add_with_outbox_message(
+        self,
+        generation_request: GenerationRequest,
+        exchange_name: str,
+        routing_key: str,
+        payload: Dict[str, Any],
+        on_commit: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """
+        Adds a new GenerationRequest together with an outgoing job message to the current
+        transaction (transactional outbox), so both are committed together by the unit of
+        work. The message is published later by a relay.
+
+        :param generation_request: The GenerationRequest domain object to persist.
+        :param exchange_name: The exchange the job message must be published to.
+        :param routing_key: The routing key for the job message.
+        :param payload: The job message body.
+        :param on_commit: Called once the transaction is committed, e.g. to wake the relay.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def commit(self) -> None:
+        """
+        Commits the unit of work's current transaction now, then runs its after-commit
+        callbacks. Used before side effects that must only follow a durable write, such as
+        publishing a job whose callback will look the request up.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def after_commit(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """
+        Awaits `callback` once the current transaction commits, or right away if no
+        transaction is open. It is discarded if the transaction rolls back.
+
+        :param callback: A coroutine function, e.g. publishing a status event.
         """
         raise NotImplementedError
 
@@ -53,4 +152,20 @@ class IGenerationRequestRepository(ABC):
         :param limit: The maximum number of records to return.
         :return: A list of GenerationRequest domain objects.
         """
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    @abstractmethod
+    async def list_by_user_id_after(
+        self, user_id: str, limit: int = 100, after: Optional[Tuple[datetime, UUID]] = None
+    ) -> List[GenerationRequest]:
+        """
+        Lists GenerationRequests for a specific user, newest first, with keyset pagination.
+
+        Unlike offset pagination, the cost of fetching a page does not grow with its depth.
+
+        :param user_id: The ID of the user.
+        :param limit: The maximum number of records to return.
+        :param after: The (created_at, id) of the last record of the previous page, or None for the first page.
+        :return: A list of GenerationRequest domain objects ordered by (created_at, id) descending.
+        """
+        raise NotImplementedError
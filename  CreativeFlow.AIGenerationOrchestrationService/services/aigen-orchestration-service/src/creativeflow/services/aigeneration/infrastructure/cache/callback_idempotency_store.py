@@ -0,0 +1,106 @@
+"""
+callback_idempotency_store.py
+
+Redis-backed deduplication of n8n callbacks.
+
+n8n retries webhooks on timeouts and network errors, so the same callback can
+arrive several times, possibly at different service instances. Each callback is
+identified by an idempotency key. The first delivery claims the key with an atomic
+`SET NX EX` as "processing", with a short TTL, and marks it "done" for the full TTL
+once its changes are committed. Later deliveries of a done key are acknowledged
+without being processed again. If the instance dies mid-processing, the claim
+expires and a redelivery processes the callback.
+"""
+
+import logging
+
+from creativeflow.services.aigeneration.core.config import settings
+from creativeflow.services.aigeneration.infrastructure.cache.redis_client import RedisClient, redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackIdempotencyStore:
+    """
+    Records which callback idempotency keys have already been claimed.
+
+    Without Redis (or on Redis errors) every claim succeeds, so deduplication degrades
+    to the domain-level safeguards instead of blocking callback processing.
+    """
+
+    PROCESSING = "processing"
+    DONE = "done"
+
+    def __init__(
+        self,
+        redis: RedisClient,
+        ttl_seconds: int = 86400,
+        processing_ttl_seconds: int = 120,
+        key_prefix: str = "aigen:n8n_callback",
+    ):
+        """
+        Args:
+            redis: The shared Redis client wrapper; used only while it is connected.
+            ttl_seconds: How long a processed key is remembered.
+            processing_ttl_seconds: How long a claim lasts before its callback is processed and committed.
+            key_prefix: Prefix of the Redis keys holding claimed idempotency keys.
+        """
+        self._redis = redis
+        self._ttl_seconds = ttl_seconds
+        self._processing_ttl_seconds = processing_ttl_seconds
+        self._key_prefix = key_prefix
+
+    def _key(self, idempotency_key: str) -> str:
+        return f"{self._key_prefix}:{idempotency_key}"
+
+    async def claim(self, idempotency_key: str) -> bool:
+        """
+        Atomically claims the key for processing. Returns False if it is already claimed,
+        i.e. the callback is a duplicate that is being or has been processed.
+        """
+        if not self._redis.is_connected:
+            return True
+        try:
+            claimed = await self._redis.get_client().set(
+                self._key(idempotency_key), self.PROCESSING, nx=True, ex=self._processing_ttl_seconds
+            )
+        except Exception as e:
+            logger.error(f"Failed to claim callback idempotency key '{idempotency_key}': {e}")
+            return True
+        return bool(claimed)
+
+    async def is_processing(self, idempotency_key: str) -> bool:
+        """Whether the key is claimed by a delivery that has not been committed yet."""
+        if not self._redis.is_connected:
+            return False
+        try:
+            return await self._redis.get_client().get(self._key(idempotency_key)) == self.PROCESSING
+        except Exception as e:
+            logger.error(f"Failed to read callback idempotency key '{idempotency_key}': {e}")
+            return False
+
+    async def mark_done(self, idempotency_key: str) -> None:
+        """Records that the claimed callback's changes are committed, for the full TTL."""
+        if not self._redis.is_connected:
+            return
+        try:
+            await self._redis.get_client().set(self._key(idempotency_key), self.DONE, ex=self._ttl_seconds)
+        except Exception as e:
+            # The claim expires instead; a redelivery is then caught by the domain-level safeguards.
+            logger.error(f"Failed to mark callback idempotency key '{idempotency_key}' as done: {e}")
+
+    async def release(self, idempotency_key: str) -> None:
+        """Forgets a claimed key so that a callback which failed to process can be delivered again."""
+        if not self._redis.is_connected:
+            return
+        try:
+            await self._redis.get_client().delete(self._key(idempotency_key))
+        except Exception as e:
+            logger.error(f"Failed to release callback idempotency key '{idempotency_key}': {e}")
+
+
+callback_idempotency_store = CallbackIdempotencyStore(
+    redis=redis_client,
+    ttl_seconds=settings.N8N_CALLBACK_IDEMPOTENCY_TTL_SECONDS,
+    processing_ttl_seconds=settings.N8N_CALLBACK_PROCESSING_TTL_SECONDS,
+)
@@ -0,0 +1,153 @@
+"""
+prompt_result_cache.py
+
+Content-addressed cache of generated sample sets.
+
+Entries are keyed by a fingerprint: a SHA-256 over the canonical JSON form of the
+generation inputs (prompt, style guidance, input parameters), the model version and
+the requesting user. Entries expire after a TTL, and the Redis tier is additionally
+bounded by an LRU index (a sorted set scored by last access) so the cache never
+grows past `max_entries`. Index members whose entry has expired are pruned: on a
+Redis miss, and on every write for members not accessed within the TTL (their
+entries are necessarily gone). An in-process TTL/LRU cache sits in front of Redis.
+"""
+
+import json
+import logging
+import time
+from hashlib import sha256
+from typing import Any, Dict, List, Optional
+
+from cachetools import TTLCache
+
+from creativeflow.services.aigeneration.core.config import settings
+from creativeflow.services.aigeneration.domain.models.asset_info import AssetInfo
+from creativeflow.services.aigeneration.infrastructure.cache.redis_client import RedisClient, redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class PromptResultCache:
+    """
+    Caches the sample assets generated for a set of generation inputs.
+
+    Redis errors are logged and treated as cache misses, so the cache never
+    blocks the generation flow.
+    """
+
+    def __init__(
+        self,
+        redis: RedisClient,
+        ttl_seconds: int = 7 * 24 * 3600,
+        max_entries: int = 100000,
+        local_max_entries: int = 1000,
+        key_prefix: str = "aigen:prompt_cache",
+    ):
+        """
+        Args:
+            redis: The shared Redis client wrapper; used only while it is connected.
+            ttl_seconds: Time-to-live of a cached sample set.
+            max_entries: Maximum number of sample sets kept in Redis; least recently used ones are evicted.
+            local_max_entries: Maximum number of sample sets held in the in-process cache.
+            key_prefix: Prefix of the Redis keys used by the cache.
+        """
+        self._redis = redis
+        self._ttl_seconds = ttl_seconds
+        self._max_entries = max_entries
+        self._local_cache: TTLCache = TTLCache(maxsize=local_max_entries, ttl=ttl_seconds)
+        self._key_prefix = key_prefix
+        self._lru_key = f"{key_prefix}:lru"
+
+    @staticmethod
+    def fingerprint(
+        user_id: str,
+        input_prompt: str,
+        style_guidance: Optional[str],
+        input_parameters: Dict[str, Any],
+        model_version: str,
+    ) -> str:
+        """
+        Returns the canonical hash of the generation inputs. Key order and surrounding
+        whitespace of the prompt texts do not affect the fingerprint.
+        """
+        canonical = json.dumps(
+            {
+                "user_id": user_id,
+                "input_prompt": input_prompt.strip(),
+                "style_guidance": style_guidance.strip() if style_guidance else None,
+                "input_parameters": input_parameters,
+                "model_version": model_version,
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+            default=str,
+        )
+        return sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _key(self, fingerprint: str) -> str:
+        return f"{self._key_prefix}:{fingerprint}"
+
+    async def get(self, fingerprint: str) -> Optional[List[AssetInfo]]:
+        """Returns the cached sample assets for the fingerprint, or None on a miss."""
+        samples = self._local_cache.get(fingerprint)
+        if samples is not None:
+            logger.debug(f"Prompt result cache hit (local) for fingerprint {fingerprint}.")
+            return samples
+
+        if not self._redis.is_connected:
+            return None
+        try:
+            client = self._redis.get_client()
+            raw = await client.get(self._key(fingerprint))
+            if raw is None:
+                # The entry expired; drop it from the LRU index as well.
+                await client.zrem(self._lru_key, fingerprint)
+                return None
+            # Refresh the entry's position in the LRU index.
+            await client.zadd(self._lru_key, {fingerprint: time.time()})
+        except Exception as e:
+            logger.error(f"Failed to read prompt result cache entry {fingerprint} from Redis: {e}")
+            return None
+        try:
+            samples = [AssetInfo.model_validate(item) for item in json.loads(raw)]
+        except ValueError as e:
+            logger.warning(f"Ignoring malformed prompt result cache entry {fingerprint}: {e}")
+            return None
+        logger.debug(f"Prompt result cache hit (Redis) for fingerprint {fingerprint}.")
+        self._local_cache[fingerprint] = samples
+        return samples
+
+    async def set(self, fingerprint: str, samples: List[AssetInfo]) -> None:
+        """Stores the sample assets for the fingerprint, evicting least recently used entries beyond `max_entries`."""
+        if not samples:
+            return
+        self._local_cache[fingerprint] = list(samples)
+        if not self._redis.is_connected:
+            return
+        payload = json.dumps([sample.model_dump(mode="json") for sample in samples])
+        try:
+            client = self._redis.get_client()
+            now = time.time()
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.set(self._key(fingerprint), payload, ex=self._ttl_seconds)
+                pipe.zadd(self._lru_key, {fingerprint: now})
+                # Members not accessed within the TTL point at entries that have expired.
+                pipe.zremrangebyscore(self._lru_key, "-inf", now - self._ttl_seconds)
+                pipe.zcard(self._lru_key)
+                _, _, _, size = await pipe.execute()
+            if size > self._max_entries:
+                evicted = await client.zpopmin(self._lru_key, size - self._max_entries)
+                if evicted:
+                    await client.delete(*[self._key(member) for member, _ in evicted])
+                    logger.debug(f"Evicted {len(evicted)} least recently used prompt result cache entries.")
+        except Exception as e:
+            logger.error(f"Failed to store prompt result cache entry {fingerprint} in Redis: {e}")
+
+
+prompt_result_cache = PromptResultCache(
+    redis=redis_client,
+    ttl_seconds=settings.PROMPT_RESULT_CACHE_TTL_SECONDS,
+    max_entries=settings.PROMPT_RESULT_CACHE_MAX_ENTRIES,
+    local_max_entries=settings.PROMPT_RESULT_CACHE_LOCAL_MAX_ENTRIES,
+)
@@ -0,0 +1,190 @@
+"""
+subscription_tier_cache.py
+
+Short-TTL, two-tier cache for user subscription tiers.
+
+Lookups hit an in-process TTL cache first, then Redis (shared by all instances),
+and only then the Credit Service. Subscription-change events published on a Redis
+channel evict the affected user from the shared Redis entry and from every
+instance's local cache. The listener resubscribes with exponential backoff when
+its pub/sub connection fails.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from cachetools import TTLCache
+
+from creativeflow.services.aigeneration.core.config import settings
+from creativeflow.services.aigeneration.infrastructure.cache.redis_client import RedisClient, redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriptionTierCache:
+    """
+    Caches subscription tiers per user in memory and, when connected, in Redis.
+
+    Redis errors are logged and treated as cache misses, so the cache never
+    blocks the generation flow.
+    """
+
+    def __init__(
+        self,
+        redis: RedisClient,
+        ttl_seconds: int = 60,
+        max_entries: int = 10000,
+        invalidation_channel: str = "subscription.changed",
+        reconnect_delay: float = 0.5,
+        max_reconnect_delay: float = 30.0,
+    ):
+        """
+        Args:
+            redis: The shared Redis client wrapper; used only while it is connected.
+            ttl_seconds: Time-to-live for cached tiers, both in memory and in Redis.
+            max_entries: Maximum number of users held in the in-process cache.
+            invalidation_channel: Redis pub/sub channel carrying subscription-change events.
+            reconnect_delay: Initial wait before resubscribing after the listener's connection fails; doubled per failed attempt.
+            max_reconnect_delay: Upper bound of the wait between resubscription attempts.
+        """
+        self._redis = redis
+        self._ttl_seconds = ttl_seconds
+        self._local_cache: TTLCache = TTLCache(maxsize=max_entries, ttl=ttl_seconds)
+        self._invalidation_channel = invalidation_channel
+        self._reconnect_delay = reconnect_delay
+        self._max_reconnect_delay = max_reconnect_delay
+        self._listener_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return f"aigen:subscription_tier:{user_id}"
+
+    async def get(self, user_id: str) -> Optional[str]:
+        """Returns the cached tier for the user, or None on a miss."""
+        tier = self._local_cache.get(user_id)
+        if tier is not None:
+            logger.debug(f"Subscription tier cache hit (local) for user {user_id}.")
+            return tier
+
+        if self._redis.is_connected:
+            try:
+                tier = await self._redis.get_client().get(self._key(user_id))
+            except Exception as e:
+                logger.error(f"Failed to read subscription tier for user {user_id} from Redis: {e}")
+                return None
+            if tier is not None:
+                logger.debug(f"Subscription tier cache hit (Redis) for user {user_id}.")
+                self._local_cache[user_id] = tier
+        return tier
+
+    async def set(self, user_id: str, tier: str) -> None:
+        """Stores the user's tier in both cache tiers."""
+        self._local_cache[user_id] = tier
+        if self._redis.is_connected:
+            try:
+                await self._redis.get_client().set(self._key(user_id), tier, ex=self._ttl_seconds)
+            except Exception as e:
+                logger.error(f"Failed to cache subscription tier for user {user_id} in Redis: {e}")
+
+    async def invalidate(self, user_id: str) -> None:
+        """
+        Evicts the user's tier everywhere: locally, in Redis, and (via pub/sub) in the
+        local caches of all other instances.
+        """
+        self._local_cache.pop(user_id, None)
+        if self._redis.is_connected:
+            try:
+                client = self._redis.get_client()
+                await client.delete(self._key(user_id))
+                await client.publish(self._invalidation_channel, json.dumps({"user_id": user_id}))
+            except Exception as e:
+                logger.error(f"Failed to invalidate subscription tier for user {user_id} in Redis: {e}")
+
+    async def start_invalidation_listener(self) -> None:
+        """
+        Subscribes to subscription-change events so cached entries are dropped as soon as
+        a user's subscription changes. Events are JSON objects with a `user_id` key.
+        """
+        if not self._redis.is_connected or (self._listener_task and not self._listener_task.done()):
+            return
+        pubsub = await self._subscribe()
+        self._listener_task = asyncio.get_event_loop().create_task(self._listen(pubsub))
+        logger.info(f"Listening for subscription-change events on channel '{self._invalidation_channel}'.")
+
+    async def _subscribe(self):
+        pubsub = self._redis.get_client().pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(self._invalidation_channel)
+        except Exception:
+            await pubsub.close()
+            raise
+        return pubsub
+
+    async def _listen(self, pubsub) -> None:
+        """Evicts users named by subscription-change events, resubscribing whenever the connection fails."""
+        while True:
+            try:
+                async for message in pubsub.listen():
+                    try:
+                        user_id = str(json.loads(message["data"])["user_id"])
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning(f"Ignoring malformed subscription-change event: {message.get('data')!r}")
+                        continue
+                    await self._evict(user_id)
+                # listen() ends once the connection has no subscriptions left.
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Subscription-change listener lost its pub/sub connection: {e}")
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception as e:
+                    logger.debug(f"Error closing the subscription-change pub/sub connection: {e}")
+
+            delay = self._reconnect_delay
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    pubsub = await self._subscribe()
+                    logger.info(f"Resubscribed to subscription-change events on channel '{self._invalidation_channel}'.")
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    delay = min(delay * 2, self._max_reconnect_delay)
+                    logger.warning(f"Failed to resubscribe to subscription-change events, retrying in {delay:.1f}s: {e}")
+
+    async def _evict(self, user_id: str) -> None:
+        """
+        Drops the user's tier locally and from Redis. Events may come from publishers that
+        do not delete the shared entry themselves; every instance deleting it is harmless.
+        """
+        self._local_cache.pop(user_id, None)
+        if self._redis.is_connected:
+            try:
+                await self._redis.get_client().delete(self._key(user_id))
+            except Exception as e:
+                logger.error(f"Failed to evict subscription tier for user {user_id} from Redis: {e}")
+        logger.debug(f"Evicted cached subscription tier for user {user_id} after a subscription change.")
+
+    async def stop(self) -> None:
+        """Stops the invalidation listener, if running."""
+        if self._listener_task and not self._listener_task.done():
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+        self._listener_task = None
+
+
+subscription_tier_cache = SubscriptionTierCache(
+    redis=redis_client,
+    ttl_seconds=settings.SUBSCRIPTION_TIER_CACHE_TTL_SECONDS,
+    max_entries=settings.SUBSCRIPTION_TIER_CACHE_MAX_ENTRIES,
+    invalidation_channel=settings.SUBSCRIPTION_CHANGE_EVENTS_CHANNEL,
+)
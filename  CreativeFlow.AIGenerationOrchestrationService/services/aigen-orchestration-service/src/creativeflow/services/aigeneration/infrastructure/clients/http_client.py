@@ -0,0 +1,7 @@
+import httpx
+
+from creativeflow.services.aigeneration.core.config import settings
+
+# Process-wide HTTP client shared by the Credit and Notification service clients, so their
+# pooled keep-alive connections are reused across requests. Closed by main.py at shutdown.
+http_client = httpx.AsyncClient(timeout=settings.SERVICE_HTTP_TIMEOUT_SECONDS)
@@ -1,34 +1,151 @@
 import logging
-from typing import Any, Tuple, List, Dict
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Tuple, List, Dict, NamedTuple, Optional, Union
 from uuid import UUID
 import xmlrpc.client
 import asyncio
 
+from creativeflow.services.aigeneration.core.config import settings
+
 logger = logging.getLogger(__name__)
 
 # This client uses the standard xmlrpc.client library. Its methods are blocking.
-# To use it in an async application, these blocking calls should be wrapped
-# in `asyncio.to_thread()` as shown in the public methods.
+# To use it in an async application, these blocking calls are run on a bounded
+# thread pool (one worker per pooled connection) by the public async methods.
+
+
+class OdooCall(NamedTuple):
+    """A single `execute_kw` call, used with `call_odoo_rpc_batch`."""
+    model: str
+    method: str
+    args: List
+    kwargs: Optional[Dict] = None
+
+
+class _TimeoutMixin:
+    """Applies a socket timeout to the HTTP(S) connection reused by the transport."""
+    def __init__(self, *args, timeout: float, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self._timeout
+        return connection
+
+
+class _KeepAliveTransport(_TimeoutMixin, xmlrpc.client.Transport):
+    pass
+
+
+class _KeepAliveSafeTransport(_TimeoutMixin, xmlrpc.client.SafeTransport):
+    pass
+
+
+class RpcLatencyStats:
+    """Thread-safe per-method call counters and latency totals for Odoo RPCs."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, name: str, seconds: float, failed: bool) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(name, {"calls": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            stats["calls"] += 1
+            stats["errors"] += int(failed)
+            stats["total_seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Returns the counters per `model.method`, including the average latency."""
+        with self._lock:
+            return {
+                name: {**stats, "avg_seconds": stats["total_seconds"] / stats["calls"]}
+                for name, stats in self._stats.items()
+            }
+
 
 class OdooAdapterClient:
     """
     Client adapter for interacting with the Odoo backend for billing/credit operations.
     Acts as an adapter to the Odoo system for functionalities related to user credits,
     subscriptions, and potentially triggering Odoo-side updates post-generation.
+
+    Connections are pooled: each pooled `ServerProxy` keeps its HTTP/1.1 connection
+    alive between calls, and calls run on a thread pool no larger than the connection
+    pool, so the number of concurrent Odoo connections is bounded and connection
+    setup is paid once per pooled connection rather than once per call.
     """
-    def __init__(self, url: str, db: str, uid: int, password: str):
+    def __init__(
+        self,
+        url: str,
+        db: str,
+        uid: int,
+        password: str,
+        pool_size: int = 8,
+        timeout: float = 30.0,
+        use_multicall: bool = False,
+    ):
         self._odoo_url = url
         self._odoo_db = db
         self._odoo_uid = uid
         self._odoo_password = password
+        self._pool_size = pool_size
+        self._timeout = timeout
+        self._use_multicall = use_multicall
+        self._proxies: "queue.LifoQueue[xmlrpc.client.ServerProxy]" = queue.LifoQueue(maxsize=pool_size)
+        self._created_proxies = 0
+        self._pool_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.latency_stats = RpcLatencyStats()
         logger.info(f"OdooAdapterClient initialized for URL: {self._odoo_url} and DB: {self._odoo_db}")
 
-    def _get_proxy(self, model: str) -> xmlrpc.client.ServerProxy:
-        """Helper to get a server proxy for a specific Odoo model."""
-        common_proxy = xmlrpc.client.ServerProxy(f'{self._odoo_url}/xmlrpc/2/common')
-        # Here we would authenticate, but for this client, we assume uid/password is passed to each call.
-        # This proxy is for the object endpoint
-        return xmlrpc.client.ServerProxy(f'{self._odoo_url}/xmlrpc/2/object')
+    def _new_proxy(self) -> xmlrpc.client.ServerProxy:
+        """Creates a proxy for the object endpoint with its own keep-alive transport."""
+        url = f"{str(self._odoo_url).rstrip('/')}/xmlrpc/2/object"
+        transport_class = _KeepAliveSafeTransport if url.startswith("https") else _KeepAliveTransport
+        return xmlrpc.client.ServerProxy(url, transport=transport_class(timeout=self._timeout), allow_none=True)
+
+    def _acquire_proxy(self) -> xmlrpc.client.ServerProxy:
+        """Takes an idle pooled proxy, creating one while the pool is below its size."""
+        try:
+            return self._proxies.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            if self._created_proxies < self._pool_size:
+                self._created_proxies += 1
+                return self._new_proxy()
+        return self._proxies.get()
+
+    def _release_proxy(self, proxy: xmlrpc.client.ServerProxy, broken: bool = False) -> None:
+        if broken:
+            # Drop the connection; the proxy reconnects transparently on its next call.
+            proxy("close")()
+        self._proxies.put(proxy)
+
+    def _run_timed(self, name: str, func, *args) -> Any:
+        """Runs a blocking RPC on a pooled proxy, recording its latency."""
+        proxy = self._acquire_proxy()
+        started = time.perf_counter()
+        failed = broken = False
+        try:
+            return func(proxy, *args)
+        except xmlrpc.client.Fault:
+            # An application error reported by Odoo; the connection itself is still usable.
+            failed = True
+            raise
+        except Exception:
+            failed = broken = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.latency_stats.record(name, elapsed, failed)
+            self._release_proxy(proxy, broken=broken)
+            logger.debug(f"Odoo RPC '{name}' took {elapsed * 1000:.1f}ms{' (failed)' if failed else ''}.")
 
     def _execute_kw(self, model: str, method: str, args: list, kwargs: dict = None) -> Any:
         """
@@ -37,10 +154,12 @@ class OdooAdapterClient:
         """
         if kwargs is None:
             kwargs = {}
-        proxy = self._get_proxy(model)
         try:
             logger.debug(f"Executing Odoo RPC: model='{model}', method='{method}', args='{args}', kwargs='{kwargs}'")
-            result = proxy.execute_kw(self._odoo_db, self._odoo_uid, self._odoo_password, model, method, args, kwargs)
+            result = self._run_timed(
+                f"{model}.{method}",
+                lambda proxy: proxy.execute_kw(self._odoo_db, self._odoo_uid, self._odoo_password, model, method, args, kwargs),
+            )
             logger.debug(f"Odoo RPC call successful. Result: {result}")
             return result
         except xmlrpc.client.Fault as e:
@@ -50,11 +169,77 @@ class OdooAdapterClient:
             logger.error(f"An unexpected error occurred during Odoo RPC call: {e}", exc_info=True)
             raise ConnectionError(f"Failed to communicate with Odoo: {e}")
 
+    def _execute_multicall(self, calls: List[OdooCall]) -> List[Union[Any, ConnectionError]]:
+        """
+        Private blocking method sending several `execute_kw` calls in one `system.multicall`
+        round trip. Requires an Odoo deployment that exposes `system.multicall` on the object endpoint.
+        """
+        def send(proxy: xmlrpc.client.ServerProxy) -> list:
+            multicall = xmlrpc.client.MultiCall(proxy)
+            for call in calls:
+                multicall.execute_kw(
+                    self._odoo_db, self._odoo_uid, self._odoo_password,
+                    call.model, call.method, call.args, call.kwargs or {},
+                )
+            results = []
+            raw_results = multicall()
+            for index in range(len(calls)):
+                try:
+                    results.append(raw_results[index])
+                except xmlrpc.client.Fault as e:
+                    results.append(ConnectionError(f"Odoo RPC Error: {e.faultString}"))
+            return results
+
+        try:
+            return self._run_timed("system.multicall", send)
+        except Exception as e:
+            logger.error(f"Odoo multicall of {len(calls)} call(s) failed: {e}", exc_info=True)
+            error = ConnectionError(f"Failed to communicate with Odoo: {e}")
+            return [error] * len(calls)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._pool_size, thread_name_prefix="odoo-rpc")
+        return self._executor
+
     async def call_odoo_rpc(self, model: str, method: str, args: List, kwargs: Dict = None) -> Any:
         """
         Asynchronously calls a generic Odoo RPC method.
         """
-        return await asyncio.to_thread(self._execute_kw, model, method, args, kwargs)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._get_executor(), self._execute_kw, model, method, args, kwargs)
+
+    async def call_odoo_rpc_batch(self, calls: List[OdooCall]) -> List[Union[Any, ConnectionError]]:
+        """
+        Asynchronously executes several Odoo RPC calls, e.g. queued credit operations.
+
+        With `use_multicall` the calls share a single `system.multicall` round trip; otherwise
+        they run concurrently over the pooled connections.
+
+        Returns:
+            One entry per call, in order: the call's result, or a ConnectionError if it failed.
+        """
+        if not calls:
+            return []
+        loop = asyncio.get_event_loop()
+        if self._use_multicall:
+            return await loop.run_in_executor(self._get_executor(), self._execute_multicall, list(calls))
+        return await asyncio.gather(
+            *[self.call_odoo_rpc(call.model, call.method, call.args, call.kwargs) for call in calls],
+            return_exceptions=True,
+        )
+
+    def close(self) -> None:
+        """Shuts down the thread pool and closes all pooled connections."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        while True:
+            try:
+                self._proxies.get_nowait()("close")()
+            except queue.Empty:
+                break
+        self._created_proxies = 0
 
     async def validate_user_subscription_and_credits(self, user_id: str, required_credits: float) -> Tuple[bool, str]:
         """
@@ -66,7 +251,7 @@ class OdooAdapterClient:
         model = "creative.user.credit"
         method = "validate_generation_request"
         args = [[user_id], required_credits] # Odoo often expects search domains in lists
-        
+
         try:
             result = await self.call_odoo_rpc(model, method, args)
             # Assuming Odoo returns a tuple like (True, "Success") or (False, "Insufficient Credits")
@@ -78,21 +263,20 @@ class OdooAdapterClient:
         except ConnectionError as e:
             return False, str(e)
 
+    @staticmethod
+    def _credit_call(method: str, user_id: str, generation_request_id: UUID, amount: float, **extra) -> OdooCall:
+        kwargs = {'user_id': user_id, 'request_id': str(generation_request_id), 'amount': amount, **extra}
+        return OdooCall("creative.user.credit", method, [], kwargs)
+
     async def deduct_user_credits(self, user_id: str, generation_request_id: UUID, credits_to_deduct: float, action_description: str) -> bool:
         """
         Instructs Odoo to deduct credits for a generation.
         """
-        model = "creative.user.credit"
-        method = "deduct_credits_for_generation"
-        args = []
-        kwargs = {
-            'user_id': user_id,
-            'request_id': str(generation_request_id),
-            'amount': credits_to_deduct,
-            'description': action_description
-        }
+        call = self._credit_call(
+            "deduct_credits_for_generation", user_id, generation_request_id, credits_to_deduct, description=action_description
+        )
         try:
-            result = await self.call_odoo_rpc(model, method, args, kwargs)
+            result = await self.call_odoo_rpc(*call)
             # Assuming Odoo returns True on success
             return bool(result)
         except ConnectionError:
@@ -102,18 +286,39 @@ class OdooAdapterClient:
         """
         Requests a credit refund from Odoo in case of system errors.
         """
-        model = "creative.user.credit"
-        method = "refund_credits_for_generation"
-        args = []
-        kwargs = {
-            'user_id': user_id,
-            'request_id': str(generation_request_id),
-            'amount': credits_to_refund,
-            'reason': reason
-        }
+        call = self._credit_call("refund_credits_for_generation", user_id, generation_request_id, credits_to_refund, reason=reason)
         try:
-            result = await self.call_odoo_rpc(model, method, args, kwargs)
+            result = await self.call_odoo_rpc(*call)
             # Assuming Odoo returns True on success
             return bool(result)
         except ConnectionError:
-            return False
\ No newline at end of file
+            return False
+
+    async def refund_user_credits_batch(self, refunds: List[Tuple[str, UUID, float, str]]) -> List[bool]:
+        """
+        Requests several credit refunds in one batch.
+
+        Args:
+            refunds: (user_id, generation_request_id, credits_to_refund, reason) tuples.
+
+        Returns:
+            Whether each refund succeeded, in order.
+        """
+        calls = [
+            self._credit_call("refund_credits_for_generation", user_id, request_id, amount, reason=reason)
+            for user_id, request_id, amount, reason in refunds
+        ]
+        results = await self.call_odoo_rpc_batch(calls)
+        return [not isinstance(result, Exception) and bool(result) for result in results]
+
+
+# Process-wide client so pooled connections are shared across requests; closed by main.py at shutdown.
+odoo_adapter_client = OdooAdapterClient(
+    url=str(settings.ODOO_URL) if settings.ODOO_URL else None,
+    db=settings.ODOO_DB,
+    uid=settings.ODOO_UID,
+    password=str(settings.ODOO_PASSWORD),  # Ensure password is a string
+    pool_size=settings.ODOO_RPC_POOL_SIZE,
+    timeout=settings.ODOO_RPC_TIMEOUT_SECONDS,
+    use_multicall=settings.ODOO_RPC_USE_MULTICALL,
+)
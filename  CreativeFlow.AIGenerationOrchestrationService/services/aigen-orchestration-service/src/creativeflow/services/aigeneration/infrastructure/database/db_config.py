@@ -8,18 +8,21 @@ for SQLAlchemy. It also defines the ORM models that map to the PostgreSQL
 database tables.
 """
 
+import logging
 import uuid
 from datetime import datetime
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Awaitable, Callable
 
 from sqlalchemy import (
-    create_engine, Column, String, Text, DateTime, Numeric,
-    func
+    create_engine, Column, String, Text, DateTime, Numeric, Integer, Index,
+    func, text
 )
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 
+logger = logging.getLogger(__name__)
+
 # --- Global Database Variables ---
 # These will be initialized by the `init_db` function on application startup.
 async_engine = None
@@ -36,6 +39,19 @@ class GenerationRequestORM(Base):
     This model maps directly to the database schema defined in the SDS.
     """
     __tablename__ = 'generation_requests'
+    __table_args__ = (
+        # Serves keyset pagination of a user's requests: WHERE user_id = ? AND (created_at, id) < (?, ?)
+        # ORDER BY created_at DESC, id DESC, as an index range scan with no sort step.
+        Index('ix_generation_requests_user_created_id', 'user_id', text('created_at DESC'), text('id DESC')),
+        # Serves the stuck-request reaper: only in-flight rows are indexed, so the sweep for expired
+        # leases (status = ? AND updated_at < ?) stays cheap however many finished requests pile up.
+        Index(
+            'ix_generation_requests_in_flight',
+            'status',
+            'updated_at',
+            postgresql_where=text("status IN ('PROCESSING_SAMPLES', 'PROCESSING_FINAL')"),
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(String, nullable=False, index=True)
@@ -61,6 +77,30 @@ class GenerationRequestORM(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
 
+class OutboxMessageORM(Base):
+    """
+    SQLAlchemy ORM model for the `outbox_messages` table (transactional outbox).
+    Job messages are inserted in the same transaction as the generation request row
+    and later published to RabbitMQ by the OutboxRelay.
+    """
+    __tablename__ = 'outbox_messages'
+    __table_args__ = (
+        # Keeps the relay's "oldest unpublished first" scan cheap as published rows accumulate.
+        Index('ix_outbox_messages_unpublished', 'created_at', postgresql_where=text('published_at IS NULL')),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    aggregate_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    exchange_name = Column(String, nullable=False)
+    routing_key = Column(String, nullable=False)
+    payload = Column(JSONB, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    published_at = Column(DateTime(timezone=True), nullable=True)
+
+
 # --- Database Initialization and Session Management ---
 
 def init_db(database_url: str):
@@ -80,6 +120,51 @@ def init_db(database_url: str):
         expire_on_commit=False,
     )
 
+async def close_db_engine():
+    """
+    Disposes of the database engine's connection pool.
+    This function should be called once during the application's shutdown phase.
+    """
+    global async_engine, AsyncSessionLocal
+
+    if async_engine is not None:
+        await async_engine.dispose()
+    async_engine = None
+    AsyncSessionLocal = None
+
+# --- Unit of Work Helpers ---
+
+# `Session.info` key of the callbacks to await once the session's transaction commits.
+_AFTER_COMMIT_CALLBACKS = "after_commit_callbacks"
+
+
+def add_after_commit_callback(session: AsyncSession, callback: Callable[[], Awaitable[None]]) -> None:
+    """
+    Registers a coroutine function to await once the session's current transaction is
+    committed through `commit_session`. It is discarded if the transaction rolls back.
+    """
+    session.info.setdefault(_AFTER_COMMIT_CALLBACKS, []).append(callback)
+
+
+async def commit_session(session: AsyncSession) -> None:
+    """
+    Commits the session's transaction, then awaits its after-commit callbacks in order.
+    A failing callback is logged; the commit has already happened and is not undone.
+    """
+    await session.commit()
+    for callback in session.info.pop(_AFTER_COMMIT_CALLBACKS, []):
+        try:
+            await callback()
+        except Exception as e:
+            logger.error(f"After-commit callback failed: {e}", exc_info=True)
+
+
+async def rollback_session(session: AsyncSession) -> None:
+    """Rolls back the session's transaction and discards its after-commit callbacks."""
+    session.info.pop(_AFTER_COMMIT_CALLBACKS, None)
+    await session.rollback()
+
+
 async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
     """
     FastAPI dependency to provide a database session per request.
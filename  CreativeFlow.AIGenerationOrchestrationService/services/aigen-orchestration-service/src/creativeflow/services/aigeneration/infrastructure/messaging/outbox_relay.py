@@ -0,0 +1,159 @@
+"""
+outbox_relay.py
+
+Relay for the transactional outbox.
+
+Job messages written to the `outbox_messages` table (in the same transaction as
+their generation request) are picked up here and published to RabbitMQ. Rows are
+claimed with `FOR UPDATE SKIP LOCKED`, so several service instances can run the
+relay concurrently without publishing the same message twice in the common case.
+Delivery is at-least-once, so consumers should treat (generation_request_id,
+job_type) as the idempotency key of a job.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from creativeflow.services.aigeneration.core.config import settings
+from creativeflow.services.aigeneration.infrastructure.database import db_config
+from creativeflow.services.aigeneration.infrastructure.database.db_config import OutboxMessageORM
+from creativeflow.services.aigeneration.infrastructure.messaging.rabbitmq_publisher import RabbitMQPublisher, rabbitmq_publisher
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRelay:
+    """
+    Background worker that drains unpublished outbox messages to RabbitMQ in batches.
+    """
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        publisher: RabbitMQPublisher,
+        poll_interval: float = 0.5,
+        batch_size: int = 100,
+    ):
+        self._session_factory = session_factory
+        self._publisher = publisher
+        self._poll_interval = poll_interval
+        self._batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        """Starts the relay loop as a background task on the running event loop."""
+        if self._task and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_event_loop().create_task(self._run())
+        logger.info(f"Outbox relay started (poll interval: {self._poll_interval}s, batch size: {self._batch_size}).")
+
+    async def stop(self) -> None:
+        """Stops the relay loop and waits for the current iteration to finish."""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Outbox relay stopped.")
+
+    def notify(self) -> None:
+        """Wakes the relay immediately, e.g. right after a request with an outbox message was committed."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                published = await self.relay_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox relay iteration failed: {e}", exc_info=True)
+                published = 0
+
+            # A full batch means there is likely more backlog; loop again without waiting.
+            if published >= self._batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def relay_once(self) -> int:
+        """
+        Claims up to `batch_size` unpublished messages, publishes them grouped by destination
+        with batched confirms, and marks them as published in the same transaction.
+
+        Returns:
+            The number of messages published.
+        """
+        async with self._session_factory() as session:
+            async with session.begin():
+                stmt = (
+                    select(OutboxMessageORM)
+                    .where(OutboxMessageORM.published_at.is_(None))
+                    .order_by(OutboxMessageORM.created_at)
+                    .limit(self._batch_size)
+                    .with_for_update(skip_locked=True)
+                )
+                messages = (await session.execute(stmt)).scalars().all()
+                if not messages:
+                    return 0
+
+                batches: Dict[Tuple[str, str], List[OutboxMessageORM]] = {}
+                for message in messages:
+                    batches.setdefault((message.exchange_name, message.routing_key), []).append(message)
+
+                published_ids = []
+                for (exchange_name, routing_key), batch in batches.items():
+                    try:
+                        await self._publisher.publish_generation_jobs(
+                            [message.payload for message in batch],
+                            routing_key=routing_key,
+                            exchange_name=exchange_name,
+                            buffer_if_disconnected=False,
+                        )
+                        published_ids.extend(message.id for message in batch)
+                    except Exception as e:
+                        logger.error(
+                            f"Failed to relay {len(batch)} outbox message(s) to exchange '{exchange_name}': {e}",
+                            exc_info=True,
+                        )
+                        await session.execute(
+                            update(OutboxMessageORM)
+                            .where(OutboxMessageORM.id.in_([message.id for message in batch]))
+                            .values(attempts=OutboxMessageORM.attempts + 1, last_error=str(e))
+                        )
+
+                if published_ids:
+                    await session.execute(
+                        update(OutboxMessageORM)
+                        .where(OutboxMessageORM.id.in_(published_ids))
+                        .values(published_at=datetime.now(timezone.utc))
+                    )
+                    logger.info(f"Relayed {len(published_ids)} outbox message(s) to RabbitMQ.")
+                return len(published_ids)
+
+
+def _session_factory() -> AsyncSession:
+    # Resolved lazily: the session factory only exists once init_db() has run at startup.
+    return db_config.AsyncSessionLocal()
+
+
+# Process-wide relay, started and stopped by main.py when ENABLE_TRANSACTIONAL_OUTBOX is set.
+outbox_relay = OutboxRelay(
+    session_factory=_session_factory,
+    publisher=rabbitmq_publisher,
+    poll_interval=settings.OUTBOX_RELAY_POLL_INTERVAL_SECONDS,
+    batch_size=settings.OUTBOX_RELAY_BATCH_SIZE,
+)
@@ -1,110 +1,323 @@
+import asyncio
 import json
 import logging
-import pika
-import time
-from typing import Optional
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+import aio_pika
+from aio_pika.abc import AbstractChannel, AbstractExchange, AbstractRobustConnection
+from aio_pika.pool import Pool
+
+from creativeflow.services.aigeneration.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# A message to publish: (exchange_name, routing_key, body)
+_Message = Tuple[str, str, bytes]
+# A buffered message and the future its publisher awaits: resolved once the broker confirms it.
+_BufferedMessage = Tuple[_Message, asyncio.Future]
+
 
 class RabbitMQPublisher:
     """
     Client for publishing messages (generation jobs) to RabbitMQ.
     Encapsulates the logic for connecting to RabbitMQ and publishing messages.
-    
-    Note: This implementation uses the blocking `pika` library. In a fully async
-    application using a library like `aio-pika` is preferred. If using `pika`,
-    publishing methods should be run in a separate thread to avoid blocking
-    the main asyncio event loop (e.g., via `asyncio.to_thread`).
+
+    This implementation is asyncio-native (`aio_pika`) and never blocks the event loop:
+    - Publishes are spread over a pool of channels opened in publisher-confirm mode,
+      so concurrent requests do not serialize on a single shared channel.
+    - Exchanges are declared once per process; later publishes reuse the cached
+      declaration instead of paying an extra broker round trip.
+    - `publish_generation_jobs` sends a batch and awaits all broker confirms together.
+    - While the robust connection is reconnecting, messages are held in a bounded
+      local buffer and flushed as soon as the connection is restored. The publish
+      call only returns once its messages are confirmed, and raises if they are
+      not flushed within `buffer_timeout` or the publisher is closed first, so a
+      caller never treats a job that was never sent as queued. A flush that fails
+      while the connection is up keeps the unpublished messages buffered and is
+      retried with exponential backoff.
     """
-    def __init__(self, connection_url: str):
+    def __init__(
+        self,
+        connection_url: str,
+        channel_pool_size: int = 8,
+        buffer_size: int = 1000,
+        confirm_timeout: float = 5.0,
+        buffer_timeout: float = 30.0,
+        flush_retry_delay: float = 0.5,
+        max_flush_retry_delay: float = 30.0,
+    ):
         self._connection_url = connection_url
-        self._connection: Optional[pika.BlockingConnection] = None
-        self._channel: Optional[pika.channel.Channel] = None
+        self._channel_pool_size = channel_pool_size
+        self._buffer_size = buffer_size
+        self._confirm_timeout = confirm_timeout
+        self._buffer_timeout = buffer_timeout
+        self._flush_retry_delay = flush_retry_delay
+        self._max_flush_retry_delay = max_flush_retry_delay
+        self._connection: Optional[AbstractRobustConnection] = None
+        self._channel_pool: Optional[Pool] = None
+        self._declared_exchanges: Set[str] = set()
+        self._declare_lock: Optional[asyncio.Lock] = None
+        self._buffer: Deque[_BufferedMessage] = deque()
+        self._flush_task: Optional[asyncio.Task] = None
         self.is_connected = False
 
-    def connect(self):
-        """
+    @property
+    def is_ready(self) -> bool:
+        """True once `connect()` has succeeded and until `close()`; publishes may be buffered while reconnecting."""
+        return self._channel_pool is not None
 
-        Establishes a connection to the RabbitMQ server and creates a channel.
-        This method is blocking and should be called at application startup.
+    async def connect(self):
+        """
+        Establishes a robust connection to the RabbitMQ server and prepares the channel pool.
+        This should be awaited at application startup.
         """
-        if self.is_connected and self._connection and self._connection.is_open:
+        if self.is_connected and self._connection and not self._connection.is_closed:
             logger.info("RabbitMQ connection is already active.")
             return
 
         logger.info("Connecting to RabbitMQ...")
         try:
-            params = pika.URLParameters(self._connection_url)
-            self._connection = pika.BlockingConnection(params)
-            self._channel = self._connection.channel()
+            self._connection = await aio_pika.connect_robust(self._connection_url)
+            self._connection.close_callbacks.add(self._on_connection_closed)
+            self._connection.reconnect_callbacks.add(self._on_connection_reconnected)
+            self._channel_pool = Pool(self._open_channel, max_size=self._channel_pool_size)
+            # Created here rather than in __init__ so it binds to the running event loop.
+            self._declare_lock = asyncio.Lock()
             self.is_connected = True
-            logger.info("Successfully connected to RabbitMQ.")
-        except pika.exceptions.AMQPConnectionError as e:
+            logger.info(f"Successfully connected to RabbitMQ (channel pool size: {self._channel_pool_size}).")
+        except aio_pika.exceptions.AMQPConnectionError as e:
             logger.error(f"Failed to connect to RabbitMQ: {e}", exc_info=True)
             self.is_connected = False
             raise
 
-    def _ensure_connection(self):
-        """Ensures the connection is active, trying to reconnect if necessary."""
-        if self.is_connected and self._channel and self._channel.is_open:
-            return
-        
-        logger.warning("RabbitMQ connection lost. Attempting to reconnect...")
-        self.is_connected = False
-        self.connect() # This will raise an exception if reconnect fails
+    async def _open_channel(self) -> AbstractChannel:
+        """Pool factory: opens a new channel with publisher confirms enabled."""
+        return await self._connection.channel(publisher_confirms=True)
+
+    async def _get_exchange(self, channel: AbstractChannel, exchange_name: str) -> AbstractExchange:
+        """
+        Returns the exchange bound to `channel`, declaring it on the broker only once per process.
+        """
+        if exchange_name not in self._declared_exchanges:
+            async with self._declare_lock:
+                if exchange_name not in self._declared_exchanges:
+                    await channel.declare_exchange(
+                        exchange_name,
+                        type=aio_pika.ExchangeType.DIRECT,
+                        durable=True,
+                    )
+                    self._declared_exchanges.add(exchange_name)
+                    logger.info(f"Declared RabbitMQ exchange '{exchange_name}'.")
+        return await channel.get_exchange(exchange_name, ensure=False)
+
+    @staticmethod
+    def _build_message(body: bytes) -> aio_pika.Message:
+        return aio_pika.Message(
+            body=body,
+            content_type='application/json',
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        )
+
+    async def _publish_batch(self, messages: List[_Message]) -> None:
+        """
+        Publishes the messages on a single pooled channel and awaits all confirms together.
+        Raises if any message is nacked or not confirmed within `confirm_timeout`.
+        """
+        async with self._channel_pool.acquire() as channel:
+            confirmations = []
+            for exchange_name, routing_key, body in messages:
+                exchange = await self._get_exchange(channel, exchange_name)
+                confirmations.append(
+                    exchange.publish(self._build_message(body), routing_key=routing_key)
+                )
+            await asyncio.wait_for(asyncio.gather(*confirmations), timeout=self._confirm_timeout)
 
-    def publish_generation_job(self, job_payload: dict, routing_key: str, exchange_name: str):
+    def _buffer_messages(self, messages: List[_Message]) -> List[asyncio.Future]:
         """
-        Publishes a generation job message to a specific exchange.
+        Holds messages locally until the connection is restored. Raises when the buffer is full.
+
+        Returns:
+            One future per message, resolved once it is confirmed by the broker.
+        """
+        if len(self._buffer) + len(messages) > self._buffer_size:
+            logger.error(
+                f"RabbitMQ publish buffer is full ({len(self._buffer)}/{self._buffer_size}). "
+                f"Rejecting {len(messages)} message(s)."
+            )
+            raise ConnectionError("RabbitMQ is unavailable and the local publish buffer is full.")
+        loop = asyncio.get_running_loop()
+        entries = [(message, loop.create_future()) for message in messages]
+        self._buffer.extend(entries)
+        logger.warning(f"RabbitMQ is reconnecting; buffered {len(messages)} message(s) ({len(self._buffer)} pending).")
+        return [future for _, future in entries]
+
+    async def _wait_for_buffered(self, futures: List[asyncio.Future]) -> None:
+        """
+        Waits until buffered messages are confirmed. If the connection is not restored within
+        `buffer_timeout`, the messages are withdrawn from the buffer and ConnectionError is raised.
+        """
+        confirmed = asyncio.gather(*futures)
+        timeout = self._buffer_timeout
+        while True:
+            try:
+                await asyncio.wait_for(asyncio.shield(confirmed), timeout=timeout)
+                return
+            except asyncio.TimeoutError:
+                pending = set(futures)
+                remaining = deque(entry for entry in self._buffer if entry[1] not in pending)
+                if len(remaining) + len(futures) == len(self._buffer):
+                    self._buffer = remaining
+                    confirmed.cancel()
+                    raise ConnectionError(
+                        f"RabbitMQ was not restored within {self._buffer_timeout}s; buffered message(s) were not published."
+                    )
+            # Taken by an in-flight flush: within the confirm timeout they are either
+            # confirmed or back in the buffer, where they can be withdrawn on the next check.
+            timeout = self._confirm_timeout
+
+    async def publish_generation_job(self, job_payload: dict, routing_key: str, exchange_name: str):
+        """
+        Publishes a generation job message to a specific exchange and waits for the broker confirm.
 
         Args:
             job_payload: A dictionary representing the job parameters.
             routing_key: The routing key for the message.
             exchange_name: The name of the exchange to publish to.
         """
-        if not self.is_connected:
+        await self.publish_generation_jobs([job_payload], routing_key, exchange_name)
+
+    async def publish_generation_jobs(
+        self,
+        job_payloads: List[dict],
+        routing_key: str,
+        exchange_name: str,
+        buffer_if_disconnected: bool = True,
+    ):
+        """
+        Publishes several generation job messages over one pooled channel with batched confirms.
+
+        If the connection is temporarily down, the messages are buffered locally (bounded)
+        and published once the robust connection reconnects; the call returns once they are
+        confirmed, and raises ConnectionError if that does not happen within `buffer_timeout`.
+
+        Args:
+            job_payloads: Dictionaries representing the job parameters.
+            routing_key: The routing key for the messages.
+            exchange_name: The name of the exchange to publish to.
+            buffer_if_disconnected: If False, raise ConnectionError instead of buffering while
+                reconnecting (for callers with their own durable retry, such as the outbox relay).
+        """
+        if not self.is_ready:
             logger.error("Cannot publish job, RabbitMQ is not connected.")
             raise ConnectionError("RabbitMQ publisher is not connected.")
 
-        try:
-            self._ensure_connection()
-            
-            # Declare the exchange (idempotent operation)
-            self._channel.exchange_declare(
-                exchange=exchange_name,
-                exchange_type='direct',
-                durable=True
-            )
+        messages = [
+            (exchange_name, routing_key, json.dumps(payload, default=str).encode())
+            for payload in job_payloads
+        ]
+        if not self.is_connected:
+            if not buffer_if_disconnected:
+                raise ConnectionError("RabbitMQ connection is being restored.")
+            await self._wait_for_buffered(self._buffer_messages(messages))
+            return
 
-            message_body = json.dumps(job_payload, default=str)
-            
-            self._channel.basic_publish(
-                exchange=exchange_name,
-                routing_key=routing_key,
-                body=message_body,
-                properties=pika.BasicProperties(
-                    delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
-                    content_type='application/json'
-                )
+        try:
+            await self._publish_batch(messages)
+            logger.info(
+                f"Published {len(messages)} message(s) to exchange '{exchange_name}' "
+                f"with routing key '{routing_key}'."
             )
-            logger.info(f"Published message to exchange '{exchange_name}' with routing key '{routing_key}'.")
-        except (pika.exceptions.AMQPError, ConnectionError) as e:
+        except (aio_pika.exceptions.AMQPError, asyncio.TimeoutError, ConnectionError) as e:
             logger.error(f"Failed to publish message to RabbitMQ: {e}", exc_info=True)
-            self.is_connected = False # Mark as disconnected to force reconnect on next call
             raise
-    
-    def close(self):
+
+    def _on_connection_closed(self, *args, **kwargs) -> None:
+        if self.is_connected:
+            logger.warning("RabbitMQ connection lost. Buffering publishes until it is restored.")
+        self.is_connected = False
+        # Exchange declarations are re-checked after a reconnect in case the broker lost them.
+        self._declared_exchanges.clear()
+
+    def _on_connection_reconnected(self, *args, **kwargs) -> None:
+        logger.info("RabbitMQ connection restored.")
+        self.is_connected = True
+        if self._buffer and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.get_event_loop().create_task(self._flush_buffer())
+
+    async def _flush_buffer(self) -> None:
+        """
+        Publishes buffered messages, grouped by destination, once the connection is back.
+
+        If a batch fails, it and every batch not yet attempted go back to the front of the
+        buffer. The flush is retried with exponential backoff while the connection stays up;
+        after a disconnect, the next reconnect starts a new flush.
         """
-        Gracefully closes the channel and connection to RabbitMQ.
-        This should be called at application shutdown.
+        delay = self._flush_retry_delay
+        while self._buffer and self.is_connected:
+            pending = [self._buffer.popleft() for _ in range(len(self._buffer))]
+            grouped: Dict[Tuple[str, str], List[_BufferedMessage]] = {}
+            for message, future in pending:
+                grouped.setdefault((message[0], message[1]), []).append((message, future))
+            batches = list(grouped.items())
+            for index, (destination, batch) in enumerate(batches):
+                try:
+                    await self._publish_batch([message for message, _ in batch])
+                    logger.info(f"Flushed {len(batch)} buffered message(s) to exchange '{destination[0]}'.")
+                except Exception as e:
+                    unpublished = [entry for _, remaining in batches[index:] for entry in remaining]
+                    self._buffer.extendleft(reversed(unpublished))
+                    logger.error(
+                        f"Failed to flush buffered RabbitMQ messages, {len(unpublished)} kept buffered; "
+                        f"retrying in {delay:.1f}s: {e}",
+                        exc_info=True,
+                    )
+                    break
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+            else:
+                delay = self._flush_retry_delay
+                continue
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self._max_flush_retry_delay)
+
+    def _fail_buffered(self, reason: str) -> None:
+        """Fails the publishes waiting on buffered messages, which will not be sent."""
+        for _, future in self._buffer:
+            if not future.done():
+                future.set_exception(ConnectionError(reason))
+        self._buffer.clear()
+
+    async def close(self):
+        """
+        Gracefully closes the channel pool and connection to RabbitMQ.
+        This should be awaited at application shutdown.
         """
-        if self._connection and self._connection.is_open:
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        if self._buffer:
+            logger.warning(f"Closing RabbitMQ publisher with {len(self._buffer)} unpublished buffered message(s).")
+            self._fail_buffered("RabbitMQ publisher closed before the buffered message(s) were published.")
+        if self._connection and not self._connection.is_closed:
             logger.info("Closing RabbitMQ connection.")
             try:
-                self._connection.close()
-                self.is_connected = False
+                if self._channel_pool is not None:
+                    await self._channel_pool.close()
+                await self._connection.close()
             except Exception as e:
                 logger.error(f"Error closing RabbitMQ connection: {e}", exc_info=True)
         else:
-            logger.info("RabbitMQ connection already closed.")
\ No newline at end of file
+            logger.info("RabbitMQ connection already closed.")
+        self._channel_pool = None
+        self.is_connected = False
+
+
+# Process-wide publisher, connected and closed by the startup/shutdown events in main.py.
+rabbitmq_publisher = RabbitMQPublisher(
+    connection_url=str(settings.RABBITMQ_URL),
+    channel_pool_size=settings.RABBITMQ_PUBLISHER_CHANNEL_POOL_SIZE,
+    buffer_size=settings.RABBITMQ_PUBLISHER_BUFFER_SIZE,
+    confirm_timeout=settings.RABBITMQ_PUBLISHER_CONFIRM_TIMEOUT_SECONDS,
+    buffer_timeout=settings.RABBITMQ_PUBLISHER_BUFFER_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,215 @@
+"""
+status_event_broadcaster.py
+
+Redis pub/sub fan-out of generation status transitions.
+
+Every transition is published once to a per-request channel and a per-user channel.
+Each service instance holds a single pub/sub connection, subscribes to a channel only
+while at least one local Server-Sent Events client is listening on it, and fans
+incoming events out to those clients through bounded in-memory queues. When the
+pub/sub connection fails, it is re-established with exponential backoff and the
+current channels are subscribed again; events published in between are missed.
+"""
+
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set
+from uuid import UUID
+
+from creativeflow.services.aigeneration.core.config import settings
+from creativeflow.services.aigeneration.domain.models.generation_request import GenerationRequest
+from creativeflow.services.aigeneration.infrastructure.cache.redis_client import RedisClient, redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationStatusBroadcaster:
+    """
+    Publishes generation status events to Redis and multiplexes them to local subscribers.
+    """
+
+    def __init__(
+        self,
+        redis: RedisClient,
+        channel_prefix: str = "aigen:status",
+        queue_size: int = 100,
+        reconnect_delay: float = 0.5,
+        max_reconnect_delay: float = 30.0,
+    ):
+        """
+        Args:
+            redis: The shared Redis client wrapper.
+            channel_prefix: Prefix of the Redis channels carrying status events.
+            queue_size: Per-subscriber buffer; the oldest event is dropped when a slow client falls behind.
+            reconnect_delay: Initial wait before re-establishing a failed pub/sub connection; doubled per failed attempt.
+            max_reconnect_delay: Upper bound of the wait between reconnection attempts.
+        """
+        self._redis = redis
+        self._channel_prefix = channel_prefix
+        self._queue_size = queue_size
+        self._reconnect_delay = reconnect_delay
+        self._max_reconnect_delay = max_reconnect_delay
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._pubsub = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def is_available(self) -> bool:
+        return self._redis.is_connected
+
+    def request_channel(self, request_id: UUID) -> str:
+        return f"{self._channel_prefix}:request:{request_id}"
+
+    def user_channel(self, user_id: str) -> str:
+        return f"{self._channel_prefix}:user:{user_id}"
+
+    @staticmethod
+    def build_event(request: GenerationRequest) -> dict:
+        """The status event payload sent to clients."""
+        return {
+            "request_id": str(request.id),
+            "user_id": request.user_id,
+            "status": request.status.value,
+            "error_message": request.error_message,
+            "updated_at": request.updated_at.isoformat(),
+        }
+
+    async def publish(self, request: GenerationRequest) -> None:
+        """
+        Publishes the request's current status to its request and user channels.
+        Failures are logged and never interrupt the generation flow.
+        """
+        if not self.is_available:
+            return
+        message = json.dumps(self.build_event(request))
+        try:
+            async with self._redis.get_client().pipeline(transaction=False) as pipe:
+                pipe.publish(self.request_channel(request.id), message)
+                pipe.publish(self.user_channel(request.user_id), message)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to publish status event for request {request.id}: {e}")
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[asyncio.Queue]:
+        """
+        Yields a queue receiving the decoded events published on `channel` for as long as
+        the context is open. The Redis subscription is shared by all local subscribers.
+        """
+        if not self.is_available:
+            raise ConnectionError("Status event streaming requires Redis.")
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self._queue_size)
+        await self._add_subscriber(channel, queue)
+        try:
+            yield queue
+        finally:
+            await self._remove_subscriber(channel, queue)
+
+    async def _add_subscriber(self, channel: str, queue: asyncio.Queue) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            subscribers = self._subscribers.setdefault(channel, set())
+            subscribers.add(queue)
+            if len(subscribers) == 1:
+                if self._pubsub is None:
+                    self._pubsub = self._redis.get_client().pubsub(ignore_subscribe_messages=True)
+                await self._pubsub.subscribe(channel)
+            # The reader exits once the pub/sub connection has no subscriptions left; restart it if needed.
+            if self._reader_task is None or self._reader_task.done():
+                self._reader_task = asyncio.get_event_loop().create_task(self._read())
+
+    async def _remove_subscriber(self, channel: str, queue: asyncio.Queue) -> None:
+        async with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if not subscribers:
+                return
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[channel]
+                try:
+                    await self._pubsub.unsubscribe(channel)
+                except Exception as e:
+                    logger.warning(f"Failed to unsubscribe from status channel '{channel}': {e}")
+
+    async def _read(self) -> None:
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        event = json.loads(message["data"])
+                    except ValueError:
+                        logger.warning(f"Ignoring malformed status event on '{message.get('channel')}'.")
+                        continue
+                    for queue in list(self._subscribers.get(message["channel"], ())):
+                        if queue.full():
+                            # Slow consumer: keep the stream current by dropping its oldest pending event.
+                            queue.get_nowait()
+                        queue.put_nowait(event)
+                # listen() ends once the connection has no subscriptions left.
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Status event reader lost its pub/sub connection: {e}")
+
+            delay = self._reconnect_delay
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    if not await self._resubscribe():
+                        return
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    delay = min(delay * 2, self._max_reconnect_delay)
+                    logger.warning(f"Failed to re-establish the status event pub/sub connection, retrying in {delay:.1f}s: {e}")
+
+    async def _resubscribe(self) -> bool:
+        """
+        Replaces the pub/sub connection and subscribes it to the channels that still have
+        local subscribers. Returns False if there are none left, so the reader can exit.
+        """
+        async with self._lock:
+            old_pubsub, self._pubsub = self._pubsub, None
+            if old_pubsub is not None:
+                try:
+                    await old_pubsub.close()
+                except Exception as e:
+                    logger.debug(f"Error closing the failed status event pub/sub connection: {e}")
+            if not self._subscribers:
+                return False
+            self._pubsub = self._redis.get_client().pubsub(ignore_subscribe_messages=True)
+            await self._pubsub.subscribe(*self._subscribers)
+            logger.info(f"Status event reader resubscribed to {len(self._subscribers)} channel(s).")
+            return True
+
+    async def stop(self) -> None:
+        """Stops the reader and closes the pub/sub connection."""
+        if self._reader_task and not self._reader_task.done():
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+        self._reader_task = None
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.close()
+            except Exception as e:
+                logger.warning(f"Error closing status event pub/sub connection: {e}")
+            self._pubsub = None
+        self._subscribers.clear()
+
+
+status_broadcaster = GenerationStatusBroadcaster(
+    redis=redis_client,
+    channel_prefix=settings.STATUS_EVENTS_CHANNEL_PREFIX,
+    queue_size=settings.STATUS_EVENTS_CLIENT_QUEUE_SIZE,
+)
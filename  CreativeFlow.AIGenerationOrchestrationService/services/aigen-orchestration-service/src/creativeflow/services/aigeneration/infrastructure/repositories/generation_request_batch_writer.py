@@ -0,0 +1,188 @@
+"""
+generation_request_batch_writer.py
+
+Micro-batching writer for n8n callback state changes.
+
+Under load, n8n delivers many callbacks per second, each of which would otherwise
+cost a SELECT, an UPDATE and a commit on its own connection. The batch writer
+collects the mutations submitted within a few milliseconds, loads all affected
+requests with one locking SELECT, applies the mutations in arrival order and
+persists them with one multi-row UPDATE per set of changed columns, all in a
+single transaction.
+"""
+
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from creativeflow.services.aigeneration.core.config import settings
+from creativeflow.services.aigeneration.domain.models.generation_request import GenerationRequest
+from creativeflow.services.aigeneration.infrastructure.database import db_config
+from creativeflow.services.aigeneration.infrastructure.repositories.postgres_generation_request_repository import PostgresGenerationRequestRepository
+
+logger = logging.getLogger(__name__)
+
+# A mutation applied to a loaded request before it is written back.
+Mutation = Callable[[GenerationRequest], None]
+# A queued submission: (request_id, mutation, future resolved with the mutated request)
+_PendingWrite = Tuple[UUID, Mutation, asyncio.Future]
+
+
+class GenerationRequestBatchWriter:
+    """
+    Coalesces concurrent read-modify-write operations on generation requests into batched transactions.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        max_batch_size: int = 200,
+        max_delay_ms: float = 5.0,
+    ):
+        """
+        Args:
+            session_factory: Factory for the sessions batches are written with.
+            max_batch_size: Maximum number of mutations written in one transaction.
+            max_delay_ms: How long the first mutation of a batch waits for others to join it.
+        """
+        self._session_factory = session_factory
+        self._max_batch_size = max_batch_size
+        self._max_delay = max_delay_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Task] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Starts the writer loop as a background task on the running event loop."""
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_event_loop().create_task(self._run())
+        logger.info(
+            f"Callback batch writer started (max batch size: {self._max_batch_size}, "
+            f"max delay: {self._max_delay * 1000:g}ms)."
+        )
+
+    async def stop(self) -> None:
+        """Stops the writer loop after flushing the mutations already submitted."""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._inflight is not None and not self._inflight.done():
+            await self._inflight
+        pending = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        if pending:
+            await self._flush(pending)
+        logger.info("Callback batch writer stopped.")
+
+    async def submit(self, request_id: UUID, mutation: Mutation) -> Optional[GenerationRequest]:
+        """
+        Queues `mutation` for the request and waits until it has been committed.
+
+        Returns:
+            The request as committed after the mutation, or None if the request does not exist.
+
+        Raises:
+            Any exception raised by the mutation, or by the database write of its batch.
+        """
+        if not self.is_running:
+            raise RuntimeError("Callback batch writer is not running.")
+        future = asyncio.get_event_loop().create_future()
+        self._queue.put_nowait((request_id, mutation, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_event_loop()
+        while True:
+            batch: List[_PendingWrite] = []
+            try:
+                batch.append(await self._queue.get())
+                deadline = loop.time() + self._max_delay
+                while len(batch) < self._max_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # Stopping while a batch is being collected: write what was already taken off the queue.
+                if batch:
+                    await self._flush(batch)
+                raise
+            # Shielded so that stopping the writer never abandons a transaction halfway.
+            self._inflight = loop.create_task(self._flush(batch))
+            await asyncio.shield(self._inflight)
+
+    async def _flush(self, batch: List[_PendingWrite]) -> None:
+        results: Dict[int, Optional[GenerationRequest]] = {}
+        errors: Dict[int, Exception] = {}
+        try:
+            async with self._session_factory() as session:
+                async with session.begin():
+                    repo = PostgresGenerationRequestRepository(session)
+                    request_ids = list(dict.fromkeys(request_id for request_id, _, _ in batch))
+                    requests = {request.id: request for request in await repo.get_by_ids(request_ids, for_update=True)}
+
+                    for index, (request_id, mutation, _) in enumerate(batch):
+                        current = requests.get(request_id)
+                        if current is None:
+                            results[index] = None
+                            continue
+                        # Mutate a copy so a failing mutation leaves no partial changes behind.
+                        candidate = current.model_copy(deep=True)
+                        try:
+                            mutation(candidate)
+                        except Exception as e:
+                            errors[index] = e
+                            continue
+                        requests[request_id] = candidate
+                        results[index] = candidate.model_copy(deep=True)
+
+                    await repo.update_many([requests[request_id] for request_id in request_ids if request_id in requests])
+                    for result in results.values():
+                        if result is not None:
+                            result.mark_clean(persisted_updated_at=requests[result.id].persisted_updated_at)
+        except Exception as e:
+            logger.error(f"Failed to write a batch of {len(batch)} callback update(s): {e}", exc_info=True)
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        logger.debug(f"Wrote a batch of {len(batch)} callback update(s) for {len(requests)} request(s).")
+        for index, (_, _, future) in enumerate(batch):
+            if future.done():
+                continue
+            if index in errors:
+                future.set_exception(errors[index])
+            else:
+                future.set_result(results[index])
+
+
+def _session_factory() -> AsyncSession:
+    # Resolved lazily: the session factory only exists once init_db() has run at startup.
+    return db_config.AsyncSessionLocal()
+
+
+# Process-wide writer, started and stopped by main.py when ENABLE_CALLBACK_BATCHING is set.
+callback_batch_writer = GenerationRequestBatchWriter(
+    session_factory=_session_factory,
+    max_batch_size=settings.CALLBACK_BATCH_MAX_SIZE,
+    max_delay_ms=settings.CALLBACK_BATCH_MAX_DELAY_MS,
+)
@@ -6,17 +6,24 @@ Handles data access operations for GenerationRequest entities using SQLAlchemy.
 """
 
 import logging
-from typing import List, Optional
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 from uuid import UUID
 
-from sqlalchemy import select, update
+from sqlalchemy import and_, any_, bindparam, cast, column, event, func, literal, or_, select, tuple_, update, values
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from creativeflow.services.aigeneration.domain.models.generation_request import GenerationRequest
 from creativeflow.services.aigeneration.domain.models.asset_info import AssetInfo
 from creativeflow.services.aigeneration.domain.models.generation_status import GenerationStatus
-from creativeflow.services.aigeneration.domain.repositories.generation_request_repository import IGenerationRequestRepository
-from creativeflow.services.aigeneration.infrastructure.database.db_config import GenerationRequestORM
+from creativeflow.services.aigeneration.domain.repositories.generation_request_repository import IGenerationRequestRepository, StaleGenerationRequestError
+from creativeflow.services.aigeneration.infrastructure.database.db_config import (
+    GenerationRequestORM,
+    OutboxMessageORM,
+    add_after_commit_callback,
+    commit_session,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -26,14 +33,17 @@ class PostgresGenerationRequestRepository(IGenerationRequestRepository):
     interface using SQLAlchemy's async capabilities.
     """
 
-    def __init__(self, db_session: AsyncSession):
+    def __init__(self, db_session: AsyncSession, optimistic_locking: bool = False):
         """
         Initializes the repository with an asynchronous database session.
 
         Args:
             db_session: An SQLAlchemy AsyncSession provided by dependency injection.
+            optimistic_locking: If True, updates are guarded by the `updated_at` value read
+                from the database and fail with StaleGenerationRequestError on a lost race.
         """
         self._db_session = db_session
+        self._optimistic_locking = optimistic_locking
 
     async def get_by_id(self, request_id: UUID) -> Optional[GenerationRequest]:
         """Retrieves a generation request by its UUID."""
@@ -42,25 +52,176 @@ class PostgresGenerationRequestRepository(IGenerationRequestRepository):
         orm_request = result.scalar_one_or_none()
         return self._to_domain(orm_request) if orm_request else None
 
+    async def get_by_ids(self, request_ids: List[UUID], for_update: bool = False) -> List[GenerationRequest]:
+        """Retrieves several generation requests with a single `WHERE id = ANY(:ids)` query."""
+        if not request_ids:
+            return []
+        ids_param = bindparam("request_ids", list(request_ids), type_=ARRAY(PG_UUID(as_uuid=True)))
+        stmt = select(GenerationRequestORM).where(GenerationRequestORM.id == any_(ids_param))
+        if for_update:
+            # Lock in a stable order so concurrent batches cannot deadlock on each other.
+            stmt = stmt.order_by(GenerationRequestORM.id).with_for_update()
+        result = await self._db_session.execute(stmt)
+        return [self._to_domain(req) for req in result.scalars().all()]
+
     async def add(self, generation_request: GenerationRequest) -> None:
         """Adds a new generation request to the database."""
-        orm_request = self._from_domain(generation_request)
+        orm_request = GenerationRequestORM(**self._from_domain(generation_request))
         self._db_session.add(orm_request)
         await self._db_session.flush()
+        generation_request.mark_clean()
         logger.info(f"Added GenerationRequest with ID {generation_request.id} to the database.")
 
+    async def add_with_outbox_message(
+        self,
+        generation_request: GenerationRequest,
+        exchange_name: str,
+        routing_key: str,
+        payload: Dict[str, Any],
+        on_commit: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """
+        Inserts the generation request row and its outbox job message in the session's
+        transaction, so either both are committed or neither is. `on_commit` is called once
+        that transaction commits.
+        """
+        orm_request = GenerationRequestORM(**self._from_domain(generation_request))
+        outbox_message = OutboxMessageORM(
+            aggregate_id=generation_request.id,
+            exchange_name=exchange_name,
+            routing_key=routing_key,
+            payload=payload,
+        )
+        self._db_session.add_all([orm_request, outbox_message])
+        await self._db_session.flush()
+        if on_commit is not None:
+            event.listen(self._db_session.sync_session, "after_commit", lambda session: on_commit(), once=True)
+        generation_request.mark_clean()
+        logger.info(f"Added GenerationRequest with ID {generation_request.id} and its outbox message to the transaction.")
+
+    async def commit(self) -> None:
+        """Commits the session's transaction and awaits its after-commit callbacks."""
+        await commit_session(self._db_session)
+
+    async def after_commit(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """Defers `callback` until the session's open transaction commits; runs it now if there is none."""
+        if self._db_session.in_transaction():
+            add_after_commit_callback(self._db_session, callback)
+        else:
+            await callback()
+
     async def update(self, generation_request: GenerationRequest) -> None:
-        """Updates an existing generation request in the database."""
-        orm_request_data = self._from_domain(generation_request, for_update=True)
+        """
+        Updates an existing generation request in the database.
+
+        Only the columns backing the aggregate's dirty fields are written, so a status flip
+        does not rewrite the JSONB asset columns. `updated_at` is set by the database.
+        """
+        changed_columns = self._from_domain(generation_request, for_update=True, fields=generation_request.dirty_fields)
+        if not changed_columns:
+            logger.debug(f"GenerationRequest {generation_request.id} has no persisted changes; skipping update.")
+            return
+
         stmt = (
             update(GenerationRequestORM)
             .where(GenerationRequestORM.id == generation_request.id)
-            .values(**orm_request_data)
+            .values(**changed_columns, updated_at=func.now())
+            .returning(GenerationRequestORM.updated_at)
+        )
+        guarded = self._optimistic_locking and generation_request.persisted_updated_at is not None
+        if guarded:
+            stmt = stmt.where(GenerationRequestORM.updated_at == generation_request.persisted_updated_at)
+
+        result = await self._db_session.execute(stmt)
+        new_updated_at = result.scalar_one_or_none()
+        if new_updated_at is None:
+            if guarded:
+                raise StaleGenerationRequestError(generation_request.id)
+            logger.warning(f"Update matched no GenerationRequest with ID {generation_request.id}.")
+            return
+
+        generation_request.mark_clean(persisted_updated_at=new_updated_at)
+        logger.info(
+            f"Updated GenerationRequest with ID {generation_request.id} in the database "
+            f"(columns: {', '.join(sorted(changed_columns))})."
         )
-        await self._db_session.execute(stmt)
-        await self._db_session.flush()
-        logger.info(f"Updated GenerationRequest with ID {generation_request.id} in the database.")
 
+    async def update_many(self, generation_requests: List[GenerationRequest]) -> None:
+        """
+        Updates several generation requests, issuing one
+        `UPDATE ... SET ... FROM (VALUES ...) WHERE id = v.id` statement per distinct set of
+        changed columns instead of one statement per request.
+        """
+        groups: Dict[Tuple[str, ...], List[GenerationRequest]] = {}
+        for request in generation_requests:
+            columns = tuple(sorted(self._COLUMN_SERIALIZERS.keys() & request.dirty_fields))
+            if columns:
+                groups.setdefault(columns, []).append(request)
+
+        for columns, requests in groups.items():
+            table = GenerationRequestORM.__table__
+            changes = values(
+                column("id", table.c.id.type),
+                *[column(name, table.c[name].type) for name in columns],
+                name="changes",
+            ).data([
+                (request.id, *[self._COLUMN_SERIALIZERS[name](request) for name in columns])
+                for request in requests
+            ])
+            # NULLs in VALUES are untyped, so cast explicitly (an all-NULL JSONB column would otherwise resolve to text).
+            stmt = (
+                update(GenerationRequestORM)
+                .where(GenerationRequestORM.id == changes.c.id)
+                .values({**{name: cast(changes.c[name], table.c[name].type) for name in columns}, "updated_at": func.now()})
+                .returning(GenerationRequestORM.id, GenerationRequestORM.updated_at)
+            )
+            result = await self._db_session.execute(stmt)
+            updated_at_by_id = dict(result.all())
+            for request in requests:
+                if request.id in updated_at_by_id:
+                    request.mark_clean(persisted_updated_at=updated_at_by_id[request.id])
+                else:
+                    logger.warning(f"Batched update matched no GenerationRequest with ID {request.id}.")
+            logger.info(f"Updated {len(updated_at_by_id)} GenerationRequest(s) in one statement (columns: {', '.join(columns)}).")
+
+    async def fail_expired_in_flight(
+        self, deadlines: Dict[GenerationStatus, timedelta], error_message: str, limit: int = 100
+    ) -> List[Tuple[GenerationRequest, GenerationStatus]]:
+        """
+        Fails expired in-flight requests with a single
+        `WITH expired AS (SELECT ... FOR UPDATE SKIP LOCKED) UPDATE ... RETURNING` statement,
+        served by the partial index on in-flight statuses.
+        """
+        if not deadlines:
+            return []
+        # Statuses are rendered inline: with a bound parameter, a generic prepared-statement plan
+        # cannot prove the partial index predicate and would fall back to a scan.
+        expired = (
+            select(GenerationRequestORM.id, GenerationRequestORM.status.label("previous_status"))
+            .where(or_(*[
+                and_(
+                    GenerationRequestORM.status == literal(stage.value, literal_execute=True),
+                    GenerationRequestORM.updated_at < func.now() - deadline,
+                )
+                for stage, deadline in deadlines.items()
+            ]))
+            .order_by(GenerationRequestORM.updated_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .cte("expired")
+        )
+        stmt = (
+            update(GenerationRequestORM)
+            .where(GenerationRequestORM.id == expired.c.id)
+            .values(status=GenerationStatus.FAILED.value, error_message=error_message, updated_at=func.now())
+            .returning(*GenerationRequestORM.__table__.c, expired.c.previous_status)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self._db_session.execute(stmt)
+        failed = [(self._to_domain(row), GenerationStatus(row.previous_status)) for row in result.all()]
+        if failed:
+            logger.info(f"Failed {len(failed)} GenerationRequest(s) whose stage deadline expired.")
+        return failed
 
     async def list_by_user_id(self, user_id: str, skip: int = 0, limit: int = 100) -> List[GenerationRequest]:
         """Lists generation requests for a specific user, with pagination."""
@@ -75,12 +236,30 @@ class PostgresGenerationRequestRepository(IGenerationRequestRepository):
         orm_requests = result.scalars().all()
         return [self._to_domain(req) for req in orm_requests]
 
+    async def list_by_user_id_after(
+        self, user_id: str, limit: int = 100, after: Optional[Tuple[datetime, UUID]] = None
+    ) -> List[GenerationRequest]:
+        """Lists generation requests for a user, newest first, using keyset pagination on (created_at, id)."""
+        stmt = select(GenerationRequestORM).where(GenerationRequestORM.user_id == user_id)
+        if after is not None:
+            after_created_at, after_id = after
+            stmt = stmt.where(
+                tuple_(GenerationRequestORM.created_at, GenerationRequestORM.id)
+                < tuple_(
+                    bindparam("after_created_at", after_created_at, type_=GenerationRequestORM.created_at.type),
+                    bindparam("after_id", after_id, type_=GenerationRequestORM.id.type),
+                )
+            )
+        stmt = stmt.order_by(GenerationRequestORM.created_at.desc(), GenerationRequestORM.id.desc()).limit(limit)
+        result = await self._db_session.execute(stmt)
+        return [self._to_domain(req) for req in result.scalars().all()]
+
     def _to_domain(self, orm_request: GenerationRequestORM) -> GenerationRequest:
         """Maps a SQLAlchemy ORM object to a domain model."""
         if not orm_request:
             return None
         
-        return GenerationRequest(
+        domain_request = GenerationRequest(
             id=orm_request.id,
             user_id=orm_request.user_id,
             project_id=orm_request.project_id,
@@ -98,28 +277,42 @@ class PostgresGenerationRequestRepository(IGenerationRequestRepository):
             created_at=orm_request.created_at,
             updated_at=orm_request.updated_at
         )
+        domain_request.mark_clean(persisted_updated_at=orm_request.updated_at)
+        return domain_request
 
-    def _from_domain(self, domain_request: GenerationRequest, for_update: bool = False) -> dict:
+    # Serializers for each persisted column, keyed by the domain field that backs it.
+    _COLUMN_SERIALIZERS: Dict[str, Callable[[GenerationRequest], Any]] = {
+        "user_id": lambda r: r.user_id,
+        "project_id": lambda r: r.project_id,
+        "input_prompt": lambda r: r.input_prompt,
+        "style_guidance": lambda r: r.style_guidance,
+        "input_parameters": lambda r: r.input_parameters,
+        "status": lambda r: r.status.value,
+        "error_message": lambda r: r.error_message,
+        "sample_asset_infos": lambda r: [info.model_dump(mode="json") for info in r.sample_asset_infos] if r.sample_asset_infos else None,
+        "selected_sample_id": lambda r: r.selected_sample_id,
+        "final_asset_info": lambda r: r.final_asset_info.model_dump(mode="json") if r.final_asset_info else None,
+        "credits_cost_sample": lambda r: r.credits_cost_sample,
+        "credits_cost_final": lambda r: r.credits_cost_final,
+        "ai_model_used": lambda r: r.ai_model_used,
+    }
+
+    def _from_domain(
+        self,
+        domain_request: GenerationRequest,
+        for_update: bool = False,
+        fields: Optional[Iterable[str]] = None,
+    ) -> dict:
         """
         Maps a domain model to a dictionary suitable for creating or updating
         a SQLAlchemy ORM object.
+
+        If `fields` is given, only the columns backed by those domain fields are included;
+        fields without a column of their own (e.g. `updated_at`, `error_details`) are ignored.
         """
-        data = {
-            "user_id": domain_request.user_id,
-            "project_id": domain_request.project_id,
-            "input_prompt": domain_request.input_prompt,
-            "style_guidance": domain_request.style_guidance,
-            "input_parameters": domain_request.input_parameters,
-            "status": domain_request.status.value,
-            "error_message": domain_request.error_message,
-            "sample_asset_infos": [info.model_dump() for info in domain_request.sample_asset_infos] if domain_request.sample_asset_infos else None,
-            "selected_sample_id": domain_request.selected_sample_id,
-            "final_asset_info": domain_request.final_asset_info.model_dump() if domain_request.final_asset_info else None,
-            "credits_cost_sample": domain_request.credits_cost_sample,
-            "credits_cost_final": domain_request.credits_cost_final,
-            "ai_model_used": domain_request.ai_model_used,
-        }
+        columns = self._COLUMN_SERIALIZERS.keys() if fields is None else self._COLUMN_SERIALIZERS.keys() & set(fields)
+        data = {column: self._COLUMN_SERIALIZERS[column](domain_request) for column in columns}
         if not for_update:
             data['id'] = domain_request.id
-        
-        return data
\ No newline at end of file
+
+        return data
@@ -6,6 +6,7 @@ configures middleware, and sets up startup/shutdown event handlers for
 managing resources like database connections and message queue publishers.
 """
 
+import asyncio
 import logging
 import uvicorn
 from fastapi import FastAPI, HTTPException
@@ -14,6 +15,7 @@ from fastapi.middleware.cors import CORSMiddleware
 
 # Import project components
 from creativeflow.services.aigeneration.api.v1.endpoints import generation_requests, n8n_callbacks
+from creativeflow.services.aigeneration.application.services.stuck_request_reaper import stuck_request_reaper
 from creativeflow.services.aigeneration.core.config import settings
 from creativeflow.services.aigeneration.core.error_handlers import (
     ApplicationException,
@@ -24,7 +26,14 @@ from creativeflow.services.aigeneration.core.error_handlers import (
 )
 from creativeflow.services.aigeneration.core.logging_config import setup_logging
 from creativeflow.services.aigeneration.infrastructure.database.db_config import close_db_engine, init_db
+from creativeflow.services.aigeneration.infrastructure.cache.redis_client import redis_client
+from creativeflow.services.aigeneration.infrastructure.clients.http_client import http_client
+from creativeflow.services.aigeneration.infrastructure.clients.odoo_adapter_client import odoo_adapter_client
+from creativeflow.services.aigeneration.infrastructure.cache.subscription_tier_cache import subscription_tier_cache
+from creativeflow.services.aigeneration.infrastructure.messaging.outbox_relay import outbox_relay
 from creativeflow.services.aigeneration.infrastructure.messaging.rabbitmq_publisher import rabbitmq_publisher
+from creativeflow.services.aigeneration.infrastructure.messaging.status_event_broadcaster import status_broadcaster
+from creativeflow.services.aigeneration.infrastructure.repositories.generation_request_batch_writer import callback_batch_writer
 
 # Configure logging as per SDS Section 10
 setup_logging(log_level=settings.LOG_LEVEL, log_format=settings.LOG_FORMAT)
@@ -58,10 +67,14 @@ async def startup_event():
     Handles application startup logic.
     - Initializes the database engine.
     - Connects to the RabbitMQ server.
+    - Connects to Redis (optional) and subscribes to subscription-change events.
+    - Starts the transactional outbox relay when enabled.
+    - Starts the n8n callback batch writer when enabled.
+    - Starts the stuck-request reaper when enabled.
     """
     logger.info(f"Starting up {settings.PROJECT_NAME}...")
     try:
-        await init_db()
+        init_db(str(settings.DATABASE_URL))
         logger.info("Database engine initialized successfully.")
     except Exception as e:
         logger.critical(f"FATAL: Could not initialize database engine: {e}", exc_info=True)
@@ -78,21 +91,75 @@ async def startup_event():
         # import os, signal
         # os.kill(os.getpid(), signal.SIGTERM)
 
+    if settings.REDIS_URL:
+        try:
+            await redis_client.connect(settings.REDIS_URL)
+            await subscription_tier_cache.start_invalidation_listener()
+        except Exception as e:
+            # Redis only backs caches; the service keeps working with in-process caching.
+            logger.error(f"Could not connect to Redis, falling back to in-process caches: {e}", exc_info=True)
+
+    if settings.ENABLE_TRANSACTIONAL_OUTBOX:
+        outbox_relay.start()
+
+    if settings.ENABLE_CALLBACK_BATCHING:
+        callback_batch_writer.start()
+
+    if settings.ENABLE_STUCK_REQUEST_REAPER:
+        stuck_request_reaper.start()
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """
     Handles application shutdown logic.
+    - Stops the stuck-request reaper, if running.
+    - Flushes and stops the n8n callback batch writer, if running.
+    - Stops the transactional outbox relay, if running.
     - Gracefully closes the RabbitMQ connection.
+    - Closes the Redis connection.
+    - Closes the pooled Odoo and Credit/Notification service connections.
     - Gracefully closes the database engine connections.
     """
     logger.info(f"Shutting down {settings.PROJECT_NAME}...")
+    try:
+        await stuck_request_reaper.stop()
+    except Exception as e:
+        logger.error(f"Error stopping stuck-request reaper: {e}", exc_info=True)
+
+    try:
+        await callback_batch_writer.stop()
+    except Exception as e:
+        logger.error(f"Error stopping callback batch writer: {e}", exc_info=True)
+
+    try:
+        await outbox_relay.stop()
+    except Exception as e:
+        logger.error(f"Error stopping outbox relay: {e}", exc_info=True)
+
     try:
         await rabbitmq_publisher.close()
         logger.info("RabbitMQ publisher connection closed.")
     except Exception as e:
         logger.error(f"Error closing RabbitMQ connection: {e}", exc_info=True)
 
+    try:
+        await subscription_tier_cache.stop()
+        await status_broadcaster.stop()
+        await redis_client.close()
+    except Exception as e:
+        logger.error(f"Error closing Redis connection: {e}", exc_info=True)
+
+    try:
+        await asyncio.to_thread(odoo_adapter_client.close)
+    except Exception as e:
+        logger.error(f"Error closing Odoo connections: {e}", exc_info=True)
+
+    try:
+        await http_client.aclose()
+    except Exception as e:
+        logger.error(f"Error closing service HTTP client: {e}", exc_info=True)
+
     try:
         await close_db_engine()
         logger.info("Database engine connections closed.")
@@ -0,0 +1,105 @@
+"""
+Load benchmark for RedisPresenceRepository.
+
+Simulates concurrent users spread over collaboration sessions. Each user sends
+presence heartbeats (cursor moves) at a fixed rate, and each session's presence
+list is read periodically, as on a join. Reports how many heartbeats reached
+Redis after debouncing and the latency of full-session reads.
+
+Usage (from the service root, against a disposable Redis instance):
+
+    PYTHONPATH=src python benchmarks/presence_load_benchmark.py \\
+        --redis-url redis://localhost:6379/15 --users 10000 --sessions 500 --duration 30
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import redis.asyncio as aioredis
+
+from creativeflow.collaboration.domain.models.presence import Presence
+from creativeflow.collaboration.infrastructure.redis.redis_presence_repository import RedisPresenceRepository
+
+
+async def simulate_user(repo, session_id, user_id, interval, deadline, counters):
+    presence = Presence(session_id=session_id, user_id=user_id)
+    # Spread the users' heartbeats over the interval.
+    await asyncio.sleep(random.random() * interval)
+    while time.monotonic() < deadline:
+        presence.state = {"cursor": {"x": random.randint(0, 1920), "y": random.randint(0, 1080)}}
+        await repo.save_presence(presence)
+        counters["heartbeats"] += 1
+        await asyncio.sleep(interval)
+
+
+async def read_sessions(repo, session_ids, interval, deadline, latencies):
+    while time.monotonic() < deadline:
+        session_id = random.choice(session_ids)
+        started = time.perf_counter()
+        await repo.get_all_in_session(session_id)
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+
+
+async def main(args):
+    client = aioredis.from_url(args.redis_url)
+    repo = RedisPresenceRepository(client, presence_ttl=args.presence_ttl, debounce_ms=args.debounce_ms,
+                                   key_prefix="bench:presence")
+
+    # Count the writes that actually reach Redis.
+    counters = {"heartbeats": 0, "writes": 0, "pipelines": 0}
+    write = repo._write
+
+    async def counting_write(presences):
+        counters["writes"] += len(presences)
+        counters["pipelines"] += 1
+        await write(presences)
+
+    repo._write = counting_write
+
+    session_ids = [f"session-{index}" for index in range(args.sessions)]
+    deadline = time.monotonic() + args.duration
+    latencies = []
+    tasks = [
+        simulate_user(repo, session_ids[index % args.sessions], f"user-{index}",
+                      args.heartbeat_interval_ms / 1000, deadline, counters)
+        for index in range(args.users)
+    ]
+    tasks += [read_sessions(repo, session_ids, args.read_interval_ms / 1000, deadline, latencies)
+              for _ in range(args.readers)]
+
+    started = time.monotonic()
+    await asyncio.gather(*tasks)
+    await repo.close()
+    elapsed = time.monotonic() - started
+
+    print(f"users={args.users} sessions={args.sessions} duration={elapsed:.1f}s debounce={args.debounce_ms}ms")
+    print(f"heartbeats: {counters['heartbeats']} ({counters['heartbeats'] / elapsed:.0f}/s)")
+    print(f"presence writes: {counters['writes']} ({counters['writes'] / elapsed:.0f}/s) "
+          f"in {counters['pipelines']} pipelines")
+    if latencies:
+        latencies.sort()
+        print(f"get_all_in_session: n={len(latencies)} p50={statistics.median(latencies):.2f}ms "
+              f"p99={latencies[int(len(latencies) * 0.99) - 1]:.2f}ms max={latencies[-1]:.2f}ms")
+
+    keys = [key async for key in client.scan_iter("bench:presence:*")]
+    if keys:
+        await client.delete(*keys)
+    await client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run.")
+    parser.add_argument("--heartbeat-interval-ms", type=float, default=50.0, help="Interval between a user's heartbeats.")
+    parser.add_argument("--debounce-ms", type=float, default=200.0)
+    parser.add_argument("--presence-ttl", type=float, default=30.0)
+    parser.add_argument("--readers", type=int, default=10, help="Concurrent session readers.")
+    parser.add_argument("--read-interval-ms", type=float, default=20.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,20 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+
+@dataclass
+class Presence:
+    """
+    Ephemeral state of a user active in a collaboration session.
+
+    Attributes:
+        session_id (str): The ID of the collaboration session.
+        user_id (str): The ID of the user.
+        state (Dict[str, Any]): Client-defined awareness state, e.g. cursor position,
+                                selection, display name and color.
+        last_seen (float): Unix timestamp of the user's last heartbeat.
+    """
+    session_id: str
+    user_id: str
+    state: Dict[str, Any] = field(default_factory=dict)
+    last_seen: float = 0.0
@@ -104,4 +104,50 @@ class IPresenceRepository(ABC, Generic[SessionId, UserId, Presence]):
             session_id (SessionId): The ID of the collaboration session.
             user_id (UserId): The ID of the user whose presence to delete.
         """
-        pass
\ No newline at end of file
+        pass
+
+class IDocumentUpdateLog(ABC, Generic[SessionId]):
+    """
+    Interface for the append-only log of Yjs updates of a session's document.
+    The log is periodically squashed into a snapshot, so the stored state stays
+    proportional to the document rather than to its edit history.
+    """
+
+    @abstractmethod
+    async def append(self, session_id: SessionId, updates: List[bytes]) -> None:
+        """
+        Appends updates to the session's log.
+
+        Args:
+            session_id (SessionId): The ID of the collaboration session.
+            updates (List[bytes]): Binary Yjs update payloads.
+        """
+        pass
+
+    @abstractmethod
+    async def get_missing_updates(self, session_id: SessionId, client_state_vector: Optional[bytes] = None) -> List[bytes]:
+        """
+        Retrieves the updates a client needs to catch up with the session.
+
+        Args:
+            session_id (SessionId): The ID of the collaboration session.
+            client_state_vector (Optional[bytes]): The encoded state vector of the client.
+                Without one, the whole document is returned.
+
+        Returns:
+            List[bytes]: Binary Yjs updates to apply, in order.
+        """
+        pass
+
+    @abstractmethod
+    async def compact(self, session_id: SessionId) -> bool:
+        """
+        Squashes the session's snapshot and logged updates into a new snapshot.
+
+        Args:
+            session_id (SessionId): The ID of the collaboration session.
+
+        Returns:
+            bool: True if the log was compacted.
+        """
+        pass
@@ -31,15 +31,19 @@ class ConflictResolutionService:
     REQ-019.1: Merging offline edits.
     """
 
-    def __init__(self, crdt_service):
+    def __init__(self, crdt_service, document_cache=None):
         """
         Initializes the ConflictResolutionService.
         
         Args:
             crdt_service (CrdtService): The CRDT service for document manipulation.
+            document_cache (Optional[YDocCache]): Cache of live session documents. When
+                provided, offline edits are merged into the cached document instead of
+                a YDoc rebuilt from `session.document_state` on every call.
         """
         from .crdt_service import CrdtService
         self._crdt_service: CrdtService = crdt_service
+        self._document_cache = document_cache
         self._logger = logging.getLogger(__name__)
 
     def resolve_offline_edits(
@@ -75,10 +79,12 @@ class ConflictResolutionService:
             len(offline_changes)
         )
 
-        # 1. Initialize a YDoc from the last known server state.
-        ydoc = self._crdt_service.initialize_document()
-        if session.document_state:
-            self._crdt_service.apply_update_to_document(ydoc, session.document_state)
+        # 1. Initialize a YDoc from the last known server state, unless a live one is cached.
+        ydoc = None
+        if self._document_cache is None:
+            ydoc = self._crdt_service.initialize_document()
+            if session.document_state:
+                self._crdt_service.apply_update_to_document(ydoc, session.document_state)
 
         # 2. Extract the update payloads from the offline changes.
         # The changes should ideally be sorted by timestamp before being passed to this service.
@@ -88,7 +94,10 @@ class ConflictResolutionService:
         # y-py's `apply_update` is idempotent and associative, which means applying the
         # updates sequentially correctly merges them into the CRDT structure.
         try:
-            self._crdt_service.merge_updates(ydoc, update_payloads)
+            if self._document_cache is not None:
+                ydoc = self._document_cache.apply_updates(session, update_payloads)
+            else:
+                self._crdt_service.merge_updates(ydoc, update_payloads)
             self._logger.info(
                 "Successfully merged %d offline changes into session %s.",
                 len(offline_changes),
@@ -113,4 +122,28 @@ class ConflictResolutionService:
         # - If a violation is found, create a ResolvedConflict entry and potentially
         #   revert the conflicting change or flag it in the UI.
 
-        return ydoc, resolved_conflicts
\ No newline at end of file
+        return ydoc, resolved_conflicts
+
+    def encode_rejoin_update(self, session: CollaborationSession, client_state_vector: Optional[bytes] = None) -> bytes:
+        """
+        Encodes the update a rejoining client needs to catch up with the session.
+
+        Only the changes missing from the client's state vector are encoded, so a
+        reconnecting client receives a diff rather than the whole document.
+
+        Args:
+            session (CollaborationSession): The collaboration session the client rejoins.
+            client_state_vector (Optional[bytes]): The encoded state vector reported by
+                                                   the client. Without one, the full
+                                                   document state is encoded.
+
+        Returns:
+            bytes: The binary update to send to the client.
+        """
+        if self._document_cache is not None:
+            return self._document_cache.encode_diff(session, client_state_vector)
+
+        ydoc = self._crdt_service.initialize_document()
+        if session.document_state:
+            self._crdt_service.apply_update_to_document(ydoc, session.document_state)
+        return self._crdt_service.encode_state_as_update(ydoc, client_state_vector)
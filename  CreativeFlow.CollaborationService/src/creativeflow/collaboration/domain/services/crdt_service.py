@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 
 import y_py as ypy
 from y_py import YDoc
@@ -88,4 +88,79 @@ class CrdtService:
         # A transaction ensures atomicity for the batch operation.
         with ydoc.begin_transaction() as txn:
             for update in updates:
-                ypy.apply_update(ydoc, update, txn)
\ No newline at end of file
+                txn.apply_v1(update)
+
+    @staticmethod
+    def squash_updates(updates: List[bytes]) -> YDoc:
+        """
+        Squashes a sequence of updates (typically a snapshot followed by the
+        incremental updates appended after it) into a fresh YDoc.
+
+        The document is created with garbage collection enabled, so content deleted
+        by the updates is reduced to tombstone ranges when the result is encoded
+        with `encode_state_as_update`, instead of being carried along in full.
+
+        Args:
+            updates (List[bytes]): The binary update payloads, in any order.
+
+        Returns:
+            YDoc: A new document containing the merged state.
+        """
+        ydoc = YDoc()
+        CrdtService.merge_updates(ydoc, [update for update in updates if update])
+        return ydoc
+
+    @staticmethod
+    def decode_state_vector(encoded_state_vector: bytes) -> Dict[int, int]:
+        """
+        Decodes a Yjs state vector into a mapping of client ID to clock.
+
+        The encoding is a varuint entry count followed by (client ID, clock)
+        varuint pairs, as produced by `encode_state_vector`.
+
+        Args:
+            encoded_state_vector (bytes): The encoded state vector.
+
+        Returns:
+            Dict[int, int]: The number of operations seen from each client.
+
+        Raises:
+            ValueError: If the state vector is truncated.
+        """
+        position = 0
+
+        def read_varuint() -> int:
+            nonlocal position
+            value = shift = 0
+            while True:
+                if position >= len(encoded_state_vector):
+                    raise ValueError("Truncated state vector.")
+                byte = encoded_state_vector[position]
+                position += 1
+                value |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    return value
+                shift += 7
+
+        state: Dict[int, int] = {}
+        for _ in range(read_varuint()):
+            client = read_varuint()
+            state[client] = read_varuint()
+        return state
+
+    @staticmethod
+    def state_vector_covers(encoded_state_vector: bytes, encoded_other_state_vector: bytes) -> bool:
+        """
+        Tells whether a document with the first state vector has seen every
+        operation seen by a document with the second one.
+
+        Args:
+            encoded_state_vector (bytes): The state vector to test, e.g. a client's.
+            encoded_other_state_vector (bytes): The state vector it must cover, e.g. a snapshot's.
+
+        Returns:
+            bool: True if every client clock in the second vector is reached by the first.
+        """
+        state = CrdtService.decode_state_vector(encoded_state_vector)
+        other = CrdtService.decode_state_vector(encoded_other_state_vector)
+        return all(state.get(client, 0) >= clock for client, clock in other.items())
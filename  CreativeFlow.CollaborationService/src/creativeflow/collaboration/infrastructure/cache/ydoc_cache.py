@@ -0,0 +1,308 @@
+import asyncio
+import copy
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from y_py import YDoc
+
+from creativeflow.collaboration.domain.repositories.collaboration_repository import ICollaborationSessionRepository
+from creativeflow.collaboration.domain.services.crdt_service import CrdtService
+
+logger = logging.getLogger(__name__)
+
+
+class _CachedDocument:
+    """A live YDoc together with the bookkeeping the cache needs for it."""
+
+    __slots__ = ("session", "ydoc", "size_bytes", "version", "compacted_version", "merged_state")
+
+    def __init__(self, session, ydoc: YDoc, size_bytes: int, merged_state: Optional[bytes]):
+        self.session = session
+        self.ydoc = ydoc
+        # The last caller-supplied `document_state` merged into `ydoc`, so an unchanged
+        # state is not re-applied on every hit.
+        self.merged_state = merged_state
+        # Approximate footprint: the encoded size of the state the doc was built
+        # from plus every update applied since.
+        self.size_bytes = size_bytes
+        # Incremented on every applied update; compared against `compacted_version`
+        # to know whether the stored state is behind the live document.
+        self.version = 0
+        self.compacted_version = 0
+
+    @property
+    def is_dirty(self) -> bool:
+        return self.version != self.compacted_version
+
+
+class YDocCache:
+    """
+    Per-instance LRU cache of live YDocs, keyed by collaboration session ID.
+
+    Keeping the document alive between reconnects means a rejoining client costs
+    one diff encode (`encode_state_as_update` against the client's state vector)
+    instead of rebuilding the document from `session.document_state`.
+
+    Memory is bounded by `max_bytes`, measured on the encoded size of each
+    document; least recently used documents are evicted first. A background
+    compactor periodically encodes every changed document as a single merged
+    update and writes it back as the session's `document_state`, so the stored
+    state never grows into a long chain of incremental updates. A changed
+    document that is evicted before the compactor reaches it is snapshotted on
+    eviction and saved on the next compaction pass.
+
+    Other pods (or any other writer) may change the stored state while a document
+    is cached here. Since merging Yjs updates is idempotent and commutative, the
+    `document_state` a caller passes in is merged into the cached document on every
+    access, and the compactor merges the currently stored state into its snapshot
+    before saving it, so neither side's updates are dropped.
+    """
+
+    def __init__(
+        self,
+        crdt_service: CrdtService,
+        session_repository: Optional[ICollaborationSessionRepository] = None,
+        max_bytes: int = 256 * 1024 * 1024,
+        max_documents: int = 10000,
+        compaction_interval: float = 30.0,
+    ):
+        """
+        Initializes the YDocCache.
+
+        Args:
+            crdt_service (CrdtService): The CRDT service used for document manipulation.
+            session_repository (Optional[ICollaborationSessionRepository]): Repository the
+                compactor saves merged document states to. Without one, compaction only
+                rewrites the cached `document_state` in memory.
+            max_bytes (int): Approximate upper bound of the memory held by cached documents.
+            max_documents (int): Maximum number of cached documents.
+            compaction_interval (float): Seconds between compaction passes.
+        """
+        self._crdt_service = crdt_service
+        self._session_repository = session_repository
+        self._max_bytes = max_bytes
+        self._max_documents = max_documents
+        self._compaction_interval = compaction_interval
+        self._documents: "OrderedDict[str, _CachedDocument]" = OrderedDict()
+        self._total_bytes = 0
+        # Sessions whose changed document was evicted before being compacted,
+        # with `document_state` already set to the merged snapshot.
+        self._pending_saves: Dict[str, object] = {}
+        self._compactor_task: Optional[asyncio.Task] = None
+        self._metrics: Dict[str, float] = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "compactions": 0,
+            "compaction_errors": 0,
+            "last_compaction_seconds": 0.0,
+        }
+
+    @property
+    def metrics(self) -> Dict[str, float]:
+        """Counters since startup, plus the current number and approximate size of cached documents."""
+        return {**self._metrics, "documents": len(self._documents), "bytes": self._total_bytes}
+
+    def get_document(self, session) -> YDoc:
+        """
+        Returns the live YDoc of a session, building it from the session's stored
+        state on a cache miss.
+
+        Args:
+            session (CollaborationSession): The collaboration session, including its
+                                            last known document state.
+
+        Returns:
+            YDoc: The cached document.
+        """
+        return self._get_entry(session).ydoc
+
+    def apply_updates(self, session, updates: List[bytes]) -> YDoc:
+        """
+        Merges updates into the session's live YDoc and marks it for compaction.
+
+        Args:
+            session (CollaborationSession): The collaboration session.
+            updates (List[bytes]): Binary Yjs update payloads, in the order to apply them.
+
+        Returns:
+            YDoc: The updated document.
+        """
+        entry = self._get_entry(session)
+        try:
+            self._crdt_service.merge_updates(entry.ydoc, updates)
+        finally:
+            # A failed batch may still have integrated some of its updates.
+            entry.version += 1
+            added = sum(len(update) for update in updates)
+            entry.size_bytes += added
+            self._total_bytes += added
+        self._evict()
+        return entry.ydoc
+
+    def encode_diff(self, session, client_state_vector: Optional[bytes] = None) -> bytes:
+        """
+        Encodes the updates a client is missing, given its state vector.
+
+        Args:
+            session (CollaborationSession): The collaboration session the client rejoins.
+            client_state_vector (Optional[bytes]): The encoded state vector of the client.
+                Without one, the full document state is encoded.
+
+        Returns:
+            bytes: A binary update containing only what the client has not seen yet.
+        """
+        return self._crdt_service.encode_state_as_update(self._get_entry(session).ydoc, client_state_vector)
+
+    def invalidate(self, session_id: str) -> None:
+        """Drops a session's cached document, e.g. after the session is deleted."""
+        entry = self._documents.pop(session_id, None)
+        if entry is not None:
+            self._total_bytes -= entry.size_bytes
+        self._pending_saves.pop(session_id, None)
+
+    def _get_entry(self, session) -> _CachedDocument:
+        entry = self._documents.get(session.id)
+        if entry is not None:
+            self._documents.move_to_end(session.id)
+            self._metrics["hits"] += 1
+            # The caller's state may carry updates another writer stored since the miss.
+            state = session.document_state
+            if state and state != entry.merged_state:
+                self._crdt_service.apply_update_to_document(entry.ydoc, state)
+                entry.merged_state = state
+            return entry
+
+        self._metrics["misses"] += 1
+        ydoc = self._crdt_service.initialize_document()
+        size_bytes = 0
+        # A document evicted with unsaved changes is rebuilt from its snapshot, merged
+        # with whatever the caller loaded from the repository.
+        pending = self._pending_saves.get(session.id)
+        for state in (pending.document_state if pending is not None else None, session.document_state):
+            if state:
+                self._crdt_service.apply_update_to_document(ydoc, state)
+                size_bytes += len(state)
+        entry = _CachedDocument(pending if pending is not None else session, ydoc, size_bytes, session.document_state)
+        self._documents[session.id] = entry
+        self._total_bytes += entry.size_bytes
+        self._evict()
+        return entry
+
+    def _evict(self) -> None:
+        # The most recently used document is never evicted, even if it alone exceeds the budget.
+        while len(self._documents) > 1 and (
+            self._total_bytes > self._max_bytes or len(self._documents) > self._max_documents
+        ):
+            session_id, entry = self._documents.popitem(last=False)
+            self._total_bytes -= entry.size_bytes
+            self._metrics["evictions"] += 1
+            if entry.is_dirty:
+                entry.session.document_state = self._crdt_service.encode_state_as_update(entry.ydoc)
+                self._pending_saves[session_id] = entry.session
+            logger.debug(
+                "Evicted YDoc of session %s from the cache (%d bytes, %s).",
+                session_id, entry.size_bytes, "pending save" if entry.is_dirty else "clean"
+            )
+
+    def start(self) -> None:
+        """Starts the compactor as a background task on the running event loop."""
+        if self._compactor_task and not self._compactor_task.done():
+            return
+        self._compactor_task = asyncio.get_event_loop().create_task(self._run_compactor())
+        logger.info("YDoc cache compactor started (interval: %ss).", self._compaction_interval)
+
+    async def stop(self) -> None:
+        """Stops the compactor after a final pass, so no changes are lost on shutdown."""
+        if self._compactor_task:
+            self._compactor_task.cancel()
+            try:
+                await self._compactor_task
+            except asyncio.CancelledError:
+                pass
+            self._compactor_task = None
+        await self.compact_once()
+        logger.info("YDoc cache compactor stopped.")
+
+    async def _run_compactor(self) -> None:
+        while True:
+            await asyncio.sleep(self._compaction_interval)
+            try:
+                await self.compact_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._metrics["compaction_errors"] += 1
+                logger.error("YDoc compaction pass failed: %s", e, exc_info=True)
+
+    async def compact_once(self) -> int:
+        """
+        Rewrites the stored state of every changed document as a single merged update,
+        merged with the state currently stored for the session.
+
+        Returns:
+            int: The number of sessions whose state was rewritten.
+        """
+        started = time.perf_counter()
+        compacted = 0
+
+        for session_id, session in list(self._pending_saves.items()):
+            ydoc = self._crdt_service.initialize_document()
+            self._crdt_service.apply_update_to_document(ydoc, session.document_state)
+            if await self._save(session, ydoc) is not None:
+                # Only forget the snapshot if it was not replaced while saving.
+                if self._pending_saves.get(session_id) is session:
+                    del self._pending_saves[session_id]
+                compacted += 1
+
+        for session_id, entry in list(self._documents.items()):
+            if not entry.is_dirty:
+                continue
+            # Updates applied while saving bump `version`, leaving the entry dirty for the next pass.
+            version = entry.version
+            snapshot = await self._save(entry.session, entry.ydoc)
+            if snapshot is None:
+                continue
+            entry.compacted_version = version
+            if self._documents.get(session_id) is entry:
+                # The merged update replaces the chain of updates counted so far.
+                self._total_bytes += len(snapshot) - entry.size_bytes
+                entry.size_bytes = len(snapshot)
+            compacted += 1
+
+        elapsed = time.perf_counter() - started
+        self._metrics["compactions"] += compacted
+        self._metrics["last_compaction_seconds"] = elapsed
+        if compacted:
+            logger.info("Compacted %d YDoc(s) in %.0fms.", compacted, elapsed * 1000)
+        return compacted
+
+    async def _save(self, session, ydoc: YDoc) -> Optional[bytes]:
+        """
+        Merges the session's currently stored state into `ydoc` and saves the result as a
+        fresh session object, so state written by other pods since `session` was loaded is
+        kept rather than overwritten.
+
+        Returns:
+            Optional[bytes]: The saved snapshot, or None if saving failed.
+        """
+        if self._session_repository is None:
+            snapshot = self._crdt_service.encode_state_as_update(ydoc)
+            session.document_state = snapshot
+            return snapshot
+        try:
+            stored = await self._session_repository.get_by_id(session.id)
+            if stored is not None and stored.document_state:
+                self._crdt_service.apply_update_to_document(ydoc, stored.document_state)
+            # Encoding is synchronous: the snapshot includes every update applied up to here.
+            snapshot = self._crdt_service.encode_state_as_update(ydoc)
+            fresh = stored if stored is not None else copy.copy(session)
+            fresh.document_state = snapshot
+            await self._session_repository.save(fresh)
+            return snapshot
+        except Exception as e:
+            self._metrics["compaction_errors"] += 1
+            logger.error("Failed to save compacted state of session %s: %s", session.id, e, exc_info=True)
+            return None
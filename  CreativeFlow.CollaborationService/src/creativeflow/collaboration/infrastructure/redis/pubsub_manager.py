@@ -1,12 +1,82 @@
 import asyncio
 import logging
-from typing import Callable, Awaitable
+import struct
+import uuid
+import zlib
+from typing import Awaitable, Callable, Dict, List, Optional
 
 import redis.asyncio as aioredis
 from redis.exceptions import RedisError
 
 logger = logging.getLogger(__name__)
 
+# Framed Yjs update batches: version byte, 16-byte ID of the publishing instance,
+# then each update as a 4-byte big-endian length followed by its bytes.
+_FRAME_VERSION = 1
+_FRAME_HEADER = struct.Struct(">B16s")
+_UPDATE_LENGTH = struct.Struct(">I")
+
+# Receives (session_id, updates) for every batch published by another instance.
+SessionUpdatesCallback = Callable[[str, List[bytes]], Awaitable[None]]
+
+
+def encode_update_frame(instance_id: bytes, updates: List[bytes]) -> bytes:
+    """Packs a batch of Yjs updates into a single framed message."""
+    parts = [_FRAME_HEADER.pack(_FRAME_VERSION, instance_id)]
+    for update in updates:
+        parts.append(_UPDATE_LENGTH.pack(len(update)))
+        parts.append(update)
+    return b"".join(parts)
+
+
+def decode_update_frame(frame: bytes) -> tuple[bytes, List[bytes]]:
+    """
+    Unpacks a framed message into the publishing instance ID and its updates.
+
+    Raises:
+        ValueError: If the frame is truncated or of an unknown version.
+    """
+    if len(frame) < _FRAME_HEADER.size:
+        raise ValueError("Truncated update frame header.")
+    version, instance_id = _FRAME_HEADER.unpack_from(frame)
+    if version != _FRAME_VERSION:
+        raise ValueError(f"Unsupported update frame version {version}.")
+    updates = []
+    view = memoryview(frame)
+    offset = _FRAME_HEADER.size
+    while offset < len(frame):
+        if offset + _UPDATE_LENGTH.size > len(frame):
+            raise ValueError("Truncated update length in frame.")
+        (length,) = _UPDATE_LENGTH.unpack_from(frame, offset)
+        offset += _UPDATE_LENGTH.size
+        if offset + length > len(frame):
+            raise ValueError("Truncated update in frame.")
+        updates.append(bytes(view[offset:offset + length]))
+        offset += length
+    return instance_id, updates
+
+
+class _Subscription:
+    """A subscribed channel, its message handler and the number of local subscribers."""
+
+    __slots__ = ("handler", "refcount")
+
+    def __init__(self, handler: Callable[[bytes], Awaitable[None]]):
+        self.handler = handler
+        self.refcount = 1
+
+
+class _PubSubShard:
+    """One Redis pub/sub connection with its own listener task."""
+
+    def __init__(self, index: int, pubsub):
+        self.index = index
+        self.pubsub = pubsub
+        self.listener_task: Optional[asyncio.Task] = None
+        self.lock: Optional[asyncio.Lock] = None
+        self.channel_count = 0
+
+
 class PubSubManager:
     """
     Manages Redis Pub/Sub functionalities for broadcasting messages across
@@ -14,19 +84,63 @@ class PubSubManager:
     ensuring that a message sent from a client connected to one instance
     is broadcast to all clients in the same session, regardless of which
     instance they are connected to.
+
+    Every collaboration session has its own channel, and an instance only
+    subscribes to the sessions it hosts clients for, so it never receives the
+    traffic of other sessions. Subscriptions are reference counted: the channel
+    stays subscribed until the last local subscriber has unsubscribed.
+
+    Channels are spread over `num_shards` pub/sub connections by a stable hash of
+    the channel name, each drained by its own listener task, so one busy session
+    does not delay the delivery of all others.
+
+    Yjs updates published within `batch_max_delay_ms` for the same session are
+    sent as one framed message, which is decoded once per frame on receipt.
+    Frames carry the publishing instance's ID, so an instance skips its own updates.
     """
 
-    def __init__(self, redis_client: aioredis.Redis):
+    def __init__(
+        self,
+        redis_client: aioredis.Redis,
+        num_shards: int = 4,
+        batch_max_delay_ms: float = 5.0,
+        batch_max_updates: int = 64,
+        batch_max_bytes: int = 256 * 1024,
+        session_channel_prefix: str = "collab:session",
+    ):
         """
         Initializes the PubSubManager.
 
         Args:
             redis_client (aioredis.Redis): An asynchronous Redis client instance.
+            num_shards (int): Number of pub/sub connections the subscribed channels are spread over.
+            batch_max_delay_ms (float): How long a Yjs update waits for others of the same
+                                        session to be published with it.
+            batch_max_updates (int): Maximum number of updates in one framed message.
+            batch_max_bytes (int): Size at which a pending batch is published without waiting.
+            session_channel_prefix (str): Prefix of the per-session channel names.
         """
         self.redis_client = redis_client
-        self.pubsub = self.redis_client.pubsub()
-        self._is_subscribed = False
-        self._listener_task: Optional[asyncio.Task] = None
+        self.instance_id = uuid.uuid4().bytes
+        self._shards = [_PubSubShard(index, self.redis_client.pubsub()) for index in range(max(1, num_shards))]
+        self._subscriptions: Dict[str, _Subscription] = {}
+        self._batch_max_delay = batch_max_delay_ms / 1000
+        self._batch_max_updates = batch_max_updates
+        self._batch_max_bytes = batch_max_bytes
+        self._session_channel_prefix = session_channel_prefix
+        # Updates waiting to be published, per session, with their total size.
+        self._pending_updates: Dict[str, List[bytes]] = {}
+        self._pending_bytes: Dict[str, int] = {}
+        self._flush_tasks: Dict[str, asyncio.Task] = {}
+        self._publish_tasks: set = set()
+
+    def session_channel(self, session_id: str) -> str:
+        """Returns the name of a session's channel."""
+        return f"{self._session_channel_prefix}:{session_id}"
+
+    def _shard_for(self, channel: str) -> _PubSubShard:
+        # crc32 rather than hash(): the mapping must not change across restarts.
+        return self._shards[zlib.crc32(channel.encode("utf-8")) % len(self._shards)]
 
     async def publish_message(self, channel: str, message: str) -> None:
         """
@@ -48,30 +162,159 @@ class PubSubManager:
             # or just log the error.
             raise
 
-    async def _listener(self, callback: Callable[[str, str], Awaitable[None]]):
-        """The background task that listens for messages."""
-        logger.info("Redis Pub/Sub listener started.")
-        while self._is_subscribed:
+    def publish_update(self, session_id: str, update: bytes) -> None:
+        """
+        Queues a Yjs update for publication to the session's channel.
+
+        Updates of the same session are batched into one framed message, published
+        after `batch_max_delay_ms` or as soon as the batch is full. Batches may reach
+        other instances out of order, which Yjs tolerates.
+
+        Args:
+            session_id (str): The ID of the collaboration session.
+            update (bytes): The binary Yjs update.
+        """
+        pending = self._pending_updates.setdefault(session_id, [])
+        pending.append(update)
+        self._pending_bytes[session_id] = self._pending_bytes.get(session_id, 0) + len(update)
+
+        if len(pending) >= self._batch_max_updates or self._pending_bytes[session_id] >= self._batch_max_bytes:
+            flush_task = self._flush_tasks.pop(session_id, None)
+            if flush_task is not None:
+                flush_task.cancel()
+            # Taken off the buffer now, so later updates start a new batch.
+            task = asyncio.get_event_loop().create_task(self._publish(session_id, self._take_pending(session_id)))
+            self._publish_tasks.add(task)
+            task.add_done_callback(self._publish_tasks.discard)
+        elif session_id not in self._flush_tasks:
+            self._flush_tasks[session_id] = asyncio.get_event_loop().create_task(self._flush_later(session_id))
+
+    async def _flush_later(self, session_id: str) -> None:
+        await asyncio.sleep(self._batch_max_delay)
+        self._flush_tasks.pop(session_id, None)
+        await self._publish(session_id, self._take_pending(session_id))
+
+    def _take_pending(self, session_id: str) -> List[bytes]:
+        self._pending_bytes.pop(session_id, None)
+        return self._pending_updates.pop(session_id, [])
+
+    async def _publish(self, session_id: str, updates: List[bytes]) -> None:
+        if not updates:
+            return
+        channel = self.session_channel(session_id)
+        try:
+            await self.redis_client.publish(channel, encode_update_frame(self.instance_id, updates))
+            logger.debug("Published %d update(s) to Redis channel '%s'", len(updates), channel)
+        except RedisError as e:
+            logger.error(
+                "Failed to publish %d update(s) to Redis channel '%s': %s",
+                len(updates), channel, e, exc_info=True
+            )
+
+    async def flush(self) -> None:
+        """Publishes all pending update batches immediately."""
+        for task in self._flush_tasks.values():
+            task.cancel()
+        self._flush_tasks.clear()
+        await asyncio.gather(*(self._publish(session_id, self._take_pending(session_id)) for session_id in list(self._pending_updates)))
+        if self._publish_tasks:
+            await asyncio.gather(*list(self._publish_tasks), return_exceptions=True)
+
+    async def _listener(self, shard: _PubSubShard):
+        """The background task that listens for messages on one shard."""
+        logger.info("Redis Pub/Sub listener for shard %d started.", shard.index)
+        while shard.channel_count:
             try:
-                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                # Blocks on the connection for up to a second, then re-checks whether
+                # the shard still has subscriptions.
+                message = await shard.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
                 if message and message.get("type") == "message":
-                    channel = message['channel'].decode('utf-8')
-                    data = message['data'].decode('utf-8')
+                    channel = message['channel']
+                    if isinstance(channel, bytes):
+                        channel = channel.decode('utf-8')
+                    subscription = self._subscriptions.get(channel)
+                    if subscription is None:
+                        continue
                     logger.debug("Received message from Redis channel '%s'", channel)
-                    # Execute the callback to handle the message
-                    await callback(channel, data)
+                    try:
+                        await subscription.handler(message['data'])
+                    except Exception as e:
+                        logger.error("Pub/Sub callback for channel '%s' failed: %s", channel, e, exc_info=True)
             except asyncio.CancelledError:
-                logger.info("Redis Pub/Sub listener task cancelled.")
+                logger.info("Redis Pub/Sub listener task for shard %d cancelled.", shard.index)
                 break
             except RedisError as e:
-                logger.error("Redis Pub/Sub listener error: %s", e, exc_info=True)
+                logger.error("Redis Pub/Sub listener error on shard %d: %s", shard.index, e, exc_info=True)
                 # Implement backoff/retry logic if necessary
                 await asyncio.sleep(5)
             except Exception as e:
-                logger.error("Unexpected error in Pub/Sub listener: %s", e, exc_info=True)
+                logger.error("Unexpected error in Pub/Sub listener on shard %d: %s", shard.index, e, exc_info=True)
                 await asyncio.sleep(5)
-        logger.info("Redis Pub/Sub listener stopped.")
+        logger.info("Redis Pub/Sub listener for shard %d stopped.", shard.index)
 
+    async def _subscribe(self, channel: str, handler: Callable[[bytes], Awaitable[None]]) -> None:
+        shard = self._shard_for(channel)
+        if shard.lock is None:
+            shard.lock = asyncio.Lock()
+        async with shard.lock:
+            subscription = self._subscriptions.get(channel)
+            if subscription is not None:
+                subscription.refcount += 1
+                return
+            await shard.pubsub.subscribe(channel)
+            self._subscriptions[channel] = _Subscription(handler)
+            shard.channel_count += 1
+            if shard.listener_task is None or shard.listener_task.done():
+                shard.listener_task = asyncio.create_task(self._listener(shard))
+            logger.info("Subscribed to Redis channel '%s' on shard %d.", channel, shard.index)
+
+    async def _unsubscribe(self, channel: str) -> None:
+        shard = self._shard_for(channel)
+        if shard.lock is None:
+            shard.lock = asyncio.Lock()
+        async with shard.lock:
+            subscription = self._subscriptions.get(channel)
+            if subscription is None:
+                return
+            subscription.refcount -= 1
+            if subscription.refcount > 0:
+                return
+            del self._subscriptions[channel]
+            shard.channel_count -= 1
+            try:
+                await shard.pubsub.unsubscribe(channel)
+                logger.info("Unsubscribed from Redis channel '%s'.", channel)
+            except RedisError as e:
+                logger.error("Failed to unsubscribe from Redis channel '%s': %s", channel, e)
+
+    async def subscribe_to_session(self, session_id: str, callback: SessionUpdatesCallback):
+        """
+        Subscribes to the Yjs updates other instances publish for a session.
+
+        Call once per local subscriber (e.g. per connected client); the channel is
+        subscribed on the first call and the callback of that call is used.
+
+        Args:
+            session_id (str): The ID of the collaboration session.
+            callback (SessionUpdatesCallback): An async function called with the session ID
+                and the updates of each batch received from another instance.
+        """
+        async def handle(data: bytes) -> None:
+            try:
+                instance_id, updates = decode_update_frame(data)
+            except ValueError as e:
+                logger.warning("Ignoring malformed update frame for session '%s': %s", session_id, e)
+                return
+            if instance_id != self.instance_id and updates:
+                await callback(session_id, updates)
+
+        await self._subscribe(self.session_channel(session_id), handle)
+
+    async def unsubscribe_from_session(self, session_id: str):
+        """
+        Releases one subscription to a session; the channel is unsubscribed with the last one.
+        """
+        await self._unsubscribe(self.session_channel(session_id))
 
     async def subscribe_to_channel(self, channel: str, callback: Callable[[str, str], Awaitable[None]]):
         """
@@ -82,35 +325,27 @@ class PubSubManager:
             callback (Callable[[str, str], Awaitable[None]]): An async function that will be
                 called with the channel and message data when a message is received.
         """
-        if self._is_subscribed:
-            # If already subscribed, just add the new channel
-            await self.pubsub.subscribe(channel)
-        else:
-            # First time subscribing, start the listener task
-            await self.pubsub.subscribe(channel)
-            self._is_subscribed = True
-            self._listener_task = asyncio.create_task(self._listener(callback))
-            logger.info("Subscribed to Redis channel '%s' and started listener task.", channel)
+        async def handle(data: bytes) -> None:
+            await callback(channel, data.decode('utf-8') if isinstance(data, bytes) else data)
+
+        await self._subscribe(channel, handle)
 
     async def unsubscribe_from_channel(self, channel: str):
         """
         Unsubscribes from a specific channel.
         """
-        try:
-            await self.pubsub.unsubscribe(channel)
-            logger.info("Unsubscribed from Redis channel '%s'.", channel)
-        except RedisError as e:
-            logger.error("Failed to unsubscribe from Redis channel '%s': %s", channel, e)
-
+        await self._unsubscribe(channel)
 
     async def close(self):
         """
         Gracefully shuts down the Pub/Sub manager.
         """
-        if self._listener_task and not self._listener_task.done():
-            self._is_subscribed = False
-            self._listener_task.cancel()
-            await self._listener_task
-        if self.pubsub:
-            await self.pubsub.close()
-        logger.info("PubSubManager closed gracefully.")
\ No newline at end of file
+        await self.flush()
+        for shard in self._shards:
+            shard.channel_count = 0
+            if shard.listener_task and not shard.listener_task.done():
+                shard.listener_task.cancel()
+                await shard.listener_task
+            await shard.pubsub.close()
+        self._subscriptions.clear()
+        logger.info("PubSubManager closed gracefully.")
@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError, WatchError
+
+from creativeflow.collaboration.domain.repositories.collaboration_repository import IDocumentUpdateLog
+from creativeflow.collaboration.domain.services.crdt_service import CrdtService
+
+logger = logging.getLogger(__name__)
+
+# Deletes the compaction lock only if it is still held by the caller.
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _next_stream_id(entry_id: bytes) -> str:
+    """Returns the smallest stream ID greater than `entry_id`, for an exclusive XTRIM MINID."""
+    milliseconds, sequence = entry_id.decode("ascii").split("-")
+    return f"{milliseconds}-{int(sequence) + 1}"
+
+
+class RedisDocumentUpdateLog(IDocumentUpdateLog[str]):
+    """
+    Append-only Yjs update log of each session, kept in a Redis Stream.
+
+    Each session has three keys, hash-tagged on the session ID so they share a
+    Redis Cluster slot and can be used together in MULTI/EXEC:
+      - `<prefix>:{<session>}:log`: a stream with one entry per appended update.
+      - `<prefix>:{<session>}:snapshot`: a hash with the squashed document (`update`),
+        its state vector (`state_vector`) and the ID of the last log entry it
+        contains (`last_id`).
+      - `<prefix>:{<session>}:compact_lock`: held while the session is compacted.
+
+    Compaction squashes the snapshot and the logged updates into a new snapshot
+    through a garbage-collected YDoc, so deleted content is reduced to tombstone
+    ranges, then writes the snapshot and trims the squashed entries in one
+    MULTI/EXEC. That transaction WATCHes the lock and the snapshot and only runs
+    if the lock is still held and the snapshot is the one that was squashed, so a
+    compaction that outlived its lock cannot overwrite a newer snapshot and trim
+    entries it does not contain. Readers fetch the snapshot and the log in one
+    MULTI/EXEC as well, so they never observe a trimmed log with a stale snapshot.
+
+    Retrieval is indexed by the snapshot's state vector: a client whose state
+    vector covers the snapshot's already has everything in it, and is sent only
+    the logged updates. Other clients get a single diff against their state vector.
+
+    The Redis client must be created with `decode_responses=False`.
+    """
+
+    def __init__(
+        self,
+        redis_client: aioredis.Redis,
+        crdt_service: CrdtService,
+        key_prefix: str = "collab:doc",
+        compaction_lock_ttl_ms: int = 30000,
+    ):
+        """
+        Initializes the RedisDocumentUpdateLog.
+
+        Args:
+            redis_client (aioredis.Redis): An asynchronous Redis client instance.
+            crdt_service (CrdtService): The CRDT service used to squash updates.
+            key_prefix (str): Prefix of the Redis keys used by the log.
+            compaction_lock_ttl_ms (int): Expiry of the per-session compaction lock, in case
+                                          the instance holding it dies.
+        """
+        self.redis_client = redis_client
+        self._crdt_service = crdt_service
+        self._key_prefix = key_prefix
+        # Sorted set of sessions with uncompacted entries, scored by their number of entries.
+        self._candidates_key = f"{key_prefix}:compaction_candidates"
+        self._compaction_lock_ttl_ms = compaction_lock_ttl_ms
+        self._release_lock = self.redis_client.register_script(_RELEASE_LOCK_SCRIPT)
+
+    def _log_key(self, session_id: str) -> str:
+        return f"{self._key_prefix}:{{{session_id}}}:log"
+
+    def _snapshot_key(self, session_id: str) -> str:
+        return f"{self._key_prefix}:{{{session_id}}}:snapshot"
+
+    def _lock_key(self, session_id: str) -> str:
+        return f"{self._key_prefix}:{{{session_id}}}:compact_lock"
+
+    async def append(self, session_id: str, updates: List[bytes]) -> None:
+        """
+        Appends updates to the session's log in one round trip.
+        """
+        if not updates:
+            return
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for update in updates:
+                pipe.xadd(self._log_key(session_id), {"u": update})
+            pipe.zincrby(self._candidates_key, len(updates), session_id)
+            await pipe.execute()
+
+    async def _read(self, session_id: str) -> Tuple[Dict[bytes, bytes], List[Tuple[bytes, Dict[bytes, bytes]]]]:
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.hgetall(self._snapshot_key(session_id))
+            pipe.xrange(self._log_key(session_id))
+            snapshot, entries = await pipe.execute()
+        return snapshot, entries
+
+    async def get_missing_updates(self, session_id: str, client_state_vector: Optional[bytes] = None) -> List[bytes]:
+        """
+        Retrieves the updates a client needs to catch up with the session.
+        """
+        snapshot, entries = await self._read(session_id)
+        logged_updates = [fields[b"u"] for _, fields in entries]
+        snapshot_update = snapshot.get(b"update")
+        snapshot_state_vector = snapshot.get(b"state_vector")
+
+        if client_state_vector and (
+            not snapshot_update
+            or (snapshot_state_vector and self._crdt_service.state_vector_covers(client_state_vector, snapshot_state_vector))
+        ):
+            # The client already has the snapshot; updates it has seen are no-ops when reapplied.
+            return logged_updates
+
+        ydoc = self._crdt_service.squash_updates([snapshot_update] + logged_updates if snapshot_update else logged_updates)
+        return [self._crdt_service.encode_state_as_update(ydoc, client_state_vector)]
+
+    async def compact(self, session_id: str, max_entries: int = 10000) -> bool:
+        """
+        Squashes the session's snapshot and up to `max_entries` logged updates into a new snapshot.
+
+        Returns:
+            bool: True if the log was compacted, False if it was empty or another
+                  instance is compacting (or has meanwhile compacted) the session.
+        """
+        lock_key = self._lock_key(session_id)
+        snapshot_key = self._snapshot_key(session_id)
+        token = uuid.uuid4().hex
+        if not await self.redis_client.set(lock_key, token, nx=True, px=self._compaction_lock_ttl_ms):
+            return False
+        try:
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.hmget(snapshot_key, "update", "last_id")
+                pipe.xrange(self._log_key(session_id), count=max_entries)
+                (snapshot_update, snapshot_last_id), entries = await pipe.execute()
+            if not entries:
+                await self.redis_client.zrem(self._candidates_key, session_id)
+                return False
+
+            updates = [fields[b"u"] for _, fields in entries]
+            ydoc = self._crdt_service.squash_updates([snapshot_update] + updates if snapshot_update else updates)
+            last_id = entries[-1][0]
+
+            try:
+                async with self.redis_client.pipeline(transaction=True) as pipe:
+                    # Fencing: EXEC fails if the lock or the snapshot changes after these checks.
+                    await pipe.watch(lock_key, snapshot_key)
+                    if await pipe.get(lock_key) != token.encode() or await pipe.hget(snapshot_key, "last_id") != snapshot_last_id:
+                        logger.warning("Compaction of session %s outlived its lock; discarding its snapshot.", session_id)
+                        return False
+                    pipe.multi()
+                    pipe.hset(snapshot_key, mapping={
+                        "update": self._crdt_service.encode_state_as_update(ydoc),
+                        "state_vector": self._crdt_service.encode_state_vector(ydoc),
+                        "last_id": last_id,
+                    })
+                    pipe.xtrim(self._log_key(session_id), minid=_next_stream_id(last_id))
+                    await pipe.execute()
+            except WatchError:
+                logger.warning("Compaction of session %s lost its lock while writing; discarding its snapshot.", session_id)
+                return False
+
+            # The candidates set spans all sessions, so it is updated outside the session's transaction.
+            remaining = await self.redis_client.zincrby(self._candidates_key, -len(entries), session_id)
+            if remaining <= 0:
+                # An append racing with this removal re-adds the session on its next update.
+                await self.redis_client.zrem(self._candidates_key, session_id)
+            logger.debug("Compacted %d logged update(s) of session %s.", len(entries), session_id)
+            return True
+        finally:
+            await self._release_lock(keys=[lock_key], args=[token])
+
+    async def get_compaction_candidates(self, min_entries: int, limit: int) -> List[str]:
+        """
+        Returns up to `limit` sessions with at least `min_entries` uncompacted updates, largest logs first.
+        """
+        members = await self.redis_client.zrevrangebyscore(self._candidates_key, "+inf", min_entries, start=0, num=limit)
+        return [member.decode("utf-8") if isinstance(member, bytes) else member for member in members]
+
+
+class UpdateLogCompactor:
+    """
+    Background job that periodically compacts the update logs that have grown
+    past a threshold. Safe to run on every instance: sessions are locked while
+    they are compacted.
+    """
+
+    def __init__(
+        self,
+        update_log: RedisDocumentUpdateLog,
+        interval: float = 10.0,
+        min_entries: int = 100,
+        batch_size: int = 50,
+    ):
+        """
+        Initializes the UpdateLogCompactor.
+
+        Args:
+            update_log (RedisDocumentUpdateLog): The update log to compact.
+            interval (float): Seconds between compaction passes.
+            min_entries (int): Number of logged updates from which a session is compacted.
+            batch_size (int): Maximum number of sessions compacted per pass.
+        """
+        self._update_log = update_log
+        self._interval = interval
+        self._min_entries = min_entries
+        self._batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Starts the compaction loop as a background task on the running event loop."""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.get_event_loop().create_task(self._run())
+        logger.info("Update log compactor started (interval: %ss, threshold: %d updates).",
+                    self._interval, self._min_entries)
+
+    async def stop(self) -> None:
+        """Stops the compaction loop."""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Update log compactor stopped.")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                compacted = await self.compact_once()
+            except asyncio.CancelledError:
+                raise
+            except RedisError as e:
+                logger.error("Update log compaction pass failed: %s", e, exc_info=True)
+                compacted = 0
+            # A full batch means more sessions are likely waiting; continue without sleeping.
+            if compacted < self._batch_size:
+                await asyncio.sleep(self._interval)
+
+    async def compact_once(self) -> int:
+        """
+        Compacts the largest logs above the threshold.
+
+        Returns:
+            int: The number of sessions compacted.
+        """
+        started = time.perf_counter()
+        compacted = 0
+        for session_id in await self._update_log.get_compaction_candidates(self._min_entries, self._batch_size):
+            try:
+                if await self._update_log.compact(session_id):
+                    compacted += 1
+            except Exception as e:
+                logger.error("Failed to compact the update log of session %s: %s", session_id, e, exc_info=True)
+        if compacted:
+            logger.info("Compacted the update logs of %d session(s) in %.0fms.",
+                        compacted, (time.perf_counter() - started) * 1000)
+        return compacted
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from creativeflow.collaboration.domain.models.presence import Presence
+from creativeflow.collaboration.domain.repositories.collaboration_repository import IPresenceRepository
+
+logger = logging.getLogger(__name__)
+
+# Prunes heartbeats older than the cutoff together with their presence entries,
+# then returns the remaining entries: a full session read in one round trip.
+# KEYS[1]: presence hash, KEYS[2]: heartbeat sorted set; ARGV[1]: cutoff timestamp.
+_GET_ALL_LIVE_SCRIPT = """
+local stale = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', '(' .. ARGV[1])
+if #stale > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', '(' .. ARGV[1])
+    for i = 1, #stale, 1000 do
+        redis.call('HDEL', KEYS[1], unpack(stale, i, math.min(i + 999, #stale)))
+    end
+end
+return redis.call('HGETALL', KEYS[1])
+"""
+
+
+class RedisPresenceRepository(IPresenceRepository[str, str, Presence]):
+    """
+    Redis implementation of the presence repository.
+
+    A session's presence is stored in two keys: a hash of user ID to serialized
+    presence, and a sorted set of user ID scored by last heartbeat. A user counts
+    as present while their heartbeat is younger than `presence_ttl`; stale entries
+    are pruned whenever the session is read. Both keys expire `presence_ttl` after
+    the session's last write, so abandoned sessions clean themselves up. The
+    session ID is the keys' hash tag, so on Redis Cluster both keys live in the
+    same slot and the pruning script can use them together.
+
+    Heartbeats are debounced: within a `debounce_ms` window, each user's latest
+    state replaces any earlier pending one, and the pending states of all users
+    are written in one pipeline at the end of the window. Redis therefore sees at
+    most one write per user and one round trip per window, however often cursors
+    move. Reads on this instance see pending states.
+    """
+
+    def __init__(
+        self,
+        redis_client: aioredis.Redis,
+        presence_ttl: float = 30.0,
+        debounce_ms: float = 50.0,
+        key_prefix: str = "collab:presence",
+    ):
+        """
+        Initializes the RedisPresenceRepository.
+
+        Args:
+            redis_client (aioredis.Redis): An asynchronous Redis client instance.
+            presence_ttl (float): Seconds without a heartbeat after which a user is no longer present.
+            debounce_ms (float): Window within which a user's heartbeats are coalesced into
+                                 one write. 0 writes every heartbeat.
+            key_prefix (str): Prefix of the Redis keys used for presence.
+        """
+        self.redis_client = redis_client
+        self._presence_ttl = presence_ttl
+        self._debounce = debounce_ms / 1000
+        self._key_prefix = key_prefix
+        self._get_all_live = self.redis_client.register_script(_GET_ALL_LIVE_SCRIPT)
+        # Latest unwritten presence per session and user.
+        self._pending: Dict[str, Dict[str, Presence]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _keys(self, session_id: str) -> Tuple[str, str]:
+        return f"{self._key_prefix}:{{{session_id}}}", f"{self._key_prefix}:{{{session_id}}}:heartbeats"
+
+    @staticmethod
+    def _serialize(presence: Presence) -> str:
+        return json.dumps({"state": presence.state, "last_seen": presence.last_seen}, separators=(",", ":"))
+
+    @staticmethod
+    def _deserialize(session_id: str, user_id: str, raw) -> Optional[Presence]:
+        try:
+            data = json.loads(raw)
+            return Presence(session_id=session_id, user_id=user_id, state=data["state"], last_seen=data["last_seen"])
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning("Ignoring malformed presence of user '%s' in session '%s': %s", user_id, session_id, e)
+            return None
+
+    async def get_presence(self, session_id: str, user_id: str) -> Optional[Presence]:
+        """
+        Retrieves the presence state for a specific user in a specific session.
+        """
+        pending = self._pending.get(session_id, {}).get(user_id)
+        if pending is not None:
+            return pending
+        hash_key, heartbeat_key = self._keys(session_id)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.hget(hash_key, user_id)
+            pipe.zscore(heartbeat_key, user_id)
+            raw, heartbeat = await pipe.execute()
+        if raw is None or heartbeat is None or heartbeat < time.time() - self._presence_ttl:
+            return None
+        return self._deserialize(session_id, user_id, raw)
+
+    async def save_presence(self, presence: Presence) -> None:
+        """
+        Records a heartbeat with the user's current presence state.
+
+        The write is deferred to the end of the current debounce window, unless
+        debouncing is disabled.
+        """
+        presence.last_seen = time.time()
+        if self._debounce <= 0:
+            await self._write([presence])
+            return
+
+        self._pending.setdefault(presence.session_id, {})[presence.user_id] = presence
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_event_loop().create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self._debounce)
+        # Heartbeats arriving while this window is written open the next window.
+        self._flush_task = None
+        try:
+            await self.flush()
+        except RedisError:
+            # Already logged; the next heartbeat of these users writes them again.
+            pass
+
+    async def flush(self) -> None:
+        """Writes all pending presence states in one pipeline."""
+        pending, self._pending = self._pending, {}
+        if pending:
+            await self._write([presence for by_user in pending.values() for presence in by_user.values()])
+
+    async def _write(self, presences: List[Presence]) -> None:
+        ttl = max(1, int(self._presence_ttl))
+        sessions = set()
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for presence in presences:
+                    hash_key, heartbeat_key = self._keys(presence.session_id)
+                    pipe.hset(hash_key, presence.user_id, self._serialize(presence))
+                    pipe.zadd(heartbeat_key, {presence.user_id: presence.last_seen})
+                    sessions.add(presence.session_id)
+                for session_id in sessions:
+                    for key in self._keys(session_id):
+                        pipe.expire(key, ttl)
+                await pipe.execute()
+        except RedisError as e:
+            logger.error("Failed to write %d presence update(s) to Redis: %s", len(presences), e, exc_info=True)
+            raise
+
+    async def get_all_in_session(self, session_id: str) -> List[Presence]:
+        """
+        Retrieves all users present in a session with one script call, pruning stale ones.
+        """
+        cutoff = time.time() - self._presence_ttl
+        raw_entries = await self._get_all_live(keys=list(self._keys(session_id)), args=[cutoff])
+
+        presences: Dict[str, Presence] = {}
+        for index in range(0, len(raw_entries), 2):
+            user_id = raw_entries[index]
+            if isinstance(user_id, bytes):
+                user_id = user_id.decode("utf-8")
+            presence = self._deserialize(session_id, user_id, raw_entries[index + 1])
+            if presence is not None:
+                presences[user_id] = presence
+        presences.update(self._pending.get(session_id, {}))
+        return list(presences.values())
+
+    async def delete_presence(self, session_id: str, user_id: str) -> None:
+        """
+        Explicitly deletes a user's presence information from a session.
+        """
+        self._pending.get(session_id, {}).pop(user_id, None)
+        hash_key, heartbeat_key = self._keys(session_id)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.hdel(hash_key, user_id)
+            pipe.zrem(heartbeat_key, user_id)
+            await pipe.execute()
+
+    async def close(self) -> None:
+        """Writes pending presence states and stops the debounce timer."""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
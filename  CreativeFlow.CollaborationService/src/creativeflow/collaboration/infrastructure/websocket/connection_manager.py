@@ -1,11 +1,173 @@
+import asyncio
+import json
 import logging
-from collections import defaultdict
-from typing import Dict, List, Optional
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, Hashable, List, Optional, Union
 
 from fastapi import WebSocket
 
 logger = logging.getLogger(__name__)
 
+# Close code sent to a client dropped for not keeping up ("Try Again Later").
+# The client reconnects and catches up with a state-vector diff.
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# y-websocket message type of an awareness update.
+_MESSAGE_AWARENESS = 1
+
+
+def _read_varuint(data: bytes, pos: int) -> tuple[int, int]:
+    """Reads a lib0 varuint at `pos`; returns (value, next position)."""
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _awareness_origin(payload: Union[str, bytes]) -> Optional[Hashable]:
+    """
+    Identifies whose awareness state a payload carries: the Yjs client ID of a binary
+    y-websocket awareness message describing a single client, or the `clientId` /
+    `client_id` / `user_id` of a JSON message. Returns None if it cannot be determined.
+    """
+    try:
+        if isinstance(payload, bytes):
+            message_type, pos = _read_varuint(payload, 0)
+            if message_type != _MESSAGE_AWARENESS:
+                return None
+            _, pos = _read_varuint(payload, pos)  # length of the awareness update
+            client_count, pos = _read_varuint(payload, pos)
+            if client_count != 1:
+                return None
+            client_id, _ = _read_varuint(payload, pos)
+            return ("client", client_id)
+        message = json.loads(payload)
+    except (IndexError, ValueError):
+        return None
+    if not isinstance(message, dict):
+        return None
+    for field in ("clientId", "client_id", "user_id"):
+        if message.get(field) is not None:
+            return (field, str(message[field]))
+    return None
+
+
+class _OutgoingMessage:
+    """A message waiting in a connection's send queue."""
+
+    __slots__ = ("payload", "enqueued_at", "coalesce_key")
+
+    def __init__(self, payload: Union[str, bytes], coalesce_key: Optional[Hashable]):
+        self.payload = payload
+        self.enqueued_at = time.monotonic()
+        self.coalesce_key = coalesce_key
+
+
+class _ConnectionWriter:
+    """
+    Bounded send queue of a single WebSocket, drained by its own writer task.
+
+    Awareness updates (cursor positions, selections) are only ever superseded by
+    newer ones, so they carry a coalesce key: a queued update is replaced in place
+    by a newer one with the same key, and new ones are dropped while the queue is
+    full. Document updates are never dropped; a client whose queue overflows with
+    them is disconnected instead, so one slow client cannot stall the session.
+    """
+
+    def __init__(self, manager: "ConnectionManager", websocket: WebSocket, max_queue_size: int, send_timeout: float):
+        self._manager = manager
+        self._websocket = websocket
+        self._max_queue_size = max_queue_size
+        self._send_timeout = send_timeout
+        self._queue: Deque[_OutgoingMessage] = deque()
+        self._queued_by_key: Dict[Hashable, _OutgoingMessage] = {}
+        self._ready = asyncio.Event()
+        self._overflowed = False
+        self._task = asyncio.get_event_loop().create_task(self._run())
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def enqueue(self, payload: Union[str, bytes], coalesce_key: Optional[Hashable] = None) -> None:
+        if self._overflowed:
+            return
+        metrics = self._manager._metrics
+        if coalesce_key is not None:
+            queued = self._queued_by_key.get(coalesce_key)
+            if queued is not None:
+                # Keep the queue position, send the latest state.
+                queued.payload = payload
+                metrics["messages_coalesced"] += 1
+                return
+            if len(self._queue) >= self._max_queue_size:
+                metrics["messages_dropped"] += 1
+                return
+        elif len(self._queue) >= self._max_queue_size:
+            self._overflowed = True
+            self._queue.clear()
+            self._queued_by_key.clear()
+            self._ready.set()
+            return
+
+        message = _OutgoingMessage(payload, coalesce_key)
+        self._queue.append(message)
+        if coalesce_key is not None:
+            self._queued_by_key[coalesce_key] = message
+        if len(self._queue) > metrics["queue_depth_high_watermark"]:
+            metrics["queue_depth_high_watermark"] = len(self._queue)
+        self._ready.set()
+
+    def close(self) -> None:
+        """Stops the writer task; queued messages are discarded."""
+        if not self._task.done() and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    async def _run(self) -> None:
+        while True:
+            await self._ready.wait()
+            if self._overflowed:
+                await self._drop_slow_consumer()
+                return
+            if not self._queue:
+                self._ready.clear()
+                continue
+
+            message = self._queue.popleft()
+            if message.coalesce_key is not None and self._queued_by_key.get(message.coalesce_key) is message:
+                del self._queued_by_key[message.coalesce_key]
+            try:
+                if isinstance(message.payload, bytes):
+                    await asyncio.wait_for(self._websocket.send_bytes(message.payload), timeout=self._send_timeout)
+                else:
+                    await asyncio.wait_for(self._websocket.send_text(message.payload), timeout=self._send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Failed to send message to WebSocket; disconnecting it: %s", e)
+                self._manager.disconnect(self._websocket)
+                return
+            self._manager._record_send(time.monotonic() - message.enqueued_at)
+
+    async def _drop_slow_consumer(self) -> None:
+        info = self._manager.get_user_info_for_connection(self._websocket)
+        logger.warning(
+            "Send queue of user '%s' in session '%s' overflowed (%d messages); disconnecting slow client.",
+            info[1] if info else "?", info[0] if info else "?", self._max_queue_size
+        )
+        self._manager._metrics["slow_consumers_disconnected"] += 1
+        self._manager.disconnect(self._websocket)
+        try:
+            await asyncio.wait_for(self._websocket.close(code=SLOW_CONSUMER_CLOSE_CODE), timeout=self._send_timeout)
+        except Exception as e:
+            logger.debug("Closing slow WebSocket failed: %s", e)
+
+
 class ConnectionManager:
     """
     Manages active WebSocket connections for collaborative sessions.
@@ -15,17 +177,64 @@ class ConnectionManager:
     responsible for handling connect/disconnect events and broadcasting messages
     to relevant clients.
 
+    Every connection has a bounded send queue drained by its own writer task, so
+    a broadcast only enqueues the message for each peer and returns: peers are
+    written to concurrently, and a slow client delays nobody but itself.
+
     For scaling across multiple instances, this in-memory manager would work in
     conjunction with a Pub/Sub system (like `PubSubManager`) to broadcast
     messages to other instances, which would then use their own ConnectionManager
     to deliver the message to their local connections.
     """
 
-    def __init__(self):
+    def __init__(self, max_queue_size: int = 256, send_timeout: float = 10.0):
+        """
+        Initializes the ConnectionManager.
+
+        Args:
+            max_queue_size (int): Maximum number of messages queued per connection. A client
+                                  that falls further behind on document updates is disconnected.
+            send_timeout (float): Seconds a single send may take before the connection is
+                                  considered dead.
+        """
         # active_connections maps: session_id -> {user_id: WebSocket}
         self.active_connections: Dict[str, Dict[str, WebSocket]] = defaultdict(dict)
         # Inverted map for quick lookup of user/session from a WebSocket object
         self.ws_to_user_map: Dict[WebSocket, tuple[str, str]] = {}
+        self._max_queue_size = max_queue_size
+        self._send_timeout = send_timeout
+        self._writers: Dict[WebSocket, _ConnectionWriter] = {}
+        self._metrics: Dict[str, float] = {
+            "messages_sent": 0,
+            "messages_dropped": 0,
+            "messages_coalesced": 0,
+            "slow_consumers_disconnected": 0,
+            "queue_depth_high_watermark": 0,
+            "send_lag_ms_max": 0.0,
+            "send_lag_ms_avg": 0.0,
+        }
+
+    @property
+    def metrics(self) -> Dict[str, float]:
+        """
+        Delivery counters since startup, the current total and largest queue depth, and
+        the send lag (time from enqueue to completed send) as a maximum and moving average.
+        """
+        depths = [writer.queue_depth for writer in self._writers.values()]
+        return {
+            **self._metrics,
+            "connections": len(self._writers),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+        }
+
+    def _record_send(self, lag_seconds: float) -> None:
+        lag_ms = lag_seconds * 1000
+        self._metrics["messages_sent"] += 1
+        if lag_ms > self._metrics["send_lag_ms_max"]:
+            self._metrics["send_lag_ms_max"] = lag_ms
+        # Exponential moving average, weighted towards the most recent sends.
+        self._metrics["send_lag_ms_avg"] += (lag_ms - self._metrics["send_lag_ms_avg"]) * 0.05
 
     async def connect(self, websocket: WebSocket, session_id: str, user_id: str):
         """
@@ -39,6 +248,7 @@ class ConnectionManager:
         await websocket.accept()
         self.active_connections[session_id][user_id] = websocket
         self.ws_to_user_map[websocket] = (session_id, user_id)
+        self._writers[websocket] = _ConnectionWriter(self, websocket, self._max_queue_size, self._send_timeout)
         logger.info("User '%s' connected to session '%s'. Total users in session: %d.",
                     user_id, session_id, len(self.active_connections[session_id]))
 
@@ -49,10 +259,14 @@ class ConnectionManager:
         Args:
             websocket (WebSocket): The WebSocket instance to disconnect.
         """
+        writer = self._writers.pop(websocket, None)
+        if writer is not None:
+            writer.close()
         if websocket in self.ws_to_user_map:
             session_id, user_id = self.ws_to_user_map[websocket]
             del self.ws_to_user_map[websocket]
-            if session_id in self.active_connections and user_id in self.active_connections[session_id]:
+            # The user may have reconnected on a new socket in the meantime; leave that one registered.
+            if self.active_connections.get(session_id, {}).get(user_id) is websocket:
                 del self.active_connections[session_id][user_id]
                 if not self.active_connections[session_id]:
                     # Clean up empty session entry
@@ -96,34 +310,74 @@ class ConnectionManager:
             message (str): The message to send.
             websocket (WebSocket): The target WebSocket connection.
         """
+        writer = self._writers.get(websocket)
+        if writer is not None:
+            # Queued behind earlier broadcasts so messages to the client stay in order.
+            writer.enqueue(message)
+            return
         try:
             await websocket.send_text(message)
         except Exception as e:
             logger.error("Failed to send personal message: %s", e)
             self.disconnect(websocket) # Clean up potentially dead connection
 
-    async def broadcast_to_session(self, message: str, session_id: str, exclude_websocket: Optional[WebSocket] = None):
+    def _fan_out(
+        self,
+        payload: Union[str, bytes],
+        session_id: str,
+        exclude_websocket: Optional[WebSocket],
+        is_awareness: bool,
+    ) -> None:
+        coalesce_key = None
+        if is_awareness:
+            # Coalesce awareness updates per origin: only each client's latest state matters.
+            # The origin comes from the payload, so relayed updates (no local sender socket)
+            # are not coalesced with other users' updates.
+            origin = _awareness_origin(payload)
+            if origin is None:
+                sender = self.ws_to_user_map.get(exclude_websocket)
+                # A unique key when the origin is unknown: droppable, but never replaces another update.
+                origin = ("user", sender[1]) if sender else object()
+            coalesce_key = ("awareness", origin)
+        # Iterate over a snapshot; writers may disconnect sockets while we fan out.
+        for connection in list(self.active_connections.get(session_id, {}).values()):
+            if connection is exclude_websocket:
+                continue
+            writer = self._writers.get(connection)
+            if writer is not None:
+                writer.enqueue(payload, coalesce_key)
+
+    async def broadcast_to_session(
+        self,
+        message: str,
+        session_id: str,
+        exclude_websocket: Optional[WebSocket] = None,
+        is_awareness: bool = False,
+    ):
         """
         Broadcasts a message to all clients in a specific session.
 
+        The message is queued for every peer and written by their writer tasks, so
+        this returns without waiting for any client.
+
         Args:
             message (str): The message to broadcast.
             session_id (str): The ID of the target session.
             exclude_websocket (Optional[WebSocket]): A WebSocket to exclude from the broadcast
                                                      (typically the sender).
+            is_awareness (bool): Whether the message is an awareness update, which may be
+                                 coalesced per originating client or dropped
+                                 for clients that are falling behind.
         """
-        connections = self.active_connections.get(session_id, {})
-        for user_id, connection in connections.items():
-            if connection != exclude_websocket:
-                try:
-                    await connection.send_text(message)
-                except Exception as e:
-                    # Connection might have closed unexpectedly
-                    logger.error("Failed to broadcast to user '%s' in session '%s': %s", user_id, session_id, e)
-                    # Disconnect the problematic client
-                    self.disconnect(connection)
+        self._fan_out(message, session_id, exclude_websocket, is_awareness)
 
-    async def broadcast_to_session_binary(self, data: bytes, session_id: str, exclude_websocket: Optional[WebSocket] = None):
+    async def broadcast_to_session_binary(
+        self,
+        data: bytes,
+        session_id: str,
+        exclude_websocket: Optional[WebSocket] = None,
+        is_awareness: bool = False,
+    ):
         """
         Broadcasts binary data to all clients in a specific session.
 
@@ -131,12 +385,18 @@ class ConnectionManager:
             data (bytes): The binary data to broadcast.
             session_id (str): The ID of the target session.
             exclude_websocket (Optional[WebSocket]): A WebSocket to exclude from the broadcast.
+            is_awareness (bool): Whether the data is an awareness update, which may be
+                                 coalesced per originating client or dropped
+                                 for clients that are falling behind.
+        """
+        self._fan_out(data, session_id, exclude_websocket, is_awareness)
+
+    async def close(self):
+        """
+        Stops all writer tasks. Messages still queued are discarded.
         """
-        connections = self.active_connections.get(session_id, {})
-        for user_id, connection in connections.items():
-            if connection != exclude_websocket:
-                try:
-                    await connection.send_bytes(data)
-                except Exception as e:
-                    logger.error("Failed to broadcast binary data to user '%s' in session '%s': %s", user_id, session_id, e)
-                    self.disconnect(connection)
\ No newline at end of file
+        writers = list(self._writers.values())
+        self._writers.clear()
+        for writer in writers:
+            writer.close()
+        await asyncio.gather(*(writer._task for writer in writers), return_exceptions=True)
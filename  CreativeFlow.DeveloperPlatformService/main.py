@@ -12,7 +12,12 @@ from api.main import api_router as main_api_router
 from core.config import get_settings
 from core.exceptions import AppException
 from core.logging_config import setup_logging
+from infrastructure.cache.api_key_cache import api_key_cache
+from infrastructure.cache.quota_counter import quota_counter
 from infrastructure.cache.redis_client import redis_client
+from infrastructure.database.session import AsyncSessionLocal
+from infrastructure.database.usage_ingestion import usage_ingestion_buffer
+from infrastructure.database.usage_partitions import usage_partition_manager
 from infrastructure.external_clients.ai_generation_client import ai_generation_client
 from infrastructure.external_clients.asset_management_client import (
     asset_management_client,
@@ -38,6 +43,7 @@ async def app_exception_handler(request: Request, exc: AppException) -> JSONResp
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail},
+        headers=exc.headers,
     )
 
 
@@ -114,6 +120,14 @@ async def lifespan(app: FastAPI):
         await redis_client.connect()
         logger.info("Redis client connected successfully.")
 
+        await api_key_cache.start(redis_client.get_client(), settings)
+        await quota_counter.start(redis_client.get_client(), settings, AsyncSessionLocal)
+
+        # Today's partition of the usage records must exist before they are written.
+        await usage_partition_manager.start(settings, AsyncSessionLocal)
+        await usage_ingestion_buffer.start(settings, AsyncSessionLocal)
+        logger.info("Usage ingestion buffer initialized.")
+
         ai_generation_client.initialize(settings.AI_GENERATION_SERVICE_URL)
         logger.info("AI Generation HTTP client initialized.")
 
@@ -135,6 +149,11 @@ async def lifespan(app: FastAPI):
     try:
         await rabbitmq_client.close()
         logger.info("RabbitMQ client disconnected.")
+        await usage_ingestion_buffer.stop()
+        logger.info("Usage ingestion buffer flushed.")
+        await usage_partition_manager.stop()
+        await api_key_cache.stop()
+        await quota_counter.stop()
         await redis_client.close()
         logger.info("Redis client disconnected.")
         await ai_generation_client.close()
@@ -21,6 +21,8 @@ from domain.repositories.api_key_repository import IApiKeyRepository
 from domain.repositories.quota_repository import IQuotaRepository
 from domain.repositories.usage_repository import IUsageRepository
 from domain.repositories.webhook_repository import IWebhookRepository
+from infrastructure.cache.api_key_cache import VerifiedKeyCache, get_api_key_cache
+from infrastructure.cache.quota_counter import RedisQuotaCounter, get_quota_counter
 from infrastructure.cache.redis_client import (
     RedisClient,
     get_redis_client_dependency,
@@ -38,6 +40,10 @@ from infrastructure.database.repositories.sqlalchemy_webhook_repository import (
     SqlAlchemyWebhookRepository,
 )
 from infrastructure.database.session import get_async_db_session
+from infrastructure.database.usage_ingestion import (
+    UsageIngestionBuffer,
+    get_usage_ingestion_buffer,
+)
 from infrastructure.external_clients.ai_generation_client import (
     AIGenerationClient,
     get_ai_generation_client,
@@ -102,9 +108,10 @@ def get_webhook_publisher(
 # Application Service Dependencies
 def get_api_key_service(
     api_key_repo: IApiKeyRepository = Depends(get_api_key_repository),
+    key_cache: VerifiedKeyCache = Depends(get_api_key_cache),
 ) -> APIKeyService:
     """Provides an instance of the APIKeyService."""
-    return APIKeyService(api_key_repo=api_key_repo)
+    return APIKeyService(api_key_repo=api_key_repo, key_cache=key_cache)
 
 
 def get_webhook_service(
@@ -117,17 +124,19 @@ def get_webhook_service(
 
 def get_usage_tracking_service(
     usage_repo: IUsageRepository = Depends(get_usage_repository),
+    usage_buffer: UsageIngestionBuffer = Depends(get_usage_ingestion_buffer),
 ) -> UsageTrackingService:
     """Provides an instance of the UsageTrackingService."""
-    return UsageTrackingService(usage_repo=usage_repo)
+    return UsageTrackingService(usage_repo=usage_repo, usage_buffer=usage_buffer)
 
 
 def get_quota_management_service(
     quota_repo: IQuotaRepository = Depends(get_quota_repository),
     usage_repo: IUsageRepository = Depends(get_usage_repository),
+    quota_counter: RedisQuotaCounter = Depends(get_quota_counter),
 ) -> QuotaManagementService:
     """Provides an instance of the QuotaManagementService."""
-    return QuotaManagementService(quota_repo=quota_repo, usage_repo=usage_repo)
+    return QuotaManagementService(quota_repo=quota_repo, usage_repo=usage_repo, quota_counter=quota_counter)
 
 
 def get_rate_limiting_service(
@@ -137,8 +146,11 @@ def get_rate_limiting_service(
     """Provides an instance of the RateLimitingService."""
     return RateLimitingService(
         redis_client=redis_client,
-        default_requests=settings.DEFAULT_RATE_LIMIT_REQUESTS,
-        default_period_seconds=settings.DEFAULT_RATE_LIMIT_PERIOD_SECONDS,
+        requests=settings.DEFAULT_RATE_LIMIT_REQUESTS,
+        period_seconds=settings.DEFAULT_RATE_LIMIT_PERIOD_SECONDS,
+        algorithm=settings.RATE_LIMIT_ALGORITHM,
+        tier_limits=settings.RATE_LIMIT_TIERS,
+        local_precheck=settings.RATE_LIMIT_LOCAL_PRECHECK,
     )
 
 
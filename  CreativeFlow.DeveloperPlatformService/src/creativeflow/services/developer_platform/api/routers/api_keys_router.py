@@ -37,22 +37,15 @@ async def create_api_key(
     """
     Creates a new API key for the authenticated user.
     """
-    key_domain, plaintext_secret = await service.generate_key(
+    key_domain, full_api_key = await service.generate_key(
         user_id=user.id,
         name=payload.name,
-        permissions=payload.permissions,
+        permissions=payload.permissions.model_dump() if payload.permissions else None,
     )
-    
-    full_api_key = f"{key_domain.key_prefix}_{plaintext_secret}"
 
     return APIKeyCreateResponseSchema(
-        id=key_domain.id,
-        name=key_domain.name,
-        permissions=key_domain.permissions.model_dump(),
-        key_prefix=key_domain.key_prefix,
+        **APIKeyResponseSchema.model_validate(key_domain).model_dump(),
         api_key=full_api_key,
-        is_active=key_domain.is_active,
-        created_at=key_domain.created_at,
     )
 
 
@@ -115,7 +108,7 @@ async def update_api_key(
         updated_key = await service.update_key(
             api_key_id=api_key_id,
             user_id=user.id,
-            update_data=payload.model_dump(exclude_unset=True)
+            **payload.model_dump(exclude_unset=True),
         )
         return APIKeyResponseSchema.model_validate(updated_key)
     except APIKeyNotFoundError as e:
@@ -1,5 +1,5 @@
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 
 from api.dependencies.authentication import get_current_active_api_client
 from api.dependencies.common import (
@@ -16,7 +16,7 @@ from application.services.usage_tracking_service import UsageTrackingService
 from application.services.quota_management_service import QuotaManagementService
 from application.services.rate_limiting_service import RateLimitingService
 from domain.models.api_key import APIKey as APIKeyDomainModel
-from core.exceptions import RateLimitExceededError, InsufficientQuotaError, ExternalServiceError, APIKeyPermissionDeniedError
+from core.exceptions import RateLimitExceededError, ExternalServiceError, APIKeyPermissionDeniedError
 
 # This router acts as the main gateway for developers using an API key.
 router = APIRouter(
@@ -34,6 +34,7 @@ router = APIRouter(
 )
 async def initiate_creative_generation_proxy(
     request: Request,
+    response: Response,
     payload: GenerationCreateRequestSchema,
     api_client: APIKeyDomainModel = Depends(get_current_active_api_client),
     proxy_service: GenerationProxyService = Depends(get_generation_proxy_service),
@@ -47,20 +48,21 @@ async def initiate_creative_generation_proxy(
     2. Proxying the request to the backend generation service.
     3. Recording the API call for billing and analytics.
     """
-    endpoint = f"{request.method} {request.url.path}"
+    # The route template, so that usage is aggregated per endpoint rather than per resource.
+    endpoint = f"{request.method} {request.scope['route'].path}"
 
     # 1. Check permissions (future enhancement, placeholder)
     if not api_client.permissions.can_generate_creative:
         raise APIKeyPermissionDeniedError(detail="This API key cannot be used for creative generation.")
 
     # 2. Check Rate Limiting
-    if await rate_limit_service.is_rate_limited(api_client.id, endpoint):
-        raise RateLimitExceededError()
+    rate_limit = await rate_limit_service.check_rate_limit(api_client)
+    response.headers.update(rate_limit.headers)
+    if not rate_limit.allowed:
+        raise RateLimitExceededError(retry_after=rate_limit.retry_after_seconds, headers=rate_limit.headers)
 
-    # 3. Check Quotas
-    can_proceed = await quota_service.check_quota_available(api_client_id=api_client.id, user_id=api_client.user_id, action_cost=1)
-    if not can_proceed:
-        raise InsufficientQuotaError()
+    # 3. Reserve Quota (raises InsufficientQuotaError if exceeded)
+    quota_reservation = await quota_service.reserve_quota(api_client_id=api_client.id, user_id=api_client.user_id, action_cost=1)
 
     is_successful = False
     try:
@@ -74,7 +76,8 @@ async def initiate_creative_generation_proxy(
         # Propagate error from downstream service
         raise HTTPException(status_code=e.status_code, detail=e.detail)
     finally:
-        # 5. Record Usage (runs even if proxy call fails, but marks it as unsuccessful)
+        # 5. Commit the quota reservation (released if the call failed) and record usage
+        await quota_service.commit_quota(quota_reservation, is_successful)
         await usage_service.record_api_call(
             api_client_id=api_client.id,
             user_id=api_client.user_id,
@@ -92,6 +95,7 @@ async def initiate_creative_generation_proxy(
 )
 async def get_generation_status_proxy(
     request: Request,
+    response: Response,
     generation_id: UUID,
     api_client: APIKeyDomainModel = Depends(get_current_active_api_client),
     proxy_service: GenerationProxyService = Depends(get_generation_proxy_service),
@@ -101,13 +105,16 @@ async def get_generation_status_proxy(
     """
     Handles requests for generation status. GET requests are typically cheaper and have higher rate limits.
     """
-    endpoint = f"{request.method} {request.url.path}"
+    # The route template, so that usage is aggregated per endpoint rather than per resource.
+    endpoint = f"{request.method} {request.scope['route'].path}"
     
     if not api_client.permissions.can_read_assets: # Assuming getting status falls under read permissions
         raise APIKeyPermissionDeniedError(detail="This API key cannot be used to query generation status.")
 
-    if await rate_limit_service.is_rate_limited(api_client.id, endpoint):
-        raise RateLimitExceededError()
+    rate_limit = await rate_limit_service.check_rate_limit(api_client)
+    response.headers.update(rate_limit.headers)
+    if not rate_limit.allowed:
+        raise RateLimitExceededError(retry_after=rate_limit.retry_after_seconds, headers=rate_limit.headers)
 
     is_successful = False
     try:
@@ -137,6 +144,7 @@ async def get_generation_status_proxy(
 )
 async def retrieve_asset_details_proxy(
     request: Request,
+    response: Response,
     asset_id: UUID,
     api_client: APIKeyDomainModel = Depends(get_current_active_api_client),
     proxy_service: GenerationProxyService = Depends(get_generation_proxy_service),
@@ -146,13 +154,16 @@ async def retrieve_asset_details_proxy(
     """
     Handles requests for asset details.
     """
-    endpoint = f"{request.method} {request.url.path}"
+    # The route template, so that usage is aggregated per endpoint rather than per resource.
+    endpoint = f"{request.method} {request.scope['route'].path}"
 
     if not api_client.permissions.can_read_assets:
         raise APIKeyPermissionDeniedError(detail="This API key cannot be used to retrieve asset details.")
 
-    if await rate_limit_service.is_rate_limited(api_client.id, endpoint):
-        raise RateLimitExceededError()
+    rate_limit = await rate_limit_service.check_rate_limit(api_client)
+    response.headers.update(rate_limit.headers)
+    if not rate_limit.allowed:
+        raise RateLimitExceededError(retry_after=rate_limit.retry_after_seconds, headers=rate_limit.headers)
 
     is_successful = False
     try:
@@ -3,6 +3,7 @@
 
 from .api_key_schemas import (
     APIKeyBase,
+    APIKeyPermissionsSchema,
     APIKeyCreateSchema,
     APIKeyCreateResponseSchema,
     APIKeyUpdateSchema,
@@ -30,6 +31,7 @@ from .webhook_schemas import (
 
 __all__ = [
     "APIKeyBase",
+    "APIKeyPermissionsSchema",
     "APIKeyCreateSchema",
     "APIKeyCreateResponseSchema",
     "APIKeyUpdateSchema",
@@ -2,16 +2,27 @@
 Pydantic schemas for API key related requests and responses.
 """
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Optional
 from uuid import UUID
 
 from pydantic import BaseModel, Field
 
 
+class APIKeyPermissionsSchema(BaseModel):
+    """Schema for the developer-settable permissions of an API Key."""
+    can_generate_creative: bool = Field(True, description="Allows initiating creative generation.")
+    can_read_assets: bool = Field(True, description="Allows retrieving asset details and lists.")
+    can_manage_assets: bool = Field(False, description="Allows uploading or modifying assets.")
+    can_read_user_info: bool = Field(False, description="Allows retrieving user/team information.")
+
+    class Config:
+        from_attributes = True
+
+
 class APIKeyBase(BaseModel):
     """Base schema for an API Key, containing common fields."""
     name: str = Field(..., min_length=3, max_length=100, description="A user-defined name for the API key.")
-    permissions: Optional[Dict[str, bool]] = Field(None, description="Granular permissions for the key, e.g., {'can_generate': true}.")
+    permissions: Optional[APIKeyPermissionsSchema] = Field(None, description="Granular permissions for the key, e.g., {'can_generate_creative': true}.")
 
 
 class APIKeyCreateSchema(APIKeyBase):
@@ -22,7 +33,7 @@ class APIKeyCreateSchema(APIKeyBase):
 class APIKeyUpdateSchema(BaseModel):
     """Schema for updating an existing API Key."""
     name: Optional[str] = Field(None, min_length=3, max_length=100, description="A new user-defined name for the API key.")
-    permissions: Optional[Dict[str, bool]] = Field(None, description="Updated granular permissions for the key.")
+    permissions: Optional[APIKeyPermissionsSchema] = Field(None, description="Updated granular permissions for the key.")
     is_active: Optional[bool] = Field(None, description="Set to false to deactivate the key.")
 
 
@@ -30,6 +41,7 @@ class APIKeyResponseSchema(APIKeyBase):
     """Schema for representing an API Key in API responses (secret excluded)."""
     id: UUID = Field(..., description="The unique identifier for the API key.")
     key_prefix: str = Field(..., description="The non-secret prefix of the API key, used for identification.")
+    rate_limit_tier: str = Field(..., description="The rate limit tier of the key, set by the platform.")
     is_active: bool = Field(..., description="Indicates if the API key is currently active.")
     created_at: datetime = Field(..., description="The timestamp when the API key was created.")
     revoked_at: Optional[datetime] = Field(None, description="The timestamp when the API key was revoked, if applicable.")
@@ -1,3 +1,4 @@
+import asyncio
 import secrets
 import uuid
 from typing import Dict, List, Optional, Tuple
@@ -6,6 +7,7 @@ from ....developer_platform.core import exceptions
 from ....developer_platform.domain.models.api_key import APIKey as APIKeyDomainModel
 from ....developer_platform.domain.models.api_key import APIKeyPermissions
 from ....developer_platform.domain.repositories.api_key_repository import IApiKeyRepository
+from ....developer_platform.infrastructure.cache.api_key_cache import VerifiedKeyCache
 from ....developer_platform.infrastructure.security import hashing
 
 API_KEY_PREFIX = "cf_dev"
@@ -18,14 +20,16 @@ class APIKeyService:
     and permission management.
     """
 
-    def __init__(self, api_key_repo: IApiKeyRepository):
+    def __init__(self, api_key_repo: IApiKeyRepository, key_cache: Optional[VerifiedKeyCache] = None):
         """
         Initializes the APIKeyService.
 
         Args:
             api_key_repo: The repository for accessing API key data.
+            key_cache: The cache of recently verified API keys, if any.
         """
         self.api_key_repo = api_key_repo
+        self.key_cache = key_cache
 
     async def generate_key(
         self, user_id: uuid.UUID, name: str, permissions: Optional[Dict[str, bool]] = None
@@ -49,14 +53,12 @@ class APIKeyService:
         full_key = f"{key_prefix}_{secret}"
         secret_hash = hashing.hash_secret(secret)
 
-        key_permissions = APIKeyPermissions(**permissions) if permissions else APIKeyPermissions()
-
         api_key_domain = APIKeyDomainModel(
             user_id=user_id,
             name=name,
             key_prefix=key_prefix,
             secret_hash=secret_hash,
-            permissions=key_permissions,
+            permissions=self._build_permissions(permissions, APIKeyPermissions().rate_limit_tier),
         )
 
         await self.api_key_repo.add(api_key_domain)
@@ -66,7 +68,8 @@ class APIKeyService:
         """
         Validates a full API key string (prefix_secret).
 
-        It splits the key, finds the key by its prefix, and verifies the secret.
+        A key verified recently is served from the verified key cache. Otherwise,
+        it splits the key, finds the key by its prefix, and verifies the secret.
 
         Args:
             key_value: The full API key string to validate.
@@ -74,6 +77,13 @@ class APIKeyService:
         Returns:
             The APIKey domain model if valid and active, otherwise None.
         """
+        generation = None
+        if self.key_cache:
+            cached_key = await self.key_cache.get(key_value)
+            if cached_key:
+                return cached_key
+            generation = await self.key_cache.generation()
+
         try:
             prefix, secret = key_value.rsplit("_", 1)
         except ValueError:
@@ -87,9 +97,12 @@ class APIKeyService:
         if not key_domain.is_active:
             raise exceptions.APIKeyInactiveError()
 
-        if not hashing.verify_secret(secret, key_domain.secret_hash):
+        # bcrypt is slow by design: verify off the event loop.
+        if not await asyncio.to_thread(hashing.verify_secret, secret, key_domain.secret_hash):
             return None
 
+        if self.key_cache:
+            await self.key_cache.set(key_value, key_domain, generation)
         return key_domain
 
     async def revoke_key(self, api_key_id: uuid.UUID, user_id: uuid.UUID) -> APIKeyDomainModel:
@@ -109,6 +122,7 @@ class APIKeyService:
         key_domain = await self.get_key_by_id(api_key_id, user_id)
         key_domain.revoke()
         await self.api_key_repo.update(key_domain)
+        self._invalidate_on_commit(key_domain.id)
         return key_domain
 
     async def list_keys_for_user(self, user_id: uuid.UUID) -> List[APIKeyDomainModel]:
@@ -168,9 +182,20 @@ class APIKeyService:
         if name is not None:
             key_domain.name = name
         if permissions is not None:
-            key_domain.permissions = APIKeyPermissions(**permissions)
+            key_domain.permissions = self._build_permissions(permissions, key_domain.permissions.rate_limit_tier)
         if is_active is not None:
             key_domain.is_active = is_active
 
         await self.api_key_repo.update(key_domain)
-        return key_domain
\ No newline at end of file
+        self._invalidate_on_commit(key_domain.id)
+        return key_domain
+
+    @staticmethod
+    def _build_permissions(permissions: Optional[Dict[str, bool]], rate_limit_tier: str) -> APIKeyPermissions:
+        # The rate limit tier is not a developer-settable permission.
+        return APIKeyPermissions(**{**(permissions or {}), "rate_limit_tier": rate_limit_tier})
+
+    def _invalidate_on_commit(self, api_key_id: uuid.UUID):
+        # Invalidating before the commit would let a concurrent validation cache the old key again.
+        if self.key_cache:
+            self.api_key_repo.on_commit(lambda: self.key_cache.invalidate_on_commit(api_key_id))
\ No newline at end of file
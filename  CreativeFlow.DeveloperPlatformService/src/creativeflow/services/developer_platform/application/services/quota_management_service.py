@@ -1,12 +1,26 @@
+import logging
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
+from redis.exceptions import RedisError
+
 from ....developer_platform.api.schemas import usage_schemas
 from ....developer_platform.core import exceptions
 from ....developer_platform.domain.models.usage import Quota, QuotaPeriod
 from ....developer_platform.domain.repositories.quota_repository import IQuotaRepository
 from ....developer_platform.domain.repositories.usage_repository import IUsageRepository
+from ....developer_platform.infrastructure.cache.quota_counter import QuotaReservation, RedisQuotaCounter
+
+logger = logging.getLogger(__name__)
+
+# The endpoints whose successful calls are counted against each type of quota.
+ACTION_ENDPOINT_PREFIXES = {
+    "generation": "POST /proxy/v1/generations",
+}
+
+# How long the usage counter of a quota period is kept, beyond the period itself.
+COUNTER_RETENTION_DAYS = 7
 
 
 class QuotaManagementService:
@@ -15,7 +29,10 @@ class QuotaManagementService:
     """
 
     def __init__(
-        self, quota_repo: IQuotaRepository, usage_repo: IUsageRepository
+        self,
+        quota_repo: IQuotaRepository,
+        usage_repo: IUsageRepository,
+        quota_counter: Optional[RedisQuotaCounter] = None,
     ):
         """
         Initializes the QuotaManagementService.
@@ -23,13 +40,16 @@ class QuotaManagementService:
         Args:
             quota_repo: The repository for managing quota definitions.
             usage_repo: The repository for getting current usage data.
+            quota_counter: The usage counters; without them, usage is counted
+                from the usage records on every check.
         """
         self.quota_repo = quota_repo
         self.usage_repo = usage_repo
+        self.quota_counter = quota_counter
 
     async def _get_or_create_default_quota(self, api_client_id: uuid.UUID, user_id: uuid.UUID) -> Quota:
         """Fetches the client's quota or creates a default one if it doesn't exist."""
-        quota = await self.quota_repo.get_quota_by_client_id(api_client_id, user_id)
+        quota = await self.quota_repo.get_by_client_id(api_client_id)
         if not quota:
             # In a real system, this would be based on the user's subscription tier.
             # For now, we'll create a default monthly quota.
@@ -40,9 +60,60 @@ class QuotaManagementService:
                 period=QuotaPeriod.MONTHLY,
                 last_reset_at=datetime.utcnow()
             )
-            await self.quota_repo.save_quota(quota)
+            await self.quota_repo.add(quota)
         return quota
 
+    @staticmethod
+    def _period_key(quota: Quota) -> int:
+        """Identifies the current period of a quota by the Unix time it started at."""
+        last_reset_at = quota.last_reset_at
+        if last_reset_at.tzinfo is None:
+            last_reset_at = last_reset_at.replace(tzinfo=timezone.utc)
+        return int(last_reset_at.timestamp())
+
+    @staticmethod
+    def _period_length(quota: Quota) -> timedelta:
+        # This is a simplification; true monthly reset is more complex.
+        return timedelta(days=1) if quota.period == QuotaPeriod.DAILY else timedelta(days=30)
+
+    async def _count_usage(self, quota: Quota, action_type: str) -> int:
+        """Counts the usage of the current period from the usage records."""
+        return await self.usage_repo.get_count_for_period(
+            api_client_id=quota.api_client_id,
+            period_start=quota.last_reset_at,
+            action_prefix=ACTION_ENDPOINT_PREFIXES.get(action_type, action_type),
+        )
+
+    async def _seed_counter(self, quota: Quota, action_type: str) -> None:
+        """
+        Creates the usage counter of the current period, from the larger of the
+        last value reconciled in this period and the count of usage records.
+
+        Neither is complete on its own: buffered usage records reach the database
+        only once flushed, and usage since the last reconciliation is not reconciled yet.
+        """
+        period_key = self._period_key(quota)
+        used = await self._count_usage(quota, action_type)
+        if quota.used_amount is not None and quota.used_period_key == period_key:
+            used = max(used, quota.used_amount)
+        ttl = self._period_length(quota) + timedelta(days=COUNTER_RETENTION_DAYS)
+        await self.quota_counter.seed(quota.api_client_id, period_key, used, int(ttl.total_seconds()))
+
+    async def _get_current_usage(self, quota: Quota, action_type: str) -> int:
+        """Returns the units used or reserved in the current period."""
+        if self.quota_counter and self.quota_counter.enabled:
+            try:
+                usage = await self.quota_counter.get_usage(quota.api_client_id, self._period_key(quota))
+                if usage is None:
+                    await self._seed_counter(quota, action_type)
+                    usage = await self.quota_counter.get_usage(quota.api_client_id, self._period_key(quota))
+                if usage is not None:
+                    used, reserved = usage
+                    return used + reserved
+            except RedisError as e:
+                logger.warning("Quota counter unavailable, counting usage records: %s", e)
+        return await self._count_usage(quota, action_type)
+
     async def check_quota(
         self, api_client_id: uuid.UUID, user_id: uuid.UUID, action_cost: int = 1, action_type: str = "generation"
     ) -> bool:
@@ -67,17 +138,72 @@ class QuotaManagementService:
         # TODO: Implement logic to check if quota needs resetting
         # For simplicity, we assume a cron job handles resetting.
 
-        current_usage = await self.usage_repo.get_count_for_period(
-            api_client_id=api_client_id,
-            period_start=quota.last_reset_at,
-            action_type=action_type
-        )
+        current_usage = await self._get_current_usage(quota, action_type)
 
         if current_usage + action_cost > quota.limit_amount:
             raise exceptions.InsufficientQuotaError()
 
         return True
 
+    async def reserve_quota(
+        self, api_client_id: uuid.UUID, user_id: uuid.UUID, action_cost: int = 1, action_type: str = "generation"
+    ) -> Optional[QuotaReservation]:
+        """
+        Holds units of the client's quota for an action about to be performed.
+
+        The reservation must be completed with `commit_quota` once the action is
+        done. Concurrent actions cannot together exceed the quota.
+
+        Args:
+            api_client_id: The ID of the API client.
+            user_id: The ID of the user owning the client.
+            action_cost: The cost of the action to be performed.
+            action_type: The type of action being performed.
+
+        Returns:
+            The reservation, or None if the quota was only checked (without usage counters).
+
+        Raises:
+            InsufficientQuotaError: If the quota would be exceeded.
+        """
+        if not self.quota_counter or not self.quota_counter.enabled:
+            await self.check_quota(api_client_id, user_id, action_cost, action_type)
+            return None
+
+        quota = await self._get_or_create_default_quota(api_client_id, user_id)
+        period_key = self._period_key(quota)
+        try:
+            try:
+                reservation = await self.quota_counter.reserve(api_client_id, period_key, quota.limit_amount, action_cost)
+            except LookupError:
+                await self._seed_counter(quota, action_type)
+                reservation = await self.quota_counter.reserve(api_client_id, period_key, quota.limit_amount, action_cost)
+        except RedisError as e:
+            logger.warning("Quota counter unavailable, counting usage records: %s", e)
+            await self.check_quota(api_client_id, user_id, action_cost, action_type)
+            return None
+
+        if reservation is None:
+            raise exceptions.InsufficientQuotaError()
+        return reservation
+
+    async def commit_quota(self, reservation: Optional[QuotaReservation], is_successful: bool) -> None:
+        """
+        Completes a reservation made by `reserve_quota`.
+
+        Args:
+            reservation: The reservation; None is ignored.
+            is_successful: Whether the action succeeded. Only successful actions
+                use quota; the units of a failed one are released.
+        """
+        if reservation is None or not self.quota_counter or not self.quota_counter.enabled:
+            return
+        try:
+            await self.quota_counter.commit(reservation, consumed=is_successful)
+        except RedisError as e:
+            # The reservation expires and its units are released: the action goes uncounted.
+            logger.error("Failed to commit quota reservation for client %s: %s", reservation.api_client_id, e)
+
     async def get_quota_status(
         self, api_client_id: uuid.UUID, user_id: uuid.UUID, action_type: str = "generation"
     ) -> usage_schemas.QuotaStatusResponseSchema:
@@ -95,19 +221,9 @@ class QuotaManagementService:
         quota = await self._get_or_create_default_quota(api_client_id, user_id)
 
         # Calculate next reset time
-        resets_at = None
-        if quota.period == QuotaPeriod.MONTHLY:
-            # This is a simplification; true monthly reset is more complex.
-            resets_at = quota.last_reset_at + timedelta(days=30)
-        elif quota.period == QuotaPeriod.DAILY:
-            resets_at = quota.last_reset_at + timedelta(days=1)
-
+        resets_at = quota.last_reset_at + self._period_length(quota)
 
-        current_usage = await self.usage_repo.get_count_for_period(
-            api_client_id=api_client_id,
-            period_start=quota.last_reset_at,
-            action_type=action_type
-        )
+        current_usage = await self._get_current_usage(quota, action_type)
 
         remaining = max(0, quota.limit_amount - current_usage)
 
@@ -1,22 +1,143 @@
+import math
 import time
 import uuid
-from typing import Optional
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
 
 import redis.asyncio as aioredis
 
+from ....developer_platform.domain.models.api_key import APIKey as APIKeyDomainModel
+
+SLIDING_WINDOW = "sliding_window"
+GCRA = "gcra"
+
+# Generic Cell Rate Algorithm: a token bucket of `burst` requests, refilled at one
+# request per `emission_interval`, stored as a single "theoretical arrival time"
+# (TAT). Redis' clock is used so that all instances agree on the time. A denied
+# request does not change the TAT.
+#
+# KEYS[1]: The key holding the TAT, in milliseconds.
+# ARGV[1]: The emission interval (period / limit), in milliseconds.
+# ARGV[2]: The burst size, in requests.
+# ARGV[3]: The cost of the request, in requests.
+# Returns: {allowed (0 or 1), remaining, retry_after_ms, reset_after_ms}
+GCRA_SCRIPT = """
+-- Needed before TIME on Redis < 5, where scripts are not replicated by effects.
+if redis.replicate_commands then
+    redis.replicate_commands()
+end
+local emission_interval = tonumber(ARGV[1])
+local delay_tolerance = emission_interval * tonumber(ARGV[2])
+local increment = emission_interval * tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + tonumber(time[2]) / 1000
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+
+local new_tat = tat + increment
+local allow_at = new_tat - delay_tolerance
+if allow_at > now then
+    local remaining = math.floor((delay_tolerance - (tat - now)) / emission_interval + 1e-6)
+    return {0, math.max(remaining, 0), math.ceil(allow_at - now), math.ceil(tat - now)}
+end
+
+local reset_after = new_tat - now
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil(reset_after))
+local remaining = math.floor((delay_tolerance - reset_after) / emission_interval + 1e-6)
+return {1, math.max(remaining, 0), 0, math.ceil(reset_after)}
+"""
+
+
+@dataclass
+class RateLimitResult:
+    """The outcome of a rate limit check, for the client's response headers."""
+    allowed: bool
+    limit: int
+    remaining: int
+    # Seconds until the limit is fully replenished.
+    reset_after_seconds: int
+    # Seconds until a request would be allowed, if denied.
+    retry_after_seconds: Optional[int] = None
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """The `X-RateLimit-*` headers (and `Retry-After`, if denied) describing the result."""
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(self.reset_after_seconds),
+        }
+        if not self.allowed and self.retry_after_seconds is not None:
+            headers["Retry-After"] = str(self.retry_after_seconds)
+        return headers
+
+
+class _LocalDenials:
+    """
+    Remembers, in process, the keys Redis denied and until when.
+
+    A TAT only moves forward, so a key denied by Redis stays denied at least
+    until its retry time: repeated requests from a client over its limit are
+    rejected without a Redis round trip.
+    """
+
+    MAX_ENTRIES = 10000
+
+    def __init__(self):
+        # Key -> (monotonic times the key is denied until and fully replenished at, limit)
+        self._denied: Dict[str, Tuple[float, float, int]] = {}
+
+    def check(self, key: str, limit: int) -> Optional[RateLimitResult]:
+        entry = self._denied.get(key)
+        if entry is None:
+            return None
+        denied_until, reset_at, denied_limit = entry
+        now = time.monotonic()
+        if now >= denied_until or denied_limit != limit:
+            del self._denied[key]
+            return None
+        return RateLimitResult(
+            allowed=False,
+            limit=limit,
+            remaining=0,
+            reset_after_seconds=math.ceil(reset_at - now),
+            retry_after_seconds=math.ceil(denied_until - now),
+        )
+
+    def record(self, key: str, limit: int, retry_after_ms: int, reset_after_ms: int):
+        now = time.monotonic()
+        if len(self._denied) >= self.MAX_ENTRIES:
+            self._denied = {k: v for k, v in self._denied.items() if v[0] > now}
+            if len(self._denied) >= self.MAX_ENTRIES:
+                return
+        self._denied[key] = (now + retry_after_ms / 1000, now + reset_after_ms / 1000, limit)
+
+
+_local_denials = _LocalDenials()
+
 
 class RateLimitingService:
     """
     Manages and enforces API rate limits using Redis.
 
-    This implementation uses the sliding window log algorithm.
+    Two algorithms are available:
+    - `gcra` (default): the Generic Cell Rate Algorithm, a token bucket stored as
+      a single timestamp per client and updated by one atomic Lua script.
+    - `sliding_window`: the sliding window log algorithm, which stores a sorted
+      set member per request in the window.
     """
 
     def __init__(
         self,
         redis_client: aioredis.Redis,
         requests: int,
-        period_seconds: int
+        period_seconds: int,
+        algorithm: str = GCRA,
+        tier_limits: Optional[Dict[str, int]] = None,
+        local_precheck: bool = False,
     ):
         """
         Initializes the RateLimitingService.
@@ -25,10 +146,69 @@ class RateLimitingService:
             redis_client: An asynchronous Redis client instance.
             requests: The number of allowed requests in the time window.
             period_seconds: The time window duration in seconds.
+            algorithm: The rate limiting algorithm, `gcra` or `sliding_window`.
+            tier_limits: The number of allowed requests in the time window, by
+                rate limit tier; tiers not listed are allowed `requests`.
+            local_precheck: Whether to reject clients recently denied by Redis
+                without querying it again (`gcra` only).
         """
         self.redis = redis_client
         self.requests = requests
         self.period_seconds = period_seconds
+        self.algorithm = algorithm
+        self.tier_limits = tier_limits or {}
+        self.local_precheck = local_precheck
+        self._gcra_script = redis_client.register_script(GCRA_SCRIPT)
+
+    def get_limit(self, api_client: APIKeyDomainModel) -> int:
+        """Returns the number of requests allowed per period for an API client's tier."""
+        return self.tier_limits.get(api_client.permissions.rate_limit_tier, self.requests)
+
+    async def check_rate_limit(self, api_client: APIKeyDomainModel, cost: int = 1) -> RateLimitResult:
+        """
+        Counts a request of an API client against its tier's rate limit.
+
+        Args:
+            api_client: The authenticated API client.
+            cost: The number of requests this request counts as.
+
+        Returns:
+            Whether the request is allowed, with the state of the client's limit.
+        """
+        limit = self.get_limit(api_client)
+        if self.algorithm == SLIDING_WINDOW:
+            key = f"rate_limit:{api_client.id}"
+            current_requests = await self._log_request(key)
+            allowed = current_requests <= limit
+            return RateLimitResult(
+                allowed=allowed,
+                limit=limit,
+                remaining=max(limit - current_requests, 0),
+                reset_after_seconds=self.period_seconds,
+                retry_after_seconds=None if allowed else self.period_seconds,
+            )
+        return await self._check_gcra(f"rate_limit:gcra:{api_client.id}", limit, cost)
+
+    async def _check_gcra(self, key: str, limit: int, cost: int) -> RateLimitResult:
+        if self.local_precheck:
+            denied = _local_denials.check(key, limit)
+            if denied:
+                return denied
+
+        emission_interval_ms = self.period_seconds * 1000 / limit
+        allowed, remaining, retry_after_ms, reset_after_ms = await self._gcra_script(
+            keys=[key], args=[emission_interval_ms, limit, cost]
+        )
+        result = RateLimitResult(
+            allowed=bool(allowed),
+            limit=limit,
+            remaining=int(remaining),
+            reset_after_seconds=math.ceil(int(reset_after_ms) / 1000),
+            retry_after_seconds=None if allowed else math.ceil(int(retry_after_ms) / 1000),
+        )
+        if self.local_precheck and not allowed:
+            _local_denials.record(key, limit, int(retry_after_ms), int(reset_after_ms))
+        return result
 
     async def is_rate_limited(self, key: str) -> bool:
         """
@@ -46,6 +226,10 @@ class RateLimitingService:
             True if the request should be blocked (rate limit exceeded),
             False otherwise.
         """
+        return await self._log_request(key) > self.requests
+
+    async def _log_request(self, key: str) -> int:
+        """Logs a request in the sliding window of a key, and returns the number of requests in the window."""
         now = time.time()
         window_start = now - self.period_seconds
 
@@ -63,6 +247,4 @@ class RateLimitingService:
 
             results = await pipe.execute()
 
-        current_requests = results[2]
-
-        return current_requests > self.requests
\ No newline at end of file
+        return results[2]
@@ -6,6 +6,7 @@ from typing import List, Optional
 from ....developer_platform.api.schemas import usage_schemas
 from ....developer_platform.domain.models.usage import APIUsageRecord
 from ....developer_platform.domain.repositories.usage_repository import IUsageRepository
+from ....developer_platform.infrastructure.database.usage_ingestion import UsageIngestionBuffer
 
 
 class UsageTrackingService:
@@ -13,14 +14,16 @@ class UsageTrackingService:
     Handles business logic for recording API calls and generating usage summaries.
     """
 
-    def __init__(self, usage_repo: IUsageRepository):
+    def __init__(self, usage_repo: IUsageRepository, usage_buffer: Optional[UsageIngestionBuffer] = None):
         """
         Initializes the UsageTrackingService.
 
         Args:
             usage_repo: The repository for persisting and querying usage data.
+            usage_buffer: The buffer writing usage records in batches, if any.
         """
         self.usage_repo = usage_repo
+        self.usage_buffer = usage_buffer
 
     async def record_api_call(
         self,
@@ -33,6 +36,9 @@ class UsageTrackingService:
         """
         Creates and persists a record of an API call.
 
+        With the usage ingestion buffer, the record is written asynchronously,
+        in a batch, outside of the request's database session.
+
         Args:
             api_client_id: The ID of the API key used for the call.
             user_id: The ID of the user associated with the API key.
@@ -48,7 +54,10 @@ class UsageTrackingService:
             cost=cost,
             is_successful=is_successful,
         )
-        await self.usage_repo.add_record(usage_record)
+        if self.usage_buffer and self.usage_buffer.enabled:
+            self.usage_buffer.submit(usage_record)
+        else:
+            await self.usage_repo.add_record(usage_record)
 
     async def get_usage_summary(
         self, api_client_id: uuid.UUID, user_id: uuid.UUID, start_date: date, end_date: date
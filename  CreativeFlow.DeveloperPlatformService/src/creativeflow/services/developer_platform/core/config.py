@@ -4,6 +4,8 @@ from environment variables or .env files.
 """
 
 from functools import lru_cache
+from typing import Dict, Optional
+
 from pydantic import HttpUrl
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -33,10 +35,46 @@ class Settings(BaseSettings):
     # Cache/Rate Limiting Configuration
     REDIS_URL: str = "redis://localhost:6379/0"
 
+    # Verified API Key Cache
+    API_KEY_CACHE_ENABLED: bool = True
+    API_KEY_CACHE_TTL_SECONDS: int = 60
+    API_KEY_CACHE_MAX_ENTRIES: int = 10000
+    # Required for the cache to be enabled; generate a random value per deployment.
+    API_KEY_CACHE_HMAC_SECRET_KEY: Optional[str] = None
+    API_KEY_CACHE_INVALIDATION_CHANNEL: str = "devplat:apikey:invalidate"
+
+    # Quota Usage Counters
+    QUOTA_COUNTERS_ENABLED: bool = True
+    # Units reserved by a request that never completes are released after this delay.
+    QUOTA_RESERVATION_TTL_SECONDS: int = 120
+    QUOTA_RECONCILE_INTERVAL_SECONDS: int = 30
+
+    # Usage Ingestion
+    USAGE_INGESTION_BUFFERED: bool = True
+    USAGE_FLUSH_BATCH_SIZE: int = 500
+    USAGE_FLUSH_INTERVAL_MS: int = 1000
+    USAGE_BUFFER_CAPACITY: int = 50000
+    # Journal of unwritten usage records; must be on persistent storage for at-least-once delivery.
+    USAGE_SPILL_DIR: str = "/var/lib/creativeflow/developer-platform/usage-spill"
+
+    # Usage Partitioning and Retention
+    # Days of usage records kept; must cover the longest quota period, as quota counters are seeded from them.
+    USAGE_RETENTION_DAYS: int = 45
+    USAGE_HOURLY_ROLLUP_RETENTION_DAYS: int = 90
+    # Daily partitions of the usage records created ahead of time.
+    USAGE_PARTITION_PREMAKE_DAYS: int = 7
+    USAGE_PARTITION_MAINTENANCE_INTERVAL_SECONDS: int = 3600
+
     # Application Behavior
     LOG_LEVEL: str = "INFO"
     DEFAULT_RATE_LIMIT_REQUESTS: int = 100
     DEFAULT_RATE_LIMIT_PERIOD_SECONDS: int = 60
+    # "gcra" (token bucket, one Redis key per client) or "sliding_window" (one sorted set member per request)
+    RATE_LIMIT_ALGORITHM: str = "gcra"
+    # Requests per DEFAULT_RATE_LIMIT_PERIOD_SECONDS by API key rate limit tier; other tiers get DEFAULT_RATE_LIMIT_REQUESTS.
+    RATE_LIMIT_TIERS: Dict[str, int] = {"pro": 600, "enterprise": 3000}
+    # Reject clients recently denied by Redis without querying it again.
+    RATE_LIMIT_LOCAL_PRECHECK: bool = True
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -78,8 +78,12 @@ class RateLimitExceededError(AppException):
         self,
         detail: str = "Rate limit exceeded.",
         retry_after: int | None = None,
+        headers: Dict[str, Any] | None = None,
     ) -> None:
-        headers = {"Retry-After": str(retry_after)} if retry_after else None
+        headers = dict(headers or {})
+        if retry_after:
+            headers["Retry-After"] = str(retry_after)
+        headers = headers or None
         super().__init__(
             status_code=HTTP_429_TOO_MANY_REQUESTS, detail=detail, headers=headers
         )
@@ -17,6 +17,7 @@ class APIKeyPermissions(BaseModel):
     can_read_assets: bool = Field(True, description="Allows retrieving asset details and lists.")
     can_manage_assets: bool = Field(False, description="Allows uploading or modifying assets.")
     can_read_user_info: bool = Field(False, description="Allows retrieving user/team information.")
+    rate_limit_tier: str = Field("standard", description="The rate limit tier of the key, set by the platform, not by developers.")
     
     class Config:
         frozen = True # Permissions should be treated as an immutable value object
@@ -40,6 +41,11 @@ class APIKey(BaseModel):
     class Config:
         from_attributes = True
 
+    @property
+    def rate_limit_tier(self) -> str:
+        """The rate limit tier of the key."""
+        return self.permissions.rate_limit_tier
+
     def revoke(self) -> None:
         """
         Marks the API key as inactive and records the revocation time.
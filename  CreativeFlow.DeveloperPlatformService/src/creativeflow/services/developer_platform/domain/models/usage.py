@@ -37,8 +37,8 @@ class Quota(BaseModel):
     """
 
     Entity representing a usage quota for a specific API client.
-    The current usage is not stored here but calculated on-demand from
-    APIUsageRecord entities.
+    The current usage is tracked by counters; `used_amount` is their last
+    value reconciled to the data store, for the period `used_period_key`.
     """
     id: UUID = Field(default_factory=uuid4)
     api_client_id: UUID
@@ -46,6 +46,8 @@ class Quota(BaseModel):
     limit_amount: int
     period: QuotaPeriod
     last_reset_at: datetime
+    used_amount: Optional[int] = Field(None, description="Units used in the period `used_period_key`, as last reconciled; None if never reconciled.")
+    used_period_key: Optional[int] = Field(None, description="The Unix time the period counted by `used_amount` started at.")
 
     class Config:
         from_attributes = True
\ No newline at end of file
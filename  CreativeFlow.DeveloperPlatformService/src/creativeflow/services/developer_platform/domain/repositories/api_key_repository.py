@@ -1,4 +1,4 @@
-from typing import List, Optional, Protocol, Tuple
+from typing import Callable, List, Optional, Protocol, Tuple
 from uuid import UUID
 
 from ..models.api_key import APIKey
@@ -70,4 +70,13 @@ class IApiKeyRepository(Protocol):
         Returns:
             The updated APIKey domain model instance.
         """
+        ...
+
+    def on_commit(self, callback: Callable[[], None]) -> None:
+        """
+        Registers a callback run once the current transaction has committed.
+
+        Args:
+            callback: The function to call after the commit; it is not called on rollback.
+        """
         ...
\ No newline at end of file
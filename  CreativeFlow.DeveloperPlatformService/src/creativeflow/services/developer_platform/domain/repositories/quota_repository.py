@@ -33,4 +33,15 @@ class IQuotaRepository(Protocol):
             A Quota domain model instance if a specific quota is configured,
             otherwise None.
         """
+        ...
+
+    async def record_used_amount(self, api_client_id: UUID, period_key: int, used_amount: int) -> None:
+        """
+        Stores the usage counter of a client's quota period, if it is still the current period.
+
+        Args:
+            api_client_id: The UUID of the API client (from the APIKey).
+            period_key: The Unix time (in whole seconds) the quota period started at.
+            used_amount: The units used in the period.
+        """
         ...
\ No newline at end of file
@@ -1,6 +1,6 @@
 from datetime import date
 from decimal import Decimal
-from typing import List, Optional, Protocol
+from typing import List, Optional, Protocol, Sequence
 from uuid import UUID
 
 from ..models.usage import APIUsageRecord
@@ -22,6 +22,19 @@ class IUsageRepository(Protocol):
         """
         ...
 
+    async def add_records(self, usage_records: Sequence[APIUsageRecord]) -> int:
+        """
+        Adds a batch of API usage records to the data store, skipping those
+        already stored, and updates the usage rollups with them.
+
+        Args:
+            usage_records: The APIUsageRecord domain model instances to persist.
+
+        Returns:
+            The number of records added.
+        """
+        ...
+
     async def get_summary_for_client(
         self, api_client_id: UUID, start_date: date, end_date: date
     ) -> List[UsageSummaryDataPoint]:
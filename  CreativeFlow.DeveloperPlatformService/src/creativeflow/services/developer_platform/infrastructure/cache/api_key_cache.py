@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of verified API keys, so that authenticating a request does not run bcrypt.
+
+Validating an API key looks it up by its prefix and verifies its secret against
+a bcrypt hash, which is slow by design and runs on the event loop. Once a
+presented key has been verified, the resolved `APIKey` is cached for
+`API_KEY_CACHE_TTL_SECONDS` in two tiers:
+
+- an in-process LRU of at most `API_KEY_CACHE_MAX_ENTRIES` keys, and
+- Redis, shared by all instances (`devplat:apikey:verified:<digest>`).
+
+Entries are keyed by an HMAC-SHA256 digest of the full presented key under
+`API_KEY_CACHE_HMAC_SECRET_KEY`: the plaintext key is never stored, and the
+digest of a key cannot be computed without the secret. The cache stays disabled
+while the secret is unset. Only verified, active keys are cached, and without
+their bcrypt `secret_hash`, which a cache hit does not need: cached keys carry
+an empty placeholder instead.
+
+When a key is revoked or updated, once the change is committed, its Redis
+entries are deleted and its ID is published on `API_KEY_CACHE_INVALIDATION_CHANNEL`;
+every instance then drops the key from its LRU. Invalidations also increment a
+generation counter in Redis (`devplat:apikey:generation`): a key is only cached
+if the generation has not changed since before it was read from the database,
+so a validation racing with a revocation cannot cache the key again. The TTL
+bounds how long a missed invalidation, e.g. while an instance is reconnecting
+to Redis, can go unnoticed.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Set
+from uuid import UUID
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from core.config import Settings
+from domain.models.api_key import APIKey
+
+logger = logging.getLogger(__name__)
+
+# Delay before resubscribing to the invalidation channel after a Redis error.
+RESUBSCRIBE_DELAY_SECONDS = 1
+
+GENERATION_KEY = "devplat:apikey:generation"
+
+# Stands in for the secret hash, which is never cached.
+OMITTED_SECRET_HASH = ""
+
+# Caches a key only if no invalidation happened since the generation was read.
+# KEYS: generation, entry, digests of the key; ARGV: expected generation, entry, digest, TTL.
+_SET_IF_GENERATION_SCRIPT = """
+if (redis.call('GET', KEYS[1]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[4])
+redis.call('SADD', KEYS[3], ARGV[3])
+redis.call('EXPIRE', KEYS[3], ARGV[4])
+return 1
+"""
+
+
+class _CachedKey(NamedTuple):
+    api_key: APIKey
+    expires_at: float
+
+
+class VerifiedKeyCache:
+    """
+    Two-tier (in-process LRU and Redis) cache of verified API keys.
+
+    The cache is disabled, and every lookup misses, until `start` is called.
+    """
+
+    def __init__(self):
+        self._redis: Optional[redis.Redis] = None
+        self._secret = b""
+        self._ttl_seconds = 0
+        self._max_entries = 0
+        self._channel = ""
+        self._local: "OrderedDict[str, _CachedKey]" = OrderedDict()
+        # Digests cached locally for each API key ID, for invalidation.
+        self._digests_by_key: Dict[UUID, Set[str]] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._set_if_generation = None
+        # Invalidations scheduled when a transaction commits.
+        self._pending_invalidations: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self._ttl_seconds > 0
+
+    async def start(self, redis_client: redis.Redis, settings: Settings):
+        """
+        Enables the cache and subscribes to invalidations from the other instances.
+
+        Args:
+            redis_client: The connected Redis client.
+            settings: The application settings.
+        """
+        if not settings.API_KEY_CACHE_ENABLED or settings.API_KEY_CACHE_TTL_SECONDS <= 0:
+            logger.info("API key verification cache is disabled.")
+            return
+        if not settings.API_KEY_CACHE_HMAC_SECRET_KEY:
+            logger.warning("API key verification cache is disabled: API_KEY_CACHE_HMAC_SECRET_KEY is not set.")
+            return
+        self._redis = redis_client
+        self._set_if_generation = redis_client.register_script(_SET_IF_GENERATION_SCRIPT)
+        self._secret = settings.API_KEY_CACHE_HMAC_SECRET_KEY.encode("utf-8")
+        self._ttl_seconds = settings.API_KEY_CACHE_TTL_SECONDS
+        self._max_entries = settings.API_KEY_CACHE_MAX_ENTRIES
+        self._channel = settings.API_KEY_CACHE_INVALIDATION_CHANNEL
+        self._listener = asyncio.create_task(self._listen())
+        logger.info(
+            "API key verification cache started (TTL %ss, %s local entries).",
+            self._ttl_seconds,
+            self._max_entries,
+        )
+
+    async def stop(self):
+        """Stops listening for invalidations and disables the cache."""
+        if self._pending_invalidations:
+            await asyncio.gather(*self._pending_invalidations, return_exceptions=True)
+        if self._listener:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        self._ttl_seconds = 0
+        self._clear_local()
+
+    def _digest(self, key_value: str) -> str:
+        return hmac.new(self._secret, key_value.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    @staticmethod
+    def _entry_key(digest: str) -> str:
+        return f"devplat:apikey:verified:{digest}"
+
+    @staticmethod
+    def _digests_key(api_key_id: UUID) -> str:
+        return f"devplat:apikey:digests:{api_key_id}"
+
+    async def get(self, key_value: str) -> Optional[APIKey]:
+        """
+        Returns the cached API key for a presented key value, if it was verified recently.
+
+        Args:
+            key_value: The full API key string presented by the client.
+
+        Returns:
+            A copy of the cached APIKey domain model, with `secret_hash` set to
+            `OMITTED_SECRET_HASH`, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+        digest = self._digest(key_value)
+        cached = self._local.get(digest)
+        if cached is not None:
+            if cached.expires_at > time.monotonic():
+                self._local.move_to_end(digest)
+                return cached.api_key.model_copy(deep=True)
+            self._evict_digest(digest)
+
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.get(self._entry_key(digest))
+                pipe.pttl(self._entry_key(digest))
+                data, ttl_ms = await pipe.execute()
+        except RedisError as e:
+            logger.warning("API key cache lookup in Redis failed: %s", e)
+            return None
+        if data is None or ttl_ms <= 0:
+            return None
+
+        api_key = APIKey.model_validate({**json.loads(data), "secret_hash": OMITTED_SECRET_HASH})
+        self._store_local(digest, api_key, ttl_ms / 1000)
+        return api_key.model_copy(deep=True)
+
+    async def generation(self) -> Optional[int]:
+        """
+        Returns the current invalidation generation, to be read before an API key is loaded.
+
+        Returns:
+            The generation to pass to `set`, or None if the key must not be cached.
+        """
+        if not self.enabled:
+            return None
+        try:
+            return int(await self._redis.get(GENERATION_KEY) or 0)
+        except RedisError as e:
+            logger.warning("API key cache generation lookup in Redis failed: %s", e)
+            return None
+
+    async def set(self, key_value: str, api_key: APIKey, generation: Optional[int]):
+        """
+        Caches an API key that has just been verified against the presented key value.
+
+        The key is not cached if any API key was invalidated since `generation` was read.
+
+        Args:
+            key_value: The full API key string presented by the client.
+            api_key: The verified, active APIKey domain model.
+            generation: The generation returned by `generation` before the key was loaded.
+        """
+        if not self.enabled or not api_key.is_active or generation is None:
+            return
+        digest = self._digest(key_value)
+        api_key = api_key.model_copy(update={"secret_hash": OMITTED_SECRET_HASH}, deep=True)
+        # Stored locally first, so that an invalidation published after the check below evicts it.
+        self._store_local(digest, api_key, self._ttl_seconds)
+        try:
+            cached = await self._set_if_generation(
+                keys=[GENERATION_KEY, self._entry_key(digest), self._digests_key(api_key.id)],
+                args=[generation, api_key.model_dump_json(exclude={"secret_hash"}), digest, self._ttl_seconds],
+            )
+        except RedisError as e:
+            logger.warning("Failed to cache API key %s in Redis: %s", api_key.id, e)
+            cached = 0
+        if not cached:
+            self._evict_digest(digest)
+
+    def invalidate_on_commit(self, api_key_id: UUID):
+        """
+        Schedules the invalidation of an API key from a transaction's after-commit hook.
+
+        Args:
+            api_key_id: The ID of the API key.
+        """
+        if not self.enabled:
+            return
+        task = asyncio.get_running_loop().create_task(self.invalidate(api_key_id))
+        self._pending_invalidations.add(task)
+        task.add_done_callback(self._pending_invalidations.discard)
+
+    async def invalidate(self, api_key_id: UUID):
+        """
+        Drops an API key from the cache of every instance, after it was revoked or updated.
+
+        Args:
+            api_key_id: The ID of the API key.
+        """
+        if not self.enabled:
+            return
+        self._evict_key(api_key_id)
+        try:
+            # Incremented first: a validation that read the key before this cannot cache it anymore.
+            await self._redis.incr(GENERATION_KEY)
+            digests = await self._redis.smembers(self._digests_key(api_key_id))
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.delete(self._digests_key(api_key_id), *(self._entry_key(digest) for digest in digests))
+                pipe.publish(self._channel, str(api_key_id))
+                await pipe.execute()
+        except RedisError as e:
+            logger.error("Failed to invalidate cached API key %s in Redis: %s", api_key_id, e)
+
+    def _store_local(self, digest: str, api_key: APIKey, ttl_seconds: float):
+        self._evict_digest(digest)
+        self._local[digest] = _CachedKey(api_key, time.monotonic() + min(ttl_seconds, self._ttl_seconds))
+        self._digests_by_key.setdefault(api_key.id, set()).add(digest)
+        while len(self._local) > self._max_entries:
+            self._evict_digest(next(iter(self._local)))
+
+    def _evict_digest(self, digest: str):
+        cached = self._local.pop(digest, None)
+        if cached is not None:
+            digests = self._digests_by_key.get(cached.api_key.id)
+            if digests is not None:
+                digests.discard(digest)
+                if not digests:
+                    del self._digests_by_key[cached.api_key.id]
+
+    def _evict_key(self, api_key_id: UUID):
+        for digest in self._digests_by_key.pop(api_key_id, set()):
+            self._local.pop(digest, None)
+
+    def _clear_local(self):
+        self._local.clear()
+        self._digests_by_key.clear()
+
+    async def _listen(self):
+        """Drops the API keys invalidated by other instances from the local LRU."""
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self._channel)
+                # Invalidations may have been missed while unsubscribed.
+                self._clear_local()
+                async for message in pubsub.listen():
+                    try:
+                        self._evict_key(UUID(message["data"]))
+                    except ValueError:
+                        logger.warning("Ignoring malformed API key invalidation: %r", message["data"])
+            except RedisError as e:
+                logger.warning("API key invalidation subscription failed, resubscribing: %s", e)
+                await asyncio.sleep(RESUBSCRIBE_DELAY_SECONDS)
+            finally:
+                await pubsub.reset()
+
+
+# Create a singleton instance
+api_key_cache = VerifiedKeyCache()
+
+
+def get_api_key_cache() -> VerifiedKeyCache:
+    """FastAPI dependency to get the verified API key cache."""
+    return api_key_cache
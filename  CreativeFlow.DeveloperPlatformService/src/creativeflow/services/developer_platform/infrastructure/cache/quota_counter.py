@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+Redis usage counters for quota enforcement, reconciled to Postgres.
+
+Each quota period of an API client has a counter hash in Redis,
+`quota:<api_client_id>:<period_key>`, with two fields:
+
+- `used`: the units consumed by completed, successful actions, and
+- `reserved`: the units held by actions in flight.
+
+An action reserves its cost before it runs, in one atomic script that checks
+`used + reserved + cost` against the limit, and commits the reservation once
+it completes: the units are moved to `used` if it succeeded, and released
+otherwise. Each reservation is also recorded, with an expiry time, in
+`quota:<api_client_id>:<period_key>:reservations`, so that the units of a
+request that never commits (e.g. a crashed instance) are released after
+`QUOTA_RESERVATION_TTL_SECONDS`.
+
+A counter is seeded from Postgres the first time it is used. The
+`QuotaUsageReconciler` periodically writes the `used` counters that changed
+back to the `quotas` table, so that a counter lost from Redis is re-seeded
+close to its last value instead of recounting usage records.
+"""
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+from uuid import UUID
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import Settings
+from infrastructure.database.repositories.sqlalchemy_quota_repository import (
+    SqlAlchemyQuotaRepository,
+)
+
+logger = logging.getLogger(__name__)
+
+DIRTY_COUNTERS_KEY = "quota:dirty"
+# Number of changed counters written to Postgres per transaction.
+RECONCILE_BATCH_SIZE = 500
+
+_REPLICATE_COMMANDS = """
+if redis.replicate_commands then
+    redis.replicate_commands()
+end
+"""
+
+# KEYS[1]: The counter hash. KEYS[2]: The reservations sorted set.
+# ARGV[1]: The limit. ARGV[2]: The cost. ARGV[3]: The reservation ID. ARGV[4]: The reservation TTL, in milliseconds.
+# Returns: 1 if reserved, 0 if the quota would be exceeded, -1 if the counter must be seeded first.
+RESERVE_SCRIPT = _REPLICATE_COMMANDS + """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+-- Release the reservations of requests that never committed.
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)
+if #expired > 0 then
+    local released = 0
+    for _, member in ipairs(expired) do
+        released = released + tonumber(string.match(member, ':(%d+)$'))
+    end
+    redis.call('HINCRBY', KEYS[1], 'reserved', -released)
+    redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+end
+
+local cost = tonumber(ARGV[2])
+local counters = redis.call('HMGET', KEYS[1], 'used', 'reserved')
+if tonumber(counters[1] or 0) + tonumber(counters[2] or 0) + cost > tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('HINCRBY', KEYS[1], 'reserved', cost)
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[4]), ARGV[3] .. ':' .. cost)
+-- Kept as long as the counter, so that expired reservations are always released.
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl > 0 then
+    redis.call('PEXPIRE', KEYS[2], ttl)
+end
+return 1
+"""
+
+# KEYS[1]: The counter hash. KEYS[2]: The reservations sorted set. KEYS[3]: The set of changed counters.
+# ARGV[1]: The reservation member. ARGV[2]: The cost. ARGV[3]: 1 if the units were consumed. ARGV[4]: The counter ID.
+COMMIT_SCRIPT = """
+local cost = tonumber(ARGV[2])
+-- An expired reservation has already been released.
+if redis.call('ZREM', KEYS[2], ARGV[1]) == 1 then
+    redis.call('HINCRBY', KEYS[1], 'reserved', -cost)
+end
+if ARGV[3] == '1' and redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HINCRBY', KEYS[1], 'used', cost)
+    redis.call('SADD', KEYS[3], ARGV[4])
+end
+return 1
+"""
+
+
+@dataclass
+class QuotaReservation:
+    """Units of an API client's quota held for an action in flight."""
+    api_client_id: UUID
+    period_key: int
+    reservation_id: str
+    cost: int
+
+
+class RedisQuotaCounter:
+    """
+    Atomic per-client, per-period usage counters with reserve/commit semantics.
+
+    The counter is disabled until `start` is called.
+    """
+
+    def __init__(self):
+        self._redis: Optional[redis.Redis] = None
+        self._reservation_ttl_ms = 0
+        self._reserve_script = None
+        self._commit_script = None
+        self.reconciler: Optional["QuotaUsageReconciler"] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._redis is not None
+
+    async def start(self, redis_client: redis.Redis, settings: Settings, session_factory: Callable[[], AsyncSession]):
+        """
+        Enables the counters and starts reconciling them to Postgres.
+
+        Args:
+            redis_client: The connected Redis client.
+            settings: The application settings.
+            session_factory: Creates the database sessions used for reconciliation.
+        """
+        if not settings.QUOTA_COUNTERS_ENABLED:
+            logger.info("Quota counters are disabled; quotas are checked against usage records.")
+            return
+        self._redis = redis_client
+        self._reservation_ttl_ms = settings.QUOTA_RESERVATION_TTL_SECONDS * 1000
+        self._reserve_script = redis_client.register_script(RESERVE_SCRIPT)
+        self._commit_script = redis_client.register_script(COMMIT_SCRIPT)
+        self.reconciler = QuotaUsageReconciler(self, session_factory, settings.QUOTA_RECONCILE_INTERVAL_SECONDS)
+        self.reconciler.start()
+        logger.info("Quota counters started.")
+
+    async def stop(self):
+        """Writes the changed counters to Postgres and disables the counters."""
+        if self.reconciler:
+            await self.reconciler.stop()
+            self.reconciler = None
+        self._redis = None
+
+    @staticmethod
+    def _counter_id(api_client_id: UUID, period_key: int) -> str:
+        return f"{api_client_id}:{period_key}"
+
+    @staticmethod
+    def _counter_key(counter_id: str) -> str:
+        return f"quota:{counter_id}"
+
+    async def seed(self, api_client_id: UUID, period_key: int, used: int, ttl_seconds: int):
+        """
+        Creates the counter of a quota period, unless another request already did.
+
+        Args:
+            api_client_id: The ID of the API client.
+            period_key: Identifies the quota period (the Unix time it started at).
+            used: The units already consumed in the period.
+            ttl_seconds: How long to keep the counter.
+        """
+        key = self._counter_key(self._counter_id(api_client_id, period_key))
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hsetnx(key, "used", used)
+            pipe.hsetnx(key, "reserved", 0)
+            pipe.expire(key, ttl_seconds)
+            await pipe.execute()
+
+    async def get_usage(self, api_client_id: UUID, period_key: int) -> Optional[Tuple[int, int]]:
+        """
+        Returns the used and reserved units of a quota period, or None if its counter is not seeded.
+        """
+        used, reserved = await self._redis.hmget(
+            self._counter_key(self._counter_id(api_client_id, period_key)), "used", "reserved"
+        )
+        if used is None:
+            return None
+        return int(used), int(reserved or 0)
+
+    async def reserve(self, api_client_id: UUID, period_key: int, limit: int, cost: int) -> Optional[QuotaReservation]:
+        """
+        Reserves units of a quota period if they are available.
+
+        Returns:
+            The reservation, or None if it would exceed the limit.
+
+        Raises:
+            LookupError: If the counter of the period is not seeded.
+        """
+        counter_key = self._counter_key(self._counter_id(api_client_id, period_key))
+        reservation_id = uuid.uuid4().hex
+        result = await self._reserve_script(
+            keys=[counter_key, f"{counter_key}:reservations"],
+            args=[limit, cost, reservation_id, self._reservation_ttl_ms],
+        )
+        if result == -1:
+            raise LookupError(f"Quota counter {counter_key} is not seeded.")
+        if result == 0:
+            return None
+        return QuotaReservation(api_client_id, period_key, reservation_id, cost)
+
+    async def commit(self, reservation: QuotaReservation, consumed: bool):
+        """
+        Completes a reservation: its units are counted as used if consumed, and released otherwise.
+        """
+        counter_id = self._counter_id(reservation.api_client_id, reservation.period_key)
+        counter_key = self._counter_key(counter_id)
+        await self._commit_script(
+            keys=[counter_key, f"{counter_key}:reservations", DIRTY_COUNTERS_KEY],
+            args=[
+                f"{reservation.reservation_id}:{reservation.cost}",
+                reservation.cost,
+                1 if consumed else 0,
+                counter_id,
+            ],
+        )
+
+    async def pop_changed(self, count: int) -> List[Tuple[UUID, int, int]]:
+        """
+        Takes up to `count` counters changed since they were last reconciled.
+
+        Returns:
+            A list of (api_client_id, period_key, used) tuples.
+        """
+        counter_ids = await self._redis.spop(DIRTY_COUNTERS_KEY, count)
+        if not counter_ids:
+            return []
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for counter_id in counter_ids:
+                pipe.hget(self._counter_key(counter_id), "used")
+            used_values = await pipe.execute()
+
+        changed = []
+        for counter_id, used in zip(counter_ids, used_values):
+            if used is not None:
+                api_client_id, period_key = counter_id.split(":")
+                changed.append((UUID(api_client_id), int(period_key), int(used)))
+        return changed
+
+    async def mark_changed(self, counters: List[Tuple[UUID, int, int]]):
+        """Marks counters as changed again, after failing to reconcile them."""
+        if counters:
+            await self._redis.sadd(
+                DIRTY_COUNTERS_KEY, *(self._counter_id(api_client_id, period_key) for api_client_id, period_key, _ in counters)
+            )
+
+
+class QuotaUsageReconciler:
+    """
+    Periodically writes the changed usage counters to the `quotas` table.
+    """
+
+    def __init__(self, counter: RedisQuotaCounter, session_factory: Callable[[], AsyncSession], interval_seconds: int):
+        self.counter = counter
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.reconcile()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            await self.reconcile()
+
+    async def reconcile(self) -> int:
+        """
+        Writes the counters changed since the last run to Postgres.
+
+        Returns:
+            The number of counters written.
+        """
+        written = 0
+        while True:
+            try:
+                changed = await self.counter.pop_changed(RECONCILE_BATCH_SIZE)
+            except RedisError as e:
+                logger.error("Failed to read the changed quota counters: %s", e)
+                return written
+            if not changed:
+                return written
+            try:
+                async with self.session_factory() as session:
+                    quota_repo = SqlAlchemyQuotaRepository(db_session=session)
+                    for api_client_id, period_key, used in changed:
+                        await quota_repo.record_used_amount(api_client_id, period_key, used)
+                    await session.commit()
+            except Exception as e:
+                logger.error("Failed to reconcile %s quota counter(s) to Postgres: %s", len(changed), e, exc_info=True)
+                try:
+                    await self.counter.mark_changed(changed)
+                except RedisError:
+                    pass
+                return written
+            written += len(changed)
+            logger.debug("Reconciled %s quota counter(s) to Postgres.", len(changed))
+
+
+# Create a singleton instance
+quota_counter = RedisQuotaCounter()
+
+
+def get_quota_counter() -> RedisQuotaCounter:
+    """FastAPI dependency to get the quota usage counters."""
+    return quota_counter
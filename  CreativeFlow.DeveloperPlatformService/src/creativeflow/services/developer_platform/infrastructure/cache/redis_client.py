@@ -0,0 +1,63 @@
+import logging
+from typing import Optional
+
+import redis.asyncio as redis
+
+from core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class RedisClient:
+    """Manages a connection pool to a Redis server."""
+
+    def __init__(self):
+        self.client: Optional[redis.Redis] = None
+
+    async def connect(self, redis_url: Optional[str] = None):
+        """
+        Establishes a connection pool to Redis.
+
+        Args:
+            redis_url: The Redis URL; defaults to the `REDIS_URL` setting.
+        """
+        if self.client:
+            logger.warning("Redis client already connected.")
+            return
+
+        try:
+            self.client = redis.from_url(
+                redis_url or get_settings().REDIS_URL, encoding="utf-8", decode_responses=True
+            )
+            await self.client.ping()
+            logger.info("Successfully connected to Redis.")
+        except Exception as e:
+            logger.critical(f"Failed to connect to Redis: {e}", exc_info=True)
+            raise
+
+    async def close(self):
+        """Closes the Redis connection pool."""
+        if self.client:
+            await self.client.close()
+            self.client = None
+            logger.info("Redis connection pool closed.")
+
+    def get_client(self) -> redis.Redis:
+        """
+        Returns the active Redis client instance.
+
+        Raises:
+            ConnectionError: If the client is not connected.
+        """
+        if not self.client:
+            raise ConnectionError("Redis client is not connected.")
+        return self.client
+
+
+# Create a singleton instance
+redis_client = RedisClient()
+
+
+def get_redis_client_dependency() -> redis.Redis:
+    """FastAPI dependency to get the connected Redis client."""
+    return redis_client.get_client()
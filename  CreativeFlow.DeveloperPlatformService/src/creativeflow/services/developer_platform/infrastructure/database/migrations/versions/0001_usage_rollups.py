@@ -0,0 +1,94 @@
+"""create the usage rollups and backfill them from the usage records
+
+Usage summaries are served from api_usage_daily_rollups, which the service
+only updates for the records it writes. The rollups of the records already
+stored are computed here, so that summaries cover the usage before the rollout.
+
+The backfill overwrites the rollup of every bucket that has records with their
+count, which is the value the service maintains, so running it again (or after
+the new version started writing records) does not double count.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _backfill(table: str, bucket_column: str, bucket_expression: str) -> None:
+    # The user owning a client never changes; the latest record's is taken.
+    op.execute(
+        f"""
+        INSERT INTO {table}
+            (id, api_client_id, user_id, endpoint, {bucket_column}, call_count, success_count, total_cost)
+        SELECT
+            gen_random_uuid(),
+            api_client_id,
+            (array_agg(user_id ORDER BY timestamp DESC))[1],
+            endpoint,
+            {bucket_expression},
+            count(*),
+            count(*) FILTER (WHERE is_successful),
+            coalesce(sum(cost), 0)
+        FROM api_usage_records
+        GROUP BY api_client_id, endpoint, {bucket_expression}
+        ON CONFLICT (api_client_id, endpoint, {bucket_column}) DO UPDATE SET
+            call_count = EXCLUDED.call_count,
+            success_count = EXCLUDED.success_count,
+            total_cost = EXCLUDED.total_cost
+        """
+    )
+
+
+def upgrade() -> None:
+    op.create_table('api_usage_hourly_rollups',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('api_client_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('endpoint', sa.String(length=255), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('call_count', sa.Integer(), nullable=False),
+    sa.Column('success_count', sa.Integer(), nullable=False),
+    sa.Column('total_cost', sa.Numeric(precision=14, scale=4), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('api_client_id', 'endpoint', 'bucket_start', name='uq_api_usage_hourly_rollups_bucket')
+    )
+    op.create_index(op.f('ix_api_usage_hourly_rollups_bucket_start'), 'api_usage_hourly_rollups', ['bucket_start'], unique=False)
+
+    op.create_table('api_usage_daily_rollups',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('api_client_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('endpoint', sa.String(length=255), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('call_count', sa.Integer(), nullable=False),
+    sa.Column('success_count', sa.Integer(), nullable=False),
+    sa.Column('total_cost', sa.Numeric(precision=14, scale=4), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('api_client_id', 'endpoint', 'day', name='uq_api_usage_daily_rollups_bucket')
+    )
+    op.create_index(op.f('ix_api_usage_daily_rollups_day'), 'api_usage_daily_rollups', ['day'], unique=False)
+
+    # Usage timestamps are recorded in UTC, naive or not.
+    _backfill(
+        'api_usage_daily_rollups', 'day', "(timestamp AT TIME ZONE 'UTC')::date"
+    )
+    _backfill(
+        'api_usage_hourly_rollups', 'bucket_start', "date_trunc('hour', timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_api_usage_daily_rollups_day'), table_name='api_usage_daily_rollups')
+    op.drop_table('api_usage_daily_rollups')
+    op.drop_index(op.f('ix_api_usage_hourly_rollups_bucket_start'), table_name='api_usage_hourly_rollups')
+    op.drop_table('api_usage_hourly_rollups')
@@ -0,0 +1,110 @@
+"""partition the usage records by day
+
+api_usage_records becomes range partitioned by timestamp, one partition per UTC
+day (api_usage_records_pYYYYMMDD) plus a default partition, with the primary key
+(id, timestamp). A table cannot be partitioned in place: the existing one is
+renamed, the partitioned table is created with a partition for each day that has
+records, and the records are copied into it.
+
+The copy holds the existing table locked: run this migration while the service
+is stopped. Partitions older than USAGE_RETENTION_DAYS are then dropped by the
+UsagePartitionManager; their usage is kept in the daily rollups (0001).
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 18:30:00.000000
+
+"""
+from datetime import date, datetime, time, timedelta, timezone
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+COLUMNS = "id, api_client_id, user_id, timestamp, endpoint, cost, is_successful"
+INDEXED_COLUMNS = ("api_client_id", "user_id", "timestamp", "endpoint")
+# Partitions created ahead of today, as USAGE_PARTITION_PREMAKE_DAYS does.
+PREMAKE_DAYS = 7
+
+
+def _day_start(day: date) -> str:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc).isoformat()
+
+
+def _create_indexes() -> None:
+    for column in INDEXED_COLUMNS:
+        op.create_index(op.f(f'ix_api_usage_records_{column}'), 'api_usage_records', [column], unique=False)
+
+
+def _rename_legacy_table(name: str) -> None:
+    """Renames the table and its indexes, whose names are taken by the new table's."""
+    op.execute(f"ALTER TABLE api_usage_records RENAME TO {name}")
+    op.execute(f"ALTER INDEX api_usage_records_pkey RENAME TO {name}_pkey")
+    for column in INDEXED_COLUMNS:
+        op.execute(f"ALTER INDEX IF EXISTS ix_api_usage_records_{column} RENAME TO ix_{name}_{column}")
+
+
+def upgrade() -> None:
+    _rename_legacy_table('api_usage_records_unpartitioned')
+
+    op.create_table('api_usage_records',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('api_client_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('endpoint', sa.String(length=255), nullable=False),
+    sa.Column('cost', sa.Numeric(precision=10, scale=4), nullable=True),
+    sa.Column('is_successful', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['api_client_id'], ['api_keys.id']),
+    sa.PrimaryKeyConstraint('id', 'timestamp', name='api_usage_records_pkey'),
+    postgresql_partition_by='RANGE (timestamp)'
+    )
+
+    days = set(
+        op.get_bind().execute(
+            sa.text("SELECT DISTINCT (timestamp AT TIME ZONE 'UTC')::date FROM api_usage_records_unpartitioned")
+        ).scalars()
+    )
+    today = datetime.now(timezone.utc).date()
+    days.update(today + timedelta(days=offset) for offset in range(PREMAKE_DAYS + 1))
+    for day in sorted(days):
+        op.execute(
+            f"CREATE TABLE api_usage_records_p{day:%Y%m%d} PARTITION OF api_usage_records "
+            f"FOR VALUES FROM ('{_day_start(day)}') TO ('{_day_start(day + timedelta(days=1))}')"
+        )
+    op.execute("CREATE TABLE api_usage_records_default PARTITION OF api_usage_records DEFAULT")
+
+    op.execute(
+        f"INSERT INTO api_usage_records ({COLUMNS}) SELECT {COLUMNS} FROM api_usage_records_unpartitioned"
+    )
+    op.drop_table('api_usage_records_unpartitioned')
+    # Created once the rows are in, which is faster than maintaining them during the copy.
+    _create_indexes()
+
+
+def downgrade() -> None:
+    _rename_legacy_table('api_usage_records_partitioned')
+
+    op.create_table('api_usage_records',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('api_client_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('endpoint', sa.String(length=255), nullable=False),
+    sa.Column('cost', sa.Numeric(precision=10, scale=4), nullable=True),
+    sa.Column('is_successful', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['api_client_id'], ['api_keys.id']),
+    sa.PrimaryKeyConstraint('id', name='api_usage_records_pkey')
+    )
+    op.execute(
+        f"INSERT INTO api_usage_records ({COLUMNS}) SELECT {COLUMNS} FROM api_usage_records_partitioned"
+    )
+    # Drops its partitions too.
+    op.drop_table('api_usage_records_partitioned')
+    _create_indexes()
@@ -3,5 +3,14 @@ from .api_key_model import APIKeyModel
 from .webhook_model import WebhookModel
 from .usage_model import UsageRecordModel
 from .quota_model import QuotaModel
+from .usage_rollup_model import UsageDailyRollupModel, UsageHourlyRollupModel
 
-__all__ = ["Base", "APIKeyModel", "WebhookModel", "UsageRecordModel", "QuotaModel"]
\ No newline at end of file
+__all__ = [
+    "Base",
+    "APIKeyModel",
+    "WebhookModel",
+    "UsageRecordModel",
+    "QuotaModel",
+    "UsageHourlyRollupModel",
+    "UsageDailyRollupModel",
+]
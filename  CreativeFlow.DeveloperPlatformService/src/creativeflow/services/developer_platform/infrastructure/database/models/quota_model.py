@@ -1,7 +1,8 @@
 from datetime import datetime
+from typing import Optional
 from uuid import UUID
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Integer, String
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -35,6 +36,10 @@ class QuotaModel(Base):
     last_reset_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=datetime.utcnow
     )
+    # Usage counter of a period, as last reconciled from Redis, and the period it counts
+    # (the Unix time it started at); a value of an earlier period is stale.
+    used_amount: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    used_period_key: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
     
     api_key = relationship("APIKeyModel", back_populates="quota")
 
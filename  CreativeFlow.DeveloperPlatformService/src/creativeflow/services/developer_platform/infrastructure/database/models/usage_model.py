@@ -15,9 +15,15 @@ class UsageRecordModel(Base):
 
     This table logs individual API calls made by developers for tracking,
     billing, and quota enforcement purposes.
+
+    The table is range partitioned by `timestamp`, one partition per UTC day
+    (`api_usage_records_pYYYYMMDD`), plus a default partition for records
+    outside them. Partitions are created ahead of time and dropped after
+    USAGE_RETENTION_DAYS by the `UsagePartitionManager`.
     """
 
     __tablename__ = "api_usage_records"
+    __table_args__ = {"postgresql_partition_by": "RANGE (timestamp)"}
 
     api_client_id: Mapped[UUID] = mapped_column(
         PG_UUID(as_uuid=True), ForeignKey("api_keys.id"), index=True
@@ -28,8 +34,10 @@ class UsageRecordModel(Base):
         index=True,
         nullable=False,
     )
+    # Part of the primary key, as the unique constraints of a partitioned table
+    # must include its partition key.
     timestamp: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), default=datetime.utcnow, index=True
+        DateTime(timezone=True), primary_key=True, default=datetime.utcnow, index=True
     )
     endpoint: Mapped[str] = mapped_column(String(255), index=True)
     cost: Mapped[Decimal] = mapped_column(Numeric(10, 4), nullable=True)
@@ -0,0 +1,70 @@
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from sqlalchemy import Date, DateTime, Integer, Numeric, String, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class UsageHourlyRollupModel(Base):
+    """
+    SQLAlchemy ORM model for the 'api_usage_hourly_rollups' table.
+
+    This table holds the API calls of each client and endpoint aggregated per
+    hour. It is updated in the same transaction as the usage records it
+    aggregates, and is kept for USAGE_HOURLY_ROLLUP_RETENTION_DAYS.
+    """
+
+    __tablename__ = "api_usage_hourly_rollups"
+    __table_args__ = (
+        UniqueConstraint("api_client_id", "endpoint", "bucket_start", name="uq_api_usage_hourly_rollups_bucket"),
+    )
+
+    api_client_id: Mapped[UUID] = mapped_column(PG_UUID(as_uuid=True), nullable=False)
+    user_id: Mapped[UUID] = mapped_column(PG_UUID(as_uuid=True), nullable=False)
+    endpoint: Mapped[str] = mapped_column(String(255), nullable=False)
+    # Start of the hour, in UTC.
+    bucket_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+    call_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    success_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total_cost: Mapped[Decimal] = mapped_column(Numeric(14, 4), nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return (
+            f"<UsageHourlyRollupModel(api_client_id='{self.api_client_id}', endpoint='{self.endpoint}', "
+            f"bucket_start='{self.bucket_start}', call_count={self.call_count})>"
+        )
+
+
+class UsageDailyRollupModel(Base):
+    """
+    SQLAlchemy ORM model for the 'api_usage_daily_rollups' table.
+
+    This table holds the API calls of each client and endpoint aggregated per
+    UTC day. It is updated in the same transaction as the usage records it
+    aggregates, is kept after the records are dropped, and serves usage
+    summaries without scanning the records.
+    """
+
+    __tablename__ = "api_usage_daily_rollups"
+    __table_args__ = (
+        UniqueConstraint("api_client_id", "endpoint", "day", name="uq_api_usage_daily_rollups_bucket"),
+    )
+
+    api_client_id: Mapped[UUID] = mapped_column(PG_UUID(as_uuid=True), nullable=False)
+    user_id: Mapped[UUID] = mapped_column(PG_UUID(as_uuid=True), nullable=False)
+    endpoint: Mapped[str] = mapped_column(String(255), nullable=False)
+    # The UTC day.
+    day: Mapped[date] = mapped_column(Date, nullable=False, index=True)
+    call_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    success_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total_cost: Mapped[Decimal] = mapped_column(Numeric(14, 4), nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return (
+            f"<UsageDailyRollupModel(api_client_id='{self.api_client_id}', endpoint='{self.endpoint}', "
+            f"day='{self.day}', call_count={self.call_count})>"
+        )
@@ -4,10 +4,10 @@ SQLAlchemy implementation of the IApiKeyRepository interface.
 Provides concrete data access methods for APIKey entities using SQLAlchemy and PostgreSQL.
 """
 import logging
-from typing import List, Optional
+from typing import Callable, List, Optional
 from uuid import UUID
 
-from sqlalchemy import select
+from sqlalchemy import event, select
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -145,4 +145,8 @@ class SqlAlchemyApiKeyRepository(IApiKeyRepository):
                 exc_info=True,
             )
             await self.db_session.rollback()
-            raise
\ No newline at end of file
+            raise
+
+    def on_commit(self, callback: Callable[[], None]) -> None:
+        """Runs a callback once the session's current transaction has committed."""
+        event.listen(self.db_session.sync_session, "after_commit", lambda session: callback(), once=True)
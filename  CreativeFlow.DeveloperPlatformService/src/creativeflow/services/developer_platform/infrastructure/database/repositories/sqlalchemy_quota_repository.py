@@ -6,10 +6,11 @@ Note: This repository manages the Quota *configuration*. Calculating current
 usage is done via the UsageRepository.
 """
 import logging
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 from uuid import UUID
 
-from sqlalchemy import select
+from sqlalchemy import case, func, select, update
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -29,6 +30,8 @@ def _to_domain(db_model: QuotaModel) -> Quota:
         limit_amount=db_model.limit_amount,
         period=db_model.period,
         last_reset_at=db_model.last_reset_at,
+        used_amount=db_model.used_amount,
+        used_period_key=db_model.used_period_key,
     )
 
 
@@ -41,6 +44,8 @@ def _to_db_model(domain_model: Quota) -> QuotaModel:
         limit_amount=domain_model.limit_amount,
         period=str(domain_model.period.value),
         last_reset_at=domain_model.last_reset_at,
+        used_amount=domain_model.used_amount,
+        used_period_key=domain_model.used_period_key,
     )
 
 
@@ -98,6 +103,8 @@ class SqlAlchemyQuotaRepository(IQuotaRepository):
             existing_model.limit_amount = update_data.limit_amount
             existing_model.period = update_data.period
             existing_model.last_reset_at = update_data.last_reset_at
+            existing_model.used_amount = update_data.used_amount
+            existing_model.used_period_key = update_data.used_period_key
 
             await self.db_session.flush()
             logger.info("Updated Quota with ID: %s", quota_domain.id)
@@ -109,4 +116,40 @@ class SqlAlchemyQuotaRepository(IQuotaRepository):
                 exc_info=True,
             )
             await self.db_session.rollback()
-            raise
\ No newline at end of file
+            raise
+
+    async def record_used_amount(self, api_client_id: UUID, period_key: int, used_amount: int) -> None:
+        """
+        Stores the usage counter of a client's quota period, if it is still the current period.
+        Counters only grow within a period, so a stale value never overwrites a newer one;
+        a value recorded for an earlier period is replaced.
+        """
+        period_start = datetime.fromtimestamp(period_key, tz=timezone.utc)
+        try:
+            stmt = (
+                update(QuotaModel)
+                .where(
+                    QuotaModel.api_client_id == api_client_id,
+                    QuotaModel.last_reset_at >= period_start,
+                    QuotaModel.last_reset_at < period_start + timedelta(seconds=1),
+                )
+                .values(
+                    used_amount=case(
+                        (
+                            QuotaModel.used_period_key == period_key,
+                            func.greatest(func.coalesce(QuotaModel.used_amount, 0), used_amount),
+                        ),
+                        else_=used_amount,
+                    ),
+                    used_period_key=period_key,
+                )
+            )
+            await self.db_session.execute(stmt)
+        except SQLAlchemyError as e:
+            logger.error(
+                "Error recording used amount for client %s: %s",
+                api_client_id,
+                e,
+                exc_info=True,
+            )
+            raise
@@ -4,17 +4,22 @@ SQLAlchemy implementation of the IUsageRepository interface.
 Provides concrete data access methods for APIUsageRecord entities.
 """
 import logging
-from datetime import date, datetime
-from typing import List, Tuple
-from uuid import UUID
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Sequence, Tuple, Type
+from uuid import UUID, uuid4
 
 from sqlalchemy import and_, func, select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from api.schemas.usage_schemas import UsageSummaryDataPoint
 from domain.models.usage import APIUsageRecord
 from domain.repositories.usage_repository import IUsageRepository
 from infrastructure.database.models.usage_model import UsageRecordModel
+from infrastructure.database.models.usage_rollup_model import UsageDailyRollupModel, UsageHourlyRollupModel
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +50,21 @@ def _to_db_model(domain_model: APIUsageRecord) -> UsageRecordModel:
     )
 
 
+def _to_utc(timestamp: datetime) -> datetime:
+    """Usage timestamps are recorded in UTC, naive or not."""
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+
+def _hour_bucket(timestamp: datetime) -> datetime:
+    return _to_utc(timestamp).replace(minute=0, second=0, microsecond=0)
+
+
+def _day_bucket(timestamp: datetime) -> date:
+    return _to_utc(timestamp).date()
+
+
 class SqlAlchemyUsageRepository(IUsageRepository):
     """SQLAlchemy implementation for API usage record persistence."""
 
@@ -58,43 +78,131 @@ class SqlAlchemyUsageRepository(IUsageRepository):
 
     async def add_record(self, usage_record_domain: APIUsageRecord) -> None:
         """Adds a new API usage record to the database."""
-        db_model = _to_db_model(usage_record_domain)
+        await self.add_records([usage_record_domain])
+
+    async def add_records(self, usage_records: Sequence[APIUsageRecord]) -> int:
+        """
+        Adds API usage records to the database with a multi-row INSERT, and adds
+        them to the hourly and daily rollups.
+
+        Records already stored (same ID) are skipped, and not counted again in
+        the rollups, so a batch can safely be written more than once.
+
+        Returns:
+            The number of records inserted.
+        """
+        if not usage_records:
+            return 0
         try:
-            self.db_session.add(db_model)
-            await self.db_session.flush()
+            stmt = (
+                insert(UsageRecordModel)
+                .values([
+                    {
+                        "id": record.id,
+                        "api_client_id": record.api_client_id,
+                        "user_id": record.user_id,
+                        "timestamp": record.timestamp,
+                        "endpoint": record.endpoint,
+                        "cost": record.cost,
+                        "is_successful": record.is_successful,
+                    }
+                    for record in usage_records
+                ])
+                .on_conflict_do_nothing(index_elements=[UsageRecordModel.id, UsageRecordModel.timestamp])
+                .returning(UsageRecordModel.id)
+            )
+            result = await self.db_session.execute(stmt)
+            inserted_ids = set(result.scalars().all())
+            await self._add_to_rollups([record for record in usage_records if record.id in inserted_ids])
+            return len(inserted_ids)
         except SQLAlchemyError as e:
             logger.error(
-                "Error adding API usage record to database: %s", e, exc_info=True
+                "Error adding %s API usage records to database: %s", len(usage_records), e, exc_info=True
             )
             await self.db_session.rollback()
             raise
 
+    async def _add_to_rollups(self, usage_records: Sequence[APIUsageRecord]) -> None:
+        """Adds records to the hourly and daily rollups of their client and endpoint."""
+        await self._upsert_rollups(
+            UsageHourlyRollupModel, "bucket_start", _hour_bucket, "uq_api_usage_hourly_rollups_bucket", usage_records
+        )
+        await self._upsert_rollups(
+            UsageDailyRollupModel, "day", _day_bucket, "uq_api_usage_daily_rollups_bucket", usage_records
+        )
+
+    async def _upsert_rollups(
+        self,
+        rollup_model: Type[Any],
+        bucket_column: str,
+        bucket_of: Callable[[datetime], Any],
+        constraint: str,
+        usage_records: Sequence[APIUsageRecord],
+    ) -> None:
+        """Adds records to the rollup rows of their client, endpoint and bucket."""
+        buckets: Dict[Tuple[UUID, str, Any], Dict] = defaultdict(
+            lambda: {"call_count": 0, "success_count": 0, "total_cost": Decimal("0")}
+        )
+        user_ids: Dict[UUID, UUID] = {}
+        for record in usage_records:
+            bucket = buckets[(record.api_client_id, record.endpoint, bucket_of(record.timestamp))]
+            bucket["call_count"] += 1
+            bucket["success_count"] += 1 if record.is_successful else 0
+            bucket["total_cost"] += record.cost or Decimal("0")
+            user_ids[record.api_client_id] = record.user_id
+        if not buckets:
+            return
+
+        stmt = insert(rollup_model).values([
+            {
+                "id": uuid4(),
+                "api_client_id": api_client_id,
+                "user_id": user_ids[api_client_id],
+                "endpoint": endpoint,
+                bucket_column: bucket,
+                **counts,
+            }
+            # Sorted, so that concurrent flushes lock rollup rows in the same order.
+            for (api_client_id, endpoint, bucket), counts in sorted(buckets.items(), key=lambda item: item[0])
+        ])
+        stmt = stmt.on_conflict_do_update(
+            constraint=constraint,
+            set_={
+                "call_count": rollup_model.call_count + stmt.excluded.call_count,
+                "success_count": rollup_model.success_count + stmt.excluded.success_count,
+                "total_cost": rollup_model.total_cost + stmt.excluded.total_cost,
+            },
+        )
+        await self.db_session.execute(stmt)
+
     async def get_summary_for_client(
         self, api_client_id: UUID, start_date: date, end_date: date
-    ) -> List[Tuple[str, int]]:
+    ) -> List[UsageSummaryDataPoint]:
         """
-        Retrieves an aggregated summary of API usage for a client within a date range.
-        Returns a list of tuples: (endpoint, call_count).
+        Retrieves an aggregated summary of API usage for a client within a date range
+        (UTC days, inclusive), grouped by endpoint, from the daily rollups.
         """
         try:
-            start_datetime = datetime.combine(start_date, datetime.min.time())
-            end_datetime = datetime.combine(end_date, datetime.max.time())
-
+            call_count = func.sum(UsageDailyRollupModel.call_count)
             stmt = (
                 select(
-                    UsageRecordModel.endpoint,
-                    func.count(UsageRecordModel.id).label("call_count"),
+                    UsageDailyRollupModel.endpoint,
+                    call_count.label("call_count"),
+                    func.sum(UsageDailyRollupModel.total_cost).label("cost"),
                 )
                 .where(
-                    UsageRecordModel.api_client_id == api_client_id,
-                    UsageRecordModel.timestamp >= start_datetime,
-                    UsageRecordModel.timestamp <= end_datetime,
+                    UsageDailyRollupModel.api_client_id == api_client_id,
+                    UsageDailyRollupModel.day >= start_date,
+                    UsageDailyRollupModel.day <= end_date,
                 )
-                .group_by(UsageRecordModel.endpoint)
-                .order_by(func.count(UsageRecordModel.id).desc())
+                .group_by(UsageDailyRollupModel.endpoint)
+                .order_by(call_count.desc())
             )
             result = await self.db_session.execute(stmt)
-            return result.fetchall()
+            return [
+                UsageSummaryDataPoint(endpoint=row.endpoint, call_count=row.call_count, cost=row.cost)
+                for row in result
+            ]
         except SQLAlchemyError as e:
             logger.error(
                 "Error getting usage summary for client %s: %s",
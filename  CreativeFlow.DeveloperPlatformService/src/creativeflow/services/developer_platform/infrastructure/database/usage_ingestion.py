@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Buffered, batched ingestion of API usage records.
+
+Recording each API call with its own INSERT, in the request's session, doubled
+the database load of the proxied endpoints. The `UsageIngestionBuffer` takes
+records without touching the database, and a background task writes them with
+multi-row INSERTs (which also update the hourly rollups) every
+`USAGE_FLUSH_BATCH_SIZE` records or `USAGE_FLUSH_INTERVAL_MS`, whichever comes
+first.
+
+Delivery is at least once. Every record is also appended to a journal segment
+in `USAGE_SPILL_DIR`, which is only deleted once all its records are committed.
+A segment whose flush failed, or that was left behind by a crashed worker, is
+replayed later; records already stored are skipped by ID, so replays do not
+double count. Each segment is held with an exclusive `flock` by the worker
+writing it, so workers sharing the directory only replay abandoned segments.
+Records are written to the segment file as they are taken, so a worker crash
+does not lose them; they are not fsynced, so a host crash may lose the last
+records still in the OS page cache.
+
+When the database is unreachable for long, the in-memory buffer is capped at
+`USAGE_BUFFER_CAPACITY` records; further records are only journaled, and
+replayed from the segment.
+"""
+import asyncio
+import fcntl
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Callable, IO, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import Settings
+from domain.models.usage import APIUsageRecord
+from infrastructure.database.repositories.sqlalchemy_usage_repository import (
+    SqlAlchemyUsageRepository,
+)
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".jsonl"
+# Delay before retrying failed segments.
+REPLAY_RETRY_SECONDS = 30
+
+
+class _JournalSegment:
+    """An append-only file of usage records, locked by the worker writing it."""
+
+    def __init__(self, path: Path, file: IO[str]):
+        self.path = path
+        self.file = file
+        self.records: List[APIUsageRecord] = []
+        # Set when records were journaled but not kept in memory.
+        self.overflowed = False
+
+    @classmethod
+    def create(cls, directory: Path) -> "_JournalSegment":
+        path = directory / f"usage-{os.getpid()}-{uuid.uuid4().hex}{SEGMENT_SUFFIX}"
+        file = open(path, "a", encoding="utf-8")
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return cls(path, file)
+
+    @classmethod
+    def claim(cls, path: Path) -> Optional["_JournalSegment"]:
+        """Opens an existing segment, unless another worker holds it."""
+        try:
+            file = open(path, "r+", encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            return None
+        if not path.exists():  # Deleted by its owner before we locked it
+            file.close()
+            return None
+        return cls(path, file)
+
+    def read_records(self) -> List[APIUsageRecord]:
+        self.file.seek(0)
+        records = []
+        for line in self.file:
+            if line.strip():
+                try:
+                    records.append(APIUsageRecord.model_validate_json(line))
+                except ValueError:
+                    # A partial last line, written when the worker died.
+                    logger.warning("Skipping malformed usage record in %s.", self.path)
+        return records
+
+    def append(self, record: APIUsageRecord):
+        self.file.write(record.model_dump_json() + "\n")
+        self.file.flush()
+
+    def close(self, delete: bool):
+        if delete:
+            self.path.unlink(missing_ok=True)
+        self.file.close()  # Releases the lock
+
+
+class UsageIngestionBuffer:
+    """
+    Buffers usage records in memory and in a journal, and writes them to the database in batches.
+
+    The buffer is disabled until `start` is called.
+    """
+
+    def __init__(self):
+        self._session_factory: Optional[Callable[[], AsyncSession]] = None
+        self._directory: Optional[Path] = None
+        self._batch_size = 0
+        self._interval = 0.0
+        self._capacity = 0
+        self._segment: Optional[_JournalSegment] = None
+        self._buffered = 0
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._last_replay_failure = float("-inf")
+
+    @property
+    def enabled(self) -> bool:
+        return self._task is not None
+
+    async def start(self, settings: Settings, session_factory: Callable[[], AsyncSession]):
+        """
+        Replays the segments left over by previous runs, and starts the flushing task.
+
+        Args:
+            settings: The application settings.
+            session_factory: Creates the database sessions used for writing records.
+        """
+        if not settings.USAGE_INGESTION_BUFFERED:
+            logger.info("Usage ingestion buffer is disabled; usage records are written per call.")
+            return
+        self._session_factory = session_factory
+        self._directory = Path(settings.USAGE_SPILL_DIR)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._batch_size = settings.USAGE_FLUSH_BATCH_SIZE
+        self._interval = settings.USAGE_FLUSH_INTERVAL_MS / 1000
+        self._capacity = settings.USAGE_BUFFER_CAPACITY
+        self._stopping = False
+        self._segment = _JournalSegment.create(self._directory)
+        await self._replay_abandoned_segments()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Usage ingestion buffer started, journaling to %s.", self._directory)
+
+    async def stop(self):
+        """Stops the flushing task and writes the buffered records."""
+        if not self._task:
+            return
+        # Not cancelled: a flush in progress would abandon its batch and segment.
+        self._stopping = True
+        self._wakeup.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+        self._segment.close(delete=not self._segment.records and not self._segment.overflowed)
+        self._segment = None
+
+    def submit(self, record: APIUsageRecord):
+        """
+        Takes a usage record to be written in the next batch. Does not wait for the database.
+
+        A record that cannot be journaled is still written from memory, if the buffer has room.
+
+        Args:
+            record: The usage record.
+        """
+        segment = self._segment
+        journaled = True
+        try:
+            segment.append(record)
+        except OSError as e:
+            journaled = False
+            logger.error("Failed to journal usage record %s in %s: %s", record.id, segment.path, e)
+        if self._buffered < self._capacity:
+            segment.records.append(record)
+            self._buffered += 1
+        elif journaled:
+            segment.overflowed = True
+        else:
+            logger.error("Dropping usage record %s: the buffer is full and the record could not be journaled.", record.id)
+        if self._buffered >= self._batch_size:
+            self._wakeup.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopping:
+                return
+            try:
+                await self.flush()
+                if loop.time() - self._last_replay_failure >= REPLAY_RETRY_SECONDS:
+                    await self._replay_abandoned_segments()
+            except Exception as e:
+                logger.error("Unexpected error flushing usage records: %s", e, exc_info=True)
+
+    async def flush(self):
+        """Writes the buffered records, and starts a new journal segment."""
+        async with self._flush_lock:
+            segment = self._segment
+            if not segment.records and not segment.overflowed:
+                return
+            segment.file.flush()
+            self._segment = _JournalSegment.create(self._directory)
+            self._buffered = 0
+
+            written = await self._write(segment.records)
+            # Otherwise kept as a spill file, and replayed: at once if it only
+            # holds records that did not fit in memory, or once the database is
+            # reachable again.
+            segment.close(delete=written and not segment.overflowed)
+            if not written:
+                self._last_replay_failure = asyncio.get_running_loop().time()
+
+    async def _write(self, records: List[APIUsageRecord]) -> bool:
+        """Writes records in batches, each in its own transaction. Returns whether all were written."""
+        for start in range(0, len(records), self._batch_size):
+            batch = records[start:start + self._batch_size]
+            try:
+                async with self._session_factory() as session:
+                    await SqlAlchemyUsageRepository(db_session=session).add_records(batch)
+                    await session.commit()
+            except Exception as e:
+                logger.error("Failed to write %s usage records, keeping them in the journal: %s", len(batch), e)
+                return False
+        return True
+
+    async def _replay_abandoned_segments(self):
+        """Writes the records of segments not held by any worker: failed flushes and crashed workers."""
+        for path in sorted(self._directory.glob(f"usage-*{SEGMENT_SUFFIX}")):
+            if path == self._segment.path:
+                continue
+            segment = _JournalSegment.claim(path)
+            if segment is None:
+                continue
+            records = segment.read_records()
+            written = await self._write(records)
+            segment.close(delete=written)
+            if not written:
+                self._last_replay_failure = asyncio.get_running_loop().time()
+                return
+            logger.info("Replayed %s usage records from %s.", len(records), path.name)
+
+
+# Create a singleton instance
+usage_ingestion_buffer = UsageIngestionBuffer()
+
+
+def get_usage_ingestion_buffer() -> UsageIngestionBuffer:
+    """FastAPI dependency to get the usage ingestion buffer."""
+    return usage_ingestion_buffer
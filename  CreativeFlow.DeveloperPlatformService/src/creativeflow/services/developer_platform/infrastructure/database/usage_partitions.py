@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Maintenance of the daily partitions of the usage records, and of the retention
+of the usage data.
+
+`api_usage_records` is range partitioned by `timestamp`, one partition per UTC
+day, named `api_usage_records_pYYYYMMDD`. The `UsagePartitionManager` runs at
+startup and then every `USAGE_PARTITION_MAINTENANCE_INTERVAL_SECONDS`, and:
+
+- creates the partitions of today and the next `USAGE_PARTITION_PREMAKE_DAYS`
+  days, and the default partition, which takes the records outside them. If
+  maintenance fell behind for longer than that, the records of a day without
+  a partition are in the default partition, and creating the partition over
+  them would fail: they are moved into the new partition before it is
+  attached, and an error is logged;
+- drops the partitions older than `USAGE_RETENTION_DAYS`, which costs a
+  catalog update instead of a DELETE of the rows (records this old in the
+  default partition are deleted); and
+- deletes the hourly rollups older than `USAGE_HOURLY_ROLLUP_RETENTION_DAYS`.
+
+The daily rollups are kept: usage summaries are served from them, and they
+outlive the records they aggregate.
+
+The table is partitioned by the migration `0002`; the service fails to start
+while it is not.
+
+Each step runs in its own short transaction with a lock timeout, so that it
+never queues the ingestion of usage records behind it for long; a step that
+fails is retried on the next run. The steps take a transaction-level advisory
+lock, so only one instance performs them at a time.
+"""
+import asyncio
+import logging
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Callable, Optional, Set
+
+from sqlalchemy import delete, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import Settings
+from infrastructure.database.models.usage_model import UsageRecordModel
+from infrastructure.database.models.usage_rollup_model import UsageHourlyRollupModel
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = UsageRecordModel.__tablename__
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+_PARTITION_NAME = re.compile(rf"^{PARENT_TABLE}_p(\d{{8}})$")
+# Arbitrary key of the advisory lock serializing maintenance across instances.
+MAINTENANCE_LOCK_ID = 7_301_202_501
+# How long a maintenance statement may wait for the locks it needs.
+LOCK_TIMEOUT = "5s"
+
+
+def partition_name(day: date) -> str:
+    return f"{PARENT_TABLE}_p{day:%Y%m%d}"
+
+
+def _day_start(day: date) -> str:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc).isoformat()
+
+
+def _day_bounds(day: date) -> str:
+    return f"FROM ('{_day_start(day)}') TO ('{_day_start(day + timedelta(days=1))}')"
+
+
+class UsagePartitionManager:
+    """
+    Creates and drops the daily partitions of the usage records, and prunes the hourly rollups.
+
+    The manager is disabled until `start` is called.
+    """
+
+    def __init__(self):
+        self._session_factory: Optional[Callable[[], AsyncSession]] = None
+        self._premake_days = 0
+        self._retention_days = 0
+        self._hourly_rollup_retention_days = 0
+        self._interval_seconds = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, settings: Settings, session_factory: Callable[[], AsyncSession]):
+        """
+        Runs the maintenance once, so that today's partition exists, and schedules it.
+
+        Args:
+            settings: The application settings.
+            session_factory: Creates the database sessions used for maintenance.
+
+        Raises:
+            RuntimeError: If the usage records table is not partitioned.
+        """
+        async with session_factory() as session:
+            if not await self._is_partitioned(session):
+                raise RuntimeError(
+                    f"{PARENT_TABLE} is not a partitioned table; run the database migrations before starting the service."
+                )
+        self._session_factory = session_factory
+        self._premake_days = settings.USAGE_PARTITION_PREMAKE_DAYS
+        self._retention_days = settings.USAGE_RETENTION_DAYS
+        self._hourly_rollup_retention_days = settings.USAGE_HOURLY_ROLLUP_RETENTION_DAYS
+        self._interval_seconds = settings.USAGE_PARTITION_MAINTENANCE_INTERVAL_SECONDS
+        await self.maintain()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Usage partition maintenance started.")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._interval_seconds)
+            try:
+                await self.maintain()
+            except Exception as e:
+                logger.error("Unexpected error maintaining usage partitions: %s", e, exc_info=True)
+
+    async def maintain(self, today: Optional[date] = None):
+        """
+        Creates the missing partitions, and drops the usage data past its retention.
+
+        Args:
+            today: The current UTC day; defaults to the clock's.
+        """
+        today = today or datetime.now(timezone.utc).date()
+        try:
+            async with self._session_factory() as session:
+                partitions = await self._list_partitions(session)
+        except SQLAlchemyError as e:
+            logger.error("Failed to list the usage record partitions: %s", e)
+            return
+
+        for offset in range(self._premake_days + 1):
+            day = today + timedelta(days=offset)
+            if partition_name(day) not in partitions:
+                await self._create_partition(day, DEFAULT_PARTITION in partitions)
+        if DEFAULT_PARTITION not in partitions:
+            await self._execute(
+                f"create partition {DEFAULT_PARTITION}",
+                text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"),
+            )
+
+        cutoff = today - timedelta(days=self._retention_days)
+        for name in sorted(partitions):
+            match = _PARTITION_NAME.match(name)
+            if match and datetime.strptime(match.group(1), "%Y%m%d").date() < cutoff:
+                await self._execute(f"drop partition {name}", text(f"DROP TABLE IF EXISTS {name}"))
+        if DEFAULT_PARTITION in partitions:
+            await self._execute(
+                f"delete expired records from {DEFAULT_PARTITION}",
+                text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < :cutoff").bindparams(
+                    cutoff=datetime.combine(cutoff, time.min, tzinfo=timezone.utc)
+                ),
+            )
+
+        rollup_cutoff = today - timedelta(days=self._hourly_rollup_retention_days)
+        await self._execute(
+            "delete expired hourly rollups",
+            delete(UsageHourlyRollupModel).where(
+                UsageHourlyRollupModel.bucket_start < datetime.combine(rollup_cutoff, time.min, tzinfo=timezone.utc)
+            ),
+        )
+
+    async def _create_partition(self, day: date, has_default: bool):
+        name = partition_name(day)
+        if not has_default:
+            await self._execute(
+                f"create partition {name}",
+                text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} FOR VALUES {_day_bounds(day)}"),
+            )
+            return
+
+        start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+        end = start + timedelta(days=1)
+        try:
+            async with self._session_factory() as session:
+                result = await session.execute(
+                    text(
+                        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end)"
+                    ),
+                    {"start": start, "end": end},
+                )
+                stranded = bool(result.scalar_one())
+        except SQLAlchemyError as e:
+            logger.warning("Failed to check %s for records of %s, will retry: %s", DEFAULT_PARTITION, day, e)
+            return
+
+        if not stranded:
+            await self._execute(
+                f"create partition {name}",
+                text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} FOR VALUES {_day_bounds(day)}"),
+            )
+            return
+
+        logger.error(
+            "Usage records of %s are in %s: partition maintenance fell behind by more than %s days. "
+            "Moving them to %s.",
+            day,
+            DEFAULT_PARTITION,
+            self._premake_days,
+            name,
+        )
+        # The partition is filled while detached, then attached; all in one transaction.
+        await self._execute(
+            f"move records of {day} from {DEFAULT_PARTITION} to partition {name}",
+            text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"),
+            text(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end "
+                f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+            ).bindparams(start=start, end=end),
+            text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES {_day_bounds(day)}"),
+        )
+
+    @staticmethod
+    async def _is_partitioned(session: AsyncSession) -> bool:
+        result = await session.execute(
+            text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"),
+            {"table": PARENT_TABLE},
+        )
+        return bool(result.scalar_one())
+
+    @staticmethod
+    async def _list_partitions(session: AsyncSession) -> Set[str]:
+        result = await session.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE pg_inherits.inhparent = to_regclass(:table)"
+            ),
+            {"table": PARENT_TABLE},
+        )
+        return set(result.scalars().all())
+
+    async def _execute(self, description: str, *statements) -> bool:
+        """Runs maintenance statements in their own transaction. Returns whether they ran."""
+        try:
+            async with self._session_factory() as session:
+                locked = await session.execute(
+                    text("SELECT pg_try_advisory_xact_lock(:lock_id)"), {"lock_id": MAINTENANCE_LOCK_ID}
+                )
+                if not locked.scalar_one():
+                    logger.debug("Skipping usage maintenance step '%s': another instance holds the lock.", description)
+                    return False
+                await session.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+                for statement in statements:
+                    await session.execute(statement)
+                await session.commit()
+        except SQLAlchemyError as e:
+            logger.warning("Usage maintenance step '%s' failed, will retry: %s", description, e)
+            return False
+        logger.debug("Usage maintenance step '%s' done.", description)
+        return True
+
+
+# Create a singleton instance
+usage_partition_manager = UsagePartitionManager()
@@ -0,0 +1,167 @@
+"""
+Benchmark for WebSocketManager.broadcast.
+
+Connects synthetic sockets to a WebSocketManager and broadcasts messages to all
+of them, first with the previous serial loop (one `send_text` per connection,
+each encoding, framing and possibly compressing the message), then with
+`broadcast`. Each synthetic socket is a `websockets` protocol object writing to
+an in-memory transport, so the cost measured is the service's own CPU time,
+without network I/O.
+
+The frames written by `broadcast` to a sample of the sockets are decoded as a
+client would, to check that they carry the message.
+
+Usage (from the service root, with the service's requirements installed):
+
+    PYTHONPATH=src python benchmarks/broadcast_benchmark.py --connections 50000 --deflate no-context
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import zlib
+
+from websockets.extensions.permessage_deflate import PerMessageDeflate
+from websockets.legacy.protocol import WebSocketCommonProtocol
+from websockets.protocol import State
+
+from creativeflow.services.notification.core.schemas import WebSocketMessage
+from creativeflow.services.notification.core.websocket_manager import WebSocketManager
+
+
+class MemoryTransport:
+    """A transport that keeps what is written to it, and never applies backpressure."""
+
+    def __init__(self):
+        self.written = []
+        self._limits = (16384, 65536)
+
+    def write(self, data):
+        self.written.append(data)
+
+    def is_closing(self):
+        return False
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        high = 65536 if high is None else high
+        self._limits = (high // 4 if low is None else low, high)
+
+    def get_write_buffer_limits(self):
+        return self._limits
+
+
+class SyntheticProtocol(WebSocketCommonProtocol):
+    """A server-side `websockets` protocol, with uvicorn's ASGI send method."""
+
+    is_client = False
+
+    async def asgi_send(self, message):
+        await self.send(message["text"])
+
+
+class SyntheticWebSocket:
+    """Stands in for a Starlette WebSocket served by uvicorn's `websockets` implementation."""
+
+    def __init__(self, deflate):
+        self.protocol = SyntheticProtocol()
+        self.transport = MemoryTransport()
+        self.protocol.connection_made(self.transport)
+        self.protocol.state = State.OPEN
+        # Normally the task reading incoming frames; ensure_open() checks it is running.
+        self.protocol.transfer_data_task = asyncio.get_running_loop().create_future()
+        if deflate != "none":
+            self.protocol.extensions = [PerMessageDeflate(
+                remote_no_context_takeover=False,
+                local_no_context_takeover=deflate == "no-context",
+                remote_max_window_bits=15,
+                local_max_window_bits=15,
+            )]
+
+        # Starlette wraps uvicorn's ASGI send callable in closures.
+        send = self.protocol.asgi_send
+
+        async def sender(message):
+            await send(message)
+
+        self._send = sender
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        await self._send({"type": "websocket.send", "text": text})
+
+
+async def serial_broadcast(manager, message):
+    """The broadcast loop before the shared-frame fan-out."""
+    for user_id in list(manager.active_connections.keys()):
+        for connection in manager.active_connections.get(user_id, [])[:]:
+            await connection.send_text(message.model_dump_json())
+
+
+def decode_frame(data, max_window_bits=15):
+    first_byte, length = data[0], data[1] & 0x7F
+    offset = 2
+    if length == 126:
+        length, offset = int.from_bytes(data[2:4], "big"), 4
+    elif length == 127:
+        length, offset = int.from_bytes(data[2:10], "big"), 10
+    payload = data[offset:offset + length]
+    if first_byte & 0x40:
+        payload = zlib.decompressobj(wbits=-max_window_bits).decompress(payload + b"\x00\x00\xff\xff")
+    return payload.decode("utf-8")
+
+
+async def main(args):
+    manager = WebSocketManager(broadcast_chunk_size=args.chunk_size)
+    sockets = []
+    for index in range(args.connections):
+        websocket = SyntheticWebSocket(args.deflate)
+        await manager.connect(websocket, f"user-{index // args.connections_per_user}")
+        sockets.append(websocket)
+    print(f"Connected {len(sockets)} synthetic sockets ({len(manager.active_connections)} users, "
+          f"deflate: {args.deflate}).")
+
+    message = WebSocketMessage(type="announcement", content={
+        "title": "Scheduled maintenance",
+        "body": "CreativeFlow will be briefly unavailable on Sunday. " * (args.payload_bytes // 52 + 1),
+    })
+    print(f"Message size: {len(message.model_dump_json())} bytes.")
+
+    for name, send in (("serial send_text", serial_broadcast), ("broadcast", None)):
+        timings = []
+        for _ in range(args.rounds):
+            for websocket in sockets:
+                websocket.transport.written.clear()
+            started = time.perf_counter()
+            if send:
+                await send(manager, message)
+            else:
+                await manager.broadcast(message)
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        written = sum(len(chunk) for websocket in sockets for chunk in websocket.transport.written)
+        print(f"{name:>17}: best of {args.rounds} {best * 1000:9.1f} ms, "
+              f"{len(sockets) / best:12,.0f} connections/s, {written / len(sockets):7.0f} bytes/connection")
+
+    # The last round was `broadcast`: check what a client would receive.
+    for websocket in sockets[:: max(1, len(sockets) // 100)]:
+        received = decode_frame(websocket.transport.written[-1])
+        assert json.loads(received) == json.loads(message.model_dump_json()), "broadcast frame does not decode"
+    print("Sampled broadcast frames decode to the message.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=50000)
+    parser.add_argument("--connections-per-user", type=int, default=2)
+    parser.add_argument("--deflate", choices=("none", "context", "no-context"), default="none",
+                        help="Negotiated permessage-deflate: none, with context takeover, or server_no_context_takeover.")
+    parser.add_argument("--payload-bytes", type=int, default=1024, help="Approximate size of the broadcast message.")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
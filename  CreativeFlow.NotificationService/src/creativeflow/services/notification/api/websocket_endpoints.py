@@ -57,6 +57,9 @@ async def websocket_endpoint(
         return
 
     await websocket_manager.connect(websocket, user_id)
+    delivery_router = getattr(websocket.app.state, "delivery_router", None)
+    if delivery_router:
+        await delivery_router.on_connect(user_id)
 
     try:
         # Keep the connection alive and listen for any client messages (e.g., pings)
@@ -71,4 +74,6 @@ async def websocket_endpoint(
     except Exception as e:
         logger.error(f"An unexpected error occurred on WebSocket for user {user_id}: {e}")
         # Ensure cleanup on unexpected errors
-        websocket_manager.disconnect(websocket, user_id)
\ No newline at end of file
+        websocket_manager.disconnect(websocket, user_id)
+    if delivery_router:
+        await delivery_router.on_disconnect(user_id)
\ No newline at end of file
@@ -3,23 +3,35 @@ Client for sending push notifications via Apple Push Notification Service (APNS)
 
 This module implements the `BasePushProvider` interface for APNS, using the
 `apns2` library to communicate with Apple's servers. It handles the construction
-of APNS-specific payloads and manages the connection to the service.
+of APNS-specific payloads and manages the connections to the service.
+
+APNS is an HTTP/2 API: one connection carries many concurrent requests, each on
+its own stream. The client keeps a pool of `APNS_CONNECTION_POOL_SIZE` long-lived
+connections and sends a batch of notifications over one of them as pipelined
+streams, instead of one blocking request per device.
 """
 import asyncio
 import os
-from typing import Optional
+from typing import List, Optional
 
 from apns2.client import APNsClient, Notification
+from apns2.credentials import TokenCredentials
 from apns2.payload import Payload
 
 from creativeflow.services.notification.channels.push.base_push_provider import BasePushProvider
 from creativeflow.services.notification.config import Settings
-from creativeflow.services.notification.core.schemas import PushNotificationContent
+from creativeflow.services.notification.core.schemas import PushDeliveryReport, PushNotificationContent
 from creativeflow.services.notification.shared.exceptions import PushProviderError
 from creativeflow.services.notification.shared.logger import get_logger
 
 logger = get_logger(__name__)
 
+# APNS reasons meaning the token will never be deliverable again.
+INVALID_TOKEN_REASONS = {"BadDeviceToken", "Unregistered", "DeviceTokenNotForTopic"}
+
+# Interval of the PING frames that keep idle pooled connections open.
+HEARTBEAT_PERIOD_SECONDS = 60
+
 
 class APNSClient(BasePushProvider):
     """
@@ -34,7 +46,9 @@ class APNSClient(BasePushProvider):
             config: The application settings containing APNS credentials.
         """
         self.config = config
-        self.apns_client_instance: Optional[APNsClient] = None
+        self._connections: List[APNsClient] = []
+        # Connections not currently sending a batch; created on first use.
+        self._idle_connections: Optional[asyncio.Queue] = None
 
         if self.config.ENABLE_APNS_PUSH:
             try:
@@ -42,16 +56,36 @@ class APNSClient(BasePushProvider):
                 if not cert_file or not os.path.exists(cert_file):
                      raise FileNotFoundError(f"APNS certificate file not found at path: {cert_file}")
 
-                self.apns_client_instance = APNsClient(
-                    key=cert_file,
-                    use_sandbox=self.config.APNS_USE_SANDBOX,
-                    team_id=self.config.APNS_TEAM_ID,
-                    key_id=self.config.APNS_KEY_ID
+                credentials = TokenCredentials(
+                    auth_key_path=cert_file,
+                    auth_key_id=self.config.APNS_KEY_ID,
+                    team_id=self.config.APNS_TEAM_ID
                 )
-                logger.info("APNS client initialized successfully.")
+                # Connections are opened lazily, on their first batch.
+                self._connections = [
+                    APNsClient(
+                        credentials=credentials,
+                        use_sandbox=self.config.APNS_USE_SANDBOX,
+                        heartbeat_period=HEARTBEAT_PERIOD_SECONDS
+                    )
+                    for _ in range(self.config.APNS_CONNECTION_POOL_SIZE)
+                ]
+                logger.info(f"APNS client initialized successfully with {len(self._connections)} pooled connections.")
             except Exception as e:
                 logger.error(f"Failed to initialize APNS client: {e}")
-                self.apns_client_instance = None
+                self._connections = []
+
+    def _build_payload(self, payload: PushNotificationContent) -> Payload:
+        custom_data = dict(payload.data or {})
+        if payload.deep_link_url:
+            custom_data['deep_link_url'] = payload.deep_link_url
+
+        return Payload(
+            alert={"title": payload.title, "body": payload.body},
+            sound="default",
+            badge=1,
+            custom=custom_data
+        )
 
     async def send(self, device_token: str, payload: PushNotificationContent) -> None:
         """
@@ -64,36 +98,67 @@ class APNSClient(BasePushProvider):
         Raises:
             PushProviderError: If the notification fails to send.
         """
-        if not self.apns_client_instance:
-            logger.warning("APNS client is not initialized or is disabled. Skipping push notification.")
-            return
+        report = await self.send_multicast([device_token], payload)
+        if not report.sent and (report.invalid_tokens or report.failed_tokens):
+            reason = report.failed_tokens.get(device_token, "invalid device token")
+            raise PushProviderError(provider_name="APNS", original_error=reason)
 
-        custom_data = payload.data or {}
-        if payload.deep_link_url:
-            custom_data['deep_link_url'] = payload.deep_link_url
+    async def send_multicast(self, device_tokens: List[str], payload: PushNotificationContent) -> PushDeliveryReport:
+        """
+        Sends a push notification to several iOS devices as pipelined HTTP/2 streams
+        over one pooled connection.
 
-        apns_payload = Payload(
-            alert={"title": payload.title, "body": payload.body},
-            sound="default",
-            badge=1,
-            custom=custom_data
-        )
+        Args:
+            device_tokens: The APNS device tokens.
+            payload: The structured content for the notification.
+
+        Returns:
+            A report of the devices the notification was sent to, and of those it was not.
+
+        Raises:
+            PushProviderError: If the batch could not be sent at all.
+        """
+        report = PushDeliveryReport()
+        if not self._connections:
+            logger.warning("APNS client is not initialized or is disabled. Skipping push notification.")
+            return report
+        if not device_tokens:
+            return report
+
+        if self._idle_connections is None:
+            self._idle_connections = asyncio.Queue()
+            for connection in self._connections:
+                self._idle_connections.put_nowait(connection)
 
-        notification = Notification(payload=apns_payload, token=device_token)
+        apns_payload = self._build_payload(payload)
+        notifications = [Notification(token=device_token, payload=apns_payload) for device_token in device_tokens]
 
+        connection = await self._idle_connections.get()
         try:
-            # apns2 is synchronous, so we run it in a thread pool.
-            response = await asyncio.to_thread(
-                self.apns_client_instance.send_notification, notification
+            # apns2 is synchronous, so the batch is sent from a thread pool.
+            results = await asyncio.to_thread(
+                connection.send_notification_batch, notifications, self.config.APNS_TOPIC
             )
-
-            if response.is_successful:
-                logger.info(f"APNS push sent successfully to token starting with {device_token[:8]}...")
+        except Exception as e:
+            logger.error(f"An unexpected error occurred while sending an APNS batch of {len(device_tokens)}: {e}")
+            raise PushProviderError(provider_name="APNS", original_error=e)
+        finally:
+            self._idle_connections.put_nowait(connection)
+
+        for device_token in device_tokens:
+            # A token without a result was not confirmed, so it is reported as failed, and retried.
+            result = results.get(device_token, "MissingResult")
+            # 410 Unregistered responses carry a timestamp along with the reason.
+            reason = result[0] if isinstance(result, tuple) else result
+            if reason == "Success":
+                report.sent += 1
+            elif reason in INVALID_TOKEN_REASONS:
+                report.invalid_tokens.append(device_token)
             else:
-                error_msg = f"APNS push failed: {response.status_code} - {response.description}"
-                logger.error(error_msg)
-                raise PushProviderError(provider_name="APNS", original_error=response.description)
+                report.failed_tokens[device_token] = reason
 
-        except Exception as e:
-            logger.error(f"An unexpected error occurred while sending APNS push: {e}")
-            raise PushProviderError(provider_name="APNS", original_error=e)
\ No newline at end of file
+        logger.info(
+            f"APNS batch sent: {report.sent} delivered, {len(report.invalid_tokens)} invalid, "
+            f"{len(report.failed_tokens)} failed."
+        )
+        return report
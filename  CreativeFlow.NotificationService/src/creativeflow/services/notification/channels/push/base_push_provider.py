@@ -7,8 +7,10 @@ to interact with different providers through a consistent contract, following th
 Strategy and Adapter design patterns.
 """
 from abc import ABC, abstractmethod
+from typing import List
 
-from creativeflow.services.notification.core.schemas import PushNotificationContent
+from creativeflow.services.notification.core.schemas import PushDeliveryReport, PushNotificationContent
+from creativeflow.services.notification.shared.exceptions import PushProviderError
 
 
 class BasePushProvider(ABC):
@@ -31,4 +33,27 @@ class BasePushProvider(ABC):
         Raises:
             PushProviderError: If the provider fails to send the notification.
         """
-        pass
\ No newline at end of file
+        pass
+
+    async def send_multicast(self, device_tokens: List[str], payload: PushNotificationContent) -> PushDeliveryReport:
+        """
+        Sends the same push notification to several devices.
+
+        The default implementation sends to each device in turn. Providers that
+        support batched delivery should override it.
+
+        Args:
+            device_tokens: The tokens of the target devices.
+            payload: A structured object containing the notification content.
+
+        Returns:
+            A report of the devices the notification was sent to, and of those it was not.
+        """
+        report = PushDeliveryReport()
+        for device_token in device_tokens:
+            try:
+                await self.send(device_token, payload)
+                report.sent += 1
+            except PushProviderError as e:
+                report.failed_tokens[device_token] = str(e.original_error)
+        return report
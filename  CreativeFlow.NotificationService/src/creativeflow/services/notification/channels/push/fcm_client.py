@@ -3,21 +3,32 @@ Client for sending push notifications via Firebase Cloud Messaging (FCM).
 
 This module implements the `BasePushProvider` interface for FCM, using the
 `pyfcm` library to communicate with Google's servers. It handles the construction
-of FCM-specific payloads and manages the connection to the service.
+of FCM-specific payloads and manages the connections to the service.
+
+Notifications to several devices are sent as FCM multicast requests (up to 1000
+registration IDs each). The client keeps a pool of `FCM_CONNECTION_POOL_SIZE`
+`FCMNotification` instances, each with its own keep-alive HTTP session; an
+instance keeps the responses of its current request, so it sends one request
+at a time.
 """
 import asyncio
-from typing import Optional
+from typing import List, Optional
 
 from pyfcm import FCMNotification
 
 from creativeflow.services.notification.channels.push.base_push_provider import BasePushProvider
 from creativeflow.services.notification.config import Settings
-from creativeflow.services.notification.core.schemas import PushNotificationContent
+from creativeflow.services.notification.core.schemas import PushDeliveryReport, PushNotificationContent
 from creativeflow.services.notification.shared.exceptions import PushProviderError
 from creativeflow.services.notification.shared.logger import get_logger
 
 logger = get_logger(__name__)
 
+# FCM errors meaning the registration ID will never be deliverable again.
+INVALID_TOKEN_ERRORS = {"NotRegistered", "InvalidRegistration", "MismatchSenderId"}
+# Reported for the registration IDs the response has no result for.
+MISSING_RESULT_ERROR = "MissingResult"
+
 
 class FCMClient(BasePushProvider):
     """
@@ -32,17 +43,22 @@ class FCMClient(BasePushProvider):
             config: The application settings containing the FCM API key.
         """
         self.config = config
-        self.fcm_service_instance: Optional[FCMNotification] = None
+        self._sessions: List[FCMNotification] = []
+        # Sessions not currently sending a request; created on first use.
+        self._idle_sessions: Optional[asyncio.Queue] = None
 
         if self.config.ENABLE_FCM_PUSH:
             try:
                 if not self.config.FCM_API_KEY:
                     raise ValueError("FCM_API_KEY is not configured.")
-                self.fcm_service_instance = FCMNotification(api_key=self.config.FCM_API_KEY)
-                logger.info("FCM client initialized successfully.")
+                self._sessions = [
+                    FCMNotification(api_key=self.config.FCM_API_KEY)
+                    for _ in range(self.config.FCM_CONNECTION_POOL_SIZE)
+                ]
+                logger.info(f"FCM client initialized successfully with {len(self._sessions)} pooled sessions.")
             except Exception as e:
                 logger.error(f"Failed to initialize FCM client: {e}")
-                self.fcm_service_instance = None
+                self._sessions = []
 
     async def send(self, device_token: str, payload: PushNotificationContent) -> None:
         """
@@ -55,17 +71,46 @@ class FCMClient(BasePushProvider):
         Raises:
             PushProviderError: If the notification fails to send.
         """
-        if not self.fcm_service_instance:
+        report = await self.send_multicast([device_token], payload)
+        if not report.sent and (report.invalid_tokens or report.failed_tokens):
+            error = report.failed_tokens.get(device_token, "invalid registration ID")
+            raise PushProviderError(provider_name="FCM", original_error=error)
+
+    async def send_multicast(self, device_tokens: List[str], payload: PushNotificationContent) -> PushDeliveryReport:
+        """
+        Sends a push notification to several Android devices with FCM multicast requests.
+
+        Args:
+            device_tokens: The FCM registration IDs.
+            payload: The structured content for the notification.
+
+        Returns:
+            A report of the devices the notification was sent to, and of those it was not.
+
+        Raises:
+            PushProviderError: If the request failed as a whole.
+        """
+        report = PushDeliveryReport()
+        if not self._sessions:
             logger.warning("FCM client is not initialized or is disabled. Skipping push notification.")
-            return
+            return report
+        if not device_tokens:
+            return report
+
+        if self._idle_sessions is None:
+            self._idle_sessions = asyncio.Queue()
+            for session in self._sessions:
+                self._idle_sessions.put_nowait(session)
 
-        data_message = payload.data or {}
+        data_message = dict(payload.data or {})
         if payload.deep_link_url:
             data_message['deep_link_url'] = payload.deep_link_url
 
+        session = await self._idle_sessions.get()
+
         def _send_sync():
-            return self.fcm_service_instance.notify_single_device(
-                registration_id=device_token,
+            return session.notify_multiple_devices(
+                registration_ids=device_tokens,
                 message_title=payload.title,
                 message_body=payload.body,
                 data_message=data_message if data_message else None,
@@ -74,15 +119,29 @@ class FCMClient(BasePushProvider):
         try:
             # pyfcm is synchronous, so we run it in a thread pool.
             result = await asyncio.to_thread(_send_sync)
-
-            if result.get("success"):
-                logger.info(f"FCM push sent successfully to token starting with {device_token[:8]}...")
+        except Exception as e:
+            logger.error(f"An unexpected error occurred while sending an FCM multicast of {len(device_tokens)}: {e}")
+            raise PushProviderError(provider_name="FCM", original_error=e)
+        finally:
+            self._idle_sessions.put_nowait(session)
+
+        # Results are in the order of the registration IDs. An ID without one was
+        # not confirmed, so it is reported as failed, and retried.
+        results = list(result.get("results") or [])
+        if len(results) != len(device_tokens):
+            logger.warning(f"FCM multicast returned {len(results)} result(s) for {len(device_tokens)} registration ID(s).")
+        for index, device_token in enumerate(device_tokens):
+            token_result = results[index] if index < len(results) else {"error": MISSING_RESULT_ERROR}
+            error = token_result.get("error")
+            if not error:
+                report.sent += 1
+            elif error in INVALID_TOKEN_ERRORS:
+                report.invalid_tokens.append(device_token)
             else:
-                errors = result.get("results", [{}])[0].get("error")
-                error_msg = f"FCM push failed: {result.get('failure')} failures. Error: {errors}"
-                logger.error(error_msg)
-                raise PushProviderError(provider_name="FCM", original_error=errors)
+                report.failed_tokens[device_token] = error
 
-        except Exception as e:
-            logger.error(f"An unexpected error occurred while sending FCM push: {e}")
-            raise PushProviderError(provider_name="FCM", original_error=e)
\ No newline at end of file
+        logger.info(
+            f"FCM multicast sent: {report.sent} delivered, {len(report.invalid_tokens)} invalid, "
+            f"{len(report.failed_tokens)} failed."
+        )
+        return report
@@ -0,0 +1,292 @@
+"""
+Cross-instance routing of WebSocket notifications.
+
+`WebSocketManager` only knows the connections of its own instance. The
+`DeliveryRouter` makes every instance able to deliver to every user:
+
+- A connection directory in Redis maps each user to the instances holding
+  their connections (`notif:conn:<user_id>`, a hash of instance ID to last
+  heartbeat). Each instance refreshes the entries of its connected users
+  periodically, and entries without a recent heartbeat are ignored, so the
+  directory heals itself when an instance dies.
+- Each instance subscribes to its own delivery channel
+  (`notif:deliver:<instance_id>`). A notification for a user connected
+  elsewhere is published once to each owning instance's channel, instead of
+  being broadcast to every instance or dropped.
+- Notifications for users with no live connection are buffered in a capped
+  list (`notif:offline:<user_id>`) and replayed when the user reconnects.
+  A reconnect can race with the buffering: the directory is read before the
+  user's entry appears, but the message is buffered after the reconnecting
+  instance replayed the buffer. So after buffering, the directory is read
+  again; if the user is now connected, the owning instance is asked to
+  replay the buffer once more. A replay takes the whole buffer at once; if
+  sending fails partway (the user disconnected again), the notifications not
+  sent yet are put back at the head of the buffer.
+"""
+import asyncio
+import json
+import socket
+import time
+import uuid
+from typing import List, Optional
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from creativeflow.services.notification.config import Settings
+from creativeflow.services.notification.core.schemas import WebSocketMessage
+from creativeflow.services.notification.core.websocket_manager import WebSocketManager
+from creativeflow.services.notification.shared.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class DeliveryRouter:
+    """
+    Routes WebSocket notifications to the instance(s) holding the user's connections.
+    """
+
+    def __init__(self, config: Settings, websocket_manager: WebSocketManager, redis_client: Optional[redis.Redis] = None):
+        """
+        Initializes the DeliveryRouter.
+
+        Args:
+            config: The application settings.
+            websocket_manager: The WebSocket manager of this instance.
+            redis_client: The Redis client to use; created from `REDIS_URL` if omitted.
+        """
+        self.config = config
+        self.websocket_manager = websocket_manager
+        self.redis_client = redis_client
+        self.instance_id = config.INSTANCE_ID or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self._directory_ttl = config.CONNECTION_DIRECTORY_TTL_SECONDS
+        self._pubsub = None
+        self._listener_task: Optional[asyncio.Task] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    @property
+    def delivery_channel(self) -> str:
+        """The channel other instances publish this instance's deliveries to."""
+        return f"notif:deliver:{self.instance_id}"
+
+    @staticmethod
+    def _directory_key(user_id: str) -> str:
+        return f"notif:conn:{user_id}"
+
+    @staticmethod
+    def _offline_key(user_id: str) -> str:
+        return f"notif:offline:{user_id}"
+
+    async def start(self):
+        """Subscribes to this instance's delivery channel and starts the directory heartbeat."""
+        if self.redis_client is None:
+            self.redis_client = redis.from_url(self.config.REDIS_URL, decode_responses=True)
+        self._pubsub = self.redis_client.pubsub()
+        await self._pubsub.subscribe(self.delivery_channel)
+        self._listener_task = asyncio.create_task(self._listen())
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        logger.info(f"Delivery router started for instance '{self.instance_id}'.")
+
+    async def stop(self):
+        """Stops listening and removes this instance's connections from the directory."""
+        for task in (self._heartbeat_task, self._listener_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        try:
+            await self._unregister(list(self.websocket_manager.active_connections.keys()))
+        except RedisError as e:
+            logger.error(f"Failed to remove instance '{self.instance_id}' from the connection directory: {e}")
+        if self._pubsub:
+            await self._pubsub.unsubscribe()
+            await self._pubsub.close()
+        logger.info(f"Delivery router for instance '{self.instance_id}' stopped.")
+
+    async def on_connect(self, user_id: str):
+        """
+        Registers a newly connected user in the directory and replays their buffered notifications.
+        """
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.hset(self._directory_key(user_id), self.instance_id, time.time())
+                pipe.expire(self._directory_key(user_id), int(self._directory_ttl))
+                await pipe.execute()
+
+        except RedisError as e:
+            logger.error(f"Failed to register user {user_id} in the connection directory: {e}")
+            return
+        await self._replay_buffered(user_id)
+
+    async def _replay_buffered(self, user_id: str):
+        """
+        Takes the user's buffered notifications atomically and sends them to their local
+        connections. Those not sent, once no connection is left, are buffered again.
+        """
+        try:
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.lrange(self._offline_key(user_id), 0, -1)
+                pipe.delete(self._offline_key(user_id))
+                buffered, _ = await pipe.execute()
+        except RedisError as e:
+            logger.error(f"Failed to read the buffered notifications of user {user_id}: {e}")
+            return
+
+        if not buffered:
+            return
+        logger.info(f"Replaying {len(buffered)} buffered notification(s) to user {user_id}.")
+        for index, raw in enumerate(buffered):
+            try:
+                message = WebSocketMessage.model_validate_json(raw)
+            except ValueError:
+                logger.warning(f"Dropping a malformed buffered notification of user {user_id}.")
+                continue
+            try:
+                sent = await self.websocket_manager.send_to_user(user_id, message)
+            except Exception as e:
+                logger.error(f"Failed to replay a buffered notification to user {user_id}: {e}")
+                sent = 0
+            if not sent:
+                await self._rebuffer(user_id, buffered[index:])
+                return
+
+    async def _rebuffer(self, user_id: str, unsent: List[str]):
+        """Puts notifications back at the head of the user's buffer, ahead of any buffered since."""
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.lpush(self._offline_key(user_id), *reversed(unsent))
+                pipe.ltrim(self._offline_key(user_id), -self.config.OFFLINE_BUFFER_MAX_MESSAGES, -1)
+                pipe.expire(self._offline_key(user_id), self.config.OFFLINE_BUFFER_TTL_SECONDS)
+                await pipe.execute()
+        except RedisError as e:
+            logger.error(f"Failed to buffer {len(unsent)} unsent notification(s) of user {user_id} again: {e}")
+            return
+        logger.info(f"User {user_id} disconnected during the replay; buffered {len(unsent)} notification(s) again.")
+
+    async def on_disconnect(self, user_id: str):
+        """Removes the user from the directory once their last connection to this instance is gone."""
+        if user_id in self.websocket_manager.active_connections:
+            return
+        try:
+            await self._unregister([user_id])
+        except RedisError as e:
+            logger.error(f"Failed to unregister user {user_id} from the connection directory: {e}")
+
+    async def _unregister(self, user_ids: List[str]):
+        if not user_ids:
+            return
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hdel(self._directory_key(user_id), self.instance_id)
+            await pipe.execute()
+
+    async def deliver(self, user_id: str, message: WebSocketMessage):
+        """
+        Delivers a notification to every connection of the user, wherever it is.
+
+        Connections on this instance are written directly; every other instance
+        holding connections of the user gets the message once on its delivery
+        channel. If the user has no live connection, the message is buffered.
+        """
+        delivered = False
+        if user_id in self.websocket_manager.active_connections:
+            await self.websocket_manager.send_to_user(user_id, message)
+            delivered = True
+
+        message_json = message.model_dump_json()
+        try:
+            remote_instances = await self._remote_instances(user_id)
+            if remote_instances:
+                envelope = json.dumps({"user_id": user_id, "message": message_json})
+                delivered = await self._publish(remote_instances, envelope) or delivered
+
+            if not delivered:
+                await self._buffer(user_id, message_json)
+        except RedisError as e:
+            logger.error(f"Failed to route notification for user {user_id}: {e}")
+
+    async def _remote_instances(self, user_id: str) -> List[str]:
+        """The other instances with a live directory entry for the user."""
+        directory = await self.redis_client.hgetall(self._directory_key(user_id))
+        cutoff = time.time() - self._directory_ttl
+        return [
+            instance_id for instance_id, heartbeat in directory.items()
+            if instance_id != self.instance_id and float(heartbeat) >= cutoff
+        ]
+
+    async def _publish(self, instance_ids: List[str], envelope: str) -> bool:
+        """Publishes the envelope to each instance's delivery channel; returns whether any received it."""
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for instance_id in instance_ids:
+                pipe.publish(f"notif:deliver:{instance_id}", envelope)
+            receivers = await pipe.execute()
+        # A publish nobody received means the instance died before its entry expired.
+        return any(receivers)
+
+    async def _buffer(self, user_id: str, message_json: str):
+        """
+        Buffers a notification for a user with no live connection, then checks the directory
+        again in case the user reconnected (and replayed the buffer) in the meantime.
+        """
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.rpush(self._offline_key(user_id), message_json)
+            pipe.ltrim(self._offline_key(user_id), -self.config.OFFLINE_BUFFER_MAX_MESSAGES, -1)
+            pipe.expire(self._offline_key(user_id), self.config.OFFLINE_BUFFER_TTL_SECONDS)
+            await pipe.execute()
+        logger.debug(f"User {user_id} is offline; buffered notification.")
+
+        if user_id in self.websocket_manager.active_connections:
+            await self._replay_buffered(user_id)
+            return
+        remote_instances = await self._remote_instances(user_id)
+        if remote_instances:
+            logger.debug(f"User {user_id} reconnected while a notification was buffered; requesting a replay.")
+            await self._publish(remote_instances, json.dumps({"user_id": user_id, "replay": True}))
+
+    async def _listen(self):
+        """Delivers the notifications other instances route to this one."""
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if not message or message.get("type") != "message":
+                    continue
+                envelope = json.loads(message["data"])
+                user_id = envelope["user_id"]
+                if envelope.get("replay"):
+                    # Another instance buffered a notification after this one replayed the buffer.
+                    if user_id in self.websocket_manager.active_connections:
+                        await self._replay_buffered(user_id)
+                    continue
+                if user_id in self.websocket_manager.active_connections:
+                    await self.websocket_manager.send_to_user(
+                        user_id, WebSocketMessage.model_validate_json(envelope["message"])
+                    )
+                else:
+                    # The user disconnected while the message was in flight.
+                    await self._buffer(user_id, envelope["message"])
+            except asyncio.CancelledError:
+                raise
+            except RedisError as e:
+                logger.error(f"Delivery channel listener error: {e}")
+                await asyncio.sleep(5)
+            except Exception as e:
+                logger.exception(f"Failed to handle a routed notification: {e}")
+
+    async def _heartbeat(self):
+        """Periodically refreshes the directory entries of the users connected to this instance."""
+        interval = self._directory_ttl / 3
+        while True:
+            await asyncio.sleep(interval)
+            user_ids = list(self.websocket_manager.active_connections.keys())
+            now = time.time()
+            try:
+                for start in range(0, len(user_ids), 1000):
+                    async with self.redis_client.pipeline(transaction=False) as pipe:
+                        for user_id in user_ids[start:start + 1000]:
+                            pipe.hset(self._directory_key(user_id), self.instance_id, now)
+                            pipe.expire(self._directory_key(user_id), int(self._directory_ttl))
+                        await pipe.execute()
+            except RedisError as e:
+                logger.error(f"Failed to refresh the connection directory: {e}")
@@ -0,0 +1,83 @@
+"""
+Registry of the push device tokens of each user, kept in Redis.
+
+Producers may send the tokens of only some of a user's devices with each
+notification. The `DeviceTokenRegistry` remembers every token seen for a user
+(one set per device type, `notif:push_tokens:<user_id>:<device_type>`), so a
+notification reaches all of the user's devices, and forgets the tokens that the
+push providers report as invalid.
+"""
+from typing import Dict, Iterable, List, Optional
+
+import redis.asyncio as redis
+
+from creativeflow.services.notification.config import Settings
+from creativeflow.services.notification.shared.logger import get_logger
+
+logger = get_logger(__name__)
+
+DEVICE_TYPES = ("ios", "android")
+
+
+class DeviceTokenRegistry:
+    """
+    Stores the push device tokens of each user in Redis sets.
+    """
+
+    def __init__(self, config: Settings, redis_client: Optional[redis.Redis] = None):
+        """
+        Initializes the DeviceTokenRegistry.
+
+        Args:
+            config: The application settings.
+            redis_client: The Redis client to use; created from `REDIS_URL` if omitted.
+        """
+        self.config = config
+        self.redis_client = redis_client or redis.from_url(config.REDIS_URL, decode_responses=True)
+
+    @staticmethod
+    def _key(user_id: str, device_type: str) -> str:
+        return f"notif:push_tokens:{user_id}:{device_type}"
+
+    async def resolve(self, user_id: str, device_tokens: Dict[str, List[str]], device_types: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Registers the given tokens and returns all known tokens of the user, in one round trip.
+
+        Args:
+            user_id: The user the tokens belong to.
+            device_tokens: The tokens supplied with the notification, by device type.
+            device_types: The device types to return the tokens of.
+
+        Returns:
+            The tokens of the user's devices, by device type.
+        """
+        device_types = list(device_types)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for device_type in device_types:
+                if device_tokens.get(device_type):
+                    pipe.sadd(self._key(user_id, device_type), *device_tokens[device_type])
+                pipe.smembers(self._key(user_id, device_type))
+            results = await pipe.execute()
+
+        members = [result for result in results if isinstance(result, set)]
+        return {device_type: sorted(tokens) for device_type, tokens in zip(device_types, members) if tokens}
+
+    async def prune(self, user_id: str, invalid_tokens: List[str]):
+        """
+        Removes tokens the push providers reported as invalid.
+
+        Args:
+            user_id: The user the tokens belong to.
+            invalid_tokens: The tokens to remove.
+        """
+        if not invalid_tokens:
+            return
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for device_type in DEVICE_TYPES:
+                pipe.srem(self._key(user_id, device_type), *invalid_tokens)
+            await pipe.execute()
+        logger.info(f"Pruned {len(invalid_tokens)} invalid device token(s) of user '{user_id}'.")
+
+    async def close(self):
+        """Closes the Redis connection."""
+        await self.redis_client.close()
@@ -0,0 +1,285 @@
+"""
+Coalescing and per-user rate limiting of bursty notifications.
+
+Bulk jobs emit one `samples_ready`, `final_asset_ready` or `generation_failed`
+event per generation. Forwarded one by one, a user running 50 generations gets
+50 pushes and 50 WebSocket frames. The `NotificationCoalescer` sits in front of
+the `NotificationManager` and merges such bursts:
+
+- Notifications of the event types in `COALESCED_EVENT_TYPES` are grouped by
+  user and event type. The first notification of a burst is sent at once; those
+  following it within `COALESCING_WINDOW_MS` are held and sent as a single
+  `notification_digest` when the window ends. A window is reopened after each
+  digest, so a steady stream is sent as one digest per window.
+- Every dispatch of a coalesced event type takes a token from the user's token
+  bucket (`RATE_LIMIT_BURST` tokens, refilled at `RATE_LIMIT_PER_MINUTE`). When
+  the bucket is empty, the notifications are not dropped: they stay in the
+  window, which is extended until a token is available.
+
+Other event types, such as progress updates, bypass the coalescer. Coalescing
+happens per instance, and notifications held in a window are lost if the
+instance crashes before the window ends; they are sent at graceful shutdown.
+
+The messages of held notifications are acked when they are merged, so that a
+window does not hold consumer slots. If the dispatch of held notifications
+fails, it is handed to the retry handler (the RabbitMQ consumer's retry path),
+which retries and eventually dead-letters it like a failed message.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from creativeflow.services.notification.config import Settings
+from creativeflow.services.notification.core.notification_manager import NotificationManager
+from creativeflow.services.notification.core.schemas import NotificationPayload
+from creativeflow.services.notification.shared.logger import get_logger
+
+logger = get_logger(__name__)
+
+DIGEST_EVENT_TYPE = "notification_digest"
+
+# Takes a notification whose dispatch failed and its error; returns whether it was queued for retry.
+RetryHandler = Callable[[NotificationPayload, Exception], Awaitable[bool]]
+
+
+class _TokenBucket:
+    """A token bucket holding up to `capacity` tokens, refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, capacity: float, rate: float, now: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated_at = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_take(self, now: float) -> bool:
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def time_until_token(self, now: float) -> float:
+        self._refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def time_until_full(self, now: float) -> float:
+        self._refill(now)
+        return max(0.0, (self.capacity - self.tokens) / self.rate)
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _CoalescingWindow:
+    """The notifications of one user and event type held until the end of the window."""
+
+    def __init__(self):
+        self.payloads: List[NotificationPayload] = []
+        self.flush_task: Optional[asyncio.Task] = None
+
+
+class NotificationCoalescer:
+    """
+    Merges bursts of notifications per user and event type into digests, and rate limits them per user.
+    """
+
+    def __init__(self, config: Settings, notification_manager: NotificationManager):
+        """
+        Initializes the NotificationCoalescer.
+
+        Args:
+            config: The application settings.
+            notification_manager: The manager the (coalesced) notifications are dispatched to.
+        """
+        self.config = config
+        self.notification_manager = notification_manager
+        self._event_types = {event_type.strip() for event_type in config.COALESCED_EVENT_TYPES.split(",") if event_type.strip()}
+        self._window = config.COALESCING_WINDOW_MS / 1000
+        self._windows: Dict[Tuple[str, str], _CoalescingWindow] = {}
+        self._buckets: Dict[str, _TokenBucket] = {}
+        self._bucket_evictions: Dict[str, asyncio.TimerHandle] = {}
+        self._retry_handler: Optional[RetryHandler] = None
+        self._received = 0
+        self._dispatched = 0
+        self._digests = 0
+
+    @property
+    def metrics(self) -> Dict[str, int]:
+        """Counters of coalesced notifications since startup."""
+        return {
+            "received": self._received,
+            "dispatched": self._dispatched,
+            "digests": self._digests,
+            "open_windows": len(self._windows),
+            "rate_limited_users": len(self._buckets),
+        }
+
+    def set_retry_handler(self, retry_handler: RetryHandler):
+        """
+        Sets where the held notifications whose dispatch failed are handed to. Without
+        one, they are logged and dropped.
+        """
+        self._retry_handler = retry_handler
+
+    async def send_notification(self, payload: NotificationPayload):
+        """
+        Dispatches a notification now, or holds it to be merged with the ones following it.
+
+        Args:
+            payload: The validated notification payload from the message queue.
+        """
+        if payload.event_type not in self._event_types or payload.is_push_retry:
+            await self.notification_manager.send_notification(payload)
+            return
+
+        self._received += 1
+        key = (payload.user_id, payload.event_type)
+        window = self._windows.get(key)
+        if window is not None:
+            window.payloads.append(payload)
+            return
+
+        window = _CoalescingWindow()
+        self._windows[key] = window
+        window.flush_task = asyncio.create_task(self._flush_later(key, window, self._window))
+        if self._take_token(payload.user_id):
+            # Leading edge: a lone notification is not delayed.
+            await self._dispatch([payload])
+        else:
+            window.payloads.append(payload)
+
+    def _take_token(self, user_id: str) -> bool:
+        now = time.monotonic()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = _TokenBucket(self.config.RATE_LIMIT_BURST, self.config.RATE_LIMIT_PER_MINUTE / 60, now)
+            self._buckets[user_id] = bucket
+        return bucket.try_take(now)
+
+    async def _flush_later(self, key: Tuple[str, str], window: _CoalescingWindow, delay: float):
+        await asyncio.sleep(delay)
+        user_id, _ = key
+        if not window.payloads:
+            # The burst is over.
+            self._windows.pop(key, None)
+            self._schedule_bucket_eviction(user_id)
+            return
+
+        if self._take_token(user_id):
+            payloads, window.payloads = window.payloads, []
+            window.flush_task = asyncio.create_task(self._flush_later(key, window, self._window))
+            await self._dispatch_held(payloads)
+        else:
+            # Rate limited: keep merging until the user's next token.
+            wait = self._buckets[user_id].time_until_token(time.monotonic())
+            window.flush_task = asyncio.create_task(self._flush_later(key, window, max(wait, self._window)))
+
+    def _schedule_bucket_eviction(self, user_id: str):
+        """Drops the user's bucket once it has refilled: a full bucket is the same as a new one."""
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            return
+        previous = self._bucket_evictions.pop(user_id, None)
+        if previous is not None:
+            previous.cancel()
+        delay = bucket.time_until_full(time.monotonic())
+        self._bucket_evictions[user_id] = asyncio.get_running_loop().call_later(delay, self._evict_bucket, user_id)
+
+    def _evict_bucket(self, user_id: str):
+        self._bucket_evictions.pop(user_id, None)
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            return
+        if bucket.is_full(time.monotonic()):
+            del self._buckets[user_id]
+        else:
+            # Used again since, or not quite full because of rounding.
+            self._schedule_bucket_eviction(user_id)
+
+    async def _dispatch(self, payloads: List[NotificationPayload]):
+        await self._send(payloads[0] if len(payloads) == 1 else self._build_digest(payloads), len(payloads))
+
+    async def _dispatch_held(self, payloads: List[NotificationPayload]):
+        """Dispatches held notifications, whose messages were acked already: a failure goes to the retry handler."""
+        payload = payloads[0] if len(payloads) == 1 else self._build_digest(payloads)
+        try:
+            await self._send(payload, len(payloads))
+        except Exception as e:
+            retried = False
+            if self._retry_handler is not None:
+                try:
+                    retried = await self._retry_handler(payload, e)
+                except Exception as retry_error:
+                    logger.error(f"Failed to queue {len(payloads)} held notification(s) for retry: {retry_error}")
+            if not retried:
+                logger.error(f"Dropping {len(payloads)} held notification(s) for user '{payload.user_id}': they could not be queued for retry.")
+
+    async def _send(self, payload: NotificationPayload, count: int):
+        self._dispatched += count
+        try:
+            await self.notification_manager.send_notification(payload)
+        except Exception as e:
+            logger.error(f"Failed to dispatch {count} coalesced notification(s) for user '{payload.user_id}': {e}")
+            raise
+
+    def _build_digest(self, payloads: List[NotificationPayload]) -> NotificationPayload:
+        """Merges notifications of one user and event type into a single digest notification."""
+        self._digests += 1
+        last = payloads[-1]
+        count = len(payloads)
+        device_tokens: Dict[str, List[str]] = {}
+        target_channels: List[str] = []
+        for payload in payloads:
+            for channel in payload.target_channels:
+                if channel not in target_channels:
+                    target_channels.append(channel)
+            payload_tokens = dict(payload.device_tokens)
+            if payload.device_token and payload.device_type:
+                payload_tokens.setdefault(payload.device_type.lower(), []).append(payload.device_token)
+            for device_type, tokens in payload_tokens.items():
+                merged = device_tokens.setdefault(device_type, [])
+                merged.extend(token for token in tokens if token not in merged)
+
+        push = last.data.get("push", {})
+        logger.debug(f"Coalesced {count} '{last.event_type}' notifications for user '{last.user_id}' into a digest.")
+        return NotificationPayload(
+            user_id=last.user_id,
+            event_type=DIGEST_EVENT_TYPE,
+            data={
+                "event_type": last.event_type,
+                "count": count,
+                # The most recent items; `count` still covers all of them.
+                "items": [payload.data for payload in payloads[-self.config.COALESCING_MAX_DIGEST_ITEMS:]],
+                "push": {
+                    "title": push.get("title", "CreativeFlow Update"),
+                    "body": f"You have {count} new notifications.",
+                    "deep_link_url": push.get("deep_link_url"),
+                },
+            },
+            target_channels=target_channels,
+            device_token=last.device_token,
+            device_type=last.device_type,
+            device_tokens=device_tokens,
+        )
+
+    async def stop(self):
+        """
+        Dispatches every held notification, ignoring rate limits. A failing dispatch is
+        handed to the retry handler and does not keep the other windows from being sent.
+        """
+        windows, self._windows = self._windows, {}
+        for handle in self._bucket_evictions.values():
+            handle.cancel()
+        self._bucket_evictions.clear()
+        for window in windows.values():
+            if window.flush_task and not window.flush_task.done():
+                window.flush_task.cancel()
+        for window in windows.values():
+            if window.payloads:
+                await self._dispatch_held(window.payloads)
+        logger.info(f"Notification coalescer stopped. Metrics: {self.metrics}")
@@ -6,12 +6,15 @@ of the service. It receives a validated notification payload and, based on the
 `target_channels` specified, directs the notification to the `WebSocketManager`
 and/or the `PushNotificationService`.
 """
+from typing import Dict, List, Optional
 
 from creativeflow.services.notification.config import Settings
+from creativeflow.services.notification.core.delivery_router import DeliveryRouter
+from creativeflow.services.notification.core.device_token_registry import DeviceTokenRegistry
 from creativeflow.services.notification.core.push_notification_service import PushNotificationService
 from creativeflow.services.notification.core.schemas import NotificationPayload, PushNotificationContent, WebSocketMessage
 from creativeflow.services.notification.core.websocket_manager import WebSocketManager
-from creativeflow.services.notification.shared.exceptions import PushProviderError
+from creativeflow.services.notification.shared.exceptions import PartialPushDeliveryError
 from creativeflow.services.notification.shared.logger import get_logger
 
 logger = get_logger(__name__)
@@ -26,7 +29,9 @@ class NotificationManager:
         self,
         websocket_manager: WebSocketManager,
         push_service: PushNotificationService,
-        settings: Settings
+        settings: Settings,
+        delivery_router: Optional[DeliveryRouter] = None,
+        device_token_registry: Optional[DeviceTokenRegistry] = None
     ):
         """
         Initializes the NotificationManager with its dependencies.
@@ -35,10 +40,16 @@ class NotificationManager:
             websocket_manager: An instance of WebSocketManager.
             push_service: An instance of PushNotificationService.
             settings: The application settings.
+            delivery_router: Routes WebSocket messages to users connected to other instances.
+                If omitted, only users connected to this instance are reached.
+            device_token_registry: Remembers each user's device tokens and prunes invalid ones.
+                If omitted, pushes only go to the tokens carried by the notification.
         """
         self.websocket_manager = websocket_manager
         self.push_service = push_service
         self.settings = settings
+        self.delivery_router = delivery_router
+        self.device_token_registry = device_token_registry
 
     async def send_notification(self, payload: NotificationPayload):
         """
@@ -46,49 +57,92 @@ class NotificationManager:
 
         Args:
             payload: The validated notification payload from the message queue.
+
+        Raises:
+            PartialPushDeliveryError: If the push could not be sent to some of the user's devices.
+                It carries a payload limited to those devices, to be retried or dead-lettered
+                instead of the original one.
         """
         logger.info(f"Processing notification for user '{payload.user_id}' with event type '{payload.event_type}'.")
 
         # --- WebSocket Dispatch ---
-        if "websocket" in payload.target_channels:
+        if "websocket" in payload.target_channels and not payload.is_push_retry:
             ws_message = WebSocketMessage(type=payload.event_type, content=payload.data)
-            await self.websocket_manager.send_to_user(payload.user_id, ws_message)
+            if self.delivery_router:
+                await self.delivery_router.deliver(payload.user_id, ws_message)
+            else:
+                await self.websocket_manager.send_to_user(payload.user_id, ws_message)
             logger.info(f"Dispatched event '{payload.event_type}' to WebSocket for user '{payload.user_id}'.")
 
         # --- Push Notification Dispatch ---
         push_channels = [ch for ch in payload.target_channels if ch.startswith("push_")]
         if push_channels:
-            device_token = payload.device_token or payload.data.get('device_token')
-            if not device_token:
+            device_types = [ch[len("push_"):] for ch in push_channels]
+            device_tokens = await self._resolve_device_tokens(payload, device_types)
+            if not device_tokens:
                 logger.warning(f"Push notification requested for user '{payload.user_id}' but no device_token provided.")
                 return
 
+            # Construct a single push content object, sent to all the user's devices
+            push_content = self._construct_push_content(payload)
+            report = await self.push_service.send_push_to_devices(device_tokens, push_content)
+            logger.info(
+                f"Dispatched push for user '{payload.user_id}' to {report.sent} device(s); "
+                f"{len(report.invalid_tokens)} invalid, {len(report.failed_tokens)} failed."
+            )
+            if report.invalid_tokens and self.device_token_registry:
+                try:
+                    await self.device_token_registry.prune(payload.user_id, report.invalid_tokens)
+                except Exception as e:
+                    logger.error(f"Failed to prune the invalid device tokens of user '{payload.user_id}': {e}")
+            if report.failed_tokens:
+                logger.error(
+                    f"Failed to dispatch push for user '{payload.user_id}' to {len(report.failed_tokens)} device(s): "
+                    f"{set(report.failed_tokens.values())}"
+                )
+                raise PartialPushDeliveryError(report.failed_tokens, self._build_push_retry(payload, device_tokens, report.failed_tokens))
+
+    @staticmethod
+    def _build_push_retry(payload: NotificationPayload, device_tokens: Dict[str, List[str]], failed_tokens: Dict[str, str]) -> NotificationPayload:
+        """A copy of the payload that only pushes to the devices the push failed for."""
+        retry_tokens = {
+            device_type: [token for token in tokens if token in failed_tokens]
+            for device_type, tokens in device_tokens.items()
+        }
+        retry_tokens = {device_type: tokens for device_type, tokens in retry_tokens.items() if tokens}
+        return payload.model_copy(update={
+            "target_channels": [f"push_{device_type}" for device_type in retry_tokens],
+            "device_token": None,
+            "device_type": None,
+            "device_tokens": retry_tokens,
+            "is_push_retry": True,
+        })
+
+    async def _resolve_device_tokens(self, payload: NotificationPayload, device_types: List[str]) -> Dict[str, List[str]]:
+        """
+        Collects the tokens of the devices to push to, by device type.
+
+        Tokens come from `device_tokens`, and from the single `device_token` for
+        compatibility with older producers. With a registry, all the tokens known
+        for the user are included, except on a push retry, which only targets the
+        devices the earlier attempt failed for.
+        """
+        if payload.is_push_retry:
+            return {device_type: tokens for device_type in device_types if (tokens := payload.device_tokens.get(device_type))}
+        device_tokens = {device_type: list(payload.device_tokens.get(device_type, [])) for device_type in device_types}
+        device_token = payload.device_token or payload.data.get('device_token')
+        if device_token:
+            token_types = [payload.device_type.lower()] if payload.device_type else device_types
+            for device_type in token_types:
+                if device_type in device_tokens and device_token not in device_tokens[device_type]:
+                    device_tokens[device_type].append(device_token)
+
+        if self.device_token_registry:
             try:
-                # Construct a single push content object
-                push_content = self._construct_push_content(payload)
-                
-                # Dispatch to iOS
-                if "push_ios" in push_channels:
-                    await self.push_service.send_push(
-                        device_token=device_token,
-                        device_type="ios",
-                        content=push_content
-                    )
-                
-                # Dispatch to Android
-                if "push_android" in push_channels:
-                    await self.push_service.send_push(
-                        device_token=device_token,
-                        device_type="android",
-                        content=push_content
-                    )
-
-            except PushProviderError as e:
-                # Errors are already logged in the PushNotificationService,
-                # but we can add context here if needed.
-                logger.error(f"Failed to dispatch push for user '{payload.user_id}': {e}")
+                device_tokens = await self.device_token_registry.resolve(payload.user_id, device_tokens, device_types)
             except Exception as e:
-                logger.error(f"Unexpected error during push dispatch for user '{payload.user_id}': {e}")
+                logger.error(f"Failed to look up the device tokens of user '{payload.user_id}'; using the supplied ones: {e}")
+        return {device_type: tokens for device_type, tokens in device_tokens.items() if tokens}
 
     def _construct_push_content(self, payload: NotificationPayload) -> PushNotificationContent:
         """Helper to create a PushNotificationContent object from a payload."""
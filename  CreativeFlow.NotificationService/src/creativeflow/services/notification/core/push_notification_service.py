@@ -5,17 +5,47 @@ This module contains the `PushNotificationService`, which acts as a dispatcher.
 It receives a generic push notification request and, based on the device type,
 routes it to the correct client (APNS or FCM). This decouples the core logic
 from the specific implementation details of each push provider.
+
+Sends are batched: requests for the same device type and content, typically the
+notifications of one campaign, are grouped into batches of up to
+`PUSH_BATCH_SIZE` tokens, which are sent as one FCM multicast or one pipelined
+APNS batch. A batch is dispatched once full or `PUSH_BATCH_LINGER_MS` after its
+first request. Batches are sent by a pool of `PUSH_WORKER_COUNT` workers from a
+queue of at most `PUSH_QUEUE_MAX_BATCHES` batches; when it is full, callers wait,
+so a large campaign cannot queue unbounded work.
+
+Callers wait for their batch to be sent, so that failures can be retried. A batch
+therefore only holds the requests in progress at once: for the RabbitMQ consumer,
+the pushes of at most `RABBITMQ_MAX_CONCURRENCY` notifications, which is what
+`PUSH_BATCH_SIZE` is sized against.
 """
+import asyncio
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
 
 from creativeflow.services.notification.channels.push.apns_client import APNSClient
+from creativeflow.services.notification.channels.push.base_push_provider import BasePushProvider
 from creativeflow.services.notification.channels.push.fcm_client import FCMClient
 from creativeflow.services.notification.config import Settings
-from creativeflow.services.notification.core.schemas import PushNotificationContent
+from creativeflow.services.notification.core.schemas import PushDeliveryReport, PushNotificationContent
 from creativeflow.services.notification.shared.exceptions import PushProviderError
 from creativeflow.services.notification.shared.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Time given to queued batches to be sent at shutdown.
+SHUTDOWN_TIMEOUT_SECONDS = 10
+
+
+@dataclass
+class _PushBatch:
+    """Requests with the same device type and content, sent with one provider call."""
+    device_type: str
+    provider: BasePushProvider
+    content: PushNotificationContent
+    requests: List[Tuple[List[str], asyncio.Future]] = field(default_factory=list)
+    token_count: int = 0
+
 
 class PushNotificationService:
     """
@@ -34,6 +64,50 @@ class PushNotificationService:
         self.apns_client = apns_client
         self.fcm_client = fcm_client
         self.settings = settings
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # Batches still accepting requests, by device type and serialized content.
+        self._pending: Dict[Tuple[str, str], _PushBatch] = {}
+        self._linger_tasks: Set[asyncio.Task] = set()
+
+    async def start(self):
+        """Starts the pool of workers sending the queued batches."""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.settings.PUSH_QUEUE_MAX_BATCHES)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.settings.PUSH_WORKER_COUNT)]
+        logger.info(f"Push notification service started with {len(self._workers)} workers.")
+
+    async def stop(self):
+        """Sends the pending and queued batches, then stops the workers."""
+        if not self._workers:
+            return
+        for task in list(self._linger_tasks):
+            task.cancel()
+        for key in list(self._pending):
+            await self._queue.put(self._pending.pop(key))
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=SHUTDOWN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self._queue.qsize()} push batch(es) still queued at shutdown; they are dropped.")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info("Push notification service stopped.")
+
+    def _get_provider(self, device_type: str) -> Optional[BasePushProvider]:
+        if device_type == "ios":
+            if self.settings.ENABLE_APNS_PUSH:
+                return self.apns_client
+            logger.info("APNS provider is disabled. Skipping notification.")
+        elif device_type == "android":
+            if self.settings.ENABLE_FCM_PUSH:
+                return self.fcm_client
+            logger.info("FCM provider is disabled. Skipping notification.")
+        else:
+            logger.warning(f"Unsupported device_type '{device_type}'. Skipping notification.")
+        return None
 
     async def send_push(self, device_token: str, device_type: str, content: PushNotificationContent) -> None:
         """
@@ -43,29 +117,106 @@ class PushNotificationService:
             device_token: The unique token for the target device.
             device_type: The type of the device ('ios' or 'android').
             content: The structured content of the notification.
-        
+
         Raises:
             PushProviderError: If the selected provider fails to send the notification.
         """
         logger.info(f"Attempting to send push to {device_type} device with token starting {device_token[:8]}...")
-        device_type_lower = device_type.lower()
+        report = await self.send_push_to_devices({device_type: [device_token]}, content)
+        if report.failed_tokens:
+            error = report.failed_tokens[device_token]
+            logger.error(f"Push dispatch failed for {device_type} token {device_token[:8]}...: {error}")
+            # Re-raise to allow the caller (NotificationManager) to know about the failure.
+            raise PushProviderError(provider_name=device_type, original_error=error)
+
+    async def send_push_to_devices(self, device_tokens: Dict[str, List[str]], content: PushNotificationContent) -> PushDeliveryReport:
+        """
+        Sends a push notification to several devices, batched with other requests for the same content.
 
+        Args:
+            device_tokens: The tokens of the target devices, by device type ('ios' or 'android').
+            content: The structured content of the notification.
+
+        Returns:
+            A report of the devices the notification was sent to, and of those it was not.
+        """
+        await self.start()
+        futures = []
+        for device_type, tokens in device_tokens.items():
+            device_type = device_type.lower()
+            provider = self._get_provider(device_type)
+            tokens = list(dict.fromkeys(tokens))
+            if provider and tokens:
+                futures.append(await self._submit(device_type, provider, tokens, content))
+
+        report = PushDeliveryReport()
+        for token_report in await asyncio.gather(*futures):
+            report.sent += token_report.sent
+            report.invalid_tokens.extend(token_report.invalid_tokens)
+            report.failed_tokens.update(token_report.failed_tokens)
+        return report
+
+    async def _submit(self, device_type: str, provider: BasePushProvider, tokens: List[str],
+                      content: PushNotificationContent) -> asyncio.Future:
+        """Adds a request to the pending batch for its content, and dispatches the batch once full."""
+        key = (device_type, content.model_dump_json())
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = _PushBatch(device_type=device_type, provider=provider, content=content)
+            self._pending[key] = batch
+            if self.settings.PUSH_BATCH_LINGER_MS > 0:
+                task = asyncio.create_task(self._dispatch_later(key, batch))
+                self._linger_tasks.add(task)
+                task.add_done_callback(self._linger_tasks.discard)
+
+        future = asyncio.get_running_loop().create_future()
+        batch.requests.append((tokens, future))
+        batch.token_count += len(tokens)
+        if batch.token_count >= self.settings.PUSH_BATCH_SIZE or self.settings.PUSH_BATCH_LINGER_MS <= 0:
+            await self._dispatch(key, batch)
+        return future
+
+    async def _dispatch_later(self, key: Tuple[str, str], batch: _PushBatch):
+        await asyncio.sleep(self.settings.PUSH_BATCH_LINGER_MS / 1000)
+        await self._dispatch(key, batch)
+
+    async def _dispatch(self, key: Tuple[str, str], batch: _PushBatch):
+        # The batch may have been dispatched already, when it filled up before its linger time.
+        if self._pending.get(key) is batch:
+            del self._pending[key]
+            await self._queue.put(batch)
+
+    async def _worker(self):
+        while True:
+            batch = await self._queue.get()
+            try:
+                await self._send_batch(batch)
+            except Exception as e:
+                logger.exception(f"Unexpected error sending a {batch.device_type} push batch: {e}")
+                for _, future in batch.requests:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def _send_batch(self, batch: _PushBatch):
+        """Sends a batch with one provider call and reports the outcome to each of its requests."""
+        tokens = list(dict.fromkeys(token for request_tokens, _ in batch.requests for token in request_tokens))
         try:
-            if device_type_lower == "ios":
-                if self.settings.ENABLE_APNS_PUSH:
-                    await self.apns_client.send(device_token, content)
-                else:
-                    logger.info("APNS provider is disabled. Skipping notification.")
-            elif device_type_lower == "android":
-                if self.settings.ENABLE_FCM_PUSH:
-                    await self.fcm_client.send(device_token, content)
-                else:
-                    logger.info("FCM provider is disabled. Skipping notification.")
-            else:
-                logger.warning(
-                    f"Unsupported device_type '{device_type}' or provider disabled for token {device_token[:8]}..."
-                )
+            report = await batch.provider.send_multicast(tokens, batch.content)
         except PushProviderError as e:
-            logger.error(f"Push dispatch failed for {device_type} token {device_token[:8]...}: {e}")
-            # Re-raise to allow the caller (NotificationManager) to know about the failure.
-            raise
\ No newline at end of file
+            logger.error(f"Push dispatch failed for a batch of {len(tokens)} {batch.device_type} token(s): {e}")
+            report = PushDeliveryReport(failed_tokens={token: str(e.original_error) for token in tokens})
+
+        invalid_tokens = set(report.invalid_tokens)
+        for request_tokens, future in batch.requests:
+            if future.done():
+                continue  # The caller was cancelled
+            request_report = PushDeliveryReport(
+                invalid_tokens=[token for token in request_tokens if token in invalid_tokens],
+                failed_tokens={token: report.failed_tokens[token] for token in request_tokens if token in report.failed_tokens},
+            )
+            # A provider that is not initialized sends nothing and reports no failures.
+            if report.sent:
+                request_report.sent = len(request_tokens) - len(request_report.invalid_tokens) - len(request_report.failed_tokens)
+            future.set_result(request_report)
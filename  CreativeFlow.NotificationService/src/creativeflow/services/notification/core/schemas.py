@@ -24,6 +24,15 @@ class NotificationPayload(BaseModel):
     )
     device_token: Optional[str] = Field(None, description="Device token for push notifications.")
     device_type: Optional[str] = Field(None, description="Device type ('ios' or 'android') for push notifications.")
+    device_tokens: Dict[str, List[str]] = Field(
+        default_factory=dict,
+        description="Device tokens of all the user's devices, by device type, e.g., {'ios': [...], 'android': [...]}."
+    )
+    is_push_retry: bool = Field(
+        False,
+        description="Set on the retry of a partially failed push: only `device_tokens` are pushed to, "
+                    "nothing else is sent, and the notification is not coalesced."
+    )
 
 
 class WebSocketMessage(BaseModel):
@@ -42,4 +51,19 @@ class PushNotificationContent(BaseModel):
     title: Optional[str] = Field(None, description="The title of the push notification.")
     body: str = Field(..., description="The main text content of the push notification.")
     data: Optional[Dict[str, Any]] = Field(None, description="Custom data payload for the client app to handle.")
-    deep_link_url: Optional[str] = Field(None, description="A deep link URL for the client app to open.")
\ No newline at end of file
+    deep_link_url: Optional[str] = Field(None, description="A deep link URL for the client app to open.")
+
+
+class PushDeliveryReport(BaseModel):
+    """
+    Outcome of sending a push notification to a set of device tokens.
+    """
+    sent: int = Field(0, description="Number of devices the provider accepted the notification for.")
+    invalid_tokens: List[str] = Field(
+        default_factory=list,
+        description="Tokens the provider reported as unregistered or invalid; they should not be used again."
+    )
+    failed_tokens: Dict[str, str] = Field(
+        default_factory=dict,
+        description="Tokens the notification could not be sent to for another reason, with the reason."
+    )
@@ -0,0 +1,158 @@
+"""
+Pre-encoded WebSocket frames for sending one message to many connections.
+
+`WebSocket.send_text` encodes, frames and, with permessage-deflate, compresses
+the message again for every connection. A `PreparedMessage` is serialized once
+and holds the complete frame bytes, which are written as-is to the transport of
+every connection served by uvicorn's `websockets` implementation:
+
+- A plain (uncompressed) text frame is valid on any connection, with or without
+  permessage-deflate: compression is optional per message, and an uncompressed
+  message does not touch either side's compression context.
+- A precompressed frame, compressed once per negotiated window size, is used for
+  connections whose server side resets its compression context after each
+  message (`server_no_context_takeover`). On other deflate connections, a frame
+  compressed without the connection's context would desynchronize the client's
+  decoder from the server's encoder, so they get the plain frame.
+
+The protocol object is reached through the closures Starlette wraps around
+uvicorn's ASGI `send`, and the frames bypass the protocol's own write path. This
+relies on the versions pinned in requirements.txt (uvicorn 0.29, websockets 12,
+Starlette 0.37). Connections whose protocol object cannot be reached, or does not
+have the expected interface (e.g. the `wsproto` implementation, or other
+versions), and connections that are not open, fall back to `send_text`, which
+goes through the protocol's own checks.
+"""
+import zlib
+from typing import Any, Callable, Dict, Optional
+
+try:
+    from websockets.extensions.permessage_deflate import PerMessageDeflate
+    from websockets.legacy.protocol import WebSocketCommonProtocol
+    from websockets.protocol import State
+except ImportError:  # pragma: no cover
+    PerMessageDeflate = WebSocketCommonProtocol = State = None
+
+_OPCODE_TEXT = 0x1
+_FIN = 0x80
+_RSV1 = 0x40
+# Trailer of a deflate block flushed with Z_SYNC_FLUSH, which RFC 7692 strips from frames.
+_EMPTY_UNCOMPRESSED_BLOCK = b"\x00\x00\xff\xff"
+
+# Bounds the search for the protocol object through the ASGI middleware wrapping `send`.
+_MAX_SEND_WRAPPERS = 32
+# The protocol attributes pre-encoded frames are written with.
+_PROTOCOL_ATTRIBUTES = ("state", "transport", "extensions", "drain")
+
+
+def _frame(data: bytes, compressed: bool) -> bytes:
+    """Encodes an unmasked, final text frame, as sent by a server."""
+    first_byte = _FIN | (_RSV1 if compressed else 0) | _OPCODE_TEXT
+    length = len(data)
+    if length < 126:
+        header = bytes((first_byte, length))
+    elif length < 65536:
+        header = bytes((first_byte, 126)) + length.to_bytes(2, "big")
+    else:
+        header = bytes((first_byte, 127)) + length.to_bytes(8, "big")
+    return header + data
+
+
+def find_protocol(send: Callable) -> Optional[Any]:
+    """
+    Finds the `websockets` protocol object behind a WebSocket's ASGI `send` callable.
+
+    uvicorn passes the bound `asgi_send` method of its protocol to the application;
+    Starlette wraps it in closures for exception handling. Returns None if the
+    connection is not served by the `websockets` implementation, or by one without
+    the expected interface.
+    """
+    if WebSocketCommonProtocol is None or send is None:
+        return None
+    pending = [send]
+    for _ in range(_MAX_SEND_WRAPPERS):
+        if not pending:
+            break
+        candidate = pending.pop()
+        owner = getattr(candidate, "__self__", None)
+        if isinstance(owner, WebSocketCommonProtocol):
+            if all(hasattr(owner, attribute) for attribute in _PROTOCOL_ATTRIBUTES):
+                return owner
+            return None
+        for cell in getattr(candidate, "__closure__", None) or ():
+            try:
+                contents = cell.cell_contents
+            except ValueError:  # Empty cell
+                continue
+            if callable(contents):
+                pending.append(contents)
+    return None
+
+
+def is_writable(protocol: Any) -> bool:
+    """Whether pre-encoded frames can be written to the connection: it is open, and its transport is not closing."""
+    transport = getattr(protocol, "transport", None)
+    return protocol.state is State.OPEN and transport is not None and not transport.is_closing()
+
+
+class PreparedMessage:
+    """
+    A text message serialized once, with its frames built on first use and shared by all connections.
+    """
+
+    def __init__(self, text: str, compression_threshold: int = 512):
+        """
+        Initializes the PreparedMessage.
+
+        Args:
+            text: The message to send.
+            compression_threshold: Size in bytes below which the message is never compressed.
+        """
+        self.text = text
+        self.data = text.encode("utf-8")
+        self._compression_threshold = compression_threshold
+        self._plain_frame: Optional[bytes] = None
+        # Precompressed frames, by negotiated window size.
+        self._deflated_frames: Dict[int, bytes] = {}
+
+    @property
+    def plain_frame(self) -> bytes:
+        if self._plain_frame is None:
+            self._plain_frame = _frame(self.data, compressed=False)
+        return self._plain_frame
+
+    def _deflated_frame(self, max_window_bits: int) -> bytes:
+        frame = self._deflated_frames.get(max_window_bits)
+        if frame is None:
+            compressor = zlib.compressobj(wbits=-max_window_bits)
+            data = compressor.compress(self.data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data.endswith(_EMPTY_UNCOMPRESSED_BLOCK):
+                data = data[:-len(_EMPTY_UNCOMPRESSED_BLOCK)]
+            frame = _frame(data, compressed=True)
+            self._deflated_frames[max_window_bits] = frame
+        return frame
+
+    def frame_for(self, protocol: Any) -> bytes:
+        """Returns the frame to write to a connection, according to its negotiated extensions."""
+        if len(self.data) >= self._compression_threshold:
+            for extension in protocol.extensions:
+                if isinstance(extension, PerMessageDeflate) and extension.local_no_context_takeover:
+                    return self._deflated_frame(extension.local_max_window_bits)
+        return self.plain_frame
+
+    def write_to(self, protocol: Any) -> bool:
+        """
+        Writes the message to an open connection without awaiting. Callers check
+        `is_writable` first, and send other connections the text instead.
+
+        Returns:
+            True if the connection's write buffer is over its limit, and should be drained.
+
+        Raises:
+            ConnectionError: If the connection is not open.
+        """
+        if not is_writable(protocol):
+            raise ConnectionError("WebSocket connection is not open.")
+        transport = protocol.transport
+        transport.write(self.frame_for(protocol))
+        return transport.get_write_buffer_size() > transport.get_write_buffer_limits()[1]
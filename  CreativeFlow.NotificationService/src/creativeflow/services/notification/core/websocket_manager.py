@@ -6,13 +6,20 @@ maintaining a state of all active client connections. It provides methods to
 connect and disconnect clients, and to send messages to specific users or
 broadcast to all connected clients. This manager is instance-local, meaning
 it only knows about connections to the specific service instance where it runs.
+
+Broadcasts serialize the message once into a `PreparedMessage` whose frame bytes
+are shared by all connections, and write them to the connections chunk by chunk
+without a round of awaits per connection; only connections whose write buffer is
+full are awaited, concurrently and with a timeout.
 """
+import asyncio
 from collections import defaultdict
-from typing import Dict, List
+from typing import Any, Dict, List, Tuple
 
 from fastapi import WebSocket
 
 from creativeflow.services.notification.core.schemas import WebSocketMessage
+from creativeflow.services.notification.core.websocket_frames import PreparedMessage, find_protocol, is_writable
 from creativeflow.services.notification.shared.logger import get_logger
 
 logger = get_logger(__name__)
@@ -23,9 +30,21 @@ class WebSocketManager:
     Manages WebSocket client connections on a per-instance basis.
     """
 
-    def __init__(self):
-        """Initializes the WebSocketManager."""
+    def __init__(self, broadcast_chunk_size: int = 1000, broadcast_send_timeout: float = 5.0, compression_threshold: int = 512):
+        """
+        Initializes the WebSocketManager.
+
+        Args:
+            broadcast_chunk_size: Number of connections written to before a broadcast yields to the event loop.
+            broadcast_send_timeout: Time a broadcast waits for the slow connections of a chunk.
+            compression_threshold: Size in bytes from which broadcasts are sent precompressed, where supported.
+        """
         self.active_connections: Dict[str, List[WebSocket]] = defaultdict(list)
+        # The `websockets` protocol objects of the connections, for writing pre-encoded frames.
+        self._protocols: Dict[WebSocket, Any] = {}
+        self._broadcast_chunk_size = broadcast_chunk_size
+        self._broadcast_send_timeout = broadcast_send_timeout
+        self._compression_threshold = compression_threshold
 
     async def connect(self, websocket: WebSocket, user_id: str):
         """
@@ -37,6 +56,14 @@ class WebSocketManager:
         """
         await websocket.accept()
         self.active_connections[user_id].append(websocket)
+        try:
+            protocol = find_protocol(getattr(websocket, "_send", None))
+        except Exception as e:
+            # Broadcasts to this connection fall back to `send_text`.
+            logger.debug(f"Could not find the WebSocket protocol of user {user_id}: {e}")
+            protocol = None
+        if protocol is not None:
+            self._protocols[websocket] = protocol
         logger.info(f"WebSocket connected for user: {user_id}. Total connections for user: {len(self.active_connections[user_id])}")
 
     def disconnect(self, websocket: WebSocket, user_id: str):
@@ -50,6 +77,7 @@ class WebSocketManager:
         if user_id in self.active_connections:
             if websocket in self.active_connections[user_id]:
                 self.active_connections[user_id].remove(websocket)
+                self._protocols.pop(websocket, None)
                 if not self.active_connections[user_id]:
                     del self.active_connections[user_id]
                 logger.info(f"WebSocket disconnected for user: {user_id}.")
@@ -58,7 +86,7 @@ class WebSocketManager:
         else:
             logger.warning(f"Attempted to disconnect websocket for a user {user_id} with no active connections.")
 
-    async def send_to_user(self, user_id: str, message: WebSocketMessage):
+    async def send_to_user(self, user_id: str, message: WebSocketMessage) -> int:
         """
         Sends a message to all active connections for a specific user.
 
@@ -68,11 +96,14 @@ class WebSocketManager:
         Args:
             user_id: The ID of the target user.
             message: The WebSocketMessage object to send.
+
+        Returns:
+            The number of connections the message was sent to.
         """
         if user_id in self.active_connections:
             connections = self.active_connections[user_id][:]  # Create a copy for safe iteration
             if not connections:
-                return
+                return 0
 
             message_json = message.model_dump_json()
             disconnected_sockets = []
@@ -89,28 +120,57 @@ class WebSocketManager:
                 self.disconnect(sock, user_id)
             
             logger.debug(f"Sent message of type '{message.type}' to {len(connections) - len(disconnected_sockets)} connections for user {user_id}.")
+            return len(connections) - len(disconnected_sockets)
+        return 0
 
     async def broadcast(self, message: WebSocketMessage):
         """
         Sends a message to all connected clients. Use with caution.
 
+        The message is serialized once. Connections are written to in chunks of
+        `broadcast_chunk_size`; within a chunk, the connections that need to be
+        awaited (full write buffers, no access to pre-encoded frames, or not
+        open) are awaited concurrently, up to `broadcast_send_timeout`.
+
         Args:
             message: The WebSocketMessage object to broadcast.
         """
-        all_user_ids = list(self.active_connections.keys())
-        message_json = message.model_dump_json()
-
-        logger.info(f"Broadcasting message of type '{message.type}' to all users.")
-        
-        for user_id in all_user_ids:
-            connections = self.active_connections.get(user_id, [])[:]
-            disconnected_sockets = []
-            for connection in connections:
+        prepared = PreparedMessage(message.model_dump_json(), self._compression_threshold)
+        targets = [
+            (user_id, connection)
+            for user_id, connections in list(self.active_connections.items())
+            for connection in connections
+        ]
+        logger.info(f"Broadcasting message of type '{message.type}' to {len(targets)} connections.")
+
+        failed: List[Tuple[str, WebSocket]] = []
+        for start in range(0, len(targets), self._broadcast_chunk_size):
+            waiting = []
+            for user_id, connection in targets[start:start + self._broadcast_chunk_size]:
+                protocol = self._protocols.get(connection)
+                if protocol is None or not is_writable(protocol):
+                    waiting.append((user_id, connection, connection.send_text(prepared.text)))
+                    continue
                 try:
-                    await connection.send_text(message_json)
+                    if prepared.write_to(protocol):
+                        waiting.append((user_id, connection, protocol.drain()))
                 except Exception as e:
                     logger.warning(f"Failed to broadcast to a WebSocket for user {user_id}. Error: {e}")
-                    disconnected_sockets.append(connection)
+                    failed.append((user_id, connection))
+
+            if waiting:
+                tasks = [asyncio.ensure_future(send) for _, _, send in waiting]
+                _, pending = await asyncio.wait(tasks, timeout=self._broadcast_send_timeout)
+                for (user_id, connection, _), task in zip(waiting, tasks):
+                    if task in pending:
+                        # Slow client: the frame stays buffered, but the broadcast moves on.
+                        task.cancel()
+                    elif task.exception():
+                        logger.warning(f"Failed to broadcast to a WebSocket for user {user_id}. Error: {task.exception()}")
+                        failed.append((user_id, connection))
+            else:
+                # Let other tasks run between chunks.
+                await asyncio.sleep(0)
 
-            for sock in disconnected_sockets:
-                self.disconnect(sock, user_id)
\ No newline at end of file
+        for user_id, connection in failed:
+            self.disconnect(connection, user_id)
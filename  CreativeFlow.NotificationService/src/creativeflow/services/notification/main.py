@@ -6,7 +6,6 @@ like service managers and message consumers, and defines application lifecycle
 events for startup and shutdown.
 """
 import asyncio
-import threading
 
 from fastapi import FastAPI, Request
 
@@ -14,6 +13,9 @@ from creativeflow.services.notification.api import websocket_endpoints
 from creativeflow.services.notification.channels.push.apns_client import APNSClient
 from creativeflow.services.notification.channels.push.fcm_client import FCMClient
 from creativeflow.services.notification.config import Settings, get_settings
+from creativeflow.services.notification.core.delivery_router import DeliveryRouter
+from creativeflow.services.notification.core.device_token_registry import DeviceTokenRegistry
+from creativeflow.services.notification.core.notification_coalescer import NotificationCoalescer
 from creativeflow.services.notification.core.notification_manager import NotificationManager
 from creativeflow.services.notification.core.push_notification_service import PushNotificationService
 from creativeflow.services.notification.core.websocket_manager import WebSocketManager
@@ -55,27 +57,45 @@ async def startup_event():
     apns_client = APNSClient(config=settings)
     fcm_client = FCMClient(config=settings)
     
+    # Cross-instance routing of WebSocket messages
+    delivery_router = None
+    if settings.ENABLE_CROSS_INSTANCE_DELIVERY:
+        delivery_router = DeliveryRouter(settings, app.state.websocket_manager)
+        await delivery_router.start()
+        app.state.delivery_router = delivery_router
+
     # Core Services
     push_service = PushNotificationService(apns_client, fcm_client, settings)
-    notification_manager = NotificationManager(app.state.websocket_manager, push_service, settings)
+    await push_service.start()
+    app.state.push_service = push_service
+    device_token_registry = None
+    if settings.ENABLE_DEVICE_TOKEN_REGISTRY:
+        device_token_registry = DeviceTokenRegistry(settings)
+        app.state.device_token_registry = device_token_registry
+    notification_manager = NotificationManager(
+        app.state.websocket_manager, push_service, settings, delivery_router, device_token_registry
+    )
     
+    coalescer = None
+    if settings.ENABLE_NOTIFICATION_COALESCING:
+        coalescer = NotificationCoalescer(settings, notification_manager)
+        app.state.coalescer = coalescer
+
     # Messaging Layer
-    message_handler = MessageHandler(notification_manager)
+    message_handler = MessageHandler(notification_manager, coalescer)
     logger.info("Service components initialized.")
 
     # --- Start Message Consumers ---
-    # RabbitMQ Consumer (runs in a separate thread)
+    # RabbitMQ Consumer (runs on the event loop; connects in the background)
     if settings.ENABLE_RABBITMQ_CONSUMER:
         logger.info("Starting RabbitMQ consumer...")
         rabbitmq_consumer = RabbitMQConsumer(settings, message_handler)
         app.state.rabbitmq_consumer = rabbitmq_consumer
-        consumer_thread = threading.Thread(
-            target=rabbitmq_consumer.start_consuming,
-            args=(settings.RABBITMQ_QUEUE_NAME_AI_UPDATES,),
-            daemon=True
+        if coalescer:
+            coalescer.set_retry_handler(rabbitmq_consumer.retry_notification)
+        app.state.rabbitmq_task = asyncio.create_task(
+            rabbitmq_consumer.start_consuming(settings.RABBITMQ_QUEUE_NAME_AI_UPDATES)
         )
-        consumer_thread.start()
-        app.state.rabbitmq_thread = consumer_thread
 
     # Redis Consumer (runs as an asyncio task)
     if settings.ENABLE_REDIS_CONSUMER:
@@ -91,6 +111,14 @@ async def startup_event():
     logger.info("CreativeFlow Notification Service has started successfully.")
 
 
+async def _run_shutdown_step(name: str, step):
+    """Awaits one shutdown step, logging (rather than raising) its failure."""
+    try:
+        await step
+    except Exception as e:
+        logger.exception(f"Failed to stop the {name}: {e}")
+
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """
@@ -102,10 +130,10 @@ async def shutdown_event():
     # Stop RabbitMQ Consumer
     if hasattr(app.state, 'rabbitmq_consumer'):
         logger.info("Stopping RabbitMQ consumer...")
-        app.state.rabbitmq_consumer.stop_consuming()
-        # Wait for the thread to finish
-        if hasattr(app.state, 'rabbitmq_thread'):
-            app.state.rabbitmq_thread.join(timeout=5)
+        await app.state.rabbitmq_consumer.stop_consuming()
+        # Still connecting if the broker was never reachable
+        if hasattr(app.state, 'rabbitmq_task') and not app.state.rabbitmq_task.done():
+            app.state.rabbitmq_task.cancel()
         logger.info("RabbitMQ consumer stopped.")
 
     # Stop Redis Consumer
@@ -120,6 +148,22 @@ async def shutdown_event():
         if hasattr(app.state, 'redis_consumer'):
             await app.state.redis_consumer.stop_listening()
 
+    # Send the notifications held for coalescing, then the pushes still batched.
+    # Each step is guarded so that one failure does not skip the cleanup after it.
+    if hasattr(app.state, 'coalescer'):
+        await _run_shutdown_step("notification coalescer", app.state.coalescer.stop())
+    # Closed after the coalescer, which may queue failed digests for retry.
+    if hasattr(app.state, 'rabbitmq_consumer'):
+        await _run_shutdown_step("RabbitMQ connection", app.state.rabbitmq_consumer.close())
+    if hasattr(app.state, 'push_service'):
+        await _run_shutdown_step("push notification service", app.state.push_service.stop())
+    if hasattr(app.state, 'device_token_registry'):
+        await _run_shutdown_step("device token registry", app.state.device_token_registry.close())
+
+    # Stop routing last, after the consumers stopped producing deliveries
+    if hasattr(app.state, 'delivery_router'):
+        await _run_shutdown_step("delivery router", app.state.delivery_router.stop())
+
     logger.info("CreativeFlow Notification Service has shut down gracefully.")
 
 
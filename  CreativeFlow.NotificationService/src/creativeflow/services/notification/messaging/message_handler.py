@@ -7,10 +7,11 @@ RabbitMQ or Redis. Once a message is validated against the `NotificationPayload`
 schema, it is forwarded to the `NotificationManager` for dispatching.
 """
 import json
-from typing import Union
+from typing import Optional, Union
 
 from pydantic import ValidationError
 
+from creativeflow.services.notification.core.notification_coalescer import NotificationCoalescer
 from creativeflow.services.notification.core.notification_manager import NotificationManager
 from creativeflow.services.notification.core.schemas import NotificationPayload
 from creativeflow.services.notification.shared.exceptions import InvalidMessageFormatError
@@ -24,14 +25,16 @@ class MessageHandler:
     Processes raw messages from queues, validates them, and triggers notifications.
     """
 
-    def __init__(self, notification_manager: NotificationManager):
+    def __init__(self, notification_manager: NotificationManager, coalescer: Optional[NotificationCoalescer] = None):
         """
         Initializes the MessageHandler.
 
         Args:
             notification_manager: An instance of the central NotificationManager.
+            coalescer: Merges bursts of notifications before they reach the manager. Optional.
         """
         self.notification_manager = notification_manager
+        self.coalescer = coalescer
 
     async def handle_message(self, raw_message_body: Union[bytes, str], message_source: str):
         """
@@ -62,4 +65,7 @@ class MessageHandler:
             raise InvalidMessageFormatError(error_msg)
 
         # If parsing and validation succeed, dispatch the notification.
-        await self.notification_manager.send_notification(payload)
\ No newline at end of file
+        if self.coalescer:
+            await self.coalescer.send_notification(payload)
+        else:
+            await self.notification_manager.send_notification(payload)
\ No newline at end of file
@@ -1,24 +1,145 @@
 """
-RabbitMQ message consumer using the `pika` library.
+RabbitMQ message consumer using the asyncio-native `aio-pika` library.
 
 This module provides a class to connect to a RabbitMQ broker, consume messages
-from a specified queue, and process them. It is designed to run in a separate
-thread to avoid blocking the main application's async event loop.
+from a specified queue, and process them. It runs on the application's event
+loop, so message handling shares the loop with the `WebSocketManager` instead
+of spinning up an event loop per message on a separate thread.
+
+Up to `RABBITMQ_PREFETCH_COUNT` messages are delivered ahead of processing and
+at most `RABBITMQ_MAX_CONCURRENCY` are handled at once. Acks are batched: the
+highest delivery tag below which every message has been settled is acked with
+`multiple=True`, either once `RABBITMQ_ACK_BATCH_SIZE` messages have completed
+or after `RABBITMQ_ACK_BATCH_INTERVAL_MS`.
+
+Failed messages are routed as follows:
+  - Messages that cannot be parsed or validated are dead-lettered at once.
+  - Messages whose handling raises another error are retried with an
+    incremented `x-retry-count` header, up to `RABBITMQ_MAX_RETRIES` times, and
+    dead-lettered after that. After a partial push failure, the retried message
+    only targets the devices the push failed for.
+Retries are delayed, so that a downstream outage does not use up the retry
+budget at once: retry N is published to the `<queue>.retry.<delay>ms` queue,
+whose messages expire after `RABBITMQ_RETRY_BASE_DELAY_MS * 2^(N-1)` and are
+then dead-lettered back to the queue. Each delay has its own queue, as a queue
+only expires the message at its head.
+Dead-lettered messages are published to the `RABBITMQ_DEAD_LETTER_EXCHANGE`
+exchange, which routes them to the `<queue>.dead_letter` queue.
+
+Notifications that fail after their message was acked, such as the digests of
+the `NotificationCoalescer`, are queued for retry with `retry_notification`.
 """
 import asyncio
-import threading
-import time
+from collections import OrderedDict
+from typing import List, Optional, Set
 
-import pika
-from pika.exceptions import AMQPConnectionError
+import aio_pika
+from aio_pika.abc import AbstractIncomingMessage
+from aio_pika.exceptions import AMQPConnectionError
 
 from creativeflow.services.notification.config import Settings
+from creativeflow.services.notification.core.schemas import NotificationPayload
 from creativeflow.services.notification.messaging.message_handler import MessageHandler
-from creativeflow.services.notification.shared.exceptions import InvalidMessageFormatError
+from creativeflow.services.notification.shared.exceptions import InvalidMessageFormatError, PartialPushDeliveryError
 from creativeflow.services.notification.shared.logger import get_logger
 
 logger = get_logger(__name__)
 
+RETRY_COUNT_HEADER = "x-retry-count"
+
+
+class _AckBatcher:
+    """
+    Tracks the messages in flight on a channel and acks settled ones in batches.
+
+    Delivery tags increase in delivery order, so acking a tag with `multiple=True`
+    settles every earlier message too. Only the longest prefix of completed
+    messages can therefore be acked; a slow message holds back the acks of the
+    ones delivered after it until it completes.
+
+    Delivery tags restart on a reopened channel, so tracked messages belong to a
+    channel generation, bumped by `reset`. Completions from an earlier generation,
+    or of messages that are not tracked, are ignored. Messages the handler already
+    settled itself (nacked) are never the target of a batched ack.
+    """
+
+    def __init__(self, batch_size: int, interval: float):
+        self._batch_size = batch_size
+        self._interval = interval
+        self._generation = 0
+        self._outstanding: "OrderedDict[int, AbstractIncomingMessage]" = OrderedDict()
+        self._completed: Set[int] = set()
+        self._settled: Set[int] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def track(self, message: AbstractIncomingMessage) -> int:
+        """Tracks a delivered message. Returns the channel generation to complete it with."""
+        self._outstanding[message.delivery_tag] = message
+        return self._generation
+
+    def complete(self, message: AbstractIncomingMessage, generation: int, settled: bool = False) -> None:
+        """
+        Marks a tracked message as handled.
+
+        Args:
+            message: The message.
+            generation: The channel generation returned by `track`.
+            settled: Whether the message was already nacked, so it must not be acked.
+        """
+        tag = message.delivery_tag
+        if generation != self._generation or tag not in self._outstanding or tag in self._completed:
+            # Its channel is gone (the broker redelivers it), or it was already completed.
+            return
+        self._completed.add(tag)
+        if settled:
+            self._settled.add(tag)
+        if len(self._completed) >= self._batch_size:
+            task = asyncio.get_event_loop().create_task(self.flush())
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_event_loop().create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self._interval)
+        await self.flush()
+
+    async def flush(self) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # Serialized so acks go out in increasing tag order; acking a tag already
+        # covered by a later multiple-ack is a channel error.
+        async with self._lock:
+            last_settled = None
+            while self._outstanding:
+                tag = next(iter(self._outstanding))
+                if tag not in self._completed:
+                    break
+                self._completed.discard(tag)
+                message = self._outstanding.pop(tag)
+                if tag in self._settled:
+                    # Nacked already: a later multiple-ack skips it, but acking it itself is an error.
+                    self._settled.discard(tag)
+                else:
+                    last_settled = message
+            if last_settled is None:
+                return
+            try:
+                await last_settled.ack(multiple=True)
+                logger.debug(f"ACKed RabbitMQ messages up to delivery tag {last_settled.delivery_tag}.")
+            except Exception as e:
+                # The channel was closed; the broker redelivers the unacked messages.
+                logger.error(f"Failed to ACK RabbitMQ messages up to delivery tag {last_settled.delivery_tag}: {e}")
+
+    def reset(self) -> None:
+        """Forgets all tracked messages, e.g. after their channel was closed, and starts a new generation."""
+        self._generation += 1
+        self._outstanding.clear()
+        self._completed.clear()
+        self._settled.clear()
+
 
 class RabbitMQConsumer:
     """
@@ -35,93 +156,234 @@ class RabbitMQConsumer:
         """
         self.config = config
         self.message_handler = message_handler
-        self.connection = None
-        self.channel = None
+        self.connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self.channel: Optional[aio_pika.abc.AbstractChannel] = None
+        self._queue: Optional[aio_pika.abc.AbstractQueue] = None
+        self._consumer_tag: Optional[str] = None
+        self._dead_letter_exchange: Optional[aio_pika.abc.AbstractExchange] = None
+        self._retry_queue_names: List[str] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._ack_batcher = _AckBatcher(
+            batch_size=config.RABBITMQ_ACK_BATCH_SIZE,
+            interval=config.RABBITMQ_ACK_BATCH_INTERVAL_MS / 1000,
+        )
+        self._handler_tasks: Set[asyncio.Task] = set()
         self._stopping = False
 
-    def _connect(self):
-        """Establishes a connection to RabbitMQ with retry logic."""
+    async def _connect(self) -> bool:
+        """Establishes a robust connection to RabbitMQ with retry logic."""
         retry_delay = 5
         while not self._stopping:
             try:
                 logger.info(f"Attempting to connect to RabbitMQ at {self.config.RABBITMQ_URL}")
-                params = pika.URLParameters(self.config.RABBITMQ_URL)
-                self.connection = pika.BlockingConnection(params)
-                self.channel = self.connection.channel()
+                self.connection = await aio_pika.connect_robust(self.config.RABBITMQ_URL)
+                self.channel = await self.connection.channel()
+                # Delivery tags restart on a reopened channel, and unacked messages are redelivered.
+                self.channel.close_callbacks.add(lambda *_: self._ack_batcher.reset())
                 logger.info("RabbitMQ connection established successfully.")
                 return True
-            except AMQPConnectionError as e:
+            except (AMQPConnectionError, OSError) as e:
                 logger.error(f"Failed to connect to RabbitMQ: {e}. Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
+                await asyncio.sleep(retry_delay)
         return False
 
-    def _setup_channel_and_queue(self, queue_name: str):
-        """Declares the queue, ensuring it exists and is durable."""
-        if self.channel:
-            self.channel.queue_declare(queue=queue_name, durable=True)
-            logger.info(f"Queue '{queue_name}' declared as durable.")
+    async def _setup_channel_and_queue(self, queue_name: str):
+        """Declares the queue, ensuring it exists and is durable, and its retry and dead-letter queues."""
+        self._queue = await self.channel.declare_queue(queue_name, durable=True)
+        logger.info(f"Queue '{queue_name}' declared as durable.")
+
+        self._dead_letter_exchange = await self.channel.declare_exchange(
+            self.config.RABBITMQ_DEAD_LETTER_EXCHANGE, aio_pika.ExchangeType.DIRECT, durable=True
+        )
+        dead_letter_queue = await self.channel.declare_queue(f"{queue_name}.dead_letter", durable=True)
+        await dead_letter_queue.bind(self._dead_letter_exchange, routing_key=queue_name)
+        logger.info(f"Dead-letter queue '{queue_name}.dead_letter' declared.")
+
+        self._retry_queue_names = []
+        for attempt in range(self.config.RABBITMQ_MAX_RETRIES):
+            delay_ms = self.config.RABBITMQ_RETRY_BASE_DELAY_MS * 2 ** attempt
+            retry_queue = await self.channel.declare_queue(
+                f"{queue_name}.retry.{delay_ms}ms",
+                durable=True,
+                arguments={
+                    "x-message-ttl": delay_ms,
+                    "x-dead-letter-exchange": "",
+                    "x-dead-letter-routing-key": queue_name,
+                },
+            )
+            self._retry_queue_names.append(retry_queue.name)
+        logger.info(f"Retry queues declared: {self._retry_queue_names}.")
+
+    async def _on_message(self, message: AbstractIncomingMessage):
+        """
+        Callback executed when a message is received. Handling runs in its own
+        task, bounded by the concurrency semaphore.
+        """
+        generation = self._ack_batcher.track(message)
+        task = asyncio.get_event_loop().create_task(self._process_message(message, generation))
+        self._handler_tasks.add(task)
+        task.add_done_callback(self._handler_tasks.discard)
+
+    async def _process_message(self, message: AbstractIncomingMessage, generation: int):
+        logger.debug(f"Received RabbitMQ message with delivery tag {message.delivery_tag}")
+        settled = False
+        async with self._semaphore:
+            try:
+                await self.message_handler.handle_message(message.body, "RabbitMQ")
+                logger.debug(f"Successfully processed message {message.delivery_tag}.")
+            except InvalidMessageFormatError as e:
+                logger.error(f"Invalid message format. Dead-lettering message {message.delivery_tag}.")
+                settled = not await self._dead_letter(message, f"invalid_format: {e}")
+            except Exception as e:
+                logger.exception(f"Unexpected error processing message {message.delivery_tag}. Error: {e}")
+                settled = not await self._retry_or_dead_letter(message, e)
+        self._ack_batcher.complete(message, generation, settled=settled)
+
+    async def _retry_or_dead_letter(self, message: AbstractIncomingMessage, error: Exception) -> bool:
+        """Republishes or dead-letters the message. Returns False if it was rejected instead, see `_dead_letter`."""
+        retries = int((message.headers or {}).get(RETRY_COUNT_HEADER, 0))
+        # After a partial push failure, only the devices it failed for are retried.
+        body = error.retry_payload.model_dump_json().encode() if isinstance(error, PartialPushDeliveryError) else None
+        if retries >= self.config.RABBITMQ_MAX_RETRIES:
+            logger.error(f"Message {message.delivery_tag} failed after {retries} retries. Dead-lettering it.")
+            return await self._dead_letter(message, f"max_retries_exceeded: {error}", body=body)
+        try:
+            await self.channel.default_exchange.publish(
+                self._copy_message(message, {RETRY_COUNT_HEADER: retries + 1}, body=body),
+                routing_key=self._retry_queue_names[retries],
+            )
+            logger.info(
+                f"Requeued message {message.delivery_tag} for retry {retries + 1}/{self.config.RABBITMQ_MAX_RETRIES} "
+                f"through '{self._retry_queue_names[retries]}'."
+            )
+        except Exception as e:
+            logger.error(f"Failed to requeue message {message.delivery_tag}: {e}. Dead-lettering it.")
+            return await self._dead_letter(message, f"requeue_failed: {error}", body=body)
+        return True
 
-    def _on_message_callback(self, ch, method, properties, body):
+    async def _dead_letter(self, message: AbstractIncomingMessage, reason: str, body: Optional[bytes] = None) -> bool:
         """
-        Callback executed when a message is received.
-        It runs the async message handler and acks/nacks the message.
+        Publishes the message (with `body` instead of its own, if given) to the dead-letter
+        exchange. Returns True if it was, so it still has to be acked, and False if it was
+        rejected (or left unsettled) instead.
         """
-        logger.debug(f"Received RabbitMQ message with delivery tag {method.delivery_tag}")
         try:
-            # Since this callback is synchronous, we run our async handler in a new event loop.
-            asyncio.run(self.message_handler.handle_message(body, "RabbitMQ"))
-            ch.basic_ack(delivery_tag=method.delivery_tag)
-            logger.debug(f"Successfully processed and ACKed message {method.delivery_tag}.")
-        except InvalidMessageFormatError:
-            logger.error(f"Invalid message format. NACKing message {method.delivery_tag} without requeue.")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            await self._dead_letter_exchange.publish(
+                self._copy_message(message, {"x-death-reason": reason[:255], "x-original-queue": self._queue.name}, body=body),
+                routing_key=self._queue.name,
+            )
         except Exception as e:
-            logger.exception(f"Unexpected error processing message {method.delivery_tag}. NACKing. Error: {e}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            # Reject instead of acking, so the message is not lost silently.
+            logger.error(f"Failed to dead-letter message {message.delivery_tag}: {e}. Rejecting it with requeue.")
+            try:
+                await message.nack(requeue=True)
+            except Exception as nack_error:
+                logger.error(f"Failed to NACK message {message.delivery_tag}: {nack_error}")
+            return False
+        return True
 
-    def start_consuming(self, queue_name: str):
+    async def retry_notification(self, payload: NotificationPayload, error: Exception) -> bool:
         """
-        Starts the message consumption loop. This is a blocking method
-        and should be run in a separate thread.
+        Queues a notification whose dispatch failed after its message was acked (e.g. a
+        coalesced digest) as the first retry of a new message, or dead-letters it if
+        retries are disabled or it cannot be queued.
+
+        Args:
+            payload: The notification that failed.
+            error: Its error. After a partial push failure, only the failed devices are retried.
+
+        Returns:
+            Whether the notification was published, for retry or to the dead-letter exchange.
+        """
+        if self.channel is None or self.channel.is_closed or self._queue is None:
+            logger.error(f"Cannot queue the notification for user '{payload.user_id}' for retry: RabbitMQ is not connected.")
+            return False
+        if isinstance(error, PartialPushDeliveryError):
+            payload = error.retry_payload
+        message = aio_pika.Message(
+            body=payload.model_dump_json().encode(),
+            headers={RETRY_COUNT_HEADER: 1},
+            content_type="application/json",
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        )
+        if self._retry_queue_names:
+            try:
+                await self.channel.default_exchange.publish(message, routing_key=self._retry_queue_names[0])
+                logger.info(f"Queued failed '{payload.event_type}' notification for user '{payload.user_id}' for retry.")
+                return True
+            except Exception as e:
+                logger.error(f"Failed to queue notification for user '{payload.user_id}' for retry: {e}. Dead-lettering it.")
+        try:
+            message.headers.update({"x-death-reason": f"dispatch_failed: {error}"[:255], "x-original-queue": self._queue.name})
+            await self._dead_letter_exchange.publish(message, routing_key=self._queue.name)
+        except Exception as e:
+            logger.error(f"Failed to dead-letter notification for user '{payload.user_id}': {e}")
+            return False
+        return True
+
+    @staticmethod
+    def _copy_message(message: AbstractIncomingMessage, extra_headers: dict, body: Optional[bytes] = None) -> aio_pika.Message:
+        return aio_pika.Message(
+            body=message.body if body is None else body,
+            headers={**(message.headers or {}), **extra_headers},
+            content_type=message.content_type,
+            content_encoding=message.content_encoding,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            message_id=message.message_id,
+            correlation_id=message.correlation_id,
+        )
+
+    async def start_consuming(self, queue_name: str):
+        """
+        Connects to RabbitMQ and starts consuming messages on the running event loop.
+        Returns once the consumer is registered; messages are handled in background tasks.
         """
         if not self.config.ENABLE_RABBITMQ_CONSUMER:
             logger.info("RabbitMQ consumer is disabled. Will not start.")
             return
 
-        if not self._connect():
+        if not await self._connect():
             return  # Could not connect, and stopping was signaled
 
-        self._setup_channel_and_queue(queue_name)
-        self.channel.basic_qos(prefetch_count=1)
-        self.channel.basic_consume(queue=queue_name, on_message_callback=self._on_message_callback)
+        self._semaphore = asyncio.Semaphore(self.config.RABBITMQ_MAX_CONCURRENCY)
+        await self.channel.set_qos(prefetch_count=self.config.RABBITMQ_PREFETCH_COUNT)
+        await self._setup_channel_and_queue(queue_name)
+        self._consumer_tag = await self._queue.consume(self._on_message)
 
-        logger.info(f"Starting RabbitMQ consumer on queue: '{queue_name}'. Waiting for messages.")
-        try:
-            self.channel.start_consuming()
-        except KeyboardInterrupt:
-            logger.info("Keyboard interrupt received. Stopping consumer.")
-        except Exception as e:
-            logger.error(f"Consumer loop stopped unexpectedly: {e}")
-        finally:
-            if self.connection and self.connection.is_open:
-                self.connection.close()
-            logger.info("RabbitMQ consumer has stopped.")
-
-    def stop_consuming(self):
-        """Stops the consumer gracefully. Can be called from another thread."""
+        logger.info(
+            f"Starting RabbitMQ consumer on queue: '{queue_name}' "
+            f"(prefetch: {self.config.RABBITMQ_PREFETCH_COUNT}, concurrency: {self.config.RABBITMQ_MAX_CONCURRENCY}). "
+            f"Waiting for messages."
+        )
+
+    async def stop_consuming(self):
+        """
+        Stops the consumer gracefully: no new deliveries are accepted, and messages in
+        progress are finished and acked. The connection stays open, for
+        `retry_notification`, until `close` is called.
+        """
         if not self.config.ENABLE_RABBITMQ_CONSUMER:
             return
-            
+
         logger.info("Stopping RabbitMQ consumer...")
         self._stopping = True
-        if self.channel and self.channel.is_open:
+        if self._queue and self._consumer_tag:
             try:
-                # This is thread-safe and will cause start_consuming() to exit
-                self.channel.stop_consuming()
+                await self._queue.cancel(self._consumer_tag)
                 logger.info("Consumer stopped.")
             except Exception as e:
                 logger.error(f"Error while stopping consumer: {e}")
 
-        if self.connection and self.connection.is_open:
-            self.connection.close()
-            logger.info("RabbitMQ connection closed.")
\ No newline at end of file
+        if self._handler_tasks:
+            done, pending = await asyncio.wait(list(self._handler_tasks), timeout=self.config.RABBITMQ_SHUTDOWN_TIMEOUT_SECONDS)
+            if pending:
+                logger.warning(f"{len(pending)} RabbitMQ message(s) still in progress at shutdown; they will be redelivered.")
+                for task in pending:
+                    task.cancel()
+        await self._ack_batcher.flush()
+
+    async def close(self):
+        """Closes the connection, once the consumer was stopped."""
+        if self.connection and not self.connection.is_closed:
+            await self.connection.close()
+            logger.info("RabbitMQ connection closed.")
@@ -41,6 +41,24 @@ class PushProviderError(NotificationDispatchError):
         super().__init__(message)
 
 
+class PartialPushDeliveryError(PushProviderError):
+    """
+    Raised when a push reached some of the user's devices but failed for others.
+    Only `retry_payload` should be retried, so the devices that already received
+    the push (and the WebSocket channel) are not notified twice.
+    """
+    def __init__(self, failed_tokens: Any, retry_payload: Any):
+        """
+        Initializes the PartialPushDeliveryError.
+
+        Args:
+            failed_tokens: The tokens the push failed for, with the reason.
+            retry_payload: The NotificationPayload to retry, limited to the failed tokens.
+        """
+        super().__init__(provider_name="push", original_error=failed_tokens)
+        self.retry_payload = retry_payload
+
+
 class InvalidMessageFormatError(ValueError, NotificationServiceError):
     """
 